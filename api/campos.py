@@ -0,0 +1,149 @@
+# api/campos.py
+"""
+Campos a pedido en las respuestas de la API.
+
+- ``?fields=id,uuid,estado`` limita la respuesta a los campos indicados.
+- ``?expand=lineas,autorizacion`` agrega los campos expandibles (objetos
+  anidados) aunque no estén en fields.
+
+Los serializers declaran en Meta ``campos_opcionales`` (solo se incluyen
+si se piden) y ``expandibles``. Los parámetros se aplican al serializer
+principal de la respuesta; los anidados usan sus campos por defecto.
+
+Las vistas ajustan el QuerySet a los campos que se van a serializar:
+difieren las columnas que no se piden y solo unen (select_related) o
+precargan (prefetch_related) las relaciones necesarias, según
+``relaciones_campos``.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+
+PARAMETRO_CAMPOS = 'fields'
+PARAMETRO_EXPANDIR = 'expand'
+
+
+def _lista(valor):
+    return [nombre.strip() for nombre in valor.split(',') if nombre.strip()]
+
+
+def campos_solicitados(request):
+    """
+    Retorna:
+    - Tupla (campos, expandir): campos es el conjunto pedido en ?fields= o
+      None si no se limitó; expandir es el conjunto de ?expand=
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+    campos = request.query_params.get(PARAMETRO_CAMPOS)
+    expandir = set(_lista(request.query_params.get(PARAMETRO_EXPANDIR, '')))
+    return (set(_lista(campos)) if campos is not None else None), expandir
+
+
+def _rutas(select_related, prefijo=''):
+    # Rutas 'a', 'a__b' de un select_related anidado ({'a': {'b': {}}})
+    for nombre, anidado in select_related.items():
+        ruta = f'{prefijo}{nombre}'
+        yield ruta
+        yield from _rutas(anidado, f'{ruta}__')
+
+
+class CamposDinamicosMixin:
+    """
+    Serializer que aplica ?fields= y ?expand= de la solicitud del contexto
+
+    Meta.campos_opcionales: campos que solo se incluyen si se piden en fields
+    (o en expand, si además son expandibles)
+    Meta.expandibles: campos que se agregan con expand
+    """
+
+    def es_principal(self):
+        """
+        Indica si es el serializer de la respuesta (o el de cada elemento
+        de un listado) y no uno anidado en otro
+        """
+        padre = self.parent
+        if isinstance(padre, serializers.ListSerializer):
+            padre = padre.parent
+        return padre is None
+
+    def get_fields(self):
+        fields = super().get_fields()
+        campos, expandir = None, set()
+        if self.es_principal():
+            campos, expandir = campos_solicitados(self.context.get('request'))
+        opcionales = set(getattr(self.Meta, 'campos_opcionales', ()))
+        expandibles = set(getattr(self.Meta, 'expandibles', ()))
+
+        for nombre in list(fields):
+            if nombre in expandibles and nombre in expandir:
+                continue
+            incluido = nombre in campos if campos is not None else nombre not in opcionales
+            if not incluido:
+                fields.pop(nombre)
+        return fields
+
+
+class CamposDinamicosViewSetMixin:
+    """
+    ViewSet que ajusta el QuerySet a los campos que se van a serializar
+
+    relaciones_campos: {campo serializado: {'select': [...], 'prefetch':
+    [...], 'columnas': [...]}} con las relaciones y columnas que necesita
+    cada campo que no es una columna del modelo
+    """
+    relaciones_campos = {}
+
+    def campos_serializados(self):
+        """
+        Nombres de los campos de salida del serializer para esta solicitud
+        """
+        serializer = self.get_serializer()
+        return [nombre for nombre, campo in serializer.fields.items() if not campo.write_only]
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return self.ajustar_a_campos(queryset)
+
+    def ajustar_a_campos(self, queryset):
+        """
+        Une y precarga solo las relaciones de los campos a serializar y, si
+        se limitaron con ?fields=, difiere las demás columnas
+        """
+        campos, _ = campos_solicitados(self.request)
+        modelo = queryset.model
+        columnas = {'pk'}
+        select = set()
+        prefetch = set()
+
+        for nombre in self.campos_serializados():
+            relacion = self.relaciones_campos.get(nombre, {})
+            select.update(relacion.get('select', ()))
+            prefetch.update(relacion.get('prefetch', ()))
+            columnas.update(relacion.get('columnas', ()))
+            try:
+                campo = modelo._meta.get_field(nombre)
+            except FieldDoesNotExist:
+                continue
+            if campo.concrete:
+                columnas.add(nombre)
+
+        if select:
+            queryset = queryset.select_related(*sorted(select))
+        if prefetch:
+            queryset = queryset.prefetch_related(*sorted(prefetch))
+
+        if campos is None or queryset.query.select_related is True:
+            return queryset
+
+        # El campo del cursor se necesita para armar los enlaces de página
+        campo_cursor = getattr(self, 'campo_cursor', None)
+        if campo_cursor:
+            columnas.add(campo_cursor)
+        # Cada tramo de una relación unida debe quedar entre las columnas
+        if queryset.query.select_related:
+            columnas.update(_rutas(queryset.query.select_related))
+        return queryset.only(*columnas)
@@ -0,0 +1,175 @@
+# api/condicional.py
+"""
+Solicitudes GET condicionales (ETag y Last-Modified).
+
+Las respuestas de detalle y de listado llevan un ETag fuerte calculado con
+las versiones de los serializers (Meta.version del serializer y de los
+anidados, que se incrementa al cambiar la representación; los listados con
+una serialización propia declaran además ``version_listado``), la URL
+pedida, el formato de salida y las fechas ``modified`` de las filas que se
+van a serializar. Antes de serializar se lee solo esa firma con una
+consulta de ``values_list``; si coincide con If-None-Match (o, en el
+detalle, con If-Modified-Since) se responde 304 sin instanciar ni
+serializar los objetos. Si no coincide, el listado serializa las filas de
+la página ya tomada en la firma, sin volver a paginar.
+
+Los campos anidados que dependen de otras filas declaran en
+``relaciones_campos`` la clave ``'modificado'`` con las rutas a su fecha de
+modificación (p. ej. ``['autorizacion__modified']``); deben ser relaciones
+de un solo objeto para no multiplicar las filas.
+"""
+import hashlib
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework import serializers
+
+
+def etiqueta(*partes):
+    """
+    ETag fuerte a partir de valores serializables en JSON
+    """
+    contenido = json.dumps(partes, default=str, separators=(',', ':'))
+    return '"%s"' % hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+
+def versiones(serializer):
+    """
+    Meta.version del serializer y de sus serializers anidados, en el orden
+    de los campos
+
+    Lanza:
+    - AttributeError si algún serializer no declara Meta.version
+    """
+    resultado = [serializer.Meta.version]
+    for campo in serializer.fields.values():
+        campo = getattr(campo, 'child', campo)
+        if isinstance(campo, serializers.Serializer) and not campo.write_only:
+            resultado.append(versiones(campo))
+    return resultado
+
+
+def _ultima(fechas):
+    fechas = [fecha for fecha in fechas if fecha is not None]
+    return max(fechas) if fechas else None
+
+
+class RespuestaCondicionalMixin:
+    """
+    ViewSet que responde 304 a los GET condicionales de retrieve y list
+
+    Requiere CamposDinamicosViewSetMixin (usa campos_serializados y
+    relaciones_campos). Los modelos sin el campo modified se responden
+    siempre completos.
+
+    version_listado: versión de la representación del listado cuando la
+    vista lo serializa sin el serializer (ver serializar_pagina)
+    """
+    version_listado = None
+
+    def columnas_modificacion(self, queryset):
+        """
+        Columnas con las fechas de modificación de los campos a serializar,
+        o None si el modelo no registra su modificación
+        """
+        try:
+            queryset.model._meta.get_field('modified')
+        except FieldDoesNotExist:
+            return None
+        columnas = ['modified']
+        for nombre in self.campos_serializados():
+            columnas.extend(self.relaciones_campos.get(nombre, {}).get('modificado', ()))
+        return columnas
+
+    def variante(self):
+        """
+        Lo que, además de los datos, cambia la representación: las
+        versiones de los serializers, la URL con sus parámetros y el
+        formato de salida
+        """
+        version = versiones(self.get_serializer())
+        if self.action == 'list':
+            version.append(self.version_listado)
+        return [version, self.request.get_full_path(), self.request.accepted_renderer.format]
+
+    def _responder(self, respuesta, etag, modificado):
+        respuesta['ETag'] = etag
+        if modificado is not None:
+            respuesta['Last-Modified'] = http_date(modificado.timestamp())
+        return respuesta
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        columnas = self.columnas_modificacion(queryset)
+        if columnas is None:
+            return super().retrieve(request, *args, **kwargs)
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        fila = queryset.prefetch_related(None).filter(
+            **{self.lookup_field: kwargs[lookup_url_kwarg]}
+        ).values_list('pk', *columnas)[:1]
+        if not fila:
+            return super().retrieve(request, *args, **kwargs)
+
+        pk, *fechas = fila[0]
+        etag = etiqueta(self.variante(), pk, fechas)
+        modificado = _ultima(fechas)
+
+        no_modificado = get_conditional_response(request._request, etag=etag, last_modified=(
+            int(modificado.timestamp()) if modificado is not None else None
+        ))
+        if no_modificado is not None:
+            return self._responder(no_modificado, etag, modificado)
+        return self._responder(super().retrieve(request, *args, **kwargs), etag, modificado)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        columnas = self.columnas_modificacion(queryset)
+        if columnas is None or self.paginator is None:
+            return self.listar(request, *args, **kwargs)
+
+        # La firma es la misma respuesta paginada (total, enlaces) con solo
+        # el id y las fechas de modificación de cada fila de la página
+        campo_cursor = getattr(self, 'campo_cursor', None)
+        valores = dict.fromkeys(['id', *([campo_cursor] if campo_cursor else []), *columnas])
+        firma = queryset.prefetch_related(None).values(*valores)
+        filas = self.paginate_queryset(firma)
+        if filas is None:
+            return self.listar(request, *args, **kwargs)
+        pagina = self.get_paginated_response([
+            [fila['id'], *(fila[columna] for columna in columnas)] for fila in filas
+        ]).data
+        etag = etiqueta(self.variante(), pagina)
+        modificado = _ultima(fila[columna] for fila in filas for columna in columnas)
+
+        # If-Modified-Since no alcanza para detectar filas eliminadas de la
+        # página, por lo que en los listados solo se compara el ETag
+        no_modificado = get_conditional_response(request._request, etag=etag)
+        if no_modificado is not None:
+            return self._responder(no_modificado, etag, modificado)
+
+        # El paginador conserva el estado de la firma (total, enlaces)
+        datos = self.serializar_pagina(queryset, [fila['id'] for fila in filas])
+        return self._responder(self.get_paginated_response(datos), etag, modificado)
+
+    def serializar_pagina(self, queryset, ids):
+        """
+        Serializa las filas de una página ya paginada, en su orden; las
+        eliminadas después de leer la firma se omiten
+
+        Parámetros:
+        - queryset: QuerySet filtrado y ajustado a los campos pedidos
+        - ids: Ids de las filas de la página
+        """
+        objetos = queryset.in_bulk(ids)
+        return self.get_serializer([objetos[pk] for pk in ids if pk in objetos], many=True).data
+
+    def listar(self, request, *args, **kwargs):
+        """
+        Respuesta completa del listado sin firma (modelos sin modified o
+        vistas sin paginación); las vistas con un listado propio reemplazan
+        este método y serializar_pagina en lugar de list
+        """
+        return super().list(request, *args, **kwargs)
@@ -0,0 +1,27 @@
+# api/filters.py
+from rest_framework import filters
+from rest_framework.settings import api_settings
+
+from core import busqueda
+
+
+class BusquedaIndexadaFilter(filters.SearchFilter):
+    """
+    Filtro ?search= que usa el índice de búsqueda (core.busqueda) sobre los
+    search_fields de la vista en lugar de icontains
+
+    Si el cliente no pide un orden (?ordering=), los resultados se ordenan
+    por relevancia y luego por el orden de la vista, por lo que debe ir
+    después de OrderingFilter en filter_backends.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        texto = request.query_params.get(self.search_param, '')
+        if not busqueda.palabras_consulta(texto):
+            return queryset
+
+        queryset = busqueda.buscar(queryset, texto, self.get_search_fields(view, request))
+        if api_settings.ORDERING_PARAM in request.query_params:
+            return queryset
+        orden = queryset.query.order_by or queryset.model._meta.ordering or ['-pk']
+        return queryset.order_by('-relevancia', *orden)
@@ -0,0 +1,74 @@
+# api/management/commands/benchmark_lista_documentos.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from api.serializers import (
+    COLUMNAS_LISTA_DOCUMENTOS, DocumentoTributarioSerializer, serializar_lista_documentos
+)
+from emisor.models import DocumentoTributario
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el tiempo de serializar el listado de documentos con '
+        'DocumentoTributarioSerializer contra el listado rápido con values() '
+        'y verifica que ambos generen el mismo JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documentos', type=int, default=1000, help='Documentos a serializar')
+        parser.add_argument('--repeticiones', type=int, default=5, help='Ejecuciones de cada serialización')
+
+    def handle(self, *args, **options):
+        if options['documentos'] < 1 or options['repeticiones'] < 1:
+            raise CommandError('Los documentos y las repeticiones deben ser mayores que cero')
+
+        documentos = DocumentoTributario.objects.order_by('-fecha_emision', '-id')
+        ids = list(documentos.values_list('id', flat=True)[:options['documentos']])
+        if not ids:
+            raise CommandError('No hay documentos para serializar')
+        documentos = documentos.filter(pk__in=ids)
+        renderer = JSONRenderer()
+
+        def serializer():
+            return renderer.render(DocumentoTributarioSerializer(documentos.all(), many=True).data)
+
+        def rapido():
+            return renderer.render(serializar_lista_documentos(documentos.values(*COLUMNAS_LISTA_DOCUMENTOS)))
+
+        self.stdout.write(f'Motor de base de datos: {connection.vendor}')
+        self.stdout.write(f'Documentos: {len(ids)}')
+
+        resultado_serializer, duracion_serializer = self._medir('DocumentoTributarioSerializer', serializer, len(ids), options)
+        resultado_rapido, duracion_rapido = self._medir('values() + serializar_lista_documentos', rapido, len(ids), options)
+
+        if resultado_serializer != resultado_rapido:
+            raise CommandError('El listado rápido no genera el mismo JSON que el serializer')
+        self.stdout.write(f'  JSON idéntico ({len(resultado_rapido)} bytes)')
+        if duracion_rapido > 0:
+            self.stdout.write(self.style.SUCCESS(f'  Mejora: {duracion_serializer / duracion_rapido:.1f}x'))
+
+    def _medir(self, etiqueta, serializar, cantidad, options):
+        """
+        Ejecuta la serialización las veces indicadas y muestra el tiempo por
+        cada 1.000 documentos y las consultas ejecutadas
+
+        Retorna:
+        - Tupla (JSON generado, duración media)
+        """
+        with CaptureQueriesContext(connection) as consultas:
+            resultado = serializar()
+        inicio = time.perf_counter()
+        for _ in range(options['repeticiones']):
+            serializar()
+        duracion = (time.perf_counter() - inicio) / options['repeticiones']
+
+        self.stdout.write(
+            f'  {etiqueta}: {duracion * 1000 * 1000 / cantidad:.1f} ms por 1.000 documentos, '
+            f'{len(consultas.captured_queries)} consultas'
+        )
+        return resultado, duracion
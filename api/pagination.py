@@ -0,0 +1,126 @@
+# api/pagination.py
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from core.paginacion import CursorInvalido, contar, paginar_por_cursor
+
+
+class PaginacionCursor(BasePagination):
+    """
+    Paginación por cursor sobre (campo_cursor, id) descendentes
+
+    La vista indica el campo con el atributo campo_cursor. Cada página
+    filtra a partir de la última fila de la anterior, por lo que recorrer
+    todo el historial no se degrada con la profundidad.
+
+    Si el cliente pide una página por número (?page=), otro orden
+    (?ordering=) o una búsqueda (?search=, ordenada por relevancia) las
+    páginas se toman por número y la respuesta conserva la forma de
+    PageNumberPagination ({count, next, previous, results}); count es
+    exacto salvo en listados sin filtros muy grandes (ver contar). Por
+    cursor la respuesta es {next, previous, results}, sin count.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    page_query_param = 'page'
+    ordering_param = api_settings.ORDERING_PARAM
+    invalid_cursor_message = 'Cursor inválido.'
+    invalid_page_message = 'Página inválida.'
+
+    def usa_cursor(self, request, campo):
+        if self.page_query_param in request.query_params:
+            return False
+        if api_settings.SEARCH_PARAM in request.query_params:
+            return False
+        ordenamiento = request.query_params.get(self.ordering_param)
+        return not ordenamiento or ordenamiento == f'-{campo}'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        campo = getattr(view, 'campo_cursor', 'fecha_emision')
+        self.request = request
+        self.por_numero = not self.usa_cursor(request, campo)
+
+        if self.por_numero:
+            return self.paginar_por_numero(queryset, request)
+
+        try:
+            filas, self.siguiente, self.anterior = paginar_por_cursor(
+                queryset, campo, request.query_params.get(self.cursor_query_param), self.page_size
+            )
+        except CursorInvalido:
+            raise NotFound(self.invalid_cursor_message)
+        return filas
+
+    def paginar_por_numero(self, queryset, request):
+        """
+        Toma la página pedida con OFFSET y una fila adicional para saber si
+        hay una siguiente, sin depender de que el total sea exacto
+        """
+        try:
+            pagina = int(request.query_params.get(self.page_query_param, 1))
+        except (TypeError, ValueError):
+            pagina = 0
+        if pagina < 1:
+            raise NotFound(self.invalid_page_message)
+
+        inicio = (pagina - 1) * self.page_size
+        filas = list(queryset[inicio:inicio + self.page_size + 1])
+        if pagina > 1 and not filas:
+            raise NotFound(self.invalid_page_message)
+
+        self.total = contar(queryset)
+        self.siguiente = pagina + 1 if len(filas) > self.page_size else None
+        self.anterior = pagina - 1 if pagina > 1 else None
+        return filas[:self.page_size]
+
+    def get_link(self, posicion):
+        if posicion is None:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.por_numero:
+            url = remove_query_param(url, self.cursor_query_param)
+            if posicion == 1:
+                return remove_query_param(url, self.page_query_param)
+            return replace_query_param(url, self.page_query_param, posicion)
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, posicion)
+
+    def get_paginated_response(self, data):
+        respuesta = {
+            'next': self.get_link(self.siguiente),
+            'previous': self.get_link(self.anterior),
+            'results': data,
+        }
+        if self.por_numero:
+            respuesta = {'count': self.total, **respuesta}
+        return Response(respuesta)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'count': {'type': 'integer', 'description': 'Solo al paginar por número de página'},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.cursor_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Cursor de la página (tomado de next o previous)',
+            'schema': {'type': 'string'},
+        }, {
+            'name': self.page_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Número de página (con ?ordering= distinto del orden por defecto o ?search=)',
+            'schema': {'type': 'integer'},
+        }]
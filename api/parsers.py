@@ -0,0 +1,34 @@
+# api/parsers.py
+import codecs
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parser para cuerpos NDJSON (un objeto JSON por línea)
+
+    Retorna un generador que lee el cuerpo línea por línea, por lo que una
+    carga grande no se carga completa en memoria. Las líneas que no son JSON
+    válido se entregan como una instancia de ValueError para que la vista
+    reporte el error de ese registro sin abortar la carga.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        lector = codecs.getreader(encoding)(stream)
+        return self._registros(lector)
+
+    def _registros(self, lector):
+        for linea in lector:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea)
+            except ValueError as e:
+                yield ValueError(f"JSON inválido: {e}")
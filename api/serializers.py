@@ -1,26 +1,38 @@
 # api/serializers.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.utils import timezone
 from rest_framework import serializers
 
+from emisor import directorio
 from emisor.models import DocumentoTributario, LineaDocumento, Contribuyente, TipoDocumento
-from autoriza.models import Autorizacion, EstadisticaDiaria
+from emisor.services import ReferenciaDuplicada, guardar_documento
+from autoriza.models import (
+    Autorizacion, EstadisticaDiaria, TrabajoIngesta,
+    ErrorIngesta, TareaAutorizacion
+)
+from .campos import CamposDinamicosMixin
 
 
-class ContribuyenteSerializer(serializers.ModelSerializer):
+class ContribuyenteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para el modelo Contribuyente
     """
     class Meta:
         model = Contribuyente
+        version = 1
         fields = ['id', 'nit', 'nombre', 'nombre_comercial', 'direccion', 'correo', 'telefono']
         read_only_fields = ['id']
 
 
-class TipoDocumentoSerializer(serializers.ModelSerializer):
+class TipoDocumentoSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para el modelo TipoDocumento
     """
     class Meta:
         model = TipoDocumento
+        version = 1
         fields = ['id', 'codigo', 'nombre', 'descripcion', 'activo']
         read_only_fields = ['id']
 
@@ -33,6 +45,7 @@ class LineaDocumentoSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = LineaDocumento
+        version = 1
         fields = ['id', 'descripcion', 'cantidad', 'precio_unitario', 'descuento', 'subtotal']
         read_only_fields = ['id', 'subtotal']
     
@@ -52,7 +65,20 @@ class LineaDocumentoSerializer(serializers.ModelSerializer):
         return data
 
 
-class DocumentoTributarioSerializer(serializers.ModelSerializer):
+class AutorizacionResumenSerializer(serializers.ModelSerializer):
+    """
+    Serializer de la autorización incluida en un documento (?expand=autorizacion)
+    """
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+
+    class Meta:
+        model = Autorizacion
+        version = 1
+        fields = ['id', 'numero_autorizacion', 'estado', 'estado_display', 'fecha_autorizacion']
+        read_only_fields = fields
+
+
+class DocumentoTributarioSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para el modelo DocumentoTributario
     """
@@ -60,20 +86,24 @@ class DocumentoTributarioSerializer(serializers.ModelSerializer):
     lineas = LineaDocumentoSerializer(many=True, required=True)
     receptor_nit = serializers.CharField(write_only=True)
     estado_display = serializers.CharField(source='get_estado_display', read_only=True)
-    
+    autorizacion = AutorizacionResumenSerializer(read_only=True, allow_null=True)
+
     class Meta:
         model = DocumentoTributario
+        version = 1
         fields = [
             'id', 'uuid', 'tipo_documento', 'referencia_interna',
             'emisor', 'establecimiento', 'receptor', 'receptor_nit',
             'fecha_emision', 'moneda', 'subtotal', 'descuento',
             'iva', 'total', 'estado', 'estado_display', 'observaciones',
-            'es_borrador', 'lineas'
+            'es_borrador', 'lineas', 'autorizacion'
         ]
         read_only_fields = [
             'id', 'uuid', 'emisor', 'receptor', 'subtotal',
             'iva', 'total', 'estado', 'es_borrador'
         ]
+        campos_opcionales = ['autorizacion']
+        expandibles = ['lineas', 'autorizacion']
     
     def validate_receptor_nit(self, value):
         """
@@ -88,47 +118,17 @@ class DocumentoTributarioSerializer(serializers.ModelSerializer):
             # Validar formato del NIT
             validate_nit(nit_limpio)
             
-            # Buscar contribuyente por NIT
-            try:
-                receptor = Contribuyente.objects.get(nit=nit_limpio)
-                return receptor
-            except Contribuyente.DoesNotExist:
+            # Buscar contribuyente por NIT en el directorio compartido
+            receptor = directorio.contribuyente(nit_limpio)
+            if receptor is None:
                 raise serializers.ValidationError(
                     "No existe un contribuyente con el NIT proporcionado"
                 )
+            return receptor
                 
         except Exception as e:
             raise serializers.ValidationError(str(e))
     
-    def validate(self, data):
-        """
-        Validaciones adicionales para el documento
-        """
-        # Validar que no exista un documento con la misma referencia para el mismo emisor en el mismo día
-        emisor = self.context['request'].user.contribuyente
-        referencia = data.get('referencia_interna')
-        
-        if referencia and emisor:
-            from django.utils import timezone
-            hoy = timezone.now().date()
-            
-            # Excluir el documento actual en caso de actualización
-            query = DocumentoTributario.objects.filter(
-                emisor=emisor,
-                referencia_interna=referencia,
-                fecha_emision__date=hoy
-            )
-            
-            if self.instance:
-                query = query.exclude(pk=self.instance.pk)
-                
-            if query.exists():
-                raise serializers.ValidationError(
-                    {"referencia_interna": "Ya existe un documento con esta referencia para el día de hoy"}
-                )
-        
-        return data
-    
     def create(self, validated_data):
         """
         Crear documento con sus líneas
@@ -137,31 +137,19 @@ class DocumentoTributarioSerializer(serializers.ModelSerializer):
         lineas_data = validated_data.pop('lineas')
         receptor = validated_data.pop('receptor_nit')
         
-        # Crear documento
+        # Crear documento y líneas con los totales calculados en memoria
         documento = DocumentoTributario(
             emisor=self.context['request'].user.contribuyente,
             receptor=receptor,
             **validated_data
         )
+        lineas = [LineaDocumento(**linea_data) for linea_data in lineas_data]
         
-        # Guardar para tener un ID
-        documento.save()
-        
-        # Crear líneas
-        for linea_data in lineas_data:
-            LineaDocumento.objects.create(
-                documento=documento,
-                **linea_data
-            )
-        
-        # Calcular totales
-        documento.subtotal = sum(linea.subtotal for linea in documento.lineas.all())
-        documento.descuento = sum(linea.descuento for linea in documento.lineas.all())
-        documento.iva = documento.calcular_iva()
-        documento.total = documento.calcular_total()
-        documento.save()
-        
-        return documento
+        # La referencia repetida en el día la rechaza la restricción única
+        try:
+            return guardar_documento(documento, lineas)
+        except ReferenciaDuplicada as e:
+            raise serializers.ValidationError(e.message_dict)
     
     def update(self, instance, validated_data):
         """
@@ -182,29 +170,193 @@ class DocumentoTributarioSerializer(serializers.ModelSerializer):
         if 'receptor_nit' in validated_data:
             instance.receptor = validated_data.get('receptor_nit')
         
-        # Actualizar líneas si se proporcionan
+        # Reemplazar las líneas si se proporcionan y recalcular totales
+        lineas = None
         if 'lineas' in validated_data:
-            # Eliminar líneas existentes
-            instance.lineas.all().delete()
-            
-            # Crear nuevas líneas
-            for linea_data in validated_data.get('lineas'):
-                LineaDocumento.objects.create(
-                    documento=instance,
-                    **linea_data
-                )
+            lineas = [LineaDocumento(**linea_data) for linea_data in validated_data.get('lineas')]
         
-        # Recalcular totales
-        instance.subtotal = sum(linea.subtotal for linea in instance.lineas.all())
-        instance.descuento = sum(linea.descuento for linea in instance.lineas.all())
-        instance.iva = instance.calcular_iva()
-        instance.total = instance.calcular_total()
-        instance.save()
-        
-        return instance
+        try:
+            return guardar_documento(instance, lineas, reemplazar=True)
+        except ReferenciaDuplicada as e:
+            raise serializers.ValidationError(e.message_dict)
+
+
+# Listado rápido de documentos: las columnas se leen con values() y se
+# convierten a la misma representación que DocumentoTributarioSerializer
+COLUMNAS_LISTA_AUTORIZACION = [
+    'autorizacion__id', 'autorizacion__numero_autorizacion',
+    'autorizacion__estado', 'autorizacion__fecha_autorizacion',
+]
+
+# Columnas que necesita cada campo del serializer
+COLUMNAS_CAMPOS_DOCUMENTO = {
+    'id': ['id'],
+    'uuid': ['uuid'],
+    'tipo_documento': ['tipo_documento_id'],
+    'referencia_interna': ['referencia_interna'],
+    'emisor': ['emisor_id'],
+    'establecimiento': ['establecimiento_id'],
+    'receptor': ['receptor_id'],
+    'fecha_emision': ['fecha_emision'],
+    'moneda': ['moneda'],
+    'subtotal': ['subtotal'],
+    'descuento': ['descuento'],
+    'iva': ['iva'],
+    'total': ['total'],
+    'estado': ['estado'],
+    'estado_display': ['estado'],
+    'observaciones': ['observaciones'],
+    'es_borrador': ['es_borrador'],
+    'lineas': [],
+    'autorizacion': COLUMNAS_LISTA_AUTORIZACION,
+}
+
+# Versión de la representación de serializar_lista_documentos; se incrementa
+# al cambiarla, como Meta.version en los serializers (ver api.condicional)
+VERSION_LISTA_DOCUMENTOS = 1
+
+# Campos por defecto (sin ?fields= ni ?expand=)
+CAMPOS_LISTA_DOCUMENTOS = [campo for campo in COLUMNAS_CAMPOS_DOCUMENTO if campo != 'autorizacion']
+COLUMNAS_LISTA_DOCUMENTOS = [
+    'id', 'uuid', 'tipo_documento_id', 'referencia_interna', 'emisor_id',
+    'establecimiento_id', 'receptor_id', 'fecha_emision', 'moneda', 'subtotal',
+    'descuento', 'iva', 'total', 'estado', 'observaciones', 'es_borrador',
+]
+COLUMNAS_LISTA_LINEAS = [
+    'documento_id', 'id', 'descripcion', 'cantidad', 'precio_unitario', 'descuento', 'subtotal'
+]
+
+_CENTAVOS = Decimal('0.01')
+_ESTADOS_DOCUMENTO = dict(DocumentoTributario.ESTADOS)
+_ESTADOS_AUTORIZACION = dict(Autorizacion.ESTADOS)
+
+
+def _decimal(valor):
+    # Igual que serializers.DecimalField con dos decimales y COERCE_DECIMAL_TO_STRING
+    return None if valor is None else '{:f}'.format(valor.quantize(_CENTAVOS))
+
+
+def _fecha_hora(valor, zona):
+    # Igual que serializers.DateTimeField en formato ISO 8601
+    if valor is None:
+        return None
+    if timezone.is_aware(valor):
+        valor = valor.astimezone(zona)
+    texto = valor.isoformat()
+    return texto[:-6] + 'Z' if texto.endswith('+00:00') else texto
+
+
+def columnas_lista_documentos(campos, *adicionales):
+    """
+    Columnas de values() que necesitan los campos indicados
+
+    Parámetros:
+    - campos: Campos del serializer a generar
+    - adicionales: Otras columnas requeridas (p. ej. el campo del cursor)
+    """
+    columnas = ['id', *adicionales]
+    for campo in campos:
+        columnas.extend(COLUMNAS_CAMPOS_DOCUMENTO.get(campo, ()))
+    return list(dict.fromkeys(columnas))
+
 
+def _lineas_documentos(ids):
+    lineas = defaultdict(list)
+    for documento_id, pk, descripcion, cantidad, precio, descuento, subtotal in LineaDocumento.objects.filter(
+        documento_id__in=ids
+    ).order_by('documento_id', 'id').values_list(*COLUMNAS_LISTA_LINEAS):
+        lineas[documento_id].append({
+            'id': pk,
+            'descripcion': descripcion,
+            'cantidad': _decimal(cantidad),
+            'precio_unitario': _decimal(precio),
+            'descuento': _decimal(descuento),
+            'subtotal': _decimal(subtotal),
+        })
+    return lineas
 
-class AutorizacionSerializer(serializers.ModelSerializer):
+
+def _autorizacion(fila, zona):
+    # Igual que AutorizacionResumenSerializer; None si no tiene autorización
+    if fila['autorizacion__id'] is None:
+        return None
+    estado = fila['autorizacion__estado']
+    return {
+        'id': fila['autorizacion__id'],
+        'numero_autorizacion': fila['autorizacion__numero_autorizacion'],
+        'estado': estado,
+        'estado_display': _ESTADOS_AUTORIZACION.get(estado, estado),
+        'fecha_autorizacion': _fecha_hora(fila['autorizacion__fecha_autorizacion'], zona),
+    }
+
+
+def serializar_lista_documentos(filas, campos=None):
+    """
+    Serializa documentos leídos con values() sin instanciar modelos ni
+    campos de DRF
+
+    El resultado es idéntico al de DocumentoTributarioSerializer(many=True)
+    con los mismos campos. Si se incluyen las líneas, las de todos los
+    documentos se leen con una sola consulta.
+
+    Parámetros:
+    - filas: Diccionarios con las columnas de columnas_lista_documentos(campos)
+    - campos: Campos a generar, en el orden del serializer (por defecto
+      CAMPOS_LISTA_DOCUMENTOS)
+
+    Retorna:
+    - Lista de diccionarios lista para el renderer
+    """
+    campos = CAMPOS_LISTA_DOCUMENTOS if campos is None else campos
+    filas = list(filas)
+    zona = timezone.get_current_timezone()
+    lineas = _lineas_documentos([fila['id'] for fila in filas]) if 'lineas' in campos else None
+
+    convertir = {
+        'id': lambda fila: fila['id'],
+        'uuid': lambda fila: str(fila['uuid']),
+        'tipo_documento': lambda fila: fila['tipo_documento_id'],
+        'referencia_interna': lambda fila: fila['referencia_interna'],
+        'emisor': lambda fila: fila['emisor_id'],
+        'establecimiento': lambda fila: fila['establecimiento_id'],
+        'receptor': lambda fila: fila['receptor_id'],
+        'fecha_emision': lambda fila: _fecha_hora(fila['fecha_emision'], zona),
+        'moneda': lambda fila: fila['moneda'],
+        'subtotal': lambda fila: _decimal(fila['subtotal']),
+        'descuento': lambda fila: _decimal(fila['descuento']),
+        'iva': lambda fila: _decimal(fila['iva']),
+        'total': lambda fila: _decimal(fila['total']),
+        'estado': lambda fila: fila['estado'],
+        'estado_display': lambda fila: _ESTADOS_DOCUMENTO.get(fila['estado'], fila['estado']),
+        'observaciones': lambda fila: fila['observaciones'],
+        'es_borrador': lambda fila: fila['es_borrador'],
+        'lineas': lambda fila: lineas[fila['id']],
+        'autorizacion': lambda fila: _autorizacion(fila, zona),
+    }
+    conversiones = [(campo, convertir[campo]) for campo in campos if campo in convertir]
+
+    return [{campo: valor(fila) for campo, valor in conversiones} for fila in filas]
+
+
+class DocumentoBulkSerializer(serializers.Serializer):
+    """
+    Serializer de cada documento de una carga masiva
+    
+    Las referencias a otros modelos se reciben como id y se resuelven en
+    bloque para toda la carga, por lo que validar un registro no consulta
+    la base de datos.
+    """
+    tipo_documento = serializers.IntegerField()
+    referencia_interna = serializers.CharField(max_length=40)
+    establecimiento = serializers.IntegerField()
+    receptor_nit = serializers.CharField(max_length=20)
+    fecha_emision = serializers.DateTimeField(required=False)
+    moneda = serializers.CharField(max_length=3, default='GTQ')
+    observaciones = serializers.CharField(allow_blank=True, default='')
+    lineas = LineaDocumentoSerializer(many=True, allow_empty=False)
+
+
+class AutorizacionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para el modelo Autorizacion
     """
@@ -213,14 +365,16 @@ class AutorizacionSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Autorizacion
+        version = 1
         fields = [
             'id', 'documento', 'numero_autorizacion', 'estado',
             'estado_display', 'fecha_autorizacion'
         ]
         read_only_fields = fields
+        expandibles = ['documento']
 
 
-class EstadisticaDiariaSerializer(serializers.ModelSerializer):
+class EstadisticaDiariaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """
     Serializer para el modelo EstadisticaDiaria
     """
@@ -228,10 +382,73 @@ class EstadisticaDiariaSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = EstadisticaDiaria
+        version = 1
         fields = [
             'id', 'fecha', 'facturas_recibidas', 'errores_nit_emisor',
             'errores_nit_receptor', 'errores_iva', 'errores_total',
             'errores_referencia_duplicada', 'facturas_correctas',
             'cantidad_emisores', 'cantidad_receptores', 'total_errores'
         ]
-        read_only_fields = fields
\ No newline at end of file
+        read_only_fields = fields
+
+
+class TrabajoIngestaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """
+    Serializer para el modelo TrabajoIngesta
+    """
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    
+    class Meta:
+        model = TrabajoIngesta
+        version = 1
+        fields = [
+            'id', 'nombre_original', 'estado', 'estado_display',
+            'registros_leidos', 'documentos_creados', 'documentos_aprobados',
+            'documentos_rechazados', 'registros_con_error', 'mensaje',
+            'fecha_inicio', 'fecha_fin', 'created'
+        ]
+        read_only_fields = fields
+
+
+class ErrorIngestaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """
+    Serializer para el modelo ErrorIngesta
+    """
+    class Meta:
+        model = ErrorIngesta
+        version = 1
+        fields = ['id', 'registro', 'referencia', 'detalle']
+        read_only_fields = fields
+
+
+
+class TareaAutorizacionSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """
+    Serializer para el modelo TareaAutorizacion
+    """
+    estado_display = serializers.CharField(source='get_estado_display', read_only=True)
+    autorizacion = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = TareaAutorizacion
+        version = 1
+        fields = [
+            'id', 'documento', 'estado', 'estado_display', 'intentos',
+            'ultimo_error', 'autorizacion', 'created', 'fecha_fin'
+        ]
+        read_only_fields = fields
+    
+    def get_autorizacion(self, obj):
+        """
+        Resultado de la autorización una vez procesada la tarea
+        """
+        try:
+            autorizacion = obj.documento.autorizacion
+        except Autorizacion.DoesNotExist:
+            return None
+        
+        return {
+            'id': autorizacion.id,
+            'estado': autorizacion.estado,
+            'numero_autorizacion': autorizacion.numero_autorizacion,
+        }
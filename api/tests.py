@@ -1,3 +1,374 @@
+import datetime
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.tests import EscenarioMixin, nit_valido
+from emisor.models import DocumentoTributario
+from emisor.services import ReferenciaDuplicada
+
+
+class DocumentosBulkTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+
+    def registro(self, referencia, receptor_nit=None):
+        return {
+            'tipo_documento': self.tipo.pk,
+            'referencia_interna': referencia,
+            'establecimiento': self.establecimiento.pk,
+            'receptor_nit': receptor_nit or self.receptor.nit,
+            'lineas': [{'descripcion': 'Servicio', 'cantidad': '1', 'precio_unitario': '100.00'}],
+        }
+
+    def cargar(self, registros):
+        respuesta = self.cliente.post(reverse('documento-bulk'), registros, format='json')
+        self.assertEqual(respuesta.status_code, 200)
+        lineas = [json.loads(linea) for linea in b''.join(respuesta.streaming_content).splitlines()]
+        return lineas[:-1], lineas[-1]['resumen']
+
+    def test_errores_por_campo_con_listas_de_mensajes(self):
+        self.documento('BULK-1')
+
+        resultados, resumen = self.cargar([
+            self.registro('BULK-1'),
+            self.registro('BULK-2'),
+            self.registro('BULK-2'),
+            self.registro('BULK-3', receptor_nit=nit_valido(555)),
+            {'referencia_interna': 'BULK-4'},
+        ])
+
+        self.assertEqual(resumen, {'creados': 1, 'errores': 4})
+        self.assertEqual([resultado['estado'] for resultado in resultados], ['ERROR', 'CREADO', 'ERROR', 'ERROR', 'ERROR'])
+        duplicada = ReferenciaDuplicada.errores(timezone.localdate())
+        self.assertEqual(resultados[0]['errores'], duplicada)
+        self.assertEqual(resultados[2]['errores'], duplicada)
+        self.assertEqual(list(resultados[3]['errores']), ['receptor_nit'])
+        for resultado in resultados:
+            for mensajes in resultado.get('errores', {}).values():
+                self.assertIsInstance(mensajes, list)
+
+    def test_reintento_individual_no_indexa_dos_veces(self):
+        from emisor.services import _insertar_documentos
+
+        existente = self.documento('BULK-5')
+        repetido = DocumentoTributario(
+            tipo_documento=self.tipo, referencia_interna='BULK-5', emisor=self.emisor,
+            receptor=self.receptor, establecimiento=self.establecimiento,
+            subtotal=existente.subtotal, iva=existente.iva, total=existente.total
+        )
+        nuevo = DocumentoTributario(
+            tipo_documento=self.tipo, referencia_interna='BULK-6', emisor=self.emisor,
+            receptor=self.receptor, establecimiento=self.establecimiento,
+            subtotal=existente.subtotal, iva=existente.iva, total=existente.total
+        )
+
+        with mock.patch('core.busqueda.indexar') as indexar:
+            errores = _insertar_documentos([repetido, nuevo])
+
+        indexar.assert_not_called()
+        self.assertEqual(errores, {0: ReferenciaDuplicada(repetido).message_dict})
+        self.assertIsNotNone(nuevo.pk)
+
+
+class PaginacionTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+        ahora = timezone.now()
+        for numero in range(25):
+            self.documento(f'PAG-{numero:02d}', fecha_emision=ahora - datetime.timedelta(minutes=numero))
+
+    def recorrer(self, url, forma):
+        referencias = []
+        while url:
+            datos = self.cliente.get(url).data
+            self.assertEqual(set(datos), forma)
+            referencias.extend(fila['referencia_interna'] for fila in datos['results'])
+            url = datos['next']
+        return referencias
+
+    def test_por_numero_de_pagina_conserva_count(self):
+        por_cursor = self.recorrer(reverse('documento-list'), {'next', 'previous', 'results'})
+        self.assertEqual(por_cursor, [f'PAG-{numero:02d}' for numero in range(25)])
+
+        respuesta = self.cliente.get(reverse('documento-list'))
+        self.assertIn('cursor=', respuesta.data['next'])
+
+        por_numero = self.recorrer(
+            reverse('documento-list') + '?ordering=referencia_interna', {'count', 'next', 'previous', 'results'}
+        )
+        self.assertEqual(por_numero, sorted(por_cursor))
+
+        respuesta = self.cliente.get(reverse('documento-list') + '?ordering=referencia_interna')
+        self.assertIn('page=2', respuesta.data['next'])
+        self.assertEqual(respuesta.data['count'], 25)
+        self.assertEqual(self.cliente.get(reverse('documento-list') + '?page=9').status_code, 404)
+
+    def test_el_conteo_estimado_solo_se_usa_sin_filtros(self):
+        from core import paginacion
+
+        documentos = DocumentoTributario.objects.all()
+        with mock.patch.object(paginacion, 'filas_estimadas', return_value=500000) as estimar:
+            self.assertEqual(paginacion.contar(documentos), 500000)
+            self.assertEqual(paginacion.PaginadorEstimado(documentos.order_by('id'), 20).count, 500000)
+            estimar.reset_mock()
+
+            filtrados = documentos.filter(referencia_interna__startswith='PAG-0')
+            self.assertEqual(paginacion.contar(filtrados), 10)
+            self.assertEqual(paginacion.PaginadorEstimado(filtrados.order_by('id'), 20).count, 10)
+            estimar.assert_not_called()
+
+            # La API toma la misma decisión al paginar por número
+            respuesta = self.cliente.get(reverse('documento-list') + '?page=1&search=PAG')
+            self.assertEqual(respuesta.data['count'], 25)
+
+    def test_los_demas_listados_usan_la_paginacion_por_defecto(self):
+        datos = self.cliente.get(reverse('contribuyente-list')).data
+        self.assertEqual(datos['count'], 2)
+
+
+class ListaDocumentosTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        from autoriza.services import crear_solicitudes_autorizacion
+        from emisor.models import LineaDocumento
+
+        ahora = timezone.now().replace(microsecond=123456)
+        documentos = [
+            self.documento(f'LST-{numero}', subtotal=Decimal(monto), fecha_emision=ahora - datetime.timedelta(hours=numero))
+            for numero, monto in enumerate(['100.00', '0.10', '12345.67'])
+        ]
+        LineaDocumento.objects.bulk_create([
+            LineaDocumento(
+                documento=documentos[0], descripcion=f'Línea {numero}', cantidad=Decimal('1.50'),
+                precio_unitario=Decimal('33.33'), descuento=Decimal('0'), subtotal=Decimal('49.99')
+            )
+            for numero in range(2)
+        ])
+        # El último queda sin autorización (autorizacion nula)
+        crear_solicitudes_autorizacion(documentos[:2])
+        self.ids = [documento.pk for documento in documentos]
+
+    def comparar(self, parametros):
+        from rest_framework.renderers import JSONRenderer
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+
+        from .serializers import (
+            DocumentoTributarioSerializer, columnas_lista_documentos, serializar_lista_documentos
+        )
+
+        solicitud = Request(APIRequestFactory().get('/', parametros))
+        serializer = DocumentoTributarioSerializer(context={'request': solicitud})
+        campos = [nombre for nombre, campo in serializer.fields.items() if not campo.write_only]
+        documentos = DocumentoTributario.objects.filter(pk__in=self.ids).order_by('-fecha_emision', '-id')
+
+        esperado = DocumentoTributarioSerializer(
+            documentos.select_related('autorizacion').prefetch_related('lineas'),
+            many=True, context={'request': solicitud}
+        ).data
+        rapido = serializar_lista_documentos(documentos.values(*columnas_lista_documentos(campos)), campos)
+        self.assertEqual(JSONRenderer().render(rapido), JSONRenderer().render(esperado))
+        return json.loads(JSONRenderer().render(rapido))
+
+    def test_el_json_es_igual_al_del_serializer(self):
+        casos = [
+            {},
+            {'fields': 'id,referencia_interna,total,fecha_emision'},
+            {'expand': 'autorizacion'},
+            {'fields': 'id,estado_display', 'expand': 'lineas,autorizacion'},
+            {'fields': 'id,inexistente'},
+        ]
+        # Una zona distinta de UTC y con minutos en el desplazamiento
+        for zona in ('America/Guatemala', 'Asia/Kolkata'):
+            for parametros in casos:
+                with self.subTest(zona=zona, parametros=parametros), timezone.override(zona):
+                    datos = self.comparar(parametros)
+                    if 'expand' in parametros:
+                        self.assertIsNone(datos[2]['autorizacion'])
+                        self.assertIsNotNone(datos[0]['autorizacion'])
+
+        with timezone.override('Asia/Kolkata'):
+            datos = self.comparar({'fields': 'fecha_emision'})
+        self.assertTrue(datos[0]['fecha_emision'].endswith('+05:30'))
+        self.assertEqual(len(self.comparar({})[0]['lineas']), 2)
+
+
+class CamposDinamicosTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        from autoriza.services import crear_solicitud_autorizacion
+        from emisor.models import LineaDocumento
+
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+        self.documento_lineas = self.documento('CMP-1')
+        LineaDocumento.objects.create(
+            documento=self.documento_lineas, descripcion='Servicio', cantidad=Decimal('1.00'),
+            precio_unitario=Decimal('100.00'), subtotal=Decimal('100.00')
+        )
+        self.autorizacion = crear_solicitud_autorizacion(self.documento_lineas)
+        self.detalle = reverse('documento-detail', args=[self.documento_lineas.pk])
+
+    def consultar(self, url, parametros=None):
+        with CaptureQueriesContext(connection) as consultas:
+            respuesta = self.cliente.get(url, parametros or {})
+        self.assertEqual(respuesta.status_code, 200)
+        return respuesta.json(), len(consultas)
+
+    def test_fields_limita_el_json(self):
+        datos, _ = self.consultar(self.detalle, {'fields': 'id,referencia_interna,total'})
+        self.assertEqual(list(datos), ['id', 'referencia_interna', 'total'])
+
+        datos, _ = self.consultar(reverse('documento-list'), {'fields': 'id,total'})
+        self.assertEqual([list(fila) for fila in datos['results']], [['id', 'total']])
+
+        # Sin ?fields= no se incluye la autorización (campo opcional)
+        datos, _ = self.consultar(self.detalle)
+        self.assertNotIn('autorizacion', datos)
+        self.assertIn('lineas', datos)
+
+    def test_expand_anida_el_objeto_relacionado(self):
+        datos, _ = self.consultar(self.detalle, {'fields': 'id', 'expand': 'autorizacion'})
+        self.assertEqual(list(datos), ['id', 'autorizacion'])
+        self.assertEqual(datos['autorizacion']['id'], self.autorizacion.pk)
+        self.assertEqual(datos['autorizacion']['numero_autorizacion'], self.autorizacion.numero_autorizacion)
+
+        datos, _ = self.consultar(
+            reverse('autorizacion-detail', args=[self.autorizacion.pk]), {'expand': 'documento'}
+        )
+        self.assertEqual(datos['documento']['referencia_interna'], 'CMP-1')
+
+    def test_los_campos_desconocidos_se_ignoran(self):
+        datos, _ = self.consultar(self.detalle, {'fields': 'id,inexistente', 'expand': 'inexistente'})
+        self.assertEqual(list(datos), ['id'])
+
+        datos, _ = self.consultar(reverse('contribuyente-list'), {'fields': 'nit,inexistente'})
+        self.assertEqual({tuple(fila) for fila in datos['results']}, {('nit',)})
+
+    def test_menos_consultas_al_limitar_los_campos(self):
+        _, completo = self.consultar(self.detalle, {'expand': 'autorizacion'})
+        _, limitado = self.consultar(self.detalle, {'fields': 'id,total'})
+        # Sin líneas no se precargan; sin autorización no se une
+        self.assertLess(limitado, completo)
+
+        _, completo = self.consultar(reverse('documento-list'))
+        _, limitado = self.consultar(reverse('documento-list'), {'fields': 'id,total'})
+        self.assertLess(limitado, completo)
+
+    def test_el_queryset_solo_lee_las_columnas_pedidas(self):
+        from rest_framework.request import Request
+        from rest_framework.test import APIRequestFactory
+
+        from .views import DocumentoTributarioViewSet
+
+        def ajustado(parametros):
+            solicitud = Request(APIRequestFactory().get('/', parametros))
+            solicitud.user = self.usuario
+            vista = DocumentoTributarioViewSet(request=solicitud, format_kwarg=None, action='list')
+            return vista.ajustar_a_campos(DocumentoTributario.objects.all())
+
+        consulta = ajustado({'fields': 'id,total'}).query
+        self.assertEqual(consulta.deferred_loading, ({'id', 'total', 'fecha_emision'}, False))
+        self.assertFalse(consulta.select_related)
+
+        consulta = ajustado({'fields': 'id', 'expand': 'autorizacion'}).query
+        self.assertEqual(consulta.select_related, {'autorizacion': {}})
+        self.assertEqual(ajustado({}).query.deferred_loading, (frozenset(), True))
+
+
+class RespuestaCondicionalTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(self.usuario)
+        self.documentos = [self.documento(f'ETG-{numero}') for numero in range(3)]
+        self.detalle = reverse('documento-detail', args=[self.documentos[0].pk])
+
+    def test_detalle_responde_304_con_if_none_match_e_if_modified_since(self):
+        respuesta = self.cliente.get(self.detalle)
+        self.assertEqual(respuesta.status_code, 200)
+        etag, modificado = respuesta['ETag'], respuesta['Last-Modified']
+
+        respuesta = self.cliente.get(self.detalle, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(respuesta['ETag'], etag)
+        self.assertEqual(self.cliente.get(self.detalle, HTTP_IF_MODIFIED_SINCE=modificado).status_code, 304)
+
+        # Otra representación del mismo documento tiene otro ETag
+        respuesta = self.cliente.get(self.detalle, {'fields': 'id'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+
+    def test_listado_responde_304_y_cambia_el_etag_al_escribir(self):
+        url = reverse('documento-list')
+        etag = self.cliente.get(url)['ETag']
+        self.assertEqual(self.cliente.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        documento = self.documentos[1]
+        documento.observaciones = 'Modificado'
+        documento.save()
+
+        respuesta = self.cliente.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertNotEqual(respuesta['ETag'], etag)
+        self.assertEqual(self.cliente.get(url, HTTP_IF_NONE_MATCH=respuesta['ETag']).status_code, 304)
+
+        # Eliminar una fila de la página también cambia el ETag
+        etag = respuesta['ETag']
+        self.documentos[2].delete()
+        self.assertEqual(self.cliente.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_el_etag_incluye_las_versiones_de_la_representacion(self):
+        from . import serializers
+
+        url = reverse('documento-list')
+        detalle = self.cliente.get(self.detalle)['ETag']
+        listado = self.cliente.get(url)['ETag']
+
+        with mock.patch.object(serializers.LineaDocumentoSerializer.Meta, 'version', 2):
+            self.assertNotEqual(self.cliente.get(self.detalle)['ETag'], detalle)
+        with mock.patch('api.views.DocumentoTributarioViewSet.version_listado', 2):
+            self.assertNotEqual(self.cliente.get(url)['ETag'], listado)
+            self.assertEqual(self.cliente.get(self.detalle)['ETag'], detalle)
+
+    def test_todos_los_serializers_declaran_su_version(self):
+        from rest_framework import serializers as drf
+
+        from . import serializers
+
+        for nombre, clase in vars(serializers).items():
+            if isinstance(clase, type) and issubclass(clase, drf.ModelSerializer) and clase.__module__ == serializers.__name__:
+                with self.subTest(serializer=nombre):
+                    self.assertIsInstance(clase.Meta.version, int)
+
+    def test_el_listado_pagina_una_sola_vez(self):
+        from .pagination import PaginacionCursor
 
-# Create your tests here.
+        url = reverse('documento-list')
+        for parametros in ({}, {'page': 1}):
+            with self.subTest(parametros=parametros), \
+                    mock.patch.object(PaginacionCursor, 'paginate_queryset', autospec=True,
+                                      side_effect=PaginacionCursor.paginate_queryset) as paginar, \
+                    CaptureQueriesContext(connection) as consultas:
+                datos = self.cliente.get(url, parametros).json()
+            self.assertEqual(paginar.call_count, 1)
+            self.assertEqual(
+                [fila['referencia_interna'] for fila in datos['results']], ['ETG-2', 'ETG-1', 'ETG-0']
+            )
+            self.assertLessEqual(sum('COUNT(' in consulta['sql'] for consulta in consultas.captured_queries), 1)
@@ -6,7 +6,8 @@ from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from .views import (
     DocumentoTributarioViewSet, ContribuyenteViewSet,
     TipoDocumentoViewSet, AutorizacionViewSet,
-    EstadisticaDiariaViewSet, VerificarDocumentoAPIView,
+    EstadisticaDiariaViewSet, TrabajoIngestaViewSet,
+    TareaAutorizacionViewSet, VerificarDocumentoAPIView,
     EstadisticasGeneralesAPIView
 )
 
@@ -17,6 +18,8 @@ router.register(r'contribuyentes', ContribuyenteViewSet)
 router.register(r'tipos-documento', TipoDocumentoViewSet)
 router.register(r'autorizaciones', AutorizacionViewSet, basename='autorizacion')
 router.register(r'estadisticas', EstadisticaDiariaViewSet)
+router.register(r'ingestas', TrabajoIngestaViewSet, basename='ingesta')
+router.register(r'tareas-autorizacion', TareaAutorizacionViewSet, basename='tarea-autorizacion')
 
 urlpatterns = [
     # Incluir URLs del router
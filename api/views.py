@@ -1,35 +1,48 @@
 # api/views.py
 from rest_framework import viewsets, permissions, status, filters
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from django.db import transaction
+from django.http import Http404
 from django.utils import timezone
 
-from emisor.models import DocumentoTributario, Contribuyente, TipoDocumento
-from autoriza.models import Autorizacion, EstadisticaDiaria
+from emisor.models import DocumentoTributario, Contribuyente, TipoDocumento, tipos_documento_activos
+from emisor.services import ReferenciaDuplicada, guardar_encabezado
+from autoriza.models import Autorizacion, EstadisticaDiaria, TrabajoIngesta, TareaAutorizacion
+from autoriza import archivo
 from .serializers import (
     DocumentoTributarioSerializer, ContribuyenteSerializer, 
     TipoDocumentoSerializer, AutorizacionSerializer,
-    EstadisticaDiariaSerializer
+    EstadisticaDiariaSerializer, TrabajoIngestaSerializer,
+    ErrorIngestaSerializer, TareaAutorizacionSerializer,
+    DocumentoBulkSerializer, VERSION_LISTA_DOCUMENTOS,
+    columnas_lista_documentos, serializar_lista_documentos
 )
+from .campos import CamposDinamicosViewSetMixin
+from .condicional import RespuestaCondicionalMixin
+from .filters import BusquedaIndexadaFilter
+from .pagination import PaginacionCursor
+from .parsers import NDJSONParser
 from .permissions import IsOwnerOrAdmin, IsAdminOrReadOnly
 
 
-class ContribuyenteViewSet(viewsets.ModelViewSet):
+class ContribuyenteViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, viewsets.ModelViewSet):
     """
     API endpoint para gestionar contribuyentes
     """
     queryset = Contribuyente.objects.all()
     serializer_class = ContribuyenteSerializer
     permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, BusquedaIndexadaFilter]
     filterset_fields = ['nit']
     search_fields = ['nit', 'nombre', 'nombre_comercial']
 
 
-class TipoDocumentoViewSet(viewsets.ReadOnlyModelViewSet):
+class TipoDocumentoViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para consultar tipos de documentos
     """
@@ -37,18 +50,72 @@ class TipoDocumentoViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TipoDocumentoSerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    # Parámetros que no requieren filtrar ni ordenar en la base de datos
+    parametros_catalogo = {'page', 'fields', 'expand', 'format'}
 
-class DocumentoTributarioViewSet(viewsets.ModelViewSet):
+    def usa_catalogo(self):
+        return not set(self.request.query_params) - self.parametros_catalogo
+
+    def listar(self, request, *args, **kwargs):
+        """
+        Listar los tipos activos desde el catálogo en caché
+        """
+        if not self.usa_catalogo():
+            return super().listar(request, *args, **kwargs)
+
+        tipos = tipos_documento_activos.obtener()
+        page = self.paginate_queryset(tipos)
+        if page is not None:
+            return self.get_paginated_response(self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(tipos, many=True).data)
+
+    def serializar_pagina(self, queryset, ids):
+        """
+        Serializar la página de la firma con los tipos del catálogo en caché
+        """
+        if not self.usa_catalogo():
+            return super().serializar_pagina(queryset, ids)
+
+        tipos = {tipo.pk: tipo for tipo in tipos_documento_activos.obtener()}
+        return self.get_serializer([tipos[pk] for pk in ids if pk in tipos], many=True).data
+
+    def get_object(self):
+        """
+        Obtener el tipo desde el catálogo en caché
+        """
+        if not self.usa_catalogo():
+            return super().get_object()
+
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        for tipo in tipos_documento_activos.obtener():
+            if str(tipo.pk) == str(self.kwargs[lookup_url_kwarg]):
+                self.check_object_permissions(self.request, tipo)
+                return tipo
+        raise Http404
+
+
+class DocumentoTributarioViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, viewsets.ModelViewSet):
     """
     API endpoint para gestionar documentos tributarios
     """
     serializer_class = DocumentoTributarioSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrAdmin]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, BusquedaIndexadaFilter]
     filterset_fields = ['estado', 'fecha_emision', 'tipo_documento']
-    search_fields = ['referencia_interna', 'observaciones', 'receptor__nit', 'receptor__nombre']
+    search_fields = [
+        'referencia_interna', 'observaciones',
+        'receptor__nit', 'receptor__nombre', 'receptor__nombre_comercial'
+    ]
     ordering_fields = ['fecha_emision', 'total', 'referencia_interna']
     ordering = ['-fecha_emision']
+    pagination_class = PaginacionCursor
+    campo_cursor = 'fecha_emision'
+    version_listado = VERSION_LISTA_DOCUMENTOS
+    relaciones_campos = {
+        'estado_display': {'columnas': ['estado']},
+        'lineas': {'prefetch': ['lineas']},
+        'autorizacion': {'select': ['autorizacion'], 'modificado': ['autorizacion__modified']},
+    }
     
     def get_queryset(self):
         """
@@ -67,12 +134,131 @@ class DocumentoTributarioViewSet(viewsets.ModelViewSet):
         # En cualquier otro caso, no mostrar documentos
         return DocumentoTributario.objects.none()
     
+    def listar(self, request, *args, **kwargs):
+        """
+        Listar documentos leyendo con values() solo las columnas de los
+        campos pedidos y, si se incluyen, las líneas de la página con una
+        sola consulta
+        """
+        campos = self.campos_serializados()
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None).values(
+            *columnas_lista_documentos(campos, self.campo_cursor)
+        )
+        
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(serializar_lista_documentos(page, campos))
+        
+        return Response(serializar_lista_documentos(queryset, campos))
+
+    def serializar_pagina(self, queryset, ids):
+        """
+        Serializa con values() las filas de la página tomada en la firma
+        """
+        campos = self.campos_serializados()
+        filas = {
+            fila['id']: fila
+            for fila in queryset.prefetch_related(None).filter(pk__in=ids).values(
+                *columnas_lista_documentos(campos)
+            )
+        }
+        return serializar_lista_documentos([filas[pk] for pk in ids if pk in filas], campos)
+    
     def perform_create(self, serializer):
         """
         Asignar el emisor al crear un documento
         """
         serializer.save()
     
+    @action(
+        detail=False, methods=['post'], url_path='bulk',
+        parser_classes=[JSONParser, NDJSONParser]
+    )
+    def bulk(self, request):
+        """
+        Crear documentos en bloque desde un arreglo JSON o NDJSON
+        
+        Los resultados se envían por cada documento como NDJSON a medida que
+        se procesa cada lote. Con ?emitir=true los documentos se crean
+        emitidos y se envían a autorización en un solo paso.
+        """
+        from django.http import StreamingHttpResponse
+        
+        if not hasattr(request.user, 'contribuyente'):
+            return Response(
+                {"error": "El usuario no tiene un contribuyente asociado"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        registros = request.data
+        if isinstance(registros, dict):
+            registros = registros.get('documentos')
+        if registros is None or isinstance(registros, (str, dict)):
+            return Response(
+                {"error": "Se esperaba un arreglo de documentos o un cuerpo NDJSON"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        emitir = request.query_params.get('emitir', '').lower() in ['1', 'true', 'si']
+        
+        response = StreamingHttpResponse(
+            self._resultados_bulk(request.user.contribuyente, registros, emitir),
+            content_type='application/x-ndjson'
+        )
+        return response
+    
+    def _resultados_bulk(self, emisor, registros, emitir, tamano_lote=500):
+        """
+        Valida y crea los documentos por lotes, entregando una línea JSON por documento
+        """
+        import json
+        from itertools import islice
+        from emisor.services import crear_documentos_lote
+        
+        def linea(datos):
+            return json.dumps(datos, ensure_ascii=False) + '\n'
+        
+        registros = enumerate(registros)
+        referencias_vistas = set()
+        creados = errores = 0
+        
+        while True:
+            lote = list(islice(registros, tamano_lote))
+            if not lote:
+                break
+            
+            resultados = []
+            validos = []
+            for indice, registro in lote:
+                if isinstance(registro, Exception):
+                    resultados.append((indice, None, {'non_field_errors': [str(registro)]}))
+                    continue
+                serializer = DocumentoBulkSerializer(data=registro)
+                if serializer.is_valid():
+                    validos.append((indice, serializer.validated_data))
+                else:
+                    resultados.append((indice, None, serializer.errors))
+            
+            resultados.extend(crear_documentos_lote(emisor, validos, emitir, referencias_vistas))
+            resultados.sort(key=lambda resultado: resultado[0])
+            
+            for indice, documento, detalle in resultados:
+                if documento is None:
+                    errores += 1
+                    yield linea({"indice": indice, "estado": "ERROR", "errores": detalle})
+                else:
+                    creados += 1
+                    yield linea({
+                        "indice": indice,
+                        "estado": "CREADO",
+                        "id": documento.pk,
+                        "uuid": str(documento.uuid),
+                        "referencia_interna": documento.referencia_interna,
+                        "total": str(documento.total)
+                    })
+        
+        yield linea({"resumen": {"creados": creados, "errores": errores}})
+    
     @action(detail=True, methods=['post'])
     @transaction.atomic
     def emitir(self, request, pk=None):
@@ -100,7 +286,23 @@ class DocumentoTributarioViewSet(viewsets.ModelViewSet):
         documento.estado = DocumentoTributario.ESTADO_EMITIDO
         documento.es_borrador = False
         documento.fecha_emision = timezone.now()
-        documento.save()
+        try:
+            guardar_encabezado(documento)
+        except ReferenciaDuplicada as e:
+            return Response(e.message_dict, status=status.HTTP_400_BAD_REQUEST)
+        
+        # En modo asíncrono solo se encola la solicitud de autorización
+        from autoriza.tasks import autorizacion_asincrona, encolar_autorizacion
+        if autorizacion_asincrona():
+            tarea = encolar_autorizacion(documento)
+            return Response(
+                {
+                    "mensaje": "Documento emitido correctamente, la autorización se procesará en segundo plano",
+                    "tarea": tarea.pk,
+                    "estado_url": reverse('tarea-autorizacion-detail', kwargs={'pk': tarea.pk}, request=request)
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
         
         # Crear solicitud de autorización
         from autoriza.services import crear_solicitud_autorizacion
@@ -129,7 +331,7 @@ class DocumentoTributarioViewSet(viewsets.ModelViewSet):
             )
 
 
-class AutorizacionViewSet(viewsets.ReadOnlyModelViewSet):
+class AutorizacionViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para consultar autorizaciones
     """
@@ -139,6 +341,14 @@ class AutorizacionViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['estado', 'fecha_autorizacion']
     ordering_fields = ['fecha_autorizacion']
     ordering = ['-fecha_autorizacion']
+    pagination_class = PaginacionCursor
+    campo_cursor = 'fecha_autorizacion'
+    relaciones_campos = {
+        'estado_display': {'columnas': ['estado']},
+        'documento': {
+            'select': ['documento'], 'prefetch': ['documento__lineas'], 'modificado': ['documento__modified']
+        },
+    }
     
     def get_queryset(self):
         """
@@ -158,7 +368,40 @@ class AutorizacionViewSet(viewsets.ReadOnlyModelViewSet):
         return Autorizacion.objects.none()
 
 
-class EstadisticaDiariaViewSet(viewsets.ReadOnlyModelViewSet):
+class TareaAutorizacionViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint para consultar el estado de las autorizaciones en cola
+    """
+    serializer_class = TareaAutorizacionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['estado', 'documento']
+    ordering_fields = ['created']
+    ordering = ['-created']
+    relaciones_campos = {
+        'estado_display': {'columnas': ['estado']},
+        'autorizacion': {
+            'select': ['documento__autorizacion'], 'modificado': ['documento__autorizacion__modified']
+        },
+    }
+    
+    def get_queryset(self):
+        """
+        Filtrar tareas según el rol del usuario
+        """
+        user = self.request.user
+        queryset = TareaAutorizacion.objects.all()
+        
+        if user.role in ['ADMIN', 'AUDITOR']:
+            return queryset
+            
+        if hasattr(user, 'contribuyente'):
+            return queryset.filter(documento__emisor=user.contribuyente)
+            
+        return TareaAutorizacion.objects.none()
+
+
+class EstadisticaDiariaViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint para consultar estadísticas diarias
     """
@@ -169,6 +412,117 @@ class EstadisticaDiariaViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_fields = ['fecha']
     ordering_fields = ['fecha']
     ordering = ['-fecha']
+    relaciones_campos = {
+        'total_errores': {'columnas': [
+            'errores_nit_emisor', 'errores_nit_receptor', 'errores_iva',
+            'errores_total', 'errores_referencia_duplicada'
+        ]},
+    }
+    
+    @action(detail=False, methods=['get'])
+    def informe(self, request):
+        """
+        Descargar el informe XML de autorizaciones (LISTAAUTORIZACIONES)
+        
+        El documento se envía por bloques a medida que se genera. Acepta los
+        parámetros opcionales desde y hasta (AAAA-MM-DD).
+        """
+        from django.http import StreamingHttpResponse
+        from django.utils.dateparse import parse_date
+        from autoriza.services import iterar_informe_xml
+        
+        fechas = {}
+        for parametro in ['desde', 'hasta']:
+            valor = request.query_params.get(parametro)
+            if valor:
+                fechas[parametro] = parse_date(valor)
+                if fechas[parametro] is None:
+                    return Response(
+                        {"error": f"El parámetro '{parametro}' debe tener el formato AAAA-MM-DD"},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+        
+        response = StreamingHttpResponse(iterar_informe_xml(**fechas), content_type='application/xml')
+        response['Content-Disposition'] = 'attachment; filename="autorizaciones.xml"'
+        return response
+
+
+class TrabajoIngestaViewSet(RespuestaCondicionalMixin, CamposDinamicosViewSetMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint para cargas masivas de solicitudes de autorización en XML
+    """
+    serializer_class = TrabajoIngestaSerializer
+    permission_classes = [permissions.IsAuthenticated, IsAdminOrReadOnly]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['estado']
+    ordering_fields = ['created']
+    ordering = ['-created']
+    relaciones_campos = {
+        'estado_display': {'columnas': ['estado']},
+    }
+    
+    def get_queryset(self):
+        """
+        Filtrar trabajos según el rol del usuario
+        """
+        user = self.request.user
+        
+        if user.role in ['ADMIN', 'AUDITOR']:
+            return TrabajoIngesta.objects.all()
+            
+        return TrabajoIngesta.objects.filter(usuario=user)
+    
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def cargar(self, request):
+        """
+        Recibir un archivo XML y registrarlo como trabajo de ingesta
+
+        El archivo lo procesa el comando procesar_ingestas; la respuesta
+        (202) indica en estado_url y en Location la URL del trabajo para consultar su
+        avance y sus errores.
+        """
+        from django.core.files.storage import default_storage
+        from autoriza.ingesta import crear_trabajo_ingesta
+        
+        archivo = request.FILES.get('archivo')
+        if not archivo:
+            return Response(
+                {"error": "Se requiere el archivo XML en el campo 'archivo'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # El archivo se guarda por bloques, sin cargarlo completo en memoria
+        nombre = default_storage.save(f'ingestas/{archivo.name}', archivo)
+        
+        trabajo = crear_trabajo_ingesta(
+            default_storage.path(nombre),
+            nombre_original=archivo.name,
+            usuario=request.user
+        )
+        url = reverse('ingesta-detail', kwargs={'pk': trabajo.pk}, request=request)
+        
+        serializer = self.get_serializer(trabajo)
+        return Response(
+            {**serializer.data, 'estado_url': url},
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': url}
+        )
+    
+    @action(detail=True, methods=['get'])
+    def errores(self, request, pk=None):
+        """
+        Listar los errores por registro de un trabajo de ingesta
+        """
+        trabajo = self.get_object()
+        
+        contexto = self.get_serializer_context()
+        page = self.paginate_queryset(trabajo.errores.all())
+        if page is not None:
+            serializer = ErrorIngestaSerializer(page, many=True, context=contexto)
+            return self.get_paginated_response(serializer.data)
+            
+        serializer = ErrorIngestaSerializer(trabajo.errores.all(), many=True, context=contexto)
+        return Response(serializer.data)
 
 
 class VerificarDocumentoAPIView(APIView):
@@ -211,13 +565,30 @@ class VerificarDocumentoAPIView(APIView):
             })
             
         except Autorizacion.DoesNotExist:
-            return Response(
-                {
-                    "valido": False,
-                    "mensaje": "No se encontró un documento válido con los datos proporcionados"
-                },
-                status=status.HTTP_404_NOT_FOUND
-            )
+            pass
+        
+        # Los documentos de ejercicios cerrados se buscan en el archivo histórico
+        archivado = archivo.buscar_autorizacion(numero_autorizacion, nit_emisor)
+        if archivado:
+            return Response({
+                "valido": True,
+                "fecha_autorizacion": archivado['fecha_autorizacion'],
+                "fecha_emision": archivado['fecha_emision'],
+                "emisor": archivado['emisor_nombre'],
+                "nit_emisor": archivado['emisor_nit'],
+                "receptor": archivado['receptor_nombre'],
+                "nit_receptor": archivado['receptor_nit'],
+                "total": str(archivado['total']),
+                "referencia": archivado['referencia_interna']
+            })
+        
+        return Response(
+            {
+                "valido": False,
+                "mensaje": "No se encontró un documento válido con los datos proporcionados"
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
 
 
 class EstadisticasGeneralesAPIView(APIView):
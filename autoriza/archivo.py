@@ -0,0 +1,465 @@
+# autoriza/archivo.py
+"""
+Archivo histórico de documentos tributarios en archivos columnares
+comprimidos.
+
+Los documentos de ejercicios cerrados se exportan con sus líneas y su
+autorización a un archivo ``.npz`` (NumPy, comprimido) por mes y emisor,
+``<ARCHIVO_DOCUMENTOS_DIR>/<AAAA-MM>/<nit_emisor>.npz``, en el que cada
+columna es un arreglo; luego se eliminan de la base de datos. El índice
+``indice.json`` guarda por archivo el rango de días, el NIT del emisor y el
+rango de números de autorización, para abrir solo los archivos que pueden
+contener lo buscado, y el límite de archivo: los días anteriores a él
+pueden tener documentos archivados.
+
+La verificación de documentos y los reportes por rango de fechas combinan
+los documentos de la base de datos con los archivados.
+"""
+import datetime
+import json
+import os
+import tempfile
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import busqueda
+from emisor.models import DocumentoTributario, LineaDocumento
+from .models import Autorizacion, AutorizacionError
+
+
+INDICE = 'indice.json'
+
+# Columnas de documento en cada archivo
+COLUMNAS_DOCUMENTO = [
+    'id', 'uuid', 'tipo_documento', 'tipo_documento_nombre', 'referencia_interna',
+    'emisor_nit', 'emisor_nombre', 'establecimiento', 'receptor_nit', 'receptor_nombre',
+    'fecha_emision', 'dia_emision', 'moneda', 'subtotal', 'descuento', 'iva', 'total',
+    'estado', 'observaciones', 'numero_autorizacion', 'estado_autorizacion',
+    'fecha_autorizacion', 'correlativo', 'errores_autorizacion',
+]
+
+# Columnas de línea; linea_documento es el id del documento
+COLUMNAS_LINEA = [
+    'linea_documento', 'linea_descripcion', 'linea_cantidad',
+    'linea_precio_unitario', 'linea_descuento', 'linea_subtotal',
+]
+
+# Columnas con montos, guardadas como enteros en centavos
+COLUMNAS_MONTO = {
+    'subtotal', 'descuento', 'iva', 'total',
+    'linea_cantidad', 'linea_precio_unitario', 'linea_descuento', 'linea_subtotal',
+}
+
+# Columnas con fecha y hora, guardadas en UTC
+COLUMNAS_FECHA_HORA = {'fecha_emision', 'fecha_autorizacion'}
+
+_cache_indice = {'ruta': None, 'modificado': None, 'indice': None}
+
+
+def directorio_archivo():
+    return getattr(settings, 'ARCHIVO_DOCUMENTOS_DIR', 'archivo')
+
+
+def cargar_indice(directorio=None):
+    """
+    Lee el índice del archivo; se vuelve a leer solo si el archivo cambió
+
+    Retorna:
+    - Diccionario con 'limite' (AAAA-MM-DD o None) y 'archivos'
+    """
+    ruta = os.path.join(directorio or directorio_archivo(), INDICE)
+    try:
+        modificado = os.stat(ruta).st_mtime_ns
+    except FileNotFoundError:
+        return {'limite': None, 'archivos': []}
+
+    if _cache_indice['ruta'] != ruta or _cache_indice['modificado'] != modificado:
+        with open(ruta, encoding='utf-8') as archivo:
+            _cache_indice.update(ruta=ruta, modificado=modificado, indice=json.load(archivo))
+    return _cache_indice['indice']
+
+
+def _escribir_atomico(ruta, escribir):
+    """
+    Escribe un archivo en un temporal del mismo directorio y lo reemplaza al final
+    """
+    directorio = os.path.dirname(ruta)
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            escribir(archivo)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def _guardar_indice(indice, directorio):
+    contenido = json.dumps(indice, ensure_ascii=False, indent=1).encode('utf-8')
+    _escribir_atomico(os.path.join(directorio, INDICE), lambda archivo: archivo.write(contenido))
+
+
+def limite_archivo(directorio=None):
+    """
+    Fecha a partir de la cual no hay documentos archivados (None si no hay archivo)
+    """
+    limite = cargar_indice(directorio)['limite']
+    return datetime.date.fromisoformat(limite) if limite else None
+
+
+# Conversión entre valores de Python y arreglos de NumPy
+
+def _a_arreglo(columna, valores):
+    import numpy as np
+
+    if columna in COLUMNAS_MONTO:
+        return np.array([int(valor * 100) for valor in valores], dtype=np.int64)
+    if columna in COLUMNAS_FECHA_HORA:
+        return np.array([
+            valor.astimezone(datetime.timezone.utc).replace(tzinfo=None) if valor else None
+            for valor in valores
+        ], dtype='datetime64[us]')
+    if columna == 'dia_emision':
+        return np.array(valores, dtype='datetime64[D]')
+    if columna in ('id', 'linea_documento', 'correlativo'):
+        return np.array([-1 if valor is None else valor for valor in valores], dtype=np.int64)
+    return np.array(['' if valor is None else str(valor) for valor in valores], dtype=str)
+
+
+def _a_python(columna, valor):
+    import numpy as np
+
+    if columna in COLUMNAS_MONTO:
+        return Decimal(int(valor)).scaleb(-2)
+    if columna in COLUMNAS_FECHA_HORA:
+        if np.isnat(valor):
+            return None
+        return valor.astype('datetime64[us]').item().replace(tzinfo=datetime.timezone.utc)
+    if columna == 'dia_emision':
+        return valor.astype('datetime64[D]').item()
+    if columna in ('id', 'linea_documento', 'correlativo'):
+        return None if valor < 0 else int(valor)
+    return str(valor)
+
+
+def _leer(entrada, columnas, directorio=None):
+    """
+    Lee solo las columnas indicadas de un archivo del índice
+
+    Retorna:
+    - Diccionario {columna: arreglo}
+    """
+    import numpy as np
+
+    ruta = os.path.join(directorio or directorio_archivo(), entrada['ruta'])
+    with np.load(ruta, allow_pickle=False) as datos:
+        return {columna: datos[columna] for columna in columnas}
+
+
+def _archivos(desde=None, hasta=None, nit_emisor=None, numero_autorizacion=None, directorio=None):
+    """
+    Entradas del índice que pueden contener documentos de los filtros dados,
+    según el rango de días, el NIT y el rango de números de cada archivo
+    """
+    for entrada in cargar_indice(directorio)['archivos']:
+        if desde and entrada['hasta'] < desde.isoformat():
+            continue
+        if hasta and entrada['desde'] > hasta.isoformat():
+            continue
+        if nit_emisor and entrada['nit_emisor'] != nit_emisor:
+            continue
+        if numero_autorizacion and not (
+            entrada['numeros'] and entrada['numeros'][0] <= numero_autorizacion <= entrada['numeros'][1]
+        ):
+            continue
+        yield entrada
+
+
+def _mascara(datos, desde=None, hasta=None, estado=None, nit_emisor=None, nit_receptor=None):
+    import numpy as np
+
+    mascara = np.ones(len(datos['dia_emision']), dtype=bool)
+    if desde:
+        mascara &= datos['dia_emision'] >= np.datetime64(desde, 'D')
+    if hasta:
+        mascara &= datos['dia_emision'] <= np.datetime64(hasta, 'D')
+    if estado:
+        mascara &= datos['estado'] == estado
+    if nit_emisor:
+        mascara &= datos['emisor_nit'] == nit_emisor
+    if nit_receptor:
+        mascara &= datos['receptor_nit'] == nit_receptor
+    return mascara
+
+
+# Consultas sobre el archivo
+
+def buscar_autorizacion(numero_autorizacion, nit_emisor, directorio=None):
+    """
+    Busca en el archivo un documento aprobado por número de autorización y NIT del emisor
+
+    Retorna:
+    - Diccionario con las columnas del documento o None
+    """
+    import numpy as np
+
+    for entrada in _archivos(nit_emisor=nit_emisor, numero_autorizacion=numero_autorizacion, directorio=directorio):
+        numeros = _leer(entrada, ['numero_autorizacion'], directorio)['numero_autorizacion']
+        posiciones = np.flatnonzero(numeros == numero_autorizacion)
+        if not len(posiciones):
+            continue
+        datos = _leer(entrada, COLUMNAS_DOCUMENTO, directorio)
+        posicion = posiciones[0]
+        if datos['estado_autorizacion'][posicion] != Autorizacion.ESTADO_APROBADO:
+            return None
+        return {columna: _a_python(columna, datos[columna][posicion]) for columna in COLUMNAS_DOCUMENTO}
+    return None
+
+
+def documentos(desde=None, hasta=None, estado=None, nit_emisor=None, nit_receptor=None,
+               columnas=COLUMNAS_DOCUMENTO, directorio=None):
+    """
+    Documentos archivados que cumplen los filtros
+
+    Retorna:
+    - Generador de diccionarios con las columnas pedidas, por mes y emisor
+    """
+    import numpy as np
+
+    necesarias = list(dict.fromkeys([
+        *columnas, 'dia_emision', 'estado', 'emisor_nit', 'receptor_nit'
+    ]))
+    for entrada in _archivos(desde, hasta, nit_emisor, directorio=directorio):
+        datos = _leer(entrada, necesarias, directorio)
+        for posicion in np.flatnonzero(_mascara(datos, desde, hasta, estado, nit_emisor, nit_receptor)):
+            yield {columna: _a_python(columna, datos[columna][posicion]) for columna in columnas}
+
+
+def totales_por_dia(desde, hasta, estado=None, directorio=None):
+    """
+    Suma por día de emisión los montos de los documentos archivados
+
+    Retorna:
+    - Diccionario {dia: {'total', 'subtotal', 'iva', 'cantidad'}}
+    """
+    import numpy as np
+
+    resultado = defaultdict(lambda: {'total': Decimal('0.00'), 'subtotal': Decimal('0.00'),
+                                     'iva': Decimal('0.00'), 'cantidad': 0})
+    for entrada in _archivos(desde, hasta, directorio=directorio):
+        datos = _leer(entrada, ['dia_emision', 'estado', 'total', 'subtotal', 'iva'], directorio)
+        mascara = _mascara(datos, desde, hasta, estado)
+        if not mascara.any():
+            continue
+        dias, posiciones = np.unique(datos['dia_emision'][mascara], return_inverse=True)
+        cantidades = np.bincount(posiciones)
+        # Suma exacta de los centavos en int64 (bincount con pesos usa float64)
+        sumas = {}
+        for campo in ('total', 'subtotal', 'iva'):
+            sumas[campo] = np.zeros(len(dias), dtype=np.int64)
+            np.add.at(sumas[campo], posiciones, datos[campo][mascara])
+        for indice, dia in enumerate(dias):
+            fila = resultado[dia.astype('datetime64[D]').item()]
+            fila['cantidad'] += int(cantidades[indice])
+            for campo, suma in sumas.items():
+                fila[campo] += Decimal(int(suma[indice])).scaleb(-2)
+    return dict(resultado)
+
+
+# Archivado
+
+def _documentos_archivables(antes_de):
+    """
+    Documentos emitidos antes de la fecha cuya autorización (si tienen) ya
+    se resolvió antes de esa fecha
+    """
+    desde_limite = timezone.make_aware(
+        datetime.datetime.combine(antes_de, datetime.time.min), timezone.get_current_timezone()
+    )
+    return DocumentoTributario.objects.filter(
+        dia_emision__lt=antes_de
+    ).filter(
+        Q(autorizacion__isnull=True) |
+        Q(autorizacion__fecha_autorizacion__lt=desde_limite) & ~Q(autorizacion__estado=Autorizacion.ESTADO_PENDIENTE)
+    )
+
+
+def _columnas_grupo(documentos_grupo):
+    """
+    Arma las columnas de documento y de línea de un grupo (mes, emisor)
+    """
+    ids = [documento.id for documento in documentos_grupo]
+    # Los días del grupo limitan las particiones de líneas y errores que se leen
+    dias = {
+        'dia_emision__gte': min(documento.dia_emision for documento in documentos_grupo),
+        'dia_emision__lte': max(documento.dia_emision for documento in documentos_grupo),
+    }
+
+    errores = defaultdict(list)
+    for documento_id, codigo in AutorizacionError.objects.filter(
+        autorizacion__documento_id__in=ids, **dias
+    ).order_by('id').values_list('autorizacion__documento_id', 'error__codigo'):
+        errores[documento_id].append(codigo)
+
+    filas = []
+    for documento in documentos_grupo:
+        autorizacion = getattr(documento, 'autorizacion', None)
+        filas.append({
+            'id': documento.id,
+            'uuid': documento.uuid,
+            'tipo_documento': documento.tipo_documento.codigo,
+            'tipo_documento_nombre': documento.tipo_documento.nombre,
+            'referencia_interna': documento.referencia_interna,
+            'emisor_nit': documento.emisor.nit,
+            'emisor_nombre': documento.emisor.nombre,
+            'establecimiento': documento.establecimiento.codigo,
+            'receptor_nit': documento.receptor.nit,
+            'receptor_nombre': documento.receptor.nombre,
+            'fecha_emision': documento.fecha_emision,
+            'dia_emision': documento.dia_emision,
+            'moneda': documento.moneda,
+            'subtotal': documento.subtotal,
+            'descuento': documento.descuento,
+            'iva': documento.iva,
+            'total': documento.total,
+            'estado': documento.estado,
+            'observaciones': documento.observaciones,
+            'numero_autorizacion': autorizacion.numero_autorizacion if autorizacion else None,
+            'estado_autorizacion': autorizacion.estado if autorizacion else None,
+            'fecha_autorizacion': autorizacion.fecha_autorizacion if autorizacion else None,
+            'correlativo': autorizacion.correlativo if autorizacion else None,
+            'errores_autorizacion': '|'.join(errores[documento.id]),
+        })
+
+    lineas = list(LineaDocumento.objects.filter(documento_id__in=ids, **dias).order_by('documento_id', 'id').values_list(
+        'documento_id', 'descripcion', 'cantidad', 'precio_unitario', 'descuento', 'subtotal'
+    ))
+
+    columnas = {columna: _a_arreglo(columna, [fila[columna] for fila in filas]) for columna in COLUMNAS_DOCUMENTO}
+    for posicion, columna in enumerate(COLUMNAS_LINEA):
+        columnas[columna] = _a_arreglo(columna, [linea[posicion] for linea in lineas])
+    return columnas
+
+
+def _escribir_grupo(ruta, columnas):
+    """
+    Escribe (o amplía) el archivo de un mes y emisor; las filas cuyo id ya
+    estaba archivado se omiten, por si una ejecución anterior se interrumpió
+    antes de eliminarlas de la base de datos
+    """
+    import numpy as np
+
+    if os.path.exists(ruta):
+        with np.load(ruta, allow_pickle=False) as existentes:
+            existentes = {columna: existentes[columna] for columna in existentes.files}
+        nuevos = ~np.isin(columnas['id'], existentes['id'])
+        lineas_nuevas = ~np.isin(columnas['linea_documento'], existentes['id'])
+        columnas = {
+            columna: np.concatenate([
+                existentes[columna],
+                columnas[columna][lineas_nuevas if columna in COLUMNAS_LINEA else nuevos]
+            ])
+            for columna in existentes
+        }
+
+    _escribir_atomico(ruta, lambda archivo: np.savez_compressed(archivo, **columnas))
+    return columnas
+
+
+def _entrada_indice(ruta_relativa, mes, nit_emisor, columnas):
+    numeros = sorted(numero for numero in columnas['numero_autorizacion'].tolist() if numero)
+    return {
+        'ruta': ruta_relativa,
+        'mes': mes,
+        'nit_emisor': nit_emisor,
+        'desde': str(columnas['dia_emision'].min()),
+        'hasta': str(columnas['dia_emision'].max()),
+        'numeros': [numeros[0], numeros[-1]] if numeros else None,
+        'documentos': int(len(columnas['id'])),
+        'lineas': int(len(columnas['linea_documento'])),
+    }
+
+
+def archivar(antes_de, tamano_lote=1000, directorio=None):
+    """
+    Exporta al archivo y elimina de la base de datos los documentos emitidos
+    antes de una fecha, con sus líneas, autorizaciones y errores
+
+    Antes de eliminar se actualizan los fragmentos del informe XML de esos
+    días, que desde entonces se conservan tal cual (ver iterar_informe_xml).
+
+    Parámetros:
+    - antes_de: Fecha (date); se archivan los días anteriores
+    - tamano_lote: Documentos a eliminar por transacción
+    - directorio: Directorio del archivo (por defecto ARCHIVO_DOCUMENTOS_DIR)
+
+    Retorna:
+    - Tupla (documentos archivados, archivos escritos)
+    """
+    from .services import iterar_informe_xml
+
+    directorio = directorio or directorio_archivo()
+    indice = cargar_indice(directorio)
+    indice = {'limite': indice['limite'], 'archivos': list(indice['archivos'])}
+    entradas = {entrada['ruta']: entrada for entrada in indice['archivos']}
+
+    # Los fragmentos del informe de los días archivados quedan generados
+    for _ in iterar_informe_xml(hasta=antes_de - datetime.timedelta(days=1)):
+        pass
+
+    grupos = (
+        _documentos_archivables(antes_de)
+        .values_list('dia_emision', 'emisor_id', 'emisor__nit')
+        .order_by()
+    )
+    por_grupo = defaultdict(set)
+    for dia, emisor_id, nit in grupos:
+        por_grupo[(dia.strftime('%Y-%m'), emisor_id, nit)].add(dia)
+
+    archivados = 0
+    escritos = 0
+    for (mes, emisor_id, nit), dias in sorted(por_grupo.items()):
+        documentos_grupo = list(
+            _documentos_archivables(antes_de).filter(
+                emisor_id=emisor_id,
+                dia_emision__gte=min(dias),
+                dia_emision__lte=max(dias)
+            ).select_related(
+                'tipo_documento', 'emisor', 'receptor', 'establecimiento', 'autorizacion'
+            ).order_by('fecha_emision', 'id')
+        )
+        if not documentos_grupo:
+            continue
+
+        ruta_relativa = os.path.join(mes, f'{nit}.npz')
+        columnas = _escribir_grupo(os.path.join(directorio, ruta_relativa), _columnas_grupo(documentos_grupo))
+        entradas[ruta_relativa] = _entrada_indice(ruta_relativa, mes, nit, columnas)
+        escritos += 1
+
+        # El índice se publica antes de eliminar para que nada quede sin consultar
+        indice['archivos'] = sorted(entradas.values(), key=lambda entrada: entrada['ruta'])
+        _guardar_indice(indice, directorio)
+
+        ids = [documento.id for documento in documentos_grupo]
+        for inicio in range(0, len(ids), tamano_lote):
+            with transaction.atomic():
+                DocumentoTributario.objects.filter(pk__in=ids[inicio:inicio + tamano_lote]).delete()
+                busqueda.eliminar(DocumentoTributario, ids[inicio:inicio + tamano_lote])
+        archivados += len(ids)
+
+    limite = limite_archivo(directorio)
+    if limite is None or antes_de > limite:
+        indice['limite'] = antes_de.isoformat()
+    indice['archivos'] = sorted(entradas.values(), key=lambda entrada: entrada['ruta'])
+    _guardar_indice(indice, directorio)
+
+    return archivados, escritos
@@ -0,0 +1,60 @@
+# autoriza/consultas_frecuentes.py
+"""
+Consultas frecuentes sobre autorizaciones y la cola de autorización, tal
+como las arman los workers, el informe XML y las estadísticas.
+"""
+import datetime
+
+from django.db.models import Q
+from django.utils import timezone
+
+from core.planes import consulta_frecuente
+from .models import Autorizacion, TareaAutorizacion
+
+
+@consulta_frecuente('autorizaciones_por_reclamar')
+def autorizaciones_por_reclamar():
+    """Autorizaciones pendientes que reclama un worker (reclamar_autorizaciones)"""
+    return Autorizacion.objects.filter(
+        estado=Autorizacion.ESTADO_PENDIENTE,
+        worker__isnull=True
+    ).order_by('id').values_list('id', flat=True)[:500]
+
+
+@consulta_frecuente('aprobaciones_del_informe')
+def aprobaciones_del_informe():
+    """Aprobaciones de un rango de días en el orden del informe XML"""
+    hasta = timezone.now()
+    return Autorizacion.objects.filter(
+        fecha_autorizacion__gte=hasta - datetime.timedelta(days=7),
+        fecha_autorizacion__lt=hasta,
+        estado=Autorizacion.ESTADO_APROBADO
+    ).order_by('fecha_autorizacion', 'correlativo').values_list(
+        'numero_autorizacion', 'fecha_autorizacion', 'correlativo'
+    )
+
+
+@consulta_frecuente('autorizaciones_pagina_cursor')
+def autorizaciones_pagina_cursor():
+    """Página profunda de autorizaciones por cursor (API)"""
+    fecha = timezone.now() - datetime.timedelta(days=365)
+    return Autorizacion.objects.filter(
+        Q(fecha_autorizacion__lt=fecha) | Q(fecha_autorizacion=fecha, id__lt=1000)
+    ).order_by('-fecha_autorizacion', '-id')[:21]
+
+
+@consulta_frecuente('autorizaciones_del_dia')
+def autorizaciones_del_dia():
+    """Autorizaciones resueltas de un día de emisión (recalcular_estadisticas)"""
+    return Autorizacion.objects.filter(
+        documento__dia_emision=timezone.localdate()
+    ).exclude(estado=Autorizacion.ESTADO_PENDIENTE)
+
+
+@consulta_frecuente('tareas_disponibles')
+def tareas_disponibles():
+    """Tareas de la cola listas para procesar (reclamar_tareas)"""
+    return TareaAutorizacion.objects.filter(
+        estado=TareaAutorizacion.ESTADO_PENDIENTE,
+        disponible_desde__lte=timezone.now()
+    ).order_by('disponible_desde', 'id')[:100]
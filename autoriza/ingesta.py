@@ -0,0 +1,421 @@
+# autoriza/ingesta.py
+"""
+Ingesta masiva de solicitudes de autorización desde archivos XML.
+
+Formato esperado:
+
+    <LISTA_SOLICITUDES>
+        <SOLICITUD_AUTORIZACION>
+            <TIEMPO>15/03/2024 10:30</TIEMPO>
+            <REFERENCIA>FAC-001</REFERENCIA>
+            <NIT_EMISOR>12345678</NIT_EMISOR>
+            <NIT_RECEPTOR>87654321</NIT_RECEPTOR>
+            <VALOR>100.00</VALOR>
+            <IVA>12.00</IVA>
+            <TOTAL>112.00</TOTAL>
+            <!-- Opcionales -->
+            <TIPO_DOCUMENTO>FACT</TIPO_DOCUMENTO>
+            <ESTABLECIMIENTO>001</ESTABLECIMIENTO>
+            <DESCUENTO>0.00</DESCUENTO>
+            <LINEAS>
+                <LINEA>
+                    <DESCRIPCION>Producto</DESCRIPCION>
+                    <CANTIDAD>1</CANTIDAD>
+                    <PRECIO_UNITARIO>100.00</PRECIO_UNITARIO>
+                    <DESCUENTO>0.00</DESCUENTO>
+                </LINEA>
+            </LINEAS>
+        </SOLICITUD_AUTORIZACION>
+    </LISTA_SOLICITUDES>
+
+El archivo se lee de forma incremental (iterparse), por lo que la memoria
+utilizada no depende del tamaño del archivo.
+"""
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction, IntegrityError
+from django.utils import timezone
+
+from core import busqueda
+from emisor import directorio
+from emisor.models import (
+    DocumentoTributario, LineaDocumento, Establecimiento, tipos_documento_activos
+)
+from emisor.services import ReferenciaDuplicada, es_referencia_duplicada
+from .models import Autorizacion, TrabajoIngesta, ErrorIngesta
+
+
+TAMANO_LOTE = 500
+
+FORMATOS_FECHA = ['%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y']
+
+
+class RegistroInvalido(Exception):
+    """
+    Error de formato o de datos en una solicitud del archivo
+    """
+    pass
+
+
+def _texto(elemento, tag):
+    hijo = elemento.find(tag)
+    if hijo is None or hijo.text is None:
+        return ''
+    return hijo.text.strip()
+
+
+def _decimal(valor, campo, requerido=True):
+    if not valor:
+        if requerido:
+            raise RegistroInvalido(f"El campo {campo} es obligatorio")
+        return None
+    try:
+        return Decimal(valor).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise RegistroInvalido(f"El campo {campo} no es un número válido: {valor}")
+
+
+def _fecha(valor):
+    if not valor:
+        raise RegistroInvalido("El campo TIEMPO es obligatorio")
+    for formato in FORMATOS_FECHA:
+        try:
+            fecha = datetime.datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+        return timezone.make_aware(fecha)
+    raise RegistroInvalido(f"El campo TIEMPO no tiene un formato válido: {valor}")
+
+
+def _limpiar_nit(valor):
+    return ''.join(c for c in valor if c.isalnum())
+
+
+def _leer_solicitud(elemento):
+    """
+    Convierte un elemento SOLICITUD_AUTORIZACION en un diccionario
+    """
+    solicitud = {
+        'referencia': _texto(elemento, 'REFERENCIA'),
+        'fecha_emision': _fecha(_texto(elemento, 'TIEMPO')),
+        'nit_emisor': _limpiar_nit(_texto(elemento, 'NIT_EMISOR')),
+        'nit_receptor': _limpiar_nit(_texto(elemento, 'NIT_RECEPTOR')),
+        'subtotal': _decimal(_texto(elemento, 'VALOR'), 'VALOR'),
+        'descuento': _decimal(_texto(elemento, 'DESCUENTO'), 'DESCUENTO', requerido=False) or Decimal('0.00'),
+        'iva': _decimal(_texto(elemento, 'IVA'), 'IVA', requerido=False),
+        'total': _decimal(_texto(elemento, 'TOTAL'), 'TOTAL', requerido=False),
+        'tipo_documento': _texto(elemento, 'TIPO_DOCUMENTO'),
+        'establecimiento': _texto(elemento, 'ESTABLECIMIENTO'),
+        'lineas': [],
+    }
+
+    if not solicitud['referencia']:
+        raise RegistroInvalido("El campo REFERENCIA es obligatorio")
+    if not solicitud['nit_emisor'] or not solicitud['nit_receptor']:
+        raise RegistroInvalido("Los campos NIT_EMISOR y NIT_RECEPTOR son obligatorios")
+
+    for linea in elemento.iterfind('LINEAS/LINEA'):
+        solicitud['lineas'].append({
+            'descripcion': _texto(linea, 'DESCRIPCION') or solicitud['referencia'],
+            'cantidad': _decimal(_texto(linea, 'CANTIDAD'), 'CANTIDAD'),
+            'precio_unitario': _decimal(_texto(linea, 'PRECIO_UNITARIO'), 'PRECIO_UNITARIO'),
+            'descuento': _decimal(_texto(linea, 'DESCUENTO'), 'DESCUENTO', requerido=False) or Decimal('0.00'),
+        })
+
+    return solicitud
+
+
+def leer_solicitudes(path):
+    """
+    Lee las solicitudes de un archivo XML de forma incremental
+
+    Parámetros:
+    - path: Ruta del archivo XML
+
+    Retorna:
+    - Generador de tuplas (numero_registro, referencia, solicitud o excepción)
+    """
+    from lxml import etree
+
+    contexto = etree.iterparse(path, events=('end',), tag='SOLICITUD_AUTORIZACION', huge_tree=True)
+
+    for numero, (_, elemento) in enumerate(contexto, start=1):
+        referencia = _texto(elemento, 'REFERENCIA')
+        try:
+            yield numero, referencia, _leer_solicitud(elemento)
+        except RegistroInvalido as e:
+            yield numero, referencia, e
+
+        # Liberar el elemento ya procesado y sus hermanos anteriores
+        elemento.clear()
+        while elemento.getprevious() is not None:
+            del elemento.getparent()[0]
+
+    del contexto
+
+
+def crear_trabajo_ingesta(path, nombre_original='', usuario=None):
+    """
+    Registra un nuevo trabajo de ingesta para un archivo
+    """
+    return TrabajoIngesta.objects.create(
+        archivo=str(path),
+        nombre_original=nombre_original,
+        usuario=usuario
+    )
+
+
+def reclamar_trabajo_ingesta():
+    """
+    Reclama el trabajo de ingesta pendiente más antiguo para procesarlo
+
+    Usa SELECT ... FOR UPDATE SKIP LOCKED: varios procesos pueden reclamar
+    trabajos al mismo tiempo sin tomar el mismo.
+
+    Retorna:
+    - La instancia de TrabajoIngesta en estado PROCESANDO o None si no hay
+      trabajos pendientes
+    """
+    with transaction.atomic():
+        trabajo = TrabajoIngesta.objects.select_for_update(skip_locked=True).filter(
+            estado=TrabajoIngesta.ESTADO_PENDIENTE
+        ).order_by('created', 'id').first()
+        if trabajo is None:
+            return None
+
+        trabajo.estado = TrabajoIngesta.ESTADO_PROCESANDO
+        trabajo.fecha_inicio = timezone.now()
+        trabajo.save(update_fields=['estado', 'fecha_inicio', 'modified'])
+
+    return trabajo
+
+
+class _Catalogos:
+    """
+    Resolución por lote de contribuyentes, establecimientos y tipos de documento
+    """
+
+    def __init__(self, tipo_documento=None):
+        self.tipos = {tipo.codigo: tipo.id for tipo in tipos_documento_activos.obtener()}
+        if tipo_documento:
+            self.tipo_defecto = self.tipos.get(tipo_documento)
+            if self.tipo_defecto is None:
+                raise ValueError(f"No existe un tipo de documento activo con código {tipo_documento}")
+        else:
+            self.tipo_defecto = next(iter(self.tipos.values()), None)
+
+    def cargar(self, solicitudes):
+        nits = set()
+        for solicitud in solicitudes:
+            nits.add(solicitud['nit_emisor'])
+            nits.add(solicitud['nit_receptor'])
+
+        self.contribuyentes = directorio.resolver(nits)
+
+        self.establecimientos = {}
+        self.establecimiento_defecto = {}
+        for est_id, contribuyente_id, codigo in Establecimiento.objects.filter(
+            contribuyente_id__in=self.contribuyentes.values(),
+            activo=True
+        ).order_by('id').values_list('id', 'contribuyente_id', 'codigo'):
+            self.establecimientos[(contribuyente_id, codigo)] = est_id
+            self.establecimiento_defecto.setdefault(contribuyente_id, est_id)
+
+    def documento(self, solicitud):
+        """
+        Construye (sin guardar) el documento y sus líneas para una solicitud
+        """
+        emisor_id = self.contribuyentes.get(solicitud['nit_emisor'])
+        if emisor_id is None:
+            raise RegistroInvalido(f"No existe un contribuyente emisor con NIT {solicitud['nit_emisor']}")
+
+        receptor_id = self.contribuyentes.get(solicitud['nit_receptor'])
+        if receptor_id is None:
+            raise RegistroInvalido(f"No existe un contribuyente receptor con NIT {solicitud['nit_receptor']}")
+
+        if solicitud['tipo_documento']:
+            tipo_id = self.tipos.get(solicitud['tipo_documento'])
+        else:
+            tipo_id = self.tipo_defecto
+        if tipo_id is None:
+            raise RegistroInvalido(f"Tipo de documento no válido: {solicitud['tipo_documento'] or '(ninguno)'}")
+
+        if solicitud['establecimiento']:
+            establecimiento_id = self.establecimientos.get((emisor_id, solicitud['establecimiento']))
+        else:
+            establecimiento_id = self.establecimiento_defecto.get(emisor_id)
+        if establecimiento_id is None:
+            raise RegistroInvalido(f"El emisor {solicitud['nit_emisor']} no tiene un establecimiento activo válido")
+
+        documento = DocumentoTributario(
+            tipo_documento_id=tipo_id,
+            referencia_interna=solicitud['referencia'],
+            emisor_id=emisor_id,
+            establecimiento_id=establecimiento_id,
+            receptor_id=receptor_id,
+            fecha_emision=solicitud['fecha_emision'],
+            subtotal=solicitud['subtotal'],
+            descuento=solicitud['descuento'],
+            iva=solicitud['iva'] if solicitud['iva'] is not None else Decimal('0.00'),
+            total=Decimal('0.00'),
+            estado=DocumentoTributario.ESTADO_EMITIDO,
+            es_borrador=False,
+        )
+        # Se respetan los montos reportados para que la validación los verifique
+        if solicitud['iva'] is None:
+            documento.iva = documento.calcular_iva()
+        documento.total = solicitud['total'] if solicitud['total'] is not None else documento.calcular_total()
+
+        lineas_data = solicitud['lineas'] or [{
+            'descripcion': solicitud['referencia'],
+            'cantidad': Decimal('1.00'),
+            'precio_unitario': solicitud['subtotal'],
+            'descuento': Decimal('0.00'),
+        }]
+        lineas = []
+        for linea_data in lineas_data:
+            linea = LineaDocumento(**linea_data)
+            linea.subtotal = linea.calcular_subtotal()
+            lineas.append(linea)
+
+        return documento, lineas
+
+
+def _guardar_documentos(pendientes):
+    """
+    Inserta los documentos del lote con bulk_create. Si el lote viola alguna
+    restricción única se reintenta registro por registro (también con
+    bulk_create, para indexarlos una sola vez) para aislar el error.
+
+    Retorna:
+    - Tupla (lista de (documento, lineas) guardados, lista de (registro,
+      referencia, detalle), lista de documentos con referencia duplicada)
+    """
+    try:
+        with transaction.atomic():
+            DocumentoTributario.objects.bulk_create([documento for _, documento, _ in pendientes])
+        guardados = [(documento, lineas) for _, documento, lineas in pendientes]
+        return guardados, [], []
+    except IntegrityError:
+        pass
+
+    guardados = []
+    errores = []
+    duplicados = []
+    for numero, documento, lineas in pendientes:
+        documento.pk = None
+        try:
+            with transaction.atomic():
+                DocumentoTributario.objects.bulk_create([documento])
+            guardados.append((documento, lineas))
+        except IntegrityError as e:
+            if es_referencia_duplicada(e):
+                detalle = ' '.join(ReferenciaDuplicada(documento).messages)
+                duplicados.append(documento)
+            else:
+                detalle = f"No se pudo guardar el documento: {e}"
+            errores.append((numero, documento.referencia_interna, detalle))
+    return guardados, errores, duplicados
+
+
+@transaction.atomic
+def _procesar_lote(trabajo, lote, catalogos):
+    """
+    Crea documentos, líneas y autorizaciones de un lote y los valida
+    """
+    from .services import crear_solicitudes_autorizacion, registrar_referencias_duplicadas
+
+    errores = []
+    pendientes = []
+
+    catalogos.cargar([solicitud for _, _, solicitud in lote if not isinstance(solicitud, Exception)])
+
+    for numero, referencia, solicitud in lote:
+        if isinstance(solicitud, Exception):
+            errores.append((numero, referencia, str(solicitud)))
+            continue
+        try:
+            documento, lineas = catalogos.documento(solicitud)
+        except RegistroInvalido as e:
+            errores.append((numero, referencia, str(e)))
+            continue
+        pendientes.append((numero, documento, lineas))
+
+    guardados, errores_guardado, duplicados = _guardar_documentos(pendientes)
+    errores.extend(errores_guardado)
+    registrar_referencias_duplicadas(duplicados)
+
+    lineas = []
+    for documento, lineas_documento in guardados:
+        for linea in lineas_documento:
+            linea.documento = documento
+            lineas.append(linea)
+    LineaDocumento.objects.bulk_create(lineas)
+    busqueda.indexar_lote(documento for documento, _ in guardados)
+
+    autorizaciones = crear_solicitudes_autorizacion([documento for documento, _ in guardados])
+    aprobados = sum(
+        1 for autorizacion in autorizaciones
+        if autorizacion.estado == Autorizacion.ESTADO_APROBADO
+    )
+
+    ErrorIngesta.objects.bulk_create([
+        ErrorIngesta(trabajo=trabajo, registro=numero, referencia=(referencia or '')[:40], detalle=detalle)
+        for numero, referencia, detalle in errores
+    ])
+
+    return {
+        'registros_leidos': len(lote),
+        'documentos_creados': len(guardados),
+        'documentos_aprobados': aprobados,
+        'documentos_rechazados': len(guardados) - aprobados,
+        'registros_con_error': len(errores),
+    }
+
+
+def _registrar_progreso(trabajo, resumen):
+    for campo, valor in resumen.items():
+        setattr(trabajo, campo, getattr(trabajo, campo) + valor)
+    trabajo.modified = timezone.now()
+    TrabajoIngesta.objects.filter(pk=trabajo.pk).update(modified=trabajo.modified, **{
+        campo: getattr(trabajo, campo) for campo in resumen
+    })
+
+
+def procesar_ingesta(trabajo, tamano_lote=TAMANO_LOTE, tipo_documento=None):
+    """
+    Procesa un trabajo de ingesta leyendo su archivo por lotes
+
+    Parámetros:
+    - trabajo: Instancia de TrabajoIngesta
+    - tamano_lote: Cantidad de solicitudes por lote
+    - tipo_documento: Código del tipo de documento por defecto (opcional)
+
+    Retorna:
+    - La instancia de TrabajoIngesta actualizada
+    """
+    trabajo.estado = TrabajoIngesta.ESTADO_PROCESANDO
+    trabajo.fecha_inicio = timezone.now()
+    trabajo.save(update_fields=['estado', 'fecha_inicio', 'modified'])
+
+    try:
+        catalogos = _Catalogos(tipo_documento)
+        lote = []
+        for registro in leer_solicitudes(trabajo.archivo):
+            lote.append(registro)
+            if len(lote) >= tamano_lote:
+                _registrar_progreso(trabajo, _procesar_lote(trabajo, lote, catalogos))
+                lote = []
+        if lote:
+            _registrar_progreso(trabajo, _procesar_lote(trabajo, lote, catalogos))
+    except Exception as e:
+        trabajo.estado = TrabajoIngesta.ESTADO_FALLIDO
+        trabajo.mensaje = str(e)
+    else:
+        trabajo.estado = TrabajoIngesta.ESTADO_COMPLETADO
+
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save(update_fields=['estado', 'mensaje', 'fecha_fin', 'modified'])
+
+    return trabajo
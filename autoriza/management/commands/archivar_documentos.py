@@ -0,0 +1,48 @@
+# autoriza/management/commands/archivar_documentos.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from autoriza import archivo
+
+
+class Command(BaseCommand):
+    help = (
+        'Exporta los documentos de ejercicios cerrados, con sus líneas y '
+        'autorizaciones, al archivo histórico comprimido (por mes y emisor) '
+        'y los elimina de la base de datos'
+    )
+
+    def add_arguments(self, parser):
+        grupo = parser.add_mutually_exclusive_group(required=True)
+        grupo.add_argument('--antes', help='Archivar los documentos emitidos antes de esta fecha (AAAA-MM-DD)')
+        grupo.add_argument('--anio', type=int, help='Archivar los ejercicios hasta este año, inclusive')
+        parser.add_argument('--lote', type=int, default=1000, help='Documentos a eliminar por transacción')
+
+    def handle(self, *args, **options):
+        if options['anio']:
+            antes_de = datetime.date(options['anio'] + 1, 1, 1)
+        else:
+            antes_de = parse_date(options['antes'])
+            if antes_de is None:
+                raise CommandError('La opción --antes debe tener el formato AAAA-MM-DD')
+
+        if options['lote'] < 1:
+            raise CommandError('El tamaño del lote debe ser mayor que cero')
+
+        limite = archivo.limite_archivo()
+        if limite and antes_de < limite:
+            self.stdout.write(f'El archivo ya cubre los días anteriores a {limite}')
+
+        archivados, escritos = archivo.archivar(antes_de, tamano_lote=options['lote'])
+
+        for entrada in archivo.cargar_indice()['archivos']:
+            self.stdout.write(
+                f'  {entrada["ruta"]}: {entrada["documentos"]} documentos, '
+                f'{entrada["lineas"]} líneas ({entrada["desde"]} a {entrada["hasta"]})'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{archivados} documentos archivados en {escritos} archivos; '
+            f'límite del archivo: {archivo.limite_archivo()}'
+        ))
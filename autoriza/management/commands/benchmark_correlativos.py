@@ -0,0 +1,111 @@
+# autoriza/management/commands/benchmark_correlativos.py
+import datetime
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from autoriza.models import Autorizacion, SecuenciaDiaria
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide el rendimiento de la secuencia diaria de correlativos con varios '
+        'workers concurrentes y verifica que no existan números duplicados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Cantidad de hilos concurrentes')
+        parser.add_argument(
+            '--por-worker', type=int, default=500, dest='por_worker',
+            help='Cantidad de correlativos que reserva cada worker (modo reservar)'
+        )
+        parser.add_argument(
+            '--modo', choices=['reservar', 'aprobar'], default='reservar',
+            help=(
+                'reservar: reserva correlativos en una fecha de prueba que se elimina al final; '
+                'aprobar: aprueba las autorizaciones pendientes existentes repartidas entre los workers '
+                '(en SQLite requiere OPTIONS transaction_mode=IMMEDIATE)'
+            )
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('Se requiere al menos un worker')
+
+        if options['modo'] == 'reservar':
+            tareas, fecha = self._tareas_reserva(workers, options['por_worker'])
+        else:
+            tareas, fecha = self._tareas_aprobacion(workers), None
+
+        resultados = [[] for _ in range(workers)]
+        errores = []
+
+        def ejecutar(indice):
+            try:
+                for tarea in tareas[indice]:
+                    resultados[indice].append(tarea())
+            except Exception as e:
+                errores.append(e)
+            finally:
+                connections.close_all()
+
+        hilos = [threading.Thread(target=ejecutar, args=(i,)) for i in range(workers)]
+        inicio = time.perf_counter()
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        duracion = time.perf_counter() - inicio
+
+        numeros = [numero for resultado in resultados for numero in resultado]
+        duplicados = len(numeros) - len(set(numeros))
+
+        if fecha is not None:
+            SecuenciaDiaria.objects.filter(fecha=fecha).delete()
+
+        self.stdout.write(f'Motor de base de datos: {connection.vendor}')
+        self.stdout.write(f'Workers: {workers}')
+        self.stdout.write(f'Números entregados: {len(numeros)}')
+        self.stdout.write(f'Duración: {duracion:.3f} s')
+        if duracion > 0:
+            self.stdout.write(f'Rendimiento: {len(numeros) / duracion:.1f} por segundo')
+        self.stdout.write(f'Duplicados: {duplicados}')
+        self.stdout.write(f'Errores: {len(errores)}')
+        for error in errores[:10]:
+            self.stderr.write(f'  {error!r}')
+
+        if duplicados or errores:
+            raise CommandError('Se detectaron números duplicados o errores')
+
+        self.stdout.write(self.style.SUCCESS('Sin duplicados ni reintentos'))
+
+    def _tareas_reserva(self, workers, por_worker):
+        # Fecha fuera de cualquier rango real para no interferir con la secuencia del día
+        fecha = datetime.date(1900, 1, 1)
+        SecuenciaDiaria.objects.filter(fecha=fecha).delete()
+
+        def reservar():
+            return SecuenciaDiaria.reservar(fecha)
+
+        return [[reservar] * por_worker for _ in range(workers)], fecha
+
+    def _tareas_aprobacion(self, workers):
+        ids = list(
+            Autorizacion.objects.filter(
+                estado=Autorizacion.ESTADO_PENDIENTE
+            ).order_by('id').values_list('id', flat=True)
+        )
+        if not ids:
+            raise CommandError('No hay autorizaciones pendientes para aprobar')
+
+        def aprobar(autorizacion_id):
+            def tarea():
+                with transaction.atomic():
+                    autorizacion = Autorizacion.objects.select_related('documento').get(pk=autorizacion_id)
+                    return autorizacion.aprobar()
+            return tarea
+
+        return [[aprobar(i) for i in ids[indice::workers]] for indice in range(workers)]
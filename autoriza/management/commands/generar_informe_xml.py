@@ -0,0 +1,53 @@
+# autoriza/management/commands/generar_informe_xml.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from autoriza.services import guardar_informe_xml
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera el informe XML de autorizaciones (LISTAAUTORIZACIONES) '
+        'reutilizando los fragmentos de los días que no cambiaron'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--salida', default='autorizaciones.xml',
+            help='Ruta del archivo XML a generar'
+        )
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD)')
+        parser.add_argument(
+            '--dias', type=int,
+            help='Publicar solo los últimos N días (incluido el día actual)'
+        )
+        parser.add_argument(
+            '--regenerar', action='store_true',
+            help='Generar de nuevo todos los días sin usar los fragmentos guardados'
+        )
+
+    def _fecha(self, valor, opcion):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f'La opción {opcion} debe tener el formato AAAA-MM-DD')
+        return fecha
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'], '--desde')
+        hasta = self._fecha(options['hasta'], '--hasta')
+
+        if options['dias'] is not None:
+            if desde:
+                raise CommandError('Las opciones --dias y --desde no se pueden combinar')
+            if options['dias'] < 1:
+                raise CommandError('La cantidad de días debe ser mayor que cero')
+            desde = (hasta or timezone.localdate()) - datetime.timedelta(days=options['dias'] - 1)
+
+        guardar_informe_xml(options['salida'], desde, hasta, regenerar=options['regenerar'])
+        self.stdout.write(self.style.SUCCESS(f"Informe generado en {options['salida']}"))
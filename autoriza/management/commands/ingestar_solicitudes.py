@@ -0,0 +1,51 @@
+# autoriza/management/commands/ingestar_solicitudes.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from autoriza.ingesta import TAMANO_LOTE, crear_trabajo_ingesta, procesar_ingesta
+from autoriza.models import TrabajoIngesta
+
+
+class Command(BaseCommand):
+    help = 'Carga masiva de solicitudes de autorización desde un archivo XML'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta del archivo XML con las solicitudes')
+        parser.add_argument(
+            '--lote', type=int, default=TAMANO_LOTE,
+            help=f'Cantidad de solicitudes por lote (por defecto {TAMANO_LOTE})'
+        )
+        parser.add_argument(
+            '--tipo-documento', dest='tipo_documento',
+            help='Código del tipo de documento a usar cuando la solicitud no lo indique'
+        )
+
+    def handle(self, *args, **options):
+        archivo = os.path.abspath(options['archivo'])
+        if not os.path.isfile(archivo):
+            raise CommandError(f'No existe el archivo {archivo}')
+        if options['lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor que cero')
+
+        trabajo = crear_trabajo_ingesta(archivo, nombre_original=os.path.basename(archivo))
+        self.stdout.write(f'Trabajo de ingesta #{trabajo.pk} iniciado')
+
+        trabajo = procesar_ingesta(
+            trabajo,
+            tamano_lote=options['lote'],
+            tipo_documento=options['tipo_documento']
+        )
+
+        self.stdout.write(
+            f'Registros leídos: {trabajo.registros_leidos}, '
+            f'documentos creados: {trabajo.documentos_creados}, '
+            f'aprobados: {trabajo.documentos_aprobados}, '
+            f'rechazados: {trabajo.documentos_rechazados}, '
+            f'con error: {trabajo.registros_con_error}'
+        )
+
+        if trabajo.estado == TrabajoIngesta.ESTADO_FALLIDO:
+            raise CommandError(f'El trabajo #{trabajo.pk} falló: {trabajo.mensaje}')
+
+        self.stdout.write(self.style.SUCCESS(f'Trabajo de ingesta #{trabajo.pk} completado'))
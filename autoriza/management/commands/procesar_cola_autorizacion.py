@@ -0,0 +1,66 @@
+# autoriza/management/commands/procesar_cola_autorizacion.py
+import os
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from autoriza.tasks import (
+    liberar_tareas_abandonadas, reclamar_tareas,
+    procesar_tareas, reintentar_fallidas
+)
+
+
+class Command(BaseCommand):
+    help = 'Procesa la cola de autorizaciones pendientes (AUTORIZACION_ASINCRONA)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=100, help='Tareas a reclamar por iteración')
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera cuando la cola está vacía'
+        )
+        parser.add_argument(
+            '--una-vez', action='store_true', dest='una_vez',
+            help='Vaciar la cola y terminar en lugar de quedarse esperando'
+        )
+        parser.add_argument(
+            '--reintentar-fallidas', action='store_true', dest='reintentar_fallidas',
+            help='Reencolar las tareas en dead letter antes de iniciar'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor que cero')
+
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+
+        if options['reintentar_fallidas']:
+            self.stdout.write(f'Tareas reencoladas: {reintentar_fallidas()}')
+
+        self.stdout.write(f'Worker {worker} iniciado')
+        total_completadas = total_fallidas = 0
+
+        try:
+            while True:
+                liberadas = liberar_tareas_abandonadas()
+                if liberadas:
+                    self.stdout.write(f'Tareas abandonadas devueltas a la cola: {liberadas}')
+
+                tareas = reclamar_tareas(options['lote'], worker)
+                if not tareas:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                completadas, fallidas = procesar_tareas(tareas)
+                total_completadas += completadas
+                total_fallidas += fallidas
+                self.stdout.write(f'Lote procesado: {completadas} completadas, {fallidas} con error')
+        except KeyboardInterrupt:
+            self.stdout.write('Deteniendo worker')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Worker {worker} finalizado: {total_completadas} completadas, {total_fallidas} con error'
+        ))
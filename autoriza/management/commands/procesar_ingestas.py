@@ -0,0 +1,56 @@
+# autoriza/management/commands/procesar_ingestas.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from autoriza.ingesta import TAMANO_LOTE, procesar_ingesta, reclamar_trabajo_ingesta
+from autoriza.models import TrabajoIngesta
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos de ingesta pendientes cargados por la API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=TAMANO_LOTE,
+            help=f'Cantidad de solicitudes por lote (por defecto {TAMANO_LOTE})'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=5.0,
+            help='Segundos de espera cuando no hay trabajos pendientes'
+        )
+        parser.add_argument(
+            '--una-vez', action='store_true', dest='una_vez',
+            help='Procesar los trabajos pendientes y terminar en lugar de quedarse esperando'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor que cero')
+
+        procesados = 0
+
+        try:
+            while True:
+                trabajo = reclamar_trabajo_ingesta()
+                if trabajo is None:
+                    if options['una_vez']:
+                        break
+                    time.sleep(options['intervalo'])
+                    continue
+
+                self.stdout.write(f'Trabajo de ingesta #{trabajo.pk} iniciado')
+                trabajo = procesar_ingesta(trabajo, tamano_lote=options['lote'])
+                procesados += 1
+
+                if trabajo.estado == TrabajoIngesta.ESTADO_FALLIDO:
+                    self.stderr.write(f'El trabajo #{trabajo.pk} falló: {trabajo.mensaje}')
+                else:
+                    self.stdout.write(
+                        f'Trabajo #{trabajo.pk}: {trabajo.documentos_creados} documentos creados, '
+                        f'{trabajo.registros_con_error} registros con error'
+                    )
+        except KeyboardInterrupt:
+            self.stdout.write('Deteniendo procesamiento')
+
+        self.stdout.write(self.style.SUCCESS(f'Trabajos de ingesta procesados: {procesados}'))
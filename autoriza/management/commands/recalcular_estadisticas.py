@@ -0,0 +1,59 @@
+# autoriza/management/commands/recalcular_estadisticas.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from autoriza.archivo import limite_archivo
+from autoriza.models import EstadisticaDiaria
+from autoriza.services import recalcular_estadisticas
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye las estadísticas diarias y el registro de emisores y '
+        'receptores únicos a partir de los documentos autorizados'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha final (AAAA-MM-DD)')
+
+    def _fecha(self, valor, opcion):
+        if not valor:
+            return None
+        fecha = parse_date(valor)
+        if fecha is None:
+            raise CommandError(f'La opción {opcion} debe tener el formato AAAA-MM-DD')
+        return fecha
+
+    def handle(self, *args, **options):
+        desde = self._fecha(options['desde'], '--desde')
+        hasta = self._fecha(options['hasta'], '--hasta')
+
+        if desde and hasta:
+            fechas = [desde + datetime.timedelta(days=i) for i in range((hasta - desde).days + 1)]
+        else:
+            # Sin rango completo se recalculan los días que ya tienen estadística
+            estadisticas = EstadisticaDiaria.objects.all()
+            if desde:
+                estadisticas = estadisticas.filter(fecha__gte=desde)
+            if hasta:
+                estadisticas = estadisticas.filter(fecha__lte=hasta)
+            fechas = list(estadisticas.order_by('fecha').values_list('fecha', flat=True))
+
+        # Los documentos de los días archivados ya no están en la base de datos
+        limite = limite_archivo()
+        if limite and fechas and fechas[0] < limite:
+            self.stdout.write(f'Se omiten los días archivados (anteriores a {limite})')
+            fechas = [fecha for fecha in fechas if fecha >= limite]
+
+        for fecha in fechas:
+            estadistica = recalcular_estadisticas(fecha)
+            self.stdout.write(
+                f'{fecha}: {estadistica.facturas_recibidas} recibidas, '
+                f'{estadistica.cantidad_emisores} emisores, '
+                f'{estadistica.cantidad_receptores} receptores'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'{len(fechas)} días recalculados'))
@@ -0,0 +1,123 @@
+# autoriza/management/commands/supervisar_autorizaciones.py
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+def _proceso_worker(indice, tamano_lote, intervalo, una_vez):
+    """
+    Punto de entrada de cada proceso hijo del pool
+    """
+    import django
+    from django.apps import apps
+
+    # Con el método spawn el proceso hijo parte sin Django configurado
+    if not apps.ready:
+        django.setup()
+
+    from autoriza.workers import ejecutar_worker, nombre_worker
+
+    detener = threading.Event()
+
+    # Ctrl+C lo gestiona el supervisor; SIGTERM pide terminar el lote en curso y salir
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: detener.set())
+
+    try:
+        ejecutar_worker(nombre_worker(indice), tamano_lote, detener, intervalo=intervalo, una_vez=una_vez)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        'Levanta un pool de procesos que validan y aprueban en paralelo las '
+        'autorizaciones pendientes, reiniciando los que terminan de forma inesperada'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--procesos', type=int, default=multiprocessing.cpu_count(),
+            help='Cantidad de procesos worker (por defecto, uno por núcleo)'
+        )
+        parser.add_argument('--lote', type=int, default=500, help='Autorizaciones a reclamar por iteración')
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera cuando no hay autorizaciones pendientes'
+        )
+        parser.add_argument(
+            '--una-vez', action='store_true', dest='una_vez',
+            help='Procesar las autorizaciones pendientes y terminar'
+        )
+
+    def handle(self, *args, **options):
+        if options['procesos'] < 1:
+            raise CommandError('Se requiere al menos un proceso')
+        if options['lote'] < 1:
+            raise CommandError('El tamaño de lote debe ser mayor que cero')
+
+        from autoriza.workers import liberar_autorizaciones_abandonadas
+
+        liberadas = liberar_autorizaciones_abandonadas()
+        if liberadas:
+            self.stdout.write(f'Autorizaciones de workers caídos liberadas: {liberadas}')
+
+        # Los procesos hijos no deben heredar las conexiones abiertas del supervisor
+        connections.close_all()
+
+        argumentos = (options['lote'], options['intervalo'], options['una_vez'])
+        procesos = {
+            indice: self._iniciar(indice, argumentos)
+            for indice in range(options['procesos'])
+        }
+        self.stdout.write(f'Supervisor iniciado con {len(procesos)} procesos')
+
+        deteniendo = False
+
+        def solicitar_detencion(*args):
+            nonlocal deteniendo
+            deteniendo = True
+
+        signal.signal(signal.SIGTERM, solicitar_detencion)
+
+        try:
+            while procesos:
+                if deteniendo:
+                    break
+                for indice, proceso in list(procesos.items()):
+                    if proceso.is_alive():
+                        continue
+                    proceso.join()
+                    if proceso.exitcode == 0:
+                        del procesos[indice]
+                        continue
+                    self.stderr.write(
+                        f'El proceso {indice} terminó con código {proceso.exitcode}; se reinicia'
+                    )
+                    procesos[indice] = self._iniciar(indice, argumentos)
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+        if procesos:
+            self.stdout.write('Deteniendo workers (se termina el lote en curso)')
+            for proceso in procesos.values():
+                if proceso.is_alive():
+                    proceso.terminate()
+            for proceso in procesos.values():
+                proceso.join()
+
+        self.stdout.write(self.style.SUCCESS('Supervisor finalizado'))
+
+    def _iniciar(self, indice, argumentos):
+        proceso = multiprocessing.Process(
+            target=_proceso_worker,
+            args=(indice,) + argumentos,
+            name=f'autorizacion-worker-{indice}'
+        )
+        proceso.start()
+        return proceso
@@ -0,0 +1,91 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('emisor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ErrorValidacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(choices=[('NIT_EMISOR', 'NIT emisor inválido'), ('NIT_RECEPTOR', 'NIT receptor inválido'), ('IVA', 'IVA mal calculado'), ('TOTAL', 'Total mal calculado'), ('REFERENCIA_DUPLICADA', 'Referencia duplicada'), ('FORMATO', 'Error de formato')], max_length=30, unique=True)),
+                ('descripcion', models.CharField(max_length=255)),
+            ],
+            options={
+                'verbose_name': 'Error de Validación',
+                'verbose_name_plural': 'Errores de Validación',
+            },
+        ),
+        migrations.CreateModel(
+            name='EstadisticaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('facturas_recibidas', models.PositiveIntegerField(default=0)),
+                ('errores_nit_emisor', models.PositiveIntegerField(default=0)),
+                ('errores_nit_receptor', models.PositiveIntegerField(default=0)),
+                ('errores_iva', models.PositiveIntegerField(default=0)),
+                ('errores_total', models.PositiveIntegerField(default=0)),
+                ('errores_referencia_duplicada', models.PositiveIntegerField(default=0)),
+                ('facturas_correctas', models.PositiveIntegerField(default=0)),
+                ('cantidad_emisores', models.PositiveIntegerField(default=0)),
+                ('cantidad_receptores', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Estadística Diaria',
+                'verbose_name_plural': 'Estadísticas Diarias',
+                'ordering': ['-fecha'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Autorizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('numero_autorizacion', models.CharField(blank=True, max_length=20, null=True, unique=True)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('APROBADO', 'Aprobado'), ('RECHAZADO', 'Rechazado')], default='PENDIENTE', max_length=20)),
+                ('fecha_autorizacion', models.DateTimeField(blank=True, null=True)),
+                ('correlativo', models.PositiveIntegerField(blank=True, null=True)),
+                ('documento', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='autorizacion', to='emisor.documentotributario')),
+            ],
+            options={
+                'verbose_name': 'Autorización',
+                'verbose_name_plural': 'Autorizaciones',
+                'ordering': ['-fecha_autorizacion'],
+            },
+        ),
+        migrations.CreateModel(
+            name='AutorizacionError',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('detalle', models.TextField(blank=True)),
+                ('autorizacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='autoriza.autorizacion')),
+                ('error', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='autoriza.errorvalidacion')),
+            ],
+            options={
+                'verbose_name': 'Error en Autorización',
+                'verbose_name_plural': 'Errores en Autorización',
+            },
+        ),
+        migrations.AddField(
+            model_name='autorizacion',
+            name='errores',
+            field=models.ManyToManyField(related_name='autorizaciones', through='autoriza.AutorizacionError', to='autoriza.errorvalidacion'),
+        ),
+        migrations.AddIndex(
+            model_name='autorizacion',
+            index=models.Index(fields=['fecha_autorizacion'], name='autoriza_au_fecha_a_43eba5_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoIngesta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('archivo', models.CharField(max_length=500)),
+                ('nombre_original', models.CharField(blank=True, max_length=255)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('FALLIDO', 'Fallido')], default='PENDIENTE', max_length=20)),
+                ('registros_leidos', models.PositiveIntegerField(default=0)),
+                ('documentos_creados', models.PositiveIntegerField(default=0)),
+                ('documentos_aprobados', models.PositiveIntegerField(default=0)),
+                ('documentos_rechazados', models.PositiveIntegerField(default=0)),
+                ('registros_con_error', models.PositiveIntegerField(default=0)),
+                ('mensaje', models.TextField(blank=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='trabajos_ingesta', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Trabajo de Ingesta',
+                'verbose_name_plural': 'Trabajos de Ingesta',
+                'ordering': ['-created'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ErrorIngesta',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('registro', models.PositiveIntegerField()),
+                ('referencia', models.CharField(blank=True, max_length=40)),
+                ('detalle', models.TextField()),
+                ('trabajo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='errores', to='autoriza.trabajoingesta')),
+            ],
+            options={
+                'verbose_name': 'Error de Ingesta',
+                'verbose_name_plural': 'Errores de Ingesta',
+                'ordering': ['registro'],
+            },
+        ),
+    ]
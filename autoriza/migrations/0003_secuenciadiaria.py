@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0002_trabajoingesta_erroringesta'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaDiaria',
+            fields=[
+                ('fecha', models.DateField(primary_key=True, serialize=False)),
+                ('ultimo', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Secuencia Diaria',
+                'verbose_name_plural': 'Secuencias Diarias',
+            },
+        ),
+    ]
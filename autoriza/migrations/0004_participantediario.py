@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0003_secuenciadiaria'),
+        ('emisor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParticipanteDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('rol', models.CharField(choices=[('EMISOR', 'Emisor'), ('RECEPTOR', 'Receptor')], max_length=10)),
+                ('contribuyente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='emisor.contribuyente')),
+            ],
+            options={
+                'verbose_name': 'Participante Diario',
+                'verbose_name_plural': 'Participantes Diarios',
+                'unique_together': {('fecha', 'rol', 'contribuyente')},
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0005_tareaautorizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WorkerAutorizacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('fecha_inicio', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ultimo_latido', models.DateTimeField(default=django.utils.timezone.now)),
+                ('lotes_procesados', models.PositiveIntegerField(default=0)),
+                ('autorizaciones_procesadas', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Worker de Autorización',
+                'verbose_name_plural': 'Workers de Autorización',
+                'ordering': ['-ultimo_latido'],
+            },
+        ),
+        migrations.AddField(
+            model_name='autorizacion',
+            name='worker',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='autorizaciones', to='autoriza.workerautorizacion'),
+        ),
+    ]
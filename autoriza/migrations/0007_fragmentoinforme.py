@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0006_workerautorizacion_autorizacion_worker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FragmentoInforme',
+            fields=[
+                ('fecha', models.DateField(primary_key=True, serialize=False)),
+                ('version', models.CharField(max_length=64)),
+                ('contenido', models.BinaryField()),
+                ('generado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Fragmento de Informe',
+                'verbose_name_plural': 'Fragmentos de Informe',
+                'ordering': ['fecha'],
+            },
+        ),
+    ]
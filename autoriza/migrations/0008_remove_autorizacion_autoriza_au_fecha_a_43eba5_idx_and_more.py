@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0007_fragmentoinforme'),
+        ('emisor', '0004_alter_documentotributario_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='autorizacion',
+            name='autoriza_au_fecha_a_43eba5_idx',
+        ),
+        migrations.AddIndex(
+            model_name='autorizacion',
+            index=models.Index(fields=['fecha_autorizacion', 'estado', 'correlativo'], name='autorizacion_fecha_estado_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='autorizacion',
+            index=models.Index(condition=models.Q(('estado', 'PENDIENTE')), fields=['id'], name='autorizacion_pendiente_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0008_remove_autorizacion_autoriza_au_fecha_a_43eba5_idx_and_more'),
+        ('emisor', '0005_remove_documentotributario_documento_emisor_fecha_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='autorizacion',
+            index=models.Index(fields=['-fecha_autorizacion', '-id'], name='autorizacion_fecha_id_idx'),
+        ),
+    ]
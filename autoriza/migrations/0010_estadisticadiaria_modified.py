@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0009_autorizacion_autorizacion_fecha_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='estadisticadiaria',
+            name='modified',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
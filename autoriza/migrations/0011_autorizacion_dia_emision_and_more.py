@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+import core.models
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_dia_emision(apps, schema_editor):
+    """
+    Copia a las autorizaciones, tareas y errores existentes el día de
+    emisión de su documento antes de declarar las columnas NOT NULL
+    """
+    DocumentoTributario = apps.get_model('emisor', 'DocumentoTributario')
+    Autorizacion = apps.get_model('autoriza', 'Autorizacion')
+    AutorizacionError = apps.get_model('autoriza', 'AutorizacionError')
+    TareaAutorizacion = apps.get_model('autoriza', 'TareaAutorizacion')
+    alias = schema_editor.connection.alias
+
+    dia_documento = Subquery(
+        DocumentoTributario.objects.filter(pk=OuterRef('documento_id')).values('dia_emision')[:1]
+    )
+    Autorizacion.objects.using(alias).filter(dia_emision__isnull=True).update(dia_emision=dia_documento)
+    TareaAutorizacion.objects.using(alias).filter(dia_emision__isnull=True).update(dia_emision=dia_documento)
+    AutorizacionError.objects.using(alias).filter(dia_emision__isnull=True).update(dia_emision=Subquery(
+        Autorizacion.objects.filter(pk=OuterRef('autorizacion_id')).values('dia_emision')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('autoriza', '0010_estadisticadiaria_modified'),
+        ('emisor', '0007_lineadocumento_dia_emision'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='autorizacion',
+            name='dia_emision',
+            field=core.models.DiaRelacionadoField(null=True, relacion='documento'),
+        ),
+        migrations.AddField(
+            model_name='autorizacionerror',
+            name='dia_emision',
+            field=core.models.DiaRelacionadoField(null=True, relacion='autorizacion'),
+        ),
+        migrations.AddField(
+            model_name='tareaautorizacion',
+            name='dia_emision',
+            field=core.models.DiaRelacionadoField(null=True, relacion='documento'),
+        ),
+        migrations.RunPython(copiar_dia_emision, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='autorizacion',
+            name='dia_emision',
+            field=core.models.DiaRelacionadoField(relacion='documento'),
+        ),
+        migrations.AlterField(
+            model_name='autorizacionerror',
+            name='dia_emision',
+            field=core.models.DiaRelacionadoField(relacion='autorizacion'),
+        ),
+        migrations.AlterField(
+            model_name='tareaautorizacion',
+            name='dia_emision',
+            field=core.models.DiaRelacionadoField(relacion='documento'),
+        ),
+    ]
@@ -1,7 +1,11 @@
 # autoriza/models.py
-from django.db import models
+import datetime
+
+from django.db import DEFAULT_DB_ALIAS, models, connection, connections, transaction, IntegrityError
+from django.conf import settings
 from django.utils import timezone
-from core.models import TimeStampedModel
+from core.catalogos import Catalogo
+from core.models import DiaRelacionadoField, TimeStampedModel
 
 
 class ErrorValidacion(models.Model):
@@ -35,6 +39,145 @@ class ErrorValidacion(models.Model):
         return self.descripcion
 
 
+# Catálogo en caché (core.catalogos) de los errores por código; se invalida
+# en autoriza.signals al guardar o eliminar
+errores_validacion = Catalogo(
+    'errores_validacion',
+    lambda: ErrorValidacion.objects.in_bulk(field_name='codigo')
+)
+
+
+def formatear_numero_autorizacion(fecha, correlativo):
+    """
+    Formatea el número de autorización con el patrón YYYYMMDD########
+    """
+    return f"{fecha.strftime('%Y%m%d')}{correlativo:08d}"
+
+
+class SecuenciaDiaria(models.Model):
+    """
+    Secuencia de correlativos de autorización por día.
+    
+    Cada fila guarda el último correlativo entregado para una fecha, de modo
+    que obtener el siguiente es un único UPDATE sobre una fila en lugar de
+    buscar el máximo entre las autorizaciones del día.
+    """
+    fecha = models.DateField(primary_key=True)
+    ultimo = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Secuencia Diaria"
+        verbose_name_plural = "Secuencias Diarias"
+        
+    def __str__(self):
+        return f"Secuencia del {self.fecha}: {self.ultimo}"
+    
+    @classmethod
+    def reservar(cls, fecha, cantidad=1):
+        """
+        Reserva de forma atómica un rango contiguo de correlativos para una fecha
+        
+        Dentro de una transacción, si DATABASES tiene la conexión
+        AUTORIZACION_SECUENCIA_DB, la reserva se confirma en una transacción
+        corta propia sobre esa conexión: la fila de la secuencia se libera
+        al reservar y no al confirmarse la transacción que valida el lote.
+        Si esa transacción se revierte, los correlativos reservados no se
+        vuelven a entregar.
+        
+        Parámetros:
+        - fecha: Fecha (date) del correlativo
+        - cantidad: Cantidad de correlativos a reservar
+        
+        Retorna:
+        - El primer correlativo del rango reservado
+        """
+        if cantidad < 1:
+            raise ValueError("La cantidad de correlativos debe ser mayor que cero")
+        
+        using = cls._conexion_reserva()
+        with transaction.atomic(using=using):
+            ultimo = cls._incrementar(fecha, cantidad, using)
+            if ultimo is None:
+                ultimo = cls._iniciar(fecha, cantidad, using)
+        
+        return ultimo - cantidad + 1
+    
+    @staticmethod
+    def _conexion_reserva():
+        """
+        Alias de la conexión en la que se reservan los correlativos
+        """
+        alias = getattr(settings, 'AUTORIZACION_SECUENCIA_DB', 'secuencias')
+        if alias in settings.DATABASES and connection.in_atomic_block:
+            return alias
+        return DEFAULT_DB_ALIAS
+    
+    @classmethod
+    def _incrementar(cls, fecha, cantidad, using):
+        """
+        Incrementa la secuencia si ya existe; retorna None si no hay fila para la fecha
+        """
+        conexion = connections[using]
+        if conexion.vendor == 'postgresql':
+            tabla = conexion.ops.quote_name(cls._meta.db_table)
+            with conexion.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {tabla} SET ultimo = ultimo + %s WHERE fecha = %s RETURNING ultimo",
+                    [cantidad, fecha]
+                )
+                fila = cursor.fetchone()
+            return fila[0] if fila else None
+        
+        secuencias = cls.objects.using(using).filter(fecha=fecha)
+        if not secuencias.update(ultimo=models.F('ultimo') + cantidad):
+            return None
+        return secuencias.values_list('ultimo', flat=True).get()
+    
+    @classmethod
+    def _iniciar(cls, fecha, cantidad, using):
+        """
+        Crea la secuencia de una fecha partiendo del mayor correlativo ya
+        aprobado ese día (solo ocurre una vez por día)
+        """
+        zona = timezone.get_current_timezone()
+        desde = timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min), zona)
+        existente = Autorizacion.objects.using(using).filter(
+            fecha_autorizacion__gte=desde,
+            fecha_autorizacion__lt=desde + datetime.timedelta(days=1),
+            estado=Autorizacion.ESTADO_APROBADO
+        ).aggregate(maximo=models.Max('correlativo'))['maximo'] or 0
+        
+        try:
+            with transaction.atomic(using=using):
+                cls.objects.using(using).create(fecha=fecha, ultimo=existente + cantidad)
+            return existente + cantidad
+        except IntegrityError:
+            # Otro proceso creó la fila al mismo tiempo
+            return cls._incrementar(fecha, cantidad, using)
+
+
+class WorkerAutorizacion(models.Model):
+    """
+    Proceso del pool de workers que valida autorizaciones pendientes
+    
+    Solo existen las filas de los procesos vivos: el worker la elimina al
+    terminar y, si el proceso cae, se elimina al liberar sus lotes.
+    """
+    nombre = models.CharField(max_length=100, unique=True)
+    fecha_inicio = models.DateTimeField(default=timezone.now)
+    ultimo_latido = models.DateTimeField(default=timezone.now)
+    lotes_procesados = models.PositiveIntegerField(default=0)
+    autorizaciones_procesadas = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        verbose_name = "Worker de Autorización"
+        verbose_name_plural = "Workers de Autorización"
+        ordering = ['-ultimo_latido']
+        
+    def __str__(self):
+        return f"Worker {self.nombre}"
+
+
 class Autorizacion(TimeStampedModel):
     """
     Modelo para gestionar la autorización de documentos tributarios
@@ -54,11 +197,22 @@ class Autorizacion(TimeStampedModel):
         on_delete=models.CASCADE,
         related_name='autorizacion'
     )
+    # Día de emisión del documento (columna de partición, ver emisor/particiones.py)
+    dia_emision = DiaRelacionadoField(relacion='documento')
     numero_autorizacion = models.CharField(max_length=20, blank=True, null=True, unique=True)
     estado = models.CharField(max_length=20, choices=ESTADOS, default=ESTADO_PENDIENTE)
     fecha_autorizacion = models.DateTimeField(null=True, blank=True)
     correlativo = models.PositiveIntegerField(null=True, blank=True)
     
+    # Worker del pool que tiene reclamada la autorización para procesarla
+    worker = models.ForeignKey(
+        'WorkerAutorizacion',
+        on_delete=models.SET_NULL,
+        related_name='autorizaciones',
+        null=True,
+        blank=True
+    )
+    
     # Campo para registro de errores
     errores = models.ManyToManyField(
         ErrorValidacion, 
@@ -70,9 +224,20 @@ class Autorizacion(TimeStampedModel):
         verbose_name = "Autorización"
         verbose_name_plural = "Autorizaciones"
         ordering = ['-fecha_autorizacion']
-        # Índice para búsquedas rápidas por fecha
         indexes = [
-            models.Index(fields=['fecha_autorizacion']),
+            # Búsquedas por fecha y recorrido ordenado de las aprobaciones del informe
+            models.Index(
+                fields=['fecha_autorizacion', 'estado', 'correlativo'],
+                name='autorizacion_fecha_estado_idx'
+            ),
+            # Listado de la API paginado por cursor sobre fecha e id
+            models.Index(fields=['-fecha_autorizacion', '-id'], name='autorizacion_fecha_id_idx'),
+            # Solo las pendientes: los workers las reclaman sin recorrer las ya resueltas
+            models.Index(
+                fields=['id'],
+                condition=models.Q(estado='PENDIENTE'),
+                name='autorizacion_pendiente_idx'
+            ),
         ]
     
     def __str__(self):
@@ -80,59 +245,110 @@ class Autorizacion(TimeStampedModel):
             return f"Autorización {self.numero_autorizacion} - {self.get_estado_display()}"
         return f"Autorización de {self.documento} - {self.get_estado_display()}"
     
+    # Campos que modifican aprobar_lote y rechazar_lote
+    CAMPOS_RESOLUCION = ['estado', 'fecha_autorizacion', 'correlativo', 'numero_autorizacion', 'modified']
+    TAMANO_LOTE_ACTUALIZACION = 1000
+    
     def aprobar(self):
         """
         Aprueba la autorización, generando el número de autorización
         """
-        if self.estado != self.ESTADO_PENDIENTE:
-            raise ValueError("Solo se pueden aprobar autorizaciones pendientes")
-            
-        # Obtener fecha actual para el número de autorización
+        return self.aprobar_lote([self])[0]
+    
+    def rechazar(self):
+        """
+        Rechaza la autorización
+        """
+        self.rechazar_lote([self])
+    
+    @classmethod
+    def _resolver_lote(cls, autorizaciones, estado_documento, accion):
+        """
+        Verifica que las autorizaciones estén pendientes y actualiza el
+        estado de sus documentos con un único UPDATE
+        """
+        from emisor.models import DocumentoTributario
+        
+        for autorizacion in autorizaciones:
+            if autorizacion.estado != cls.ESTADO_PENDIENTE:
+                raise ValueError(f"Solo se pueden {accion} autorizaciones pendientes")
+        
         now = timezone.now()
-        self.fecha_autorizacion = now
         
-        # Generar correlativo diario
-        fecha_str = now.strftime("%Y%m%d")
+        DocumentoTributario.objects.filter(
+            pk__in=[autorizacion.documento_id for autorizacion in autorizaciones]
+        ).update(estado=estado_documento, modified=now)
+        
+        # Mantener coherentes los documentos ya cargados en memoria
+        for autorizacion in autorizaciones:
+            if cls.documento.is_cached(autorizacion):
+                autorizacion.documento.estado = estado_documento
+                autorizacion.documento.modified = now
+        
+        return now
+    
+    @classmethod
+    @transaction.atomic
+    def aprobar_lote(cls, autorizaciones):
+        """
+        Aprueba un conjunto de autorizaciones pendientes reservando un rango
+        contiguo de correlativos en una sola operación
+        
+        Parámetros:
+        - autorizaciones: Lista de instancias de Autorización pendientes
+        
+        Retorna:
+        - Lista con los números de autorización generados, en el mismo orden
+        """
+        autorizaciones = list(autorizaciones)
+        if not autorizaciones:
+            return []
         
-        # Buscar el último correlativo para este día
-        ultimo = Autorizacion.objects.filter(
-            fecha_autorizacion__year=now.year,
-            fecha_autorizacion__month=now.month,
-            fecha_autorizacion__day=now.day,
-            estado=self.ESTADO_APROBADO
-        ).order_by('-correlativo').first()
+        now = cls._resolver_lote(autorizaciones, 'AUTORIZADO', 'aprobar')
         
-        self.correlativo = 1
-        if ultimo and ultimo.correlativo:
-            self.correlativo = ultimo.correlativo + 1
-            
-        # Generar número de autorización
-        self.numero_autorizacion = f"{fecha_str}{self.correlativo:08d}"
-        self.estado = self.ESTADO_APROBADO
+        # Generar correlativos diarios desde la secuencia del día (en una
+        # transacción propia si está configurada AUTORIZACION_SECUENCIA_DB)
+        fecha = timezone.localdate(now)
+        primero = SecuenciaDiaria.reservar(fecha, len(autorizaciones))
         
-        # Actualizar estado del documento
-        self.documento.estado = 'AUTORIZADO'
-        self.documento.save(update_fields=['estado'])
+        for correlativo, autorizacion in enumerate(autorizaciones, start=primero):
+            autorizacion.fecha_autorizacion = now
+            autorizacion.correlativo = correlativo
+            autorizacion.numero_autorizacion = formatear_numero_autorizacion(fecha, correlativo)
+            autorizacion.estado = cls.ESTADO_APROBADO
+            autorizacion.modified = now
         
-        self.save()
+        cls.objects.bulk_update(
+            autorizaciones, cls.CAMPOS_RESOLUCION,
+            batch_size=cls.TAMANO_LOTE_ACTUALIZACION
+        )
         
-        return self.numero_autorizacion
+        return [autorizacion.numero_autorizacion for autorizacion in autorizaciones]
     
-    def rechazar(self):
+    @classmethod
+    @transaction.atomic
+    def rechazar_lote(cls, autorizaciones):
         """
-        Rechaza la autorización
+        Rechaza un conjunto de autorizaciones pendientes
+        
+        Parámetros:
+        - autorizaciones: Lista de instancias de Autorización pendientes
         """
-        if self.estado != self.ESTADO_PENDIENTE:
-            raise ValueError("Solo se pueden rechazar autorizaciones pendientes")
-            
-        self.estado = self.ESTADO_RECHAZADO
-        self.fecha_autorizacion = timezone.now()
+        autorizaciones = list(autorizaciones)
+        if not autorizaciones:
+            return
         
-        # Actualizar estado del documento
-        self.documento.estado = 'RECHAZADO'
-        self.documento.save(update_fields=['estado'])
+        now = cls._resolver_lote(autorizaciones, 'RECHAZADO', 'rechazar')
         
-        self.save()
+        for autorizacion in autorizaciones:
+            autorizacion.estado = cls.ESTADO_RECHAZADO
+            autorizacion.fecha_autorizacion = now
+            autorizacion.modified = now
+        
+        cls.objects.bulk_update(
+            autorizaciones, ['estado', 'fecha_autorizacion', 'modified'],
+            batch_size=cls.TAMANO_LOTE_ACTUALIZACION
+        )
 
 
 class AutorizacionError(TimeStampedModel):
@@ -140,6 +356,8 @@ class AutorizacionError(TimeStampedModel):
     Relación entre Autorización y ErrorValidacion con detalles
     """
     autorizacion = models.ForeignKey(Autorizacion, on_delete=models.CASCADE)
+    # Día de emisión del documento autorizado (columna de partición)
+    dia_emision = DiaRelacionadoField(relacion='autorizacion')
     error = models.ForeignKey(ErrorValidacion, on_delete=models.CASCADE)
     detalle = models.TextField(blank=True)
     
@@ -165,6 +383,7 @@ class EstadisticaDiaria(models.Model):
     facturas_correctas = models.PositiveIntegerField(default=0)
     cantidad_emisores = models.PositiveIntegerField(default=0)
     cantidad_receptores = models.PositiveIntegerField(default=0)
+    modified = models.DateTimeField(auto_now=True)
     
     class Meta:
         verbose_name = "Estadística Diaria"
@@ -183,4 +402,204 @@ class EstadisticaDiaria(models.Model):
                 self.errores_nit_receptor + 
                 self.errores_iva + 
                 self.errores_total + 
-                self.errores_referencia_duplicada)
\ No newline at end of file
+                self.errores_referencia_duplicada)
+
+
+class FragmentoInforme(models.Model):
+    """
+    Fragmento XML ya generado de un día del informe LISTAAUTORIZACIONES.
+    
+    La versión resume la estadística y las aprobaciones del día; mientras
+    no cambie, el fragmento se reutiliza sin volver a consultarlas.
+    """
+    fecha = models.DateField(primary_key=True)
+    version = models.CharField(max_length=64)
+    contenido = models.BinaryField()
+    generado = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Fragmento de Informe"
+        verbose_name_plural = "Fragmentos de Informe"
+        ordering = ['fecha']
+        
+    def __str__(self):
+        return f"Fragmento del informe del {self.fecha}"
+
+
+class TrabajoIngesta(TimeStampedModel):
+    """
+    Registro de una carga masiva de solicitudes de autorización desde XML
+    """
+    ESTADO_PENDIENTE = 'PENDIENTE'
+    ESTADO_PROCESANDO = 'PROCESANDO'
+    ESTADO_COMPLETADO = 'COMPLETADO'
+    ESTADO_FALLIDO = 'FALLIDO'
+    
+    ESTADOS = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_FALLIDO, 'Fallido'),
+    ]
+    
+    archivo = models.CharField(max_length=500)
+    nombre_original = models.CharField(max_length=255, blank=True)
+    usuario = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name='trabajos_ingesta',
+        null=True,
+        blank=True
+    )
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=ESTADO_PENDIENTE)
+    
+    # Progreso de la carga
+    registros_leidos = models.PositiveIntegerField(default=0)
+    documentos_creados = models.PositiveIntegerField(default=0)
+    documentos_aprobados = models.PositiveIntegerField(default=0)
+    documentos_rechazados = models.PositiveIntegerField(default=0)
+    registros_con_error = models.PositiveIntegerField(default=0)
+    
+    mensaje = models.TextField(blank=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Trabajo de Ingesta"
+        verbose_name_plural = "Trabajos de Ingesta"
+        ordering = ['-created']
+        
+    def __str__(self):
+        return f"Ingesta {self.nombre_original or self.archivo} - {self.get_estado_display()}"
+
+
+class ErrorIngesta(models.Model):
+    """
+    Error de un registro individual dentro de un trabajo de ingesta
+    """
+    trabajo = models.ForeignKey(
+        TrabajoIngesta,
+        on_delete=models.CASCADE,
+        related_name='errores'
+    )
+    registro = models.PositiveIntegerField()
+    referencia = models.CharField(max_length=40, blank=True)
+    detalle = models.TextField()
+    
+    class Meta:
+        verbose_name = "Error de Ingesta"
+        verbose_name_plural = "Errores de Ingesta"
+        ordering = ['registro']
+        
+    def __str__(self):
+        return f"Registro {self.registro}: {self.detalle}"
+
+
+class ParticipanteDiario(models.Model):
+    """
+    Registro de los emisores y receptores vistos cada día, usado para
+    mantener de forma incremental las cantidades de EstadisticaDiaria
+    """
+    ROL_EMISOR = 'EMISOR'
+    ROL_RECEPTOR = 'RECEPTOR'
+    
+    ROLES = [
+        (ROL_EMISOR, 'Emisor'),
+        (ROL_RECEPTOR, 'Receptor'),
+    ]
+    
+    fecha = models.DateField()
+    rol = models.CharField(max_length=10, choices=ROLES)
+    contribuyente = models.ForeignKey(
+        'emisor.Contribuyente',
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    
+    class Meta:
+        verbose_name = "Participante Diario"
+        verbose_name_plural = "Participantes Diarios"
+        unique_together = [['fecha', 'rol', 'contribuyente']]
+        
+    def __str__(self):
+        return f"{self.get_rol_display()} {self.contribuyente_id} el {self.fecha}"
+    
+    @classmethod
+    def registrar(cls, participantes):
+        """
+        Registra los participantes que aún no se habían visto en su fecha
+        
+        Parámetros:
+        - participantes: Conjunto de tuplas (fecha, rol, contribuyente_id)
+        
+        Retorna:
+        - Counter con la cantidad de participantes nuevos por (fecha, rol)
+        """
+        from collections import Counter
+        
+        nuevos = Counter()
+        participantes = set(participantes)
+        if not participantes:
+            return nuevos
+        
+        existentes = set(cls.objects.filter(
+            fecha__in={fecha for fecha, _, _ in participantes},
+            contribuyente_id__in={contribuyente_id for _, _, contribuyente_id in participantes}
+        ).values_list('fecha', 'rol', 'contribuyente_id'))
+        
+        for fecha, rol, contribuyente_id in participantes - existentes:
+            # Si otro proceso lo registró al mismo tiempo, la restricción única
+            # evita contarlo dos veces
+            try:
+                with transaction.atomic():
+                    cls.objects.create(fecha=fecha, rol=rol, contribuyente_id=contribuyente_id)
+            except IntegrityError:
+                continue
+            nuevos[(fecha, rol)] += 1
+        
+        return nuevos
+
+
+class TareaAutorizacion(TimeStampedModel):
+    """
+    Cola de autorizaciones pendientes de procesar en segundo plano
+    """
+    ESTADO_PENDIENTE = 'PENDIENTE'
+    ESTADO_PROCESANDO = 'PROCESANDO'
+    ESTADO_COMPLETADA = 'COMPLETADA'
+    ESTADO_FALLIDA = 'FALLIDA'
+    
+    ESTADOS = [
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_COMPLETADA, 'Completada'),
+        (ESTADO_FALLIDA, 'Fallida'),
+    ]
+    
+    documento = models.ForeignKey(
+        'emisor.DocumentoTributario',
+        on_delete=models.CASCADE,
+        related_name='tareas_autorizacion'
+    )
+    # Día de emisión del documento, para la llave foránea hacia la tabla particionada
+    dia_emision = DiaRelacionadoField(relacion='documento')
+    estado = models.CharField(max_length=20, choices=ESTADOS, default=ESTADO_PENDIENTE)
+    intentos = models.PositiveIntegerField(default=0)
+    max_intentos = models.PositiveIntegerField(default=5)
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True)
+    ultimo_error = models.TextField(blank=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = "Tarea de Autorización"
+        verbose_name_plural = "Tareas de Autorización"
+        ordering = ['disponible_desde', 'id']
+        # Índice para que los workers tomen tareas disponibles sin recorrer la tabla
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde']),
+        ]
+        
+    def __str__(self):
+        return f"Tarea de autorización de {self.documento_id} - {self.get_estado_display()}"
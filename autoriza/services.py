@@ -1,9 +1,19 @@
 # autoriza/services.py
+import datetime
+import hashlib
+from collections import Counter, defaultdict
+
 from django.db import transaction
+from django.db.models import Count, F, Max, Prefetch, Q, QuerySet, Sum, prefetch_related_objects
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 
-from emisor.models import DocumentoTributario
-from .models import Autorizacion, ErrorValidacion, AutorizacionError, EstadisticaDiaria
+from emisor.models import Contribuyente, DocumentoTributario
+from .models import (
+    Autorizacion, ErrorValidacion, AutorizacionError,
+    EstadisticaDiaria, ParticipanteDiario, FragmentoInforme, errores_validacion
+)
+from .archivo import limite_archivo
 
 
 @transaction.atomic
@@ -34,6 +44,34 @@ def crear_solicitud_autorizacion(documento):
     return autorizacion
 
 
+@transaction.atomic
+def crear_solicitudes_autorizacion(documentos):
+    """
+    Crea y valida en bloque las solicitudes de autorización de varios documentos
+    
+    Parámetros:
+    - documentos: Lista de instancias de DocumentoTributario en estado EMITIDO
+    
+    Retorna:
+    - Lista de instancias de Autorización creadas, en el mismo orden
+    """
+    documentos = list(documentos)
+    
+    # Verificar que los documentos estén en estado emitido
+    for documento in documentos:
+        if documento.estado != DocumentoTributario.ESTADO_EMITIDO:
+            raise ValueError("Solo se pueden autorizar documentos en estado EMITIDO")
+    
+    autorizaciones = Autorizacion.objects.bulk_create([
+        Autorizacion(documento=documento, estado=Autorizacion.ESTADO_PENDIENTE)
+        for documento in documentos
+    ])
+    
+    validar_lote(autorizaciones)
+    
+    return autorizaciones
+
+
 def validar_documento(autorizacion):
     """
     Valida un documento tributario para su autorización
@@ -44,236 +82,627 @@ def validar_documento(autorizacion):
     Retorna:
     - True si el documento es válido, False en caso contrario
     """
-    documento = autorizacion.documento
-    errores = []
-    
-    # 1. Validar NIT del emisor
-    try:
-        from core.validators import validate_nit
-        validate_nit(documento.emisor.nit)
-    except Exception as e:
-        error = ErrorValidacion.objects.get(codigo=ErrorValidacion.TIPO_NIT_EMISOR)
-        AutorizacionError.objects.create(
-            autorizacion=autorizacion,
-            error=error,
-            detalle=str(e)
-        )
-        errores.append(error.codigo)
-    
-    # 2. Validar NIT del receptor
-    try:
-        validate_nit(documento.receptor.nit)
-    except Exception as e:
-        error = ErrorValidacion.objects.get(codigo=ErrorValidacion.TIPO_NIT_RECEPTOR)
-        AutorizacionError.objects.create(
-            autorizacion=autorizacion,
-            error=error,
-            detalle=str(e)
-        )
-        errores.append(error.codigo)
-    
-    # 3. Validar cálculo de IVA
-    iva_calculado = documento.calcular_iva()
-    if documento.iva != iva_calculado:
-        error = ErrorValidacion.objects.get(codigo=ErrorValidacion.TIPO_IVA)
-        AutorizacionError.objects.create(
-            autorizacion=autorizacion,
-            error=error,
-            detalle=f"El IVA reportado ({documento.iva}) no coincide con el calculado ({iva_calculado})"
-        )
-        errores.append(error.codigo)
-    
-    # 4. Validar cálculo de total
-    total_calculado = documento.calcular_total()
-    if documento.total != total_calculado:
-        error = ErrorValidacion.objects.get(codigo=ErrorValidacion.TIPO_TOTAL)
-        AutorizacionError.objects.create(
-            autorizacion=autorizacion,
-            error=error,
-            detalle=f"El total reportado ({documento.total}) no coincide con el calculado ({total_calculado})"
-        )
-        errores.append(error.codigo)
-    
-    # 5. Validar referencia única para el día
-    fecha = documento.fecha_emision.date()
-    duplicado = DocumentoTributario.objects.filter(
-        emisor=documento.emisor,
-        referencia_interna=documento.referencia_interna,
-        fecha_emision__date=fecha
-    ).exclude(id=documento.id).exists()
-    
-    if duplicado:
-        error = ErrorValidacion.objects.get(codigo=ErrorValidacion.TIPO_REFERENCIA_DUPLICADA)
-        AutorizacionError.objects.create(
-            autorizacion=autorizacion,
-            error=error,
-            detalle=f"Ya existe un documento con la referencia {documento.referencia_interna} emitido el {fecha}"
-        )
-        errores.append(error.codigo)
-    
-    # Si no hay errores, aprobar la autorización
-    if not errores:
-        autorizacion.aprobar()
-        # Actualizar estadísticas
-        actualizar_estadisticas(autorizacion, True)
-        return True
+    return validar_lote([autorizacion])[0]
+
+
+def _cargar_contribuyentes(documentos):
+    """
+    Carga con una sola consulta los emisores y receptores que aún no estén
+    en memoria en los documentos recibidos
+    """
+    faltantes = []
+    for documento in documentos:
+        for campo in ['emisor', 'receptor']:
+            if not DocumentoTributario._meta.get_field(campo).is_cached(documento):
+                faltantes.append((documento, campo))
+    
+    if not faltantes:
+        return
+    
+    contribuyentes = Contribuyente.objects.in_bulk({
+        getattr(documento, f'{campo}_id') for documento, campo in faltantes
+    })
+    for documento, campo in faltantes:
+        setattr(documento, campo, contribuyentes[getattr(documento, f'{campo}_id')])
+
+
+def validar_lote(autorizaciones):
+    """
+    Valida en una sola pasada un conjunto de autorizaciones pendientes
+    
+    Las reglas son las mismas de validar_documento, pero los documentos,
+    emisores y receptores se cargan con joins, la validez de los NIT se lee
+    del resultado guardado en cada Contribuyente y todos los errores se
+    insertan con un único bulk_create. La regla de referencia duplicada la
+    aplica la restricción única al guardar el documento: esas solicitudes
+    no llegan a validarse y se cuentan con registrar_referencias_duplicadas.
+    
+    Parámetros:
+    - autorizaciones: QuerySet o lista de instancias de Autorización
+    
+    Retorna:
+    - Lista de booleanos (True si fue aprobada) en el mismo orden recibido
+    """
+    if isinstance(autorizaciones, QuerySet):
+        autorizaciones = list(autorizaciones.select_related('documento__emisor', 'documento__receptor'))
     else:
-        # Rechazar la autorización
-        autorizacion.rechazar()
-        # Actualizar estadísticas
-        actualizar_estadisticas(autorizacion, False)
-        return False
+        autorizaciones = list(autorizaciones)
+        # Los documentos que no estén en memoria se cargan con un join a emisor y receptor
+        prefetch_related_objects(autorizaciones, Prefetch(
+            'documento',
+            queryset=DocumentoTributario.objects.select_related('emisor', 'receptor')
+        ))
+        _cargar_contribuyentes([autorizacion.documento for autorizacion in autorizaciones])
+    
+    if not autorizaciones:
+        return []
+    
+    catalogo = errores_validacion.obtener()
+    documentos = [autorizacion.documento for autorizacion in autorizaciones]
+    
+    errores_lote = []
+    codigos_por_autorizacion = []
+    
+    for autorizacion, documento in zip(autorizaciones, documentos):
+        errores = []
+        
+        # 1. Validar NIT del emisor (resultado guardado en el contribuyente)
+        detalle = documento.emisor.error_nit()
+        if detalle is not None:
+            errores.append((ErrorValidacion.TIPO_NIT_EMISOR, detalle))
+        
+        # 2. Validar NIT del receptor
+        detalle = documento.receptor.error_nit()
+        if detalle is not None:
+            errores.append((ErrorValidacion.TIPO_NIT_RECEPTOR, detalle))
+        
+        # 3. Validar cálculo de IVA
+        iva_calculado = documento.calcular_iva()
+        if documento.iva != iva_calculado:
+            errores.append((
+                ErrorValidacion.TIPO_IVA,
+                f"El IVA reportado ({documento.iva}) no coincide con el calculado ({iva_calculado})"
+            ))
+        
+        # 4. Validar cálculo de total
+        total_calculado = documento.calcular_total()
+        if documento.total != total_calculado:
+            errores.append((
+                ErrorValidacion.TIPO_TOTAL,
+                f"El total reportado ({documento.total}) no coincide con el calculado ({total_calculado})"
+            ))
+        
+        for codigo, detalle in errores:
+            errores_lote.append(AutorizacionError(
+                autorizacion=autorizacion,
+                error=catalogo[codigo],
+                detalle=detalle
+            ))
+        codigos_por_autorizacion.append([codigo for codigo, _ in errores])
+    
+    AutorizacionError.objects.bulk_create(errores_lote)
+    
+    # Aprobar y rechazar en bloque
+    resultados = [not codigos for codigos in codigos_por_autorizacion]
+    Autorizacion.aprobar_lote([
+        autorizacion for autorizacion, aprobada in zip(autorizaciones, resultados) if aprobada
+    ])
+    Autorizacion.rechazar_lote([
+        autorizacion for autorizacion, aprobada in zip(autorizaciones, resultados) if not aprobada
+    ])
+    
+    # Actualizar estadísticas
+    actualizar_estadisticas_lote(zip(autorizaciones, resultados, codigos_por_autorizacion))
+    
+    return resultados
+
+
+# Campo de EstadisticaDiaria que acumula cada tipo de error
+CAMPOS_ERROR_ESTADISTICA = {
+    ErrorValidacion.TIPO_NIT_EMISOR: 'errores_nit_emisor',
+    ErrorValidacion.TIPO_NIT_RECEPTOR: 'errores_nit_receptor',
+    ErrorValidacion.TIPO_IVA: 'errores_iva',
+    ErrorValidacion.TIPO_TOTAL: 'errores_total',
+    ErrorValidacion.TIPO_REFERENCIA_DUPLICADA: 'errores_referencia_duplicada',
+}
 
 
-def actualizar_estadisticas(autorizacion, aprobado):
+def actualizar_estadisticas(autorizacion, aprobado, codigos_error=None):
     """
     Actualiza las estadísticas diarias de autorización
     
     Parámetros:
     - autorizacion: Instancia de Autorización
     - aprobado: Boolean indicando si la autorización fue aprobada
+    - codigos_error: Códigos de los errores encontrados (opcional, si no se
+      indican se consultan desde la base de datos)
+    """
+    if codigos_error is None and not aprobado:
+        codigos_error = autorizacion.autorizacionerror_set.values_list('error__codigo', flat=True)
+    
+    actualizar_estadisticas_lote([(autorizacion, aprobado, codigos_error or [])])
+
+
+def _incrementar_estadistica(fecha, contadores):
+    """
+    Suma los contadores a la estadística de la fecha con un UPDATE atómico
     """
-    fecha = autorizacion.documento.fecha_emision.date()
+    cambios = {campo: F(campo) + valor for campo, valor in contadores.items() if valor}
+    if not cambios:
+        return
+    cambios['modified'] = timezone.now()
+    
+    if not EstadisticaDiaria.objects.filter(fecha=fecha).update(**cambios):
+        EstadisticaDiaria.objects.get_or_create(fecha=fecha)
+        EstadisticaDiaria.objects.filter(fecha=fecha).update(**cambios)
+
+
+def actualizar_estadisticas_lote(resultados):
+    """
+    Actualiza las estadísticas diarias para un conjunto de autorizaciones
+    
+    Los contadores se incrementan con F() en un UPDATE por fecha, y las
+    cantidades de emisores y receptores únicos solo crecen cuando un
+    contribuyente aparece por primera vez en el día (ParticipanteDiario),
+    por lo que el costo no depende del volumen acumulado del día.
     
-    # Buscar o crear estadística para la fecha
-    estadistica, created = EstadisticaDiaria.objects.get_or_create(
-        fecha=fecha
+    Los cambios se aplican en la transacción del lote: se confirman o se
+    revierten junto con las autorizaciones. Las fechas se actualizan en
+    orden para que dos lotes concurrentes no se bloqueen mutuamente.
+    
+    Parámetros:
+    - resultados: Iterable de tuplas (autorizacion, aprobado, codigos_error)
+    """
+    _actualizar_estadisticas_documentos(
+        (autorizacion.documento, aprobado, codigos_error)
+        for autorizacion, aprobado, codigos_error in resultados
+    )
+
+
+def registrar_referencias_duplicadas(documentos):
+    """
+    Cuenta en las estadísticas diarias las solicitudes de autorización que
+    la restricción documento_referencia_dia_unica rechazó al guardarlas
+
+    No tienen documento ni autorización guardados: se suman a facturas
+    recibidas y a errores de referencia duplicada del día de emisión.
+
+    Parámetros:
+    - documentos: Documentos (sin guardar) rechazados por repetir la referencia
+    """
+    _actualizar_estadisticas_documentos(
+        (documento, False, [ErrorValidacion.TIPO_REFERENCIA_DUPLICADA])
+        for documento in documentos
     )
+
+
+def _actualizar_estadisticas_documentos(resultados):
+    """
+    Acumula por fecha los contadores y los participantes de los documentos
+    y los aplica en la transacción en curso (ver actualizar_estadisticas_lote)
     
-    # Incrementar contador de facturas recibidas
-    estadistica.facturas_recibidas += 1
+    Parámetros:
+    - resultados: Iterable de tuplas (documento, aprobado, codigos_error)
+    """
+    incrementos = defaultdict(Counter)
+    participantes = set()
     
-    # Si fue aprobada, incrementar contador de facturas correctas
-    if aprobado:
-        estadistica.facturas_correctas += 1
-    else:
-        # Incrementar contadores de errores
-        errores = autorizacion.autorizacionerror_set.all()
-        for error in errores:
-            codigo = error.error.codigo
-            if codigo == ErrorValidacion.TIPO_NIT_EMISOR:
-                estadistica.errores_nit_emisor += 1
-            elif codigo == ErrorValidacion.TIPO_NIT_RECEPTOR:
-                estadistica.errores_nit_receptor += 1
-            elif codigo == ErrorValidacion.TIPO_IVA:
-                estadistica.errores_iva += 1
-            elif codigo == ErrorValidacion.TIPO_TOTAL:
-                estadistica.errores_total += 1
-            elif codigo == ErrorValidacion.TIPO_REFERENCIA_DUPLICADA:
-                estadistica.errores_referencia_duplicada += 1
-    
-    # Actualizar contadores de emisores y receptores únicos
-    documento = autorizacion.documento
-    
-    # Contar emisores únicos para esta fecha
-    emisores_unicos = DocumentoTributario.objects.filter(
-        fecha_emision__date=fecha
-    ).values('emisor').distinct().count()
-    
-    # Contar receptores únicos para esta fecha
-    receptores_unicos = DocumentoTributario.objects.filter(
-        fecha_emision__date=fecha
-    ).values('receptor').distinct().count()
-    
-    estadistica.cantidad_emisores = emisores_unicos
-    estadistica.cantidad_receptores = receptores_unicos
+    for documento, aprobado, codigos_error in resultados:
+        fecha = timezone.localdate(documento.fecha_emision)
+        contadores = incrementos[fecha]
+        
+        # Incrementar contador de facturas recibidas
+        contadores['facturas_recibidas'] += 1
+        
+        # Si fue aprobada, incrementar contador de facturas correctas
+        if aprobado:
+            contadores['facturas_correctas'] += 1
+        else:
+            # Incrementar contadores de errores
+            for codigo in codigos_error:
+                campo = CAMPOS_ERROR_ESTADISTICA.get(codigo)
+                if campo:
+                    contadores[campo] += 1
+        
+        participantes.add((fecha, ParticipanteDiario.ROL_EMISOR, documento.emisor_id))
+        if documento.receptor_id is not None:
+            participantes.add((fecha, ParticipanteDiario.ROL_RECEPTOR, documento.receptor_id))
+    
+    if not incrementos:
+        return
+    
+    with transaction.atomic():
+        # Actualizar contadores de emisores y receptores únicos
+        nuevos = ParticipanteDiario.registrar(participantes)
+        
+        for fecha, contadores in sorted(incrementos.items()):
+            contadores['cantidad_emisores'] += nuevos[(fecha, ParticipanteDiario.ROL_EMISOR)]
+            contadores['cantidad_receptores'] += nuevos[(fecha, ParticipanteDiario.ROL_RECEPTOR)]
+            _incrementar_estadistica(fecha, contadores)
+
+
+@transaction.atomic
+def recalcular_estadisticas(fecha):
+    """
+    Reconstruye desde los documentos la estadística y los participantes de
+    una fecha. Útil para corregir datos históricos o previos a los
+    contadores incrementales.
+    
+    Las solicitudes rechazadas por referencia duplicada (sin documento
+    guardado) se mantienen del contador anterior; sus participantes no se
+    pueden reconstruir.
+    
+    Parámetros:
+    - fecha: Fecha (date) a recalcular
+    
+    Retorna:
+    - Instancia de EstadisticaDiaria recalculada
+    """
+    autorizaciones = Autorizacion.objects.filter(
+        documento__dia_emision=fecha
+    ).exclude(estado=Autorizacion.ESTADO_PENDIENTE)
+    
+    estados = dict(autorizaciones.values('estado').annotate(
+        cantidad=Count('id')
+    ).values_list('estado', 'cantidad').order_by())
+    
+    errores = dict(AutorizacionError.objects.filter(
+        dia_emision=fecha,
+        autorizacion__in=autorizaciones.filter(estado=Autorizacion.ESTADO_RECHAZADO)
+    ).values('error__codigo').annotate(
+        cantidad=Count('id')
+    ).values_list('error__codigo', 'cantidad').order_by())
+    
+    documentos = DocumentoTributario.objects.filter(
+        autorizacion__in=autorizaciones
+    )
+    
+    ParticipanteDiario.objects.filter(fecha=fecha).delete()
+    ParticipanteDiario.objects.bulk_create([
+        ParticipanteDiario(fecha=fecha, rol=ParticipanteDiario.ROL_EMISOR, contribuyente_id=emisor_id)
+        for emisor_id in documentos.values_list('emisor_id', flat=True).distinct().order_by()
+    ] + [
+        ParticipanteDiario(fecha=fecha, rol=ParticipanteDiario.ROL_RECEPTOR, contribuyente_id=receptor_id)
+        for receptor_id in documentos.values_list('receptor_id', flat=True).distinct().order_by()
+    ])
+    
+    estadistica, created = EstadisticaDiaria.objects.select_for_update().get_or_create(fecha=fecha)
     
+    # Las solicitudes rechazadas por la restricción de referencia única no
+    # dejan documento ni autorización: se conservan del contador actual
+    duplicadas = errores.get(ErrorValidacion.TIPO_REFERENCIA_DUPLICADA, 0)
+    rechazadas = max(estadistica.errores_referencia_duplicada - duplicadas, 0)
+    
+    estadistica.facturas_recibidas = sum(estados.values()) + rechazadas
+    estadistica.facturas_correctas = estados.get(Autorizacion.ESTADO_APROBADO, 0)
+    for codigo, campo in CAMPOS_ERROR_ESTADISTICA.items():
+        setattr(estadistica, campo, errores.get(codigo, 0))
+    estadistica.errores_referencia_duplicada = duplicadas + rechazadas
+    estadistica.cantidad_emisores = ParticipanteDiario.objects.filter(
+        fecha=fecha, rol=ParticipanteDiario.ROL_EMISOR
+    ).count()
+    estadistica.cantidad_receptores = ParticipanteDiario.objects.filter(
+        fecha=fecha, rol=ParticipanteDiario.ROL_RECEPTOR
+    ).count()
     estadistica.save()
+    
+    return estadistica
+
 
+# Aprobaciones que se leen de la base de datos por bloque al generar el informe
+TAMANO_BLOQUE_INFORME = 2000
 
-def generar_informe_xml():
+
+class _BufferInforme:
+    """
+    Destino en memoria para lxml.etree.xmlfile que se vacía en cada bloque
     """
-    Genera un archivo XML con las estadísticas y autorizaciones
+    
+    def __init__(self):
+        self.partes = []
+    
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+    
+    def vaciar(self):
+        datos = b''.join(self.partes)
+        self.partes = []
+        return datos
+
+
+def _escribir_elemento(xf, elemento, nivel):
+    """
+    Escribe un elemento ya indentado al nivel indicado
+    """
+    from lxml import etree
+    
+    etree.indent(elemento, space='  ', level=nivel)
+    xf.write('\n' + '  ' * nivel, elemento)
+
+
+def _elemento_estadistica(estadistica):
+    """
+    Construye los elementos de resumen de un día (todo excepto el listado)
+    """
+    from lxml import etree
+    
+    elementos = []
+    
+    fecha_elem = etree.Element("FECHA")
+    fecha_elem.text = estadistica.fecha.strftime("%d/%m/%Y")
+    elementos.append(fecha_elem)
+    
+    facturas_elem = etree.Element("FACTURAS_RECIBIDAS")
+    facturas_elem.text = str(estadistica.facturas_recibidas)
+    elementos.append(facturas_elem)
+    
+    errores_elem = etree.Element("ERRORES")
+    for etiqueta, valor in [
+        ("NIT_EMISOR", estadistica.errores_nit_emisor),
+        ("NIT_RECEPTOR", estadistica.errores_nit_receptor),
+        ("IVA", estadistica.errores_iva),
+        ("TOTAL", estadistica.errores_total),
+        ("REFERENCIA_DUPLICADA", estadistica.errores_referencia_duplicada),
+    ]:
+        etree.SubElement(errores_elem, etiqueta).text = str(valor)
+    elementos.append(errores_elem)
+    
+    for etiqueta, valor in [
+        ("FACTURAS_CORRECTAS", estadistica.facturas_correctas),
+        ("CANTIDAD_EMISORES", estadistica.cantidad_emisores),
+        ("CANTIDAD_RECEPTORES", estadistica.cantidad_receptores),
+    ]:
+        elemento = etree.Element(etiqueta)
+        elemento.text = str(valor)
+        elementos.append(elemento)
+    
+    return elementos
+
+
+def _elemento_aprobacion(referencia, nit_emisor, numero_autorizacion):
+    from lxml import etree
+    
+    aprobacion_elem = etree.Element("APROBACION")
+    
+    nit_emisor_elem = etree.SubElement(aprobacion_elem, "NIT_EMISOR")
+    nit_emisor_elem.set("ref", referencia)
+    nit_emisor_elem.text = nit_emisor
+    
+    codigo_elem = etree.SubElement(aprobacion_elem, "CODIGO_APROBACION")
+    codigo_elem.text = numero_autorizacion
+    
+    return aprobacion_elem
+
+
+def _limites_dia(fecha):
+    """
+    Retorna el rango [desde, hasta) de fechas con zona horaria de un día local
+    """
+    zona = timezone.get_current_timezone()
+    desde = timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min), zona)
+    return desde, desde + datetime.timedelta(days=1)
+
+
+def _rangos_contiguos(fechas):
+    """
+    Agrupa una lista ordenada de fechas en rangos (inicio, fin) de días consecutivos
+    """
+    rangos = []
+    for fecha in fechas:
+        if rangos and rangos[-1][1] + datetime.timedelta(days=1) == fecha:
+            rangos[-1][1] = fecha
+        else:
+            rangos.append([fecha, fecha])
+    return rangos
+
+
+def _filtro_dias(fechas, campo='fecha_autorizacion'):
+    """
+    Construye un filtro Q que cubre los días locales indicados
+    """
+    filtro = Q(pk__in=[])
+    for inicio, fin in _rangos_contiguos(fechas):
+        filtro |= Q(**{
+            f'{campo}__gte': _limites_dia(inicio)[0],
+            f'{campo}__lt': _limites_dia(fin)[1],
+        })
+    return filtro
+
+
+def _versiones_informe(estadisticas):
+    """
+    Calcula la versión de cada día del informe
+    
+    La versión combina los contadores de la estadística con la cantidad,
+    la suma de ids y la última modificación de las aprobaciones del día,
+    obtenidas con una sola consulta agrupada.
     
     Retorna:
-    - String con el contenido XML
+    - Diccionario {fecha: version}
+    """
+    if not estadisticas:
+        return {}
+    
+    resumen = {
+        fila['dia']: (fila['cantidad'], fila['suma_ids'], fila['ultima_modificacion'])
+        for fila in Autorizacion.objects.filter(
+            _filtro_dias([estadistica.fecha for estadistica in estadisticas]),
+            estado=Autorizacion.ESTADO_APROBADO
+        ).annotate(
+            dia=TruncDate('fecha_autorizacion')
+        ).values('dia').annotate(
+            cantidad=Count('id'),
+            suma_ids=Sum('id'),
+            ultima_modificacion=Max('modified')
+        ).order_by()
+    }
+    
+    versiones = {}
+    for estadistica in estadisticas:
+        firma = (
+            estadistica.facturas_recibidas,
+            estadistica.errores_nit_emisor,
+            estadistica.errores_nit_receptor,
+            estadistica.errores_iva,
+            estadistica.errores_total,
+            estadistica.errores_referencia_duplicada,
+            estadistica.facturas_correctas,
+            estadistica.cantidad_emisores,
+            estadistica.cantidad_receptores,
+            resumen.get(estadistica.fecha),
+        )
+        versiones[estadistica.fecha] = hashlib.sha256(repr(firma).encode()).hexdigest()
+    
+    return versiones
+
+
+def _escribir_dia(estadistica, filas, tamano_bloque):
+    """
+    Genera el fragmento AUTORIZACION de un día por bloques de bytes
+    
+    Parámetros:
+    - estadistica: Instancia de EstadisticaDiaria del día
+    - filas: Iterador de aprobaciones del día (referencia, nit_emisor, numero)
+    - tamano_bloque: Aprobaciones a escribir por bloque
     """
     from lxml import etree
-    from django.utils.dateparse import parse_date
     
-    # Crear elemento raíz
-    root = etree.Element("LISTAAUTORIZACIONES")
+    salida = _BufferInforme()
+    
+    # El fragmento se escribe ya indentado en el nivel que ocupa en el informe
+    salida.write(b'\n  ')
+    with etree.xmlfile(salida, encoding='UTF-8') as xf:
+        with xf.element("AUTORIZACION"):
+            for elemento in _elemento_estadistica(estadistica):
+                _escribir_elemento(xf, elemento, 2)
+            
+            xf.write('\n    ')
+            with xf.element("LISTADO_AUTORIZACIONES"):
+                total = 0
+                for fila in filas:
+                    _escribir_elemento(xf, _elemento_aprobacion(*fila), 3)
+                    total += 1
+                    if total % tamano_bloque == 0:
+                        yield salida.vaciar()
+                
+                total_elem = etree.Element("TOTAL_APROBACIONES")
+                total_elem.text = str(total)
+                _escribir_elemento(xf, total_elem, 3)
+                xf.write('\n    ')
+            xf.write('\n  ')
+    
+    yield salida.vaciar()
+
+
+def iterar_informe_xml(desde=None, hasta=None, regenerar=False, tamano_bloque=TAMANO_BLOQUE_INFORME):
+    """
+    Genera el informe XML de estadísticas y autorizaciones por bloques
+    
+    Cada día se arma como un fragmento que se guarda en FragmentoInforme
+    junto con su versión; los días cuya estadística y aprobaciones no
+    cambiaron se copian del fragmento guardado. Las aprobaciones de los días
+    a regenerar se leen con una sola consulta ordenada por fecha y por
+    bloques, y se agrupan por día a medida que se escriben.
+    
+    Parámetros:
+    - desde: Fecha inicial (date) del informe, inclusive (opcional)
+    - hasta: Fecha final (date) del informe, inclusive (opcional)
+    - regenerar: Ignorar los fragmentos guardados y generarlos de nuevo, salvo
+      los de días ya archivados
+    - tamano_bloque: Aprobaciones a leer y escribir por bloque
     
-    # Obtener todas las estadísticas ordenadas por fecha
+    Retorna:
+    - Generador de bloques de bytes con el contenido XML
+    """
     estadisticas = EstadisticaDiaria.objects.all().order_by('fecha')
+    if desde:
+        estadisticas = estadisticas.filter(fecha__gte=desde)
+    if hasta:
+        estadisticas = estadisticas.filter(fecha__lte=hasta)
+    estadisticas = list(estadisticas)
+    
+    versiones = _versiones_informe(estadisticas)
+    
+    # Los días anteriores al límite del archivo histórico ya no tienen todas
+    # sus aprobaciones en la base de datos: su fragmento se conserva tal cual
+    limite = limite_archivo()
+    
+    vigentes = {
+        fecha
+        for fecha, version in FragmentoInforme.objects.filter(
+            fecha__in=list(versiones)
+        ).values_list('fecha', 'version')
+        if (limite and fecha < limite) or (not regenerar and versiones[fecha] == version)
+    }
+    
+    fragmentos = FragmentoInforme.objects.filter(
+        fecha__in=list(vigentes)
+    ).order_by('fecha').values_list('fecha', 'contenido').iterator(chunk_size=50)
+    
+    a_generar = [estadistica.fecha for estadistica in estadisticas if estadistica.fecha not in vigentes]
+    aprobaciones = Autorizacion.objects.filter(
+        _filtro_dias(a_generar),
+        estado=Autorizacion.ESTADO_APROBADO
+    ).order_by('fecha_autorizacion', 'correlativo').values_list(
+        'fecha_autorizacion',
+        'documento__referencia_interna',
+        'documento__emisor__nit',
+        'numero_autorizacion'
+    ).iterator(chunk_size=tamano_bloque)
+    
+    fila = next(aprobaciones, None)
+    
+    def aprobaciones_del_dia(fecha):
+        nonlocal fila
+        while fila is not None and timezone.localdate(fila[0]) == fecha:
+            yield fila[1:]
+            fila = next(aprobaciones, None)
+    
+    yield b"<?xml version='1.0' encoding='UTF-8'?>\n<LISTAAUTORIZACIONES>"
     
     for estadistica in estadisticas:
-        # Crear elemento AUTORIZACION para cada fecha
-        autorizacion_elem = etree.SubElement(root, "AUTORIZACION")
-        
-        # Añadir fecha
-        fecha_elem = etree.SubElement(autorizacion_elem, "FECHA")
-        fecha_elem.text = estadistica.fecha.strftime("%d/%m/%Y")
-        
-        # Añadir facturas recibidas
-        facturas_elem = etree.SubElement(autorizacion_elem, "FACTURAS_RECIBIDAS")
-        facturas_elem.text = str(estadistica.facturas_recibidas)
-        
-        # Añadir errores
-        errores_elem = etree.SubElement(autorizacion_elem, "ERRORES")
+        if estadistica.fecha in vigentes:
+            fecha, contenido = next(fragmentos)
+            yield bytes(contenido)
+            continue
         
-        nit_emisor_elem = etree.SubElement(errores_elem, "NIT_EMISOR")
-        nit_emisor_elem.text = str(estadistica.errores_nit_emisor)
+        partes = []
+        for bloque in _escribir_dia(estadistica, aprobaciones_del_dia(estadistica.fecha), tamano_bloque):
+            partes.append(bloque)
+            yield bloque
         
-        nit_receptor_elem = etree.SubElement(errores_elem, "NIT_RECEPTOR")
-        nit_receptor_elem.text = str(estadistica.errores_nit_receptor)
-        
-        iva_elem = etree.SubElement(errores_elem, "IVA")
-        iva_elem.text = str(estadistica.errores_iva)
-        
-        total_elem = etree.SubElement(errores_elem, "TOTAL")
-        total_elem.text = str(estadistica.errores_total)
-        
-        ref_dup_elem = etree.SubElement(errores_elem, "REFERENCIA_DUPLICADA")
-        ref_dup_elem.text = str(estadistica.errores_referencia_duplicada)
-        
-        # Añadir facturas correctas
-        correctas_elem = etree.SubElement(autorizacion_elem, "FACTURAS_CORRECTAS")
-        correctas_elem.text = str(estadistica.facturas_correctas)
-        
-        # Añadir cantidad de emisores
-        emisores_elem = etree.SubElement(autorizacion_elem, "CANTIDAD_EMISORES")
-        emisores_elem.text = str(estadistica.cantidad_emisores)
-        
-        # Añadir cantidad de receptores
-        receptores_elem = etree.SubElement(autorizacion_elem, "CANTIDAD_RECEPTORES")
-        receptores_elem.text = str(estadistica.cantidad_receptores)
-        
-        # Añadir listado de autorizaciones
-        listado_elem = etree.SubElement(autorizacion_elem, "LISTADO_AUTORIZACIONES")
-        
-        # Obtener autorizaciones aprobadas para esta fecha
-        autorizaciones = Autorizacion.objects.filter(
-            fecha_autorizacion__date=estadistica.fecha,
-            estado=Autorizacion.ESTADO_APROBADO
-        ).select_related('documento__emisor')
-        
-        for aut in autorizaciones:
-            aprobacion_elem = etree.SubElement(listado_elem, "APROBACION")
-            
-            nit_emisor_elem = etree.SubElement(aprobacion_elem, "NIT_EMISOR")
-            nit_emisor_elem.set("ref", aut.documento.referencia_interna)
-            nit_emisor_elem.text = aut.documento.emisor.nit
-            
-            codigo_elem = etree.SubElement(aprobacion_elem, "CODIGO_APROBACION")
-            codigo_elem.text = aut.numero_autorizacion
-        
-        # Añadir total de aprobaciones
-        total_aprobaciones_elem = etree.SubElement(listado_elem, "TOTAL_APROBACIONES")
-        total_aprobaciones_elem.text = str(autorizaciones.count())
+        FragmentoInforme.objects.update_or_create(
+            fecha=estadistica.fecha,
+            defaults={'version': versiones[estadistica.fecha], 'contenido': b''.join(partes)}
+        )
     
-    # Convertir a cadena XML
-    return etree.tostring(root, pretty_print=True, encoding='UTF-8', xml_declaration=True)
+    yield b"\n</LISTAAUTORIZACIONES>\n"
 
 
-def guardar_informe_xml(path='autorizaciones.xml'):
+def generar_informe_xml(desde=None, hasta=None):
     """
-    Guarda el informe XML en un archivo
+    Genera un archivo XML con las estadísticas y autorizaciones
     
     Parámetros:
-    - path: Ruta donde guardar el archivo
+    - desde: Fecha inicial (date) del informe, inclusive (opcional)
+    - hasta: Fecha final (date) del informe, inclusive (opcional)
+    
+    Retorna:
+    - String con el contenido XML
     """
-    xml_content = generar_informe_xml()
+    return b''.join(iterar_informe_xml(desde, hasta))
+
+
+def guardar_informe_xml(path='autorizaciones.xml', desde=None, hasta=None, regenerar=False):
+    """
+    Guarda el informe XML en un archivo escribiéndolo por bloques
     
+    Parámetros:
+    - path: Ruta donde guardar el archivo
+    - desde: Fecha inicial (date) del informe, inclusive (opcional)
+    - hasta: Fecha final (date) del informe, inclusive (opcional)
+    - regenerar: Ignorar los fragmentos guardados y generarlos de nuevo
+    """
     with open(path, 'wb') as f:
-        f.write(xml_content)
\ No newline at end of file
+        for bloque in iterar_informe_xml(desde, hasta, regenerar=regenerar):
+            f.write(bloque)
@@ -0,0 +1,16 @@
+# autoriza/signals.py
+"""
+Receptores que invalidan los catálogos en caché de autoriza al guardar o
+eliminar sus registros. Se conectan en AutorizaConfig.ready().
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import ErrorValidacion, errores_validacion
+
+
+@receiver(post_save, sender=ErrorValidacion, dispatch_uid='autoriza.error_validacion_guardado')
+@receiver(post_delete, sender=ErrorValidacion, dispatch_uid='autoriza.error_validacion_eliminado')
+def error_validacion_modificado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        errores_validacion.invalidar()
@@ -0,0 +1,274 @@
+# autoriza/tasks.py
+"""
+Procesamiento asíncrono de autorizaciones mediante una cola en la base de datos.
+
+La emisión solo registra una TareaAutorizacion; el comando
+``procesar_cola_autorizacion`` toma las tareas disponibles con
+``SELECT ... FOR UPDATE SKIP LOCKED`` (varios workers pueden trabajar a la vez
+sin bloquearse entre sí), crea las autorizaciones en bloque y reintenta con
+espera exponencial las que fallan. Las tareas que agotan sus intentos quedan
+en estado FALLIDA (dead letter) para su revisión.
+"""
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from emisor.models import DocumentoTributario
+from .models import Autorizacion, TareaAutorizacion
+from .services import crear_solicitud_autorizacion, crear_solicitudes_autorizacion
+
+
+logger = logging.getLogger(__name__)
+
+# Segundos base de espera entre reintentos (se duplica en cada intento)
+ESPERA_REINTENTO = 30
+
+# Tiempo tras el cual una tarea en proceso se considera abandonada
+TIEMPO_MAXIMO_PROCESO = datetime.timedelta(minutes=10)
+
+
+def autorizacion_asincrona():
+    """
+    Indica si la autorización de documentos se procesa en segundo plano
+    """
+    return getattr(settings, 'AUTORIZACION_ASINCRONA', False)
+
+
+def encolar_autorizacion(documento):
+    """
+    Registra un documento emitido en la cola de autorización
+
+    Parámetros:
+    - documento: Instancia de DocumentoTributario en estado EMITIDO
+
+    Retorna:
+    - Instancia de TareaAutorizacion creada
+    """
+    if documento.estado != DocumentoTributario.ESTADO_EMITIDO:
+        raise ValueError("Solo se pueden autorizar documentos en estado EMITIDO")
+
+    return TareaAutorizacion.objects.create(
+        documento=documento,
+        max_intentos=getattr(settings, 'AUTORIZACION_MAX_INTENTOS', 5)
+    )
+
+
+def encolar_autorizaciones(documentos):
+    """
+    Registra varios documentos emitidos en la cola con un solo INSERT
+
+    Retorna:
+    - Lista de instancias de TareaAutorizacion creadas
+    """
+    documentos = list(documentos)
+    for documento in documentos:
+        if documento.estado != DocumentoTributario.ESTADO_EMITIDO:
+            raise ValueError("Solo se pueden autorizar documentos en estado EMITIDO")
+
+    max_intentos = getattr(settings, 'AUTORIZACION_MAX_INTENTOS', 5)
+    return TareaAutorizacion.objects.bulk_create([
+        TareaAutorizacion(documento=documento, max_intentos=max_intentos)
+        for documento in documentos
+    ])
+
+
+def solicitar_autorizacion(documento):
+    """
+    Envía un documento a autorización de forma síncrona o asíncrona según
+    la configuración AUTORIZACION_ASINCRONA
+
+    Retorna:
+    - TareaAutorizacion si se encoló, Autorizacion si se procesó en el momento
+    """
+    if autorizacion_asincrona():
+        return encolar_autorizacion(documento)
+    return crear_solicitud_autorizacion(documento)
+
+
+def solicitar_autorizaciones(documentos):
+    """
+    Envía varios documentos a autorización en un solo paso, encolándolos o
+    procesándolos en bloque según AUTORIZACION_ASINCRONA
+
+    Retorna:
+    - Lista de TareaAutorizacion si se encolaron, de Autorizacion si se procesaron
+    """
+    if autorizacion_asincrona():
+        return encolar_autorizaciones(documentos)
+    return crear_solicitudes_autorizacion(documentos)
+
+
+def liberar_tareas_abandonadas(tiempo_maximo=TIEMPO_MAXIMO_PROCESO):
+    """
+    Devuelve a la cola las tareas que quedaron en proceso por un worker caído
+
+    Cada abandono cuenta como un intento fallido: la tarea se reintenta con
+    la misma espera exponencial que un error y pasa a dead letter al agotar
+    max_intentos.
+
+    Retorna:
+    - Cantidad de tareas liberadas
+    """
+    with transaction.atomic():
+        tareas = list(
+            TareaAutorizacion.objects.select_for_update(skip_locked=True).filter(
+                estado=TareaAutorizacion.ESTADO_PROCESANDO,
+                fecha_inicio__lt=timezone.now() - tiempo_maximo
+            )
+        )
+        for tarea in tareas:
+            _registrar_fallo(
+                tarea,
+                f"El worker {tarea.worker or '(desconocido)'} no terminó la tarea en {tiempo_maximo}"
+            )
+
+    return len(tareas)
+
+
+def reclamar_tareas(cantidad, worker):
+    """
+    Toma hasta ``cantidad`` tareas disponibles y las marca en proceso
+
+    Las filas bloqueadas por otro worker se omiten (SKIP LOCKED), por lo
+    que varios workers pueden reclamar tareas al mismo tiempo.
+
+    Retorna:
+    - Lista de instancias de TareaAutorizacion reclamadas
+    """
+    now = timezone.now()
+
+    with transaction.atomic():
+        tareas = list(
+            TareaAutorizacion.objects.select_for_update(skip_locked=True).filter(
+                estado=TareaAutorizacion.ESTADO_PENDIENTE,
+                disponible_desde__lte=now
+            ).order_by('disponible_desde', 'id')[:cantidad]
+        )
+        if not tareas:
+            return []
+
+        TareaAutorizacion.objects.filter(pk__in=[tarea.pk for tarea in tareas]).update(
+            estado=TareaAutorizacion.ESTADO_PROCESANDO,
+            intentos=F('intentos') + 1,
+            worker=worker,
+            fecha_inicio=now,
+            modified=now
+        )
+
+    for tarea in tareas:
+        tarea.estado = TareaAutorizacion.ESTADO_PROCESANDO
+        tarea.intentos += 1
+        tarea.worker = worker
+        tarea.fecha_inicio = now
+
+    return tareas
+
+
+def _completar(tareas):
+    TareaAutorizacion.objects.filter(pk__in=[tarea.pk for tarea in tareas]).update(
+        estado=TareaAutorizacion.ESTADO_COMPLETADA,
+        ultimo_error='',
+        fecha_fin=timezone.now(),
+        modified=timezone.now()
+    )
+
+
+def _registrar_fallo(tarea, error, reintentar=True):
+    """
+    Programa un reintento con espera exponencial o envía la tarea a dead letter
+    """
+    now = timezone.now()
+    tarea.ultimo_error = str(error)
+    tarea.modified = now
+
+    if not reintentar or tarea.intentos >= tarea.max_intentos:
+        tarea.estado = TareaAutorizacion.ESTADO_FALLIDA
+        tarea.fecha_fin = now
+        logger.error("Tarea de autorización %s enviada a dead letter: %s", tarea.pk, error)
+    else:
+        tarea.estado = TareaAutorizacion.ESTADO_PENDIENTE
+        tarea.disponible_desde = now + datetime.timedelta(
+            seconds=ESPERA_REINTENTO * 2 ** (tarea.intentos - 1)
+        )
+        logger.warning("Tarea de autorización %s falló (intento %s): %s", tarea.pk, tarea.intentos, error)
+
+    tarea.save(update_fields=['estado', 'ultimo_error', 'disponible_desde', 'fecha_fin', 'modified'])
+
+
+def procesar_tareas(tareas):
+    """
+    Crea y valida las autorizaciones de las tareas reclamadas
+
+    Primero se intenta todo el lote en una transacción; si falla, cada
+    tarea se procesa por separado para aislar la que produce el error.
+
+    Retorna:
+    - Tupla (completadas, fallidas)
+    """
+    if not tareas:
+        return 0, 0
+
+    documentos = DocumentoTributario.objects.in_bulk([tarea.documento_id for tarea in tareas])
+
+    # Documentos que ya tienen autorización (tarea repetida) se dan por completados
+    ya_autorizados = set(
+        Autorizacion.objects.filter(documento_id__in=documentos).values_list('documento_id', flat=True)
+    )
+    pendientes = []
+    fallidas = 0
+    for tarea in tareas:
+        if tarea.documento_id in ya_autorizados:
+            continue
+        documento = documentos.get(tarea.documento_id)
+        if documento is None or documento.estado != DocumentoTributario.ESTADO_EMITIDO:
+            # Un documento que ya no está emitido no se corrige reintentando
+            _registrar_fallo(tarea, "Solo se pueden autorizar documentos en estado EMITIDO", reintentar=False)
+            fallidas += 1
+            continue
+        pendientes.append(tarea)
+
+    try:
+        crear_solicitudes_autorizacion([documentos[tarea.documento_id] for tarea in pendientes])
+    except Exception:
+        logger.exception("Falló el lote de %s tareas, se procesarán individualmente", len(pendientes))
+    else:
+        _completar([tarea for tarea in tareas if tarea.documento_id in ya_autorizados] + pendientes)
+        return len(tareas) - fallidas, fallidas
+
+    _completar([tarea for tarea in tareas if tarea.documento_id in ya_autorizados])
+    completadas = len(tareas) - len(pendientes) - fallidas
+
+    for tarea in pendientes:
+        try:
+            documento = DocumentoTributario.objects.get(pk=tarea.documento_id)
+            crear_solicitud_autorizacion(documento)
+        except Exception as e:
+            _registrar_fallo(tarea, e)
+            fallidas += 1
+        else:
+            _completar([tarea])
+            completadas += 1
+
+    return completadas, fallidas
+
+
+def reintentar_fallidas():
+    """
+    Devuelve a la cola las tareas en dead letter con un nuevo ciclo de intentos
+
+    Retorna:
+    - Cantidad de tareas reencoladas
+    """
+    return TareaAutorizacion.objects.filter(
+        estado=TareaAutorizacion.ESTADO_FALLIDA
+    ).update(
+        estado=TareaAutorizacion.ESTADO_PENDIENTE,
+        intentos=0,
+        disponible_desde=timezone.now(),
+        fecha_fin=None,
+        modified=timezone.now()
+    )
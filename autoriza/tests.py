@@ -1,3 +1,746 @@
-from django.test import TestCase
+import datetime
+import os
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.tests import EscenarioMixin, nit_valido
+from emisor.models import Contribuyente, DocumentoTributario, Establecimiento
+
+from .ingesta import crear_trabajo_ingesta, procesar_ingesta
+from .models import (
+    Autorizacion, AutorizacionError, ErrorValidacion, EstadisticaDiaria, FragmentoInforme,
+    SecuenciaDiaria, TareaAutorizacion, TrabajoIngesta, WorkerAutorizacion
+)
+from .services import (
+    crear_solicitud_autorizacion, crear_solicitudes_autorizacion, iterar_informe_xml, recalcular_estadisticas
+)
+from .tasks import (
+    ESPERA_REINTENTO, encolar_autorizacion, liberar_tareas_abandonadas,
+    procesar_tareas, reclamar_tareas, reintentar_fallidas
+)
+from .workers import ejecutar_worker, liberar_autorizaciones_abandonadas, registrar_worker
+
+
+def _solicitud(referencia, nit_emisor, nit_receptor, valor='100.00', tiempo='15/03/2024 10:30'):
+    return (
+        '<SOLICITUD_AUTORIZACION>'
+        f'<TIEMPO>{tiempo}</TIEMPO><REFERENCIA>{referencia}</REFERENCIA>'
+        f'<NIT_EMISOR>{nit_emisor}</NIT_EMISOR><NIT_RECEPTOR>{nit_receptor}</NIT_RECEPTOR>'
+        f'<VALOR>{valor}</VALOR>'
+        '</SOLICITUD_AUTORIZACION>'
+    )
+
+
+class IngestaTests(EscenarioMixin, TestCase):
+
+    def archivo(self, *solicitudes):
+        ruta = os.path.join(self.temporal, 'solicitudes.xml')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write(f"<LISTA_SOLICITUDES>{''.join(solicitudes)}</LISTA_SOLICITUDES>")
+        return ruta
+
+    def test_registra_errores_por_registro(self):
+        ruta = self.archivo(
+            _solicitud('ING-1', self.emisor.nit, self.receptor.nit),
+            _solicitud('ING-2', nit_valido(999999), self.receptor.nit),
+            _solicitud('ING-3', self.emisor.nit, self.receptor.nit, valor='abc'),
+        )
+
+        trabajo = procesar_ingesta(crear_trabajo_ingesta(ruta), tamano_lote=2)
+
+        self.assertEqual(trabajo.estado, TrabajoIngesta.ESTADO_COMPLETADO)
+        self.assertEqual(trabajo.registros_leidos, 3)
+        self.assertEqual(trabajo.documentos_creados, 1)
+        self.assertEqual(trabajo.registros_con_error, 2)
+        errores = {error.registro: error for error in trabajo.errores.all()}
+        self.assertEqual(set(errores), {2, 3})
+        self.assertEqual(errores[2].referencia, 'ING-2')
+        self.assertIn('No existe un contribuyente emisor', errores[2].detalle)
+        self.assertIn('VALOR', errores[3].detalle)
+        self.assertTrue(
+            Autorizacion.objects.filter(documento__referencia_interna='ING-1').exists()
+        )
+
+    def test_referencia_duplicada_se_registra_y_cuenta_en_estadisticas(self):
+        ruta = self.archivo(
+            _solicitud('DUP-1', self.emisor.nit, self.receptor.nit, tiempo='15/03/2024 09:00'),
+            _solicitud('DUP-1', self.emisor.nit, self.receptor.nit, tiempo='15/03/2024 17:00'),
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            trabajo = procesar_ingesta(crear_trabajo_ingesta(ruta))
+
+        self.assertEqual((trabajo.documentos_creados, trabajo.registros_con_error), (1, 1))
+        error = trabajo.errores.get()
+        self.assertEqual(error.registro, 2)
+        self.assertEqual(
+            error.detalle, 'Ya existe un documento con esta referencia para el 15/03/2024.'
+        )
+
+        estadistica = EstadisticaDiaria.objects.get(fecha=datetime.date(2024, 3, 15))
+        self.assertEqual(estadistica.facturas_recibidas, 2)
+        self.assertEqual(estadistica.errores_referencia_duplicada, 1)
+
+        # El rechazo no deja documento: recalcular conserva el contador
+        estadistica = recalcular_estadisticas(datetime.date(2024, 3, 15))
+        self.assertEqual(estadistica.facturas_recibidas, 2)
+        self.assertEqual(estadistica.errores_referencia_duplicada, 1)
+
+    def test_archivo_ilegible_marca_el_trabajo_fallido(self):
+        ruta = os.path.join(self.temporal, 'roto.xml')
+        with open(ruta, 'w', encoding='utf-8') as archivo:
+            archivo.write('<LISTA_SOLICITUDES><SOLICITUD_AUTORIZACION>')
+
+        trabajo = procesar_ingesta(crear_trabajo_ingesta(ruta))
+
+        self.assertEqual(trabajo.estado, TrabajoIngesta.ESTADO_FALLIDO)
+        self.assertTrue(trabajo.mensaje)
+
+    def test_cargar_responde_202_y_procesar_ingestas_completa_el_trabajo(self):
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        contenido = f"<LISTA_SOLICITUDES>{_solicitud('API-1', self.emisor.nit, self.receptor.nit)}</LISTA_SOLICITUDES>"
+
+        respuesta = cliente.post(
+            reverse('ingesta-cargar'),
+            {'archivo': SimpleUploadedFile('solicitudes.xml', contenido.encode(), 'text/xml')},
+            format='multipart'
+        )
+
+        self.assertEqual(respuesta.status_code, 202)
+        self.assertEqual(respuesta['Location'], respuesta.data['estado_url'])
+        trabajo = TrabajoIngesta.objects.get(pk=respuesta.data['id'])
+        self.assertEqual(trabajo.estado, TrabajoIngesta.ESTADO_PENDIENTE)
+        self.assertFalse(DocumentoTributario.objects.filter(referencia_interna='API-1').exists())
+
+        call_command('procesar_ingestas', una_vez=True, stdout=open(os.devnull, 'w'))
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, TrabajoIngesta.ESTADO_COMPLETADO)
+        self.assertEqual(trabajo.documentos_creados, 1)
+
+
+class ValidarLoteTests(EscenarioMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        from accounts.models import CustomUser
+
+        cls.receptor_invalido = Contribuyente.objects.create(
+            nit='1234567-0', nombre='NIT inválido', direccion='Zona 2', correo='invalido@example.com'
+        )
+        # Las reglas de validación no consideran si el emisor está activo
+        inactivo = CustomUser.objects.create_user('inactivo@example.com', 'clave', is_active=False)
+        cls.emisor_inactivo = Contribuyente.objects.create(
+            nit=nit_valido(1112223), nombre='Emisor inactivo', direccion='Zona 3',
+            correo='inactivo@example.com', usuario=inactivo
+        )
+        cls.establecimiento_inactivo = Establecimiento.objects.create(
+            contribuyente=cls.emisor_inactivo, codigo='001', nombre='Cerrado',
+            direccion='Zona 3', activo=False
+        )
+
+    def casos(self, prefijo):
+        """
+        Retorna:
+        - Documentos con cada resultado posible, leídos sin emisor ni receptor
+        """
+        documentos = [
+            self.documento(f'{prefijo}-OK'),
+            self.documento(f'{prefijo}-NIT', receptor=self.receptor_invalido),
+            self.documento(
+                f'{prefijo}-INACTIVO', emisor=self.emisor_inactivo,
+                establecimiento=self.establecimiento_inactivo
+            ),
+            self.documento(f'{prefijo}-TOTAL'),
+            self.documento(f'{prefijo}-VARIOS', receptor=self.receptor_invalido),
+        ]
+        DocumentoTributario.objects.filter(
+            referencia_interna__in=[f'{prefijo}-TOTAL', f'{prefijo}-VARIOS']
+        ).update(total=Decimal('1.00'))
+        return list(DocumentoTributario.objects.filter(pk__in=[d.pk for d in documentos]).order_by('id'))
+
+    def resultado(self, autorizaciones):
+        return [
+            (
+                autorizacion.estado,
+                list(AutorizacionError.objects.filter(autorizacion=autorizacion).order_by('id').values_list(
+                    'error__codigo', 'detalle'
+                ))
+            )
+            for autorizacion in autorizaciones
+        ]
+
+    def test_el_lote_da_los_mismos_resultados_que_cada_documento(self):
+        individuales = self.casos('UNO')
+        lote = self.casos('LOTE')
+        lote_doble = self.casos('DOBLE-A') + self.casos('DOBLE-B')
+
+        por_documento = [crear_solicitud_autorizacion(documento) for documento in individuales]
+        with CaptureQueriesContext(connection) as consultas:
+            por_lote = crear_solicitudes_autorizacion(lote)
+        # El doble de documentos no agrega consultas
+        with self.assertNumQueries(len(consultas)):
+            crear_solicitudes_autorizacion(lote_doble)
+        self.assertLessEqual(len(consultas), 25)
+
+        resultado = self.resultado(por_lote)
+        self.assertEqual(resultado, self.resultado(por_documento))
+        self.assertEqual([estado for estado, _ in resultado], [
+            Autorizacion.ESTADO_APROBADO, Autorizacion.ESTADO_RECHAZADO, Autorizacion.ESTADO_APROBADO,
+            Autorizacion.ESTADO_RECHAZADO, Autorizacion.ESTADO_RECHAZADO,
+        ])
+        self.assertEqual([[codigo for codigo, _ in errores] for _, errores in resultado], [
+            [], [ErrorValidacion.TIPO_NIT_RECEPTOR], [], [ErrorValidacion.TIPO_TOTAL],
+            [ErrorValidacion.TIPO_NIT_RECEPTOR, ErrorValidacion.TIPO_TOTAL],
+        ])
+        self.assertEqual(
+            list(DocumentoTributario.objects.filter(pk__in=[d.pk for d in lote]).order_by('id').values_list(
+                'estado', flat=True
+            )),
+            ['AUTORIZADO', 'RECHAZADO', 'AUTORIZADO', 'RECHAZADO', 'RECHAZADO']
+        )
+
+
+def _informe_en_memoria():
+    """
+    Informe armado como árbol en memoria, como se generaba antes de
+    escribirlo por bloques; las aprobaciones van en orden de correlativo
+    """
+    from lxml import etree
+
+    root = etree.Element("LISTAAUTORIZACIONES")
+    for estadistica in EstadisticaDiaria.objects.all().order_by('fecha'):
+        autorizacion_elem = etree.SubElement(root, "AUTORIZACION")
+        etree.SubElement(autorizacion_elem, "FECHA").text = estadistica.fecha.strftime("%d/%m/%Y")
+        etree.SubElement(autorizacion_elem, "FACTURAS_RECIBIDAS").text = str(estadistica.facturas_recibidas)
+        errores_elem = etree.SubElement(autorizacion_elem, "ERRORES")
+        etree.SubElement(errores_elem, "NIT_EMISOR").text = str(estadistica.errores_nit_emisor)
+        etree.SubElement(errores_elem, "NIT_RECEPTOR").text = str(estadistica.errores_nit_receptor)
+        etree.SubElement(errores_elem, "IVA").text = str(estadistica.errores_iva)
+        etree.SubElement(errores_elem, "TOTAL").text = str(estadistica.errores_total)
+        etree.SubElement(errores_elem, "REFERENCIA_DUPLICADA").text = str(estadistica.errores_referencia_duplicada)
+        etree.SubElement(autorizacion_elem, "FACTURAS_CORRECTAS").text = str(estadistica.facturas_correctas)
+        etree.SubElement(autorizacion_elem, "CANTIDAD_EMISORES").text = str(estadistica.cantidad_emisores)
+        etree.SubElement(autorizacion_elem, "CANTIDAD_RECEPTORES").text = str(estadistica.cantidad_receptores)
+        listado_elem = etree.SubElement(autorizacion_elem, "LISTADO_AUTORIZACIONES")
+        autorizaciones = Autorizacion.objects.filter(
+            fecha_autorizacion__date=estadistica.fecha,
+            estado=Autorizacion.ESTADO_APROBADO
+        ).select_related('documento__emisor').order_by('fecha_autorizacion', 'correlativo')
+        for aut in autorizaciones:
+            aprobacion_elem = etree.SubElement(listado_elem, "APROBACION")
+            nit_emisor_elem = etree.SubElement(aprobacion_elem, "NIT_EMISOR")
+            nit_emisor_elem.set("ref", aut.documento.referencia_interna)
+            nit_emisor_elem.text = aut.documento.emisor.nit
+            etree.SubElement(aprobacion_elem, "CODIGO_APROBACION").text = aut.numero_autorizacion
+        etree.SubElement(listado_elem, "TOTAL_APROBACIONES").text = str(autorizaciones.count())
+    return etree.tostring(root, pretty_print=True, encoding='UTF-8', xml_declaration=True)
+
+
+class InformeXmlTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.hoy = timezone.localdate()
+        crear_solicitudes_autorizacion([self.documento(f'INF-{i}') for i in range(5)])
+        rechazado = self.documento('INF-R')
+        DocumentoTributario.objects.filter(pk=rechazado.pk).update(total=Decimal('1.00'))
+        crear_solicitudes_autorizacion([DocumentoTributario.objects.get(pk=rechazado.pk)])
+        # Un día con estadística y sin aprobaciones
+        EstadisticaDiaria.objects.create(
+            fecha=self.hoy - datetime.timedelta(days=3), facturas_recibidas=2, errores_iva=2
+        )
+
+    def test_el_informe_por_bloques_coincide_con_el_arbol_en_memoria(self):
+        from lxml import etree
+
+        for tamano_bloque in [1, 2, 1000]:
+            with self.subTest(tamano_bloque=tamano_bloque):
+                informe = b''.join(iterar_informe_xml(regenerar=True, tamano_bloque=tamano_bloque))
+                self.assertEqual(informe, _informe_en_memoria())
+
+        raiz = etree.fromstring(informe)
+        dias = raiz.findall('AUTORIZACION')
+        self.assertEqual(len(dias), 2)
+        self.assertEqual(dias[1].findtext('LISTADO_AUTORIZACIONES/TOTAL_APROBACIONES'), '5')
+        self.assertEqual(
+            [elemento.get('ref') for elemento in dias[1].iterfind('LISTADO_AUTORIZACIONES/APROBACION/NIT_EMISOR')],
+            [f'INF-{i}' for i in range(5)]
+        )
+
+        # Un rango de fechas deja solo los días pedidos
+        raiz = etree.fromstring(b''.join(iterar_informe_xml(desde=self.hoy)))
+        self.assertEqual([dia.findtext('FECHA') for dia in raiz], [self.hoy.strftime('%d/%m/%Y')])
+
+    def test_solo_se_regeneran_los_dias_que_cambiaron(self):
+        from . import services
+
+        anterior = self.hoy - datetime.timedelta(days=3)
+
+        def regenerados():
+            with mock.patch.object(services, '_escribir_dia', wraps=services._escribir_dia) as escribir:
+                informe = b''.join(iterar_informe_xml())
+            self.assertEqual(informe, _informe_en_memoria())
+            return [llamada.args[0].fecha for llamada in escribir.call_args_list]
+
+        self.assertEqual(regenerados(), [anterior, self.hoy])
+        self.assertEqual(FragmentoInforme.objects.count(), 2)
+        self.assertEqual(regenerados(), [])
+
+        # Una aprobación nueva del día
+        crear_solicitudes_autorizacion([self.documento('INF-5')])
+        self.assertEqual(regenerados(), [self.hoy])
+        self.assertEqual(regenerados(), [])
+
+        # Una aprobación modificada
+        Autorizacion.objects.filter(numero_autorizacion__isnull=False).update(
+            modified=timezone.now() + datetime.timedelta(seconds=1)
+        )
+        self.assertEqual(regenerados(), [self.hoy])
+
+        # La estadística de otro día
+        EstadisticaDiaria.objects.filter(fecha=anterior).update(errores_total=1)
+        self.assertEqual(regenerados(), [anterior])
+        self.assertEqual(regenerados(), [])
+
+
+class SecuenciaDiariaTests(EscenarioMixin, TestCase):
+
+    def test_reservas_sucesivas_no_se_solapan(self):
+        fecha = datetime.date(2024, 3, 15)
+
+        primero = SecuenciaDiaria.reservar(fecha, 3)
+        segundo = SecuenciaDiaria.reservar(fecha, 2)
+        tercero = SecuenciaDiaria.reservar(fecha)
+
+        self.assertEqual((segundo, tercero), (primero + 3, primero + 5))
+
+    def test_inicia_despues_del_mayor_correlativo_aprobado(self):
+        fecha = datetime.date(2020, 1, 10)
+        Autorizacion.objects.create(
+            documento=self.documento('SEC-1'), estado=Autorizacion.ESTADO_APROBADO, correlativo=7,
+            fecha_autorizacion=timezone.make_aware(datetime.datetime.combine(fecha, datetime.time(12)))
+        )
+
+        # La conexión de la secuencia solo ve filas confirmadas
+        with self.settings(AUTORIZACION_SECUENCIA_DB=None):
+            self.assertEqual(SecuenciaDiaria.reservar(fecha), 8)
+
+    def test_aprobar_lote_entrega_numeros_unicos(self):
+        documentos = [self.documento(f'LOTE-{i}') for i in range(5)]
+
+        crear_solicitudes_autorizacion(documentos[:3])
+        crear_solicitudes_autorizacion(documentos[3:])
+
+        numeros = list(Autorizacion.objects.values_list('numero_autorizacion', flat=True))
+        self.assertEqual(len(numeros), 5)
+        self.assertEqual(len(set(numeros)), 5)
+
+    def test_estadisticas_se_aplican_en_la_transaccion_del_lote(self):
+        documento = self.documento('EST-1')
+        fecha = timezone.localdate(documento.fecha_emision)
+
+        class Revertir(Exception):
+            pass
+
+        with self.assertRaises(Revertir):
+            with transaction.atomic():
+                crear_solicitudes_autorizacion([documento])
+                estadistica = EstadisticaDiaria.objects.get(fecha=fecha)
+                self.assertEqual((estadistica.facturas_recibidas, estadistica.facturas_correctas), (1, 1))
+                raise Revertir
+        # Se revierten junto con las autorizaciones
+        self.assertFalse(EstadisticaDiaria.objects.filter(fecha=fecha).exists())
+
+        crear_solicitudes_autorizacion([DocumentoTributario.objects.get(pk=documento.pk)])
+        estadistica = EstadisticaDiaria.objects.get(fecha=fecha)
+        self.assertEqual((estadistica.facturas_recibidas, estadistica.cantidad_emisores), (1, 1))
+
+
+@skipUnless(
+    connection.vendor == 'postgresql' and 'secuencias' in settings.DATABASES,
+    'Requiere PostgreSQL con la conexión AUTORIZACION_SECUENCIA_DB'
+)
+class SecuenciaDiariaConcurrenteTests(TransactionTestCase):
+    databases = '__all__'
+
+    def test_la_reserva_no_espera_la_transaccion_de_otro_lote(self):
+        fecha = datetime.date(2020, 1, 11)
+        reservado = threading.Event()
+        continuar = threading.Event()
+        numeros = []
+
+        def lote_abierto():
+            try:
+                with transaction.atomic():
+                    numeros.append(SecuenciaDiaria.reservar(fecha, 10))
+                    reservado.set()
+                    continuar.wait(10)
+            finally:
+                connections.close_all()
+
+        hilo = threading.Thread(target=lote_abierto)
+        hilo.start()
+        try:
+            self.assertTrue(reservado.wait(10))
+            with transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL lock_timeout = '2s'")
+                numeros.append(SecuenciaDiaria.reservar(fecha, 10))
+        finally:
+            continuar.set()
+            hilo.join()
+
+        self.assertEqual(sorted(numeros), [1, 11])
+
+
+class ColaAutorizacionTests(EscenarioMixin, TestCase):
+
+    def test_reclamar_toma_cada_tarea_una_vez(self):
+        tarea = encolar_autorizacion(self.documento('COLA-1'))
+
+        reclamadas = reclamar_tareas(10, 'worker-1')
+
+        self.assertEqual([t.pk for t in reclamadas], [tarea.pk])
+        self.assertEqual(reclamar_tareas(10, 'worker-2'), [])
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, TareaAutorizacion.ESTADO_PROCESANDO)
+        self.assertEqual(tarea.intentos, 1)
+        self.assertEqual(tarea.worker, 'worker-1')
+
+    def test_procesar_completa_la_tarea(self):
+        documento = self.documento('COLA-2')
+        encolar_autorizacion(documento)
+
+        self.assertEqual(procesar_tareas(reclamar_tareas(10, 'worker-1')), (1, 0))
+
+        self.assertEqual(
+            TareaAutorizacion.objects.get(documento=documento).estado,
+            TareaAutorizacion.ESTADO_COMPLETADA
+        )
+        self.assertTrue(Autorizacion.objects.filter(documento=documento).exists())
+
+    @mock.patch('autoriza.tasks.crear_solicitud_autorizacion', side_effect=RuntimeError('sin conexión'))
+    @mock.patch('autoriza.tasks.crear_solicitudes_autorizacion', side_effect=RuntimeError('sin conexión'))
+    def test_error_reintenta_con_espera_y_agota_en_dead_letter(self, *_):
+        tarea = encolar_autorizacion(self.documento('COLA-3'))
+        TareaAutorizacion.objects.filter(pk=tarea.pk).update(max_intentos=2)
+
+        with self.assertLogs('autoriza.tasks', 'WARNING'):
+            self.assertEqual(procesar_tareas(reclamar_tareas(10, 'worker-1')), (0, 1))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, TareaAutorizacion.ESTADO_PENDIENTE)
+        self.assertEqual(tarea.ultimo_error, 'sin conexión')
+        self.assertGreater(
+            tarea.disponible_desde,
+            timezone.now() + datetime.timedelta(seconds=ESPERA_REINTENTO - 5)
+        )
+
+        TareaAutorizacion.objects.filter(pk=tarea.pk).update(disponible_desde=timezone.now())
+        with self.assertLogs('autoriza.tasks', 'ERROR'):
+            procesar_tareas(reclamar_tareas(10, 'worker-1'))
+        tarea.refresh_from_db()
+        self.assertEqual(tarea.estado, TareaAutorizacion.ESTADO_FALLIDA)
+
+        self.assertEqual(reintentar_fallidas(), 1)
+        tarea.refresh_from_db()
+        self.assertEqual((tarea.estado, tarea.intentos), (TareaAutorizacion.ESTADO_PENDIENTE, 0))
+
+    def test_tarea_abandonada_cuenta_como_intento(self):
+        reintentable = encolar_autorizacion(self.documento('COLA-4'))
+        agotada = encolar_autorizacion(self.documento('COLA-5'))
+        reclamar_tareas(10, 'worker-caido')
+        TareaAutorizacion.objects.update(fecha_inicio=timezone.now() - datetime.timedelta(hours=1))
+        TareaAutorizacion.objects.filter(pk=agotada.pk).update(max_intentos=1)
+
+        with self.assertLogs('autoriza.tasks', 'WARNING'):
+            self.assertEqual(liberar_tareas_abandonadas(), 2)
+
+        reintentable.refresh_from_db()
+        agotada.refresh_from_db()
+        self.assertEqual(reintentable.estado, TareaAutorizacion.ESTADO_PENDIENTE)
+        self.assertGreater(reintentable.disponible_desde, timezone.now())
+        self.assertIn('worker-caido', reintentable.ultimo_error)
+        self.assertEqual(agotada.estado, TareaAutorizacion.ESTADO_FALLIDA)
+
+
+class WorkerAutorizacionTests(EscenarioMixin, TestCase):
+
+    def pendiente(self, referencia, **campos):
+        return Autorizacion.objects.create(
+            documento=self.documento(referencia), estado=Autorizacion.ESTADO_PENDIENTE, **campos
+        )
+
+    def test_el_worker_elimina_su_registro_al_terminar(self):
+        autorizacion = self.pendiente('WRK-1')
+
+        aprobadas, rechazadas = ejecutar_worker('prueba:1', 10, threading.Event(), una_vez=True)
+
+        self.assertEqual((aprobadas, rechazadas), (1, 0))
+        autorizacion.refresh_from_db()
+        self.assertEqual(autorizacion.estado, Autorizacion.ESTADO_APROBADO)
+        self.assertFalse(WorkerAutorizacion.objects.exists())
+
+    def test_liberar_elimina_los_workers_caidos(self):
+        caido = registrar_worker('prueba:caido')
+        vivo = registrar_worker('prueba:vivo')
+        WorkerAutorizacion.objects.filter(pk=caido.pk).update(
+            ultimo_latido=timezone.now() - datetime.timedelta(minutes=5)
+        )
+        abandonada = self.pendiente('WRK-2', worker=caido)
+        reclamada = self.pendiente('WRK-3', worker=vivo)
+
+        with self.assertLogs('autoriza.workers', 'WARNING'):
+            self.assertEqual(liberar_autorizaciones_abandonadas(), 1)
+
+        self.assertEqual(list(WorkerAutorizacion.objects.values_list('nombre', flat=True)), ['prueba:vivo'])
+        abandonada.refresh_from_db()
+        reclamada.refresh_from_db()
+        self.assertIsNone(abandonada.worker_id)
+        self.assertEqual(reclamada.worker_id, vivo.pk)
+
+
+class ArchivoTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        from emisor.models import LineaDocumento
+
+        self.directorio = os.path.join(self.temporal, 'archivo')
+        ajustes = override_settings(ARCHIVO_DOCUMENTOS_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        self.dia = datetime.date(2024, 3, 15)
+        self.limite = self.dia + datetime.timedelta(days=1)
+        # Hora local con microsegundos: en UTC ya es el día siguiente
+        emision = timezone.make_aware(datetime.datetime(2024, 3, 15, 23, 30, 15, 123456))
+        aprobados = [
+            self.documento(f'ARC-{i}', subtotal=Decimal(monto), fecha_emision=emision)
+            for i, monto in enumerate(['100.00', '0.10', '0.20', '12345.67'])
+        ]
+        rechazado = self.documento('ARC-R', fecha_emision=emision)
+        DocumentoTributario.objects.filter(pk=rechazado.pk).update(total=Decimal('1.00'))
+        self.sin_autorizacion = self.documento('ARC-S', subtotal=Decimal('33.33'), fecha_emision=emision)
+        # El día del límite se queda en la base de datos
+        self.vigente = self.documento(
+            'ARC-V', fecha_emision=timezone.make_aware(datetime.datetime(2024, 3, 16, 9, 0))
+        )
+        crear_solicitudes_autorizacion(aprobados + [DocumentoTributario.objects.get(pk=rechazado.pk)])
+        Autorizacion.objects.filter(documento_id__in=[d.pk for d in aprobados + [rechazado]]).update(
+            fecha_autorizacion=datetime.datetime(2024, 3, 16, 3, 0, 0, 500000, tzinfo=datetime.timezone.utc)
+        )
+        for documento in aprobados[:2]:
+            LineaDocumento.objects.bulk_create([
+                LineaDocumento(
+                    documento=documento, descripcion=f'Línea {i}', cantidad=Decimal('1.50'),
+                    precio_unitario=Decimal('33.33'), descuento=Decimal('0.01'), subtotal=Decimal('49.99')
+                )
+                for i in range(3)
+            ])
+        self.aprobado = Autorizacion.objects.get(documento=aprobados[0])
+        self.archivables = [d.pk for d in aprobados + [rechazado, self.sin_autorizacion]]
+
+    def columnas_en_bd(self):
+        """
+        Columnas de archivo.COLUMNAS_DOCUMENTO leídas de la base de datos; los
+        textos nulos se archivan vacíos
+        """
+        filas = {}
+        for documento in DocumentoTributario.objects.filter(pk__in=self.archivables).select_related(
+            'tipo_documento', 'emisor', 'receptor', 'establecimiento'
+        ):
+            autorizacion = Autorizacion.objects.filter(documento=documento).first()
+            filas[documento.pk] = {
+                'id': documento.pk,
+                'uuid': str(documento.uuid),
+                'tipo_documento': documento.tipo_documento.codigo,
+                'tipo_documento_nombre': documento.tipo_documento.nombre,
+                'referencia_interna': documento.referencia_interna,
+                'emisor_nit': documento.emisor.nit,
+                'emisor_nombre': documento.emisor.nombre,
+                'establecimiento': documento.establecimiento.codigo,
+                'receptor_nit': documento.receptor.nit,
+                'receptor_nombre': documento.receptor.nombre,
+                'fecha_emision': documento.fecha_emision,
+                'dia_emision': documento.dia_emision,
+                'moneda': documento.moneda,
+                'subtotal': documento.subtotal,
+                'descuento': documento.descuento,
+                'iva': documento.iva,
+                'total': documento.total,
+                'estado': documento.estado,
+                'observaciones': documento.observaciones,
+                'numero_autorizacion': (autorizacion and autorizacion.numero_autorizacion) or '',
+                'estado_autorizacion': autorizacion.estado if autorizacion else '',
+                'fecha_autorizacion': autorizacion.fecha_autorizacion if autorizacion else None,
+                'correlativo': autorizacion.correlativo if autorizacion else None,
+                'errores_autorizacion': '|'.join(AutorizacionError.objects.filter(
+                    autorizacion=autorizacion
+                ).order_by('id').values_list('error__codigo', flat=True)) if autorizacion else '',
+            }
+        return filas
+
+    def lineas_en_bd(self):
+        from emisor.models import LineaDocumento
+
+        return list(LineaDocumento.objects.filter(documento_id__in=self.archivables).order_by(
+            'documento_id', 'id'
+        ).values_list('documento_id', 'descripcion', 'cantidad', 'precio_unitario', 'descuento', 'subtotal'))
+
+    def lineas_archivadas(self):
+        from . import archivo
+
+        lineas = []
+        for entrada in archivo.cargar_indice(self.directorio)['archivos']:
+            datos = archivo._leer(entrada, archivo.COLUMNAS_LINEA, self.directorio)
+            lineas.extend(
+                tuple(archivo._a_python(columna, datos[columna][posicion]) for columna in archivo.COLUMNAS_LINEA)
+                for posicion in range(len(datos['linea_documento']))
+            )
+        return lineas
+
+    def reportes(self):
+        """
+        Totales de los reportes de consulta por rango de fechas (por día) y de
+        IVA (por NIT), combinando la base de datos y el archivo como las vistas
+        """
+        from django.db.models import Count, Sum
+
+        from . import archivo
+
+        desde, hasta = self.dia - datetime.timedelta(days=1), self.limite
+        autorizados = DocumentoTributario.objects.filter(
+            dia_emision__gte=desde, dia_emision__lte=hasta, estado=DocumentoTributario.ESTADO_AUTORIZADO
+        )
+        por_dia = {
+            fila['dia_emision']: {campo: fila[campo] for campo in ('total', 'subtotal', 'iva', 'cantidad')}
+            for fila in autorizados.values('dia_emision').annotate(
+                total=Sum('total'), subtotal=Sum('subtotal'), iva=Sum('iva'), cantidad=Count('id')
+            ).order_by()
+        }
+        for dia, totales in archivo.totales_por_dia(
+            desde, hasta, estado=DocumentoTributario.ESTADO_AUTORIZADO, directorio=self.directorio
+        ).items():
+            fila = por_dia.setdefault(dia, {'total': 0, 'subtotal': 0, 'iva': 0, 'cantidad': 0})
+            for campo, valor in totales.items():
+                fila[campo] += valor
+
+        iva = {}
+        for dia in (self.dia, self.limite):
+            for campo, nit in (('emisor', self.emisor.nit), ('receptor', self.receptor.nit)):
+                suma = autorizados.filter(
+                    dia_emision=dia, **{f'{campo}__nit': nit}
+                ).aggregate(total=Sum('iva'))['total'] or 0
+                for doc in archivo.documentos(
+                    desde=dia, hasta=dia, estado=DocumentoTributario.ESTADO_AUTORIZADO,
+                    columnas=[f'{campo}_nit', 'iva'], directorio=self.directorio
+                ):
+                    if doc[f'{campo}_nit'] == nit:
+                        suma += doc['iva']
+                iva[(dia, campo)] = suma
+        return por_dia, iva
+
+    def test_archivar_conserva_columnas_lineas_y_reportes(self):
+        from . import archivo
+
+        columnas = self.columnas_en_bd()
+        lineas = self.lineas_en_bd()
+        reportes = self.reportes()
+        self.assertEqual(len(lineas), 6)
+
+        self.assertEqual(archivo.archivar(self.limite, tamano_lote=2, directorio=self.directorio), (6, 1))
+
+        self.assertFalse(DocumentoTributario.objects.filter(pk__in=self.archivables).exists())
+        self.assertTrue(DocumentoTributario.objects.filter(pk=self.vigente.pk).exists())
+        archivados = {doc['id']: doc for doc in archivo.documentos(directorio=self.directorio)}
+        self.assertEqual(archivados, columnas)
+        for doc in archivados.values():
+            # Montos exactos en centavos y fechas en UTC; los nulos se conservan
+            self.assertEqual(doc['total'].as_tuple().exponent, -2)
+            self.assertEqual(doc['fecha_emision'].tzinfo, datetime.timezone.utc)
+        self.assertIsNone(archivados[self.sin_autorizacion.pk]['correlativo'])
+        self.assertIsNone(archivados[self.sin_autorizacion.pk]['fecha_autorizacion'])
+        self.assertEqual(self.lineas_archivadas(), lineas)
+        self.assertEqual(archivo.cargar_indice(self.directorio)['archivos'][0]['lineas'], 6)
+        self.assertEqual(self.reportes(), reportes)
+
+    def test_totales_por_dia_suma_los_centavos_exactos(self):
+        from . import archivo
+
+        esperado = DocumentoTributario.objects.filter(
+            pk__in=self.archivables, estado=DocumentoTributario.ESTADO_AUTORIZADO
+        ).values_list('total', 'subtotal', 'iva')
+        esperado = {
+            'total': sum(fila[0] for fila in esperado), 'subtotal': sum(fila[1] for fila in esperado),
+            'iva': sum(fila[2] for fila in esperado), 'cantidad': len(esperado),
+        }
+        archivo.archivar(self.limite, directorio=self.directorio)
+
+        totales = archivo.totales_por_dia(
+            self.dia, self.dia, estado=DocumentoTributario.ESTADO_AUTORIZADO, directorio=self.directorio
+        )
+        self.assertEqual(totales, {self.dia: esperado})
+        self.assertEqual(str(totales[self.dia]['iva']), str(esperado['iva']))
+
+    def test_buscar_autorizacion_y_verificar_documento_archivado(self):
+        from . import archivo
+
+        numero = self.aprobado.numero_autorizacion
+        rechazado = Autorizacion.objects.get(documento__referencia_interna='ARC-R')
+        archivo.archivar(self.limite, directorio=self.directorio)
+
+        encontrado = archivo.buscar_autorizacion(numero, self.emisor.nit, directorio=self.directorio)
+        self.assertEqual(encontrado['referencia_interna'], 'ARC-0')
+        self.assertEqual(encontrado['total'], Decimal('112.00'))
+        self.assertIsNone(archivo.buscar_autorizacion(numero, self.receptor.nit, directorio=self.directorio))
+        self.assertIsNone(archivo.buscar_autorizacion('NO-EXISTE', self.emisor.nit, directorio=self.directorio))
+        self.assertIsNone(rechazado.numero_autorizacion)
+
+        cliente = APIClient()
+        cliente.force_authenticate(self.usuario)
+        respuesta = cliente.get(
+            reverse('verificar-documento'), {'numero_autorizacion': numero, 'nit_emisor': self.emisor.nit}
+        )
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta.data['valido'])
+        self.assertEqual(respuesta.data['referencia'], 'ARC-0')
+        self.assertEqual(respuesta.data['total'], '112.00')
+        self.assertEqual(respuesta.data['fecha_autorizacion'], self.aprobado.fecha_autorizacion)
+
+        respuesta = cliente.get(
+            reverse('verificar-documento'), {'numero_autorizacion': numero, 'nit_emisor': self.receptor.nit}
+        )
+        self.assertEqual(respuesta.status_code, 404)
+
+    def test_una_ejecucion_interrumpida_no_duplica_filas(self):
+        from . import archivo
+
+        columnas = self.columnas_en_bd()
+        lineas = self.lineas_en_bd()
+
+        # Falla el borrado después de escribir el archivo y publicar el índice
+        with mock.patch.object(archivo.busqueda, 'eliminar', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                archivo.archivar(self.limite, directorio=self.directorio)
+        self.assertEqual(DocumentoTributario.objects.filter(pk__in=self.archivables).count(), 6)
+
+        self.assertEqual(archivo.archivar(self.limite, directorio=self.directorio), (6, 1))
+
+        archivados = [doc['id'] for doc in archivo.documentos(directorio=self.directorio)]
+        self.assertEqual(sorted(archivados), sorted(columnas))
+        self.assertEqual(self.lineas_archivadas(), lineas)
+        self.assertEqual(archivo.cargar_indice(self.directorio)['archivos'][0]['documentos'], 6)
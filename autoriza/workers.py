@@ -0,0 +1,239 @@
+# autoriza/workers.py
+"""
+Pool de procesos para validar autorizaciones pendientes en paralelo.
+
+Cada proceso se registra como WorkerAutorizacion, reclama lotes de
+autorizaciones pendientes marcándolas con su worker (``SELECT ... FOR UPDATE
+SKIP LOCKED`` para que dos procesos no tomen las mismas filas) y las valida
+con ``validar_lote``. Un hilo por proceso actualiza el latido del worker; las
+autorizaciones de un worker cuyo latido venció se liberan para que otro las
+tome y su registro se elimina, igual que al terminar un worker. El comando
+``supervisar_autorizaciones`` levanta y vigila los procesos.
+"""
+import datetime
+import logging
+import os
+import socket
+import threading
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Autorizacion, WorkerAutorizacion
+from .services import validar_lote
+
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre latidos de un worker
+INTERVALO_LATIDO = 10
+
+# Tiempo sin latido tras el cual un worker se considera caído
+TIEMPO_MAXIMO_SIN_LATIDO = datetime.timedelta(seconds=60)
+
+
+def nombre_worker(indice=None):
+    """
+    Genera el nombre único de un worker a partir del host y el PID
+    """
+    nombre = f'{socket.gethostname()}:{os.getpid()}'
+    if indice is not None:
+        nombre = f'{nombre}:{indice}'
+    return nombre
+
+
+def registrar_worker(nombre):
+    """
+    Registra un worker del pool (o reinicia el registro con el mismo nombre)
+
+    Retorna:
+    - Instancia de WorkerAutorizacion
+    """
+    now = timezone.now()
+    worker, _ = WorkerAutorizacion.objects.update_or_create(
+        nombre=nombre,
+        defaults={
+            'fecha_inicio': now,
+            'ultimo_latido': now,
+        }
+    )
+    return worker
+
+
+def registrar_latido(worker):
+    """
+    Actualiza el latido del worker; retorna False si el registro ya no existe
+    """
+    return bool(
+        WorkerAutorizacion.objects.filter(pk=worker.pk).update(ultimo_latido=timezone.now())
+    )
+
+
+def detener_worker(worker):
+    """
+    Libera las autorizaciones que tenía reclamadas el worker y elimina su registro
+    """
+    with transaction.atomic():
+        Autorizacion.objects.filter(
+            worker=worker,
+            estado=Autorizacion.ESTADO_PENDIENTE
+        ).update(worker=None)
+        WorkerAutorizacion.objects.filter(pk=worker.pk).delete()
+
+
+def liberar_autorizaciones_abandonadas(tiempo_maximo=TIEMPO_MAXIMO_SIN_LATIDO):
+    """
+    Libera las autorizaciones pendientes reclamadas por workers caídos
+    (sin latido reciente) y elimina el registro de esos workers
+
+    Retorna:
+    - Cantidad de autorizaciones liberadas
+    """
+    limite = timezone.now() - tiempo_maximo
+
+    with transaction.atomic():
+        caidos = list(
+            WorkerAutorizacion.objects.filter(ultimo_latido__lt=limite).values_list('pk', flat=True)
+        )
+        if not caidos:
+            return 0
+        liberadas = Autorizacion.objects.filter(
+            estado=Autorizacion.ESTADO_PENDIENTE,
+            worker__in=caidos
+        ).update(worker=None)
+        WorkerAutorizacion.objects.filter(pk__in=caidos, ultimo_latido__lt=limite).delete()
+
+    if liberadas:
+        logger.warning("Se liberaron %s autorizaciones de workers caídos", liberadas)
+    return liberadas
+
+
+def reclamar_autorizaciones(worker, cantidad):
+    """
+    Reclama hasta ``cantidad`` autorizaciones pendientes sin worker asignado
+
+    Retorna:
+    - Lista de ids de las autorizaciones reclamadas
+    """
+    with transaction.atomic():
+        ids = list(
+            Autorizacion.objects.select_for_update(skip_locked=True).filter(
+                estado=Autorizacion.ESTADO_PENDIENTE,
+                worker__isnull=True
+            ).order_by('id').values_list('id', flat=True)[:cantidad]
+        )
+        if ids:
+            # El filtro por worker nulo evita pisar un reclamo concurrente
+            # en motores sin SKIP LOCKED
+            Autorizacion.objects.filter(pk__in=ids, worker__isnull=True).update(worker=worker)
+
+    return ids
+
+
+def procesar_autorizaciones(worker, ids):
+    """
+    Valida, aprueba o rechaza las autorizaciones reclamadas por el worker
+
+    Retorna:
+    - Tupla (aprobadas, rechazadas)
+    """
+    with transaction.atomic():
+        autorizaciones = Autorizacion.objects.filter(
+            pk__in=ids,
+            worker=worker,
+            estado=Autorizacion.ESTADO_PENDIENTE
+        ).order_by('id')
+        resultados = validar_lote(autorizaciones)
+        Autorizacion.objects.filter(pk__in=ids, worker=worker).update(worker=None)
+        WorkerAutorizacion.objects.filter(pk=worker.pk).update(
+            lotes_procesados=F('lotes_procesados') + 1,
+            autorizaciones_procesadas=F('autorizaciones_procesadas') + len(resultados),
+            ultimo_latido=timezone.now()
+        )
+
+    aprobadas = sum(1 for aprobado in resultados if aprobado)
+    return aprobadas, len(resultados) - aprobadas
+
+
+class Latido(threading.Thread):
+    """
+    Hilo que mantiene actualizado el latido de un worker mientras procesa
+    """
+
+    def __init__(self, worker, intervalo=INTERVALO_LATIDO):
+        super().__init__(daemon=True)
+        self.worker = worker
+        self.intervalo = intervalo
+        self.detenido = threading.Event()
+
+    def run(self):
+        try:
+            while not self.detenido.wait(self.intervalo):
+                try:
+                    registrar_latido(self.worker)
+                except Exception:
+                    logger.exception("No se pudo registrar el latido del worker %s", self.worker.nombre)
+        finally:
+            connection.close()
+
+    def detener(self):
+        self.detenido.set()
+        self.join()
+
+
+def ejecutar_worker(nombre, tamano_lote, detener, intervalo=2.0, una_vez=False):
+    """
+    Ciclo principal de un proceso del pool
+
+    Parámetros:
+    - nombre: Nombre único del worker
+    - tamano_lote: Autorizaciones a reclamar por iteración
+    - detener: Evento que solicita el apagado ordenado (se termina el lote en curso)
+    - intervalo: Segundos de espera cuando no hay autorizaciones pendientes
+    - una_vez: Terminar cuando no queden autorizaciones pendientes
+
+    Retorna:
+    - Tupla (aprobadas, rechazadas)
+    """
+    worker = registrar_worker(nombre)
+    latido = Latido(worker)
+    latido.start()
+    total_aprobadas = total_rechazadas = 0
+
+    try:
+        while not detener.is_set():
+            liberar_autorizaciones_abandonadas()
+
+            # Un worker que dejó de latir más de lo tolerado pudo ser eliminado
+            if not registrar_latido(worker):
+                logger.warning("El registro del worker %s fue eliminado, se vuelve a registrar", nombre)
+                worker = latido.worker = registrar_worker(nombre)
+
+            ids = reclamar_autorizaciones(worker, tamano_lote)
+            if not ids:
+                if una_vez:
+                    break
+                detener.wait(intervalo)
+                continue
+
+            try:
+                aprobadas, rechazadas = procesar_autorizaciones(worker, ids)
+            except Exception:
+                logger.exception("Falló el lote de %s autorizaciones en el worker %s", len(ids), nombre)
+                # Se liberan para que otro intento las tome
+                Autorizacion.objects.filter(pk__in=ids, worker=worker).update(worker=None)
+                detener.wait(intervalo)
+                continue
+
+            total_aprobadas += aprobadas
+            total_rechazadas += rechazadas
+            logger.info(
+                "Worker %s procesó un lote: %s aprobadas, %s rechazadas",
+                nombre, aprobadas, rechazadas
+            )
+    finally:
+        latido.detener()
+        detener_worker(worker)
+
+    return total_aprobadas, total_rechazadas
@@ -3,14 +3,15 @@ from django.shortcuts import render
 from django.views.generic import TemplateView, ListView, DetailView, FormView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.http import HttpResponse, JsonResponse
-from django.db.models import Sum, Count, Q
-from django.db.models.functions import TruncMonth, TruncDay
+from django.db.models import Sum, Count, Q, F
+from django.db.models.functions import TruncMonth
 from django.utils import timezone
 import datetime
 import csv
 import json
 
 from emisor.models import DocumentoTributario, Contribuyente
+from autoriza import archivo
 from autoriza.models import Autorizacion, EstadisticaDiaria
 from .forms import ReporteFechaForm, ReporteRangoFechasForm, ReporteIvaForm
 
@@ -38,19 +39,20 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         if hasattr(user, 'contribuyente'):
             contribuyente = user.contribuyente
             
-            # Documentos del último mes
-            ultimo_mes = timezone.now() - datetime.timedelta(days=30)
+            # Documentos del último mes (por día de emisión: usa su índice y, con
+            # DOCUMENTOS_PARTICIONADOS, solo lee las particiones de esos meses)
+            ultimo_mes = timezone.localdate() - datetime.timedelta(days=30)
             
             # Documentos emitidos
             emitidos = DocumentoTributario.objects.filter(
                 emisor=contribuyente,
-                fecha_emision__gte=ultimo_mes
+                dia_emision__gte=ultimo_mes
             )
             
             # Documentos recibidos
             recibidos = DocumentoTributario.objects.filter(
                 receptor=contribuyente,
-                fecha_emision__gte=ultimo_mes
+                dia_emision__gte=ultimo_mes
             )
             
             # Estadísticas de documentos emitidos
@@ -70,7 +72,7 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             
             # Datos para gráfica de documentos por día
             emitidos_por_dia = emitidos.annotate(
-                dia=TruncDay('fecha_emision')
+                dia=F('dia_emision')
             ).values('dia').annotate(
                 count=Count('id'),
                 monto=Sum('total')
@@ -92,10 +94,11 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         elif user.role in ['AUDITOR', 'ADMIN']:
             # Estadísticas generales del último mes
             ultimo_mes = timezone.now() - datetime.timedelta(days=30)
+            ultimo_mes_dia = timezone.localdate() - datetime.timedelta(days=30)
             
             # Total de documentos
             total_docs = DocumentoTributario.objects.filter(
-                fecha_emision__gte=ultimo_mes
+                dia_emision__gte=ultimo_mes_dia
             ).count()
             
             # Total de autorizaciones
@@ -112,9 +115,9 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             
             # Documentos por día
             docs_por_dia = DocumentoTributario.objects.filter(
-                fecha_emision__gte=ultimo_mes
+                dia_emision__gte=ultimo_mes_dia
             ).annotate(
-                dia=TruncDay('fecha_emision')
+                dia=F('dia_emision')
             ).values('dia').annotate(
                 count=Count('id')
             ).order_by('dia')
@@ -122,13 +125,13 @@ class DashboardView(LoginRequiredMixin, TemplateView):
             # Top contribuyentes por cantidad de emisiones
             top_emisores = Contribuyente.objects.annotate(
                 num_docs=Count('documentos_emitidos', filter=Q(
-                    documentos_emitidos__fecha_emision__gte=ultimo_mes
+                    documentos_emitidos__dia_emision__gte=ultimo_mes_dia
                 ))
             ).filter(num_docs__gt=0).order_by('-num_docs')[:10]
             
             # Estadísticas por estado
             por_estado = DocumentoTributario.objects.filter(
-                fecha_emision__gte=ultimo_mes
+                dia_emision__gte=ultimo_mes_dia
             ).values('estado').annotate(
                 count=Count('id')
             ).order_by('estado')
@@ -218,7 +221,7 @@ class ReporteIvaView(AuditorRequiredMixin, FormView):
                 # Documentos emitidos (IVA cobrado)
                 emitidos = DocumentoTributario.objects.filter(
                     emisor=contribuyente,
-                    fecha_emision__date=fecha,
+                    dia_emision=fecha,
                     estado=DocumentoTributario.ESTADO_AUTORIZADO
                 )
                 
@@ -227,12 +230,22 @@ class ReporteIvaView(AuditorRequiredMixin, FormView):
                 # Documentos recibidos (IVA pagado)
                 recibidos = DocumentoTributario.objects.filter(
                     receptor=contribuyente,
-                    fecha_emision__date=fecha,
+                    dia_emision=fecha,
                     estado=DocumentoTributario.ESTADO_AUTORIZADO
                 )
                 
                 iva_recibido = recibidos.aggregate(total=Sum('iva'))['total'] or 0
                 
+                # Documentos del día que están en el archivo histórico
+                for doc in archivo.documentos(
+                    desde=fecha, hasta=fecha, estado=DocumentoTributario.ESTADO_AUTORIZADO,
+                    columnas=['emisor_nit', 'receptor_nit', 'iva']
+                ):
+                    if doc['emisor_nit'] == nit:
+                        iva_emitido += doc['iva']
+                    if doc['receptor_nit'] == nit:
+                        iva_recibido += doc['iva']
+                
                 data = {
                     'nit': nit,
                     'nombre': contribuyente.nombre,
@@ -259,12 +272,12 @@ class ReporteIvaView(AuditorRequiredMixin, FormView):
         else:
             # Obtener todos los contribuyentes con actividad en esa fecha
             contribuyentes_emisores = Contribuyente.objects.filter(
-                documentos_emitidos__fecha_emision__date=fecha,
+                documentos_emitidos__dia_emision=fecha,
                 documentos_emitidos__estado=DocumentoTributario.ESTADO_AUTORIZADO
             ).distinct()
             
             contribuyentes_receptores = Contribuyente.objects.filter(
-                documentos_recibidos__fecha_emision__date=fecha,
+                documentos_recibidos__dia_emision=fecha,
                 documentos_recibidos__estado=DocumentoTributario.ESTADO_AUTORIZADO
             ).distinct()
             
@@ -273,6 +286,19 @@ class ReporteIvaView(AuditorRequiredMixin, FormView):
                 contribuyentes_receptores.values_list('id', flat=True)
             )
             
+            # IVA de los documentos del día que están en el archivo histórico
+            iva_archivado = {}
+            for doc in archivo.documentos(
+                desde=fecha, hasta=fecha, estado=DocumentoTributario.ESTADO_AUTORIZADO,
+                columnas=['emisor_nit', 'receptor_nit', 'iva']
+            ):
+                iva_archivado.setdefault(doc['emisor_nit'], [0, 0])[0] += doc['iva']
+                iva_archivado.setdefault(doc['receptor_nit'], [0, 0])[1] += doc['iva']
+            if iva_archivado:
+                contribuyentes_ids.update(
+                    Contribuyente.objects.filter(nit__in=iva_archivado).values_list('id', flat=True)
+                )
+            
             # Resultado con datos de IVA
             resultado = []
             series_emitido = []
@@ -283,17 +309,21 @@ class ReporteIvaView(AuditorRequiredMixin, FormView):
                 # IVA emitido
                 iva_emitido = DocumentoTributario.objects.filter(
                     emisor=contribuyente,
-                    fecha_emision__date=fecha,
+                    dia_emision=fecha,
                     estado=DocumentoTributario.ESTADO_AUTORIZADO
                 ).aggregate(total=Sum('iva'))['total'] or 0
                 
                 # IVA recibido
                 iva_recibido = DocumentoTributario.objects.filter(
                     receptor=contribuyente,
-                    fecha_emision__date=fecha,
+                    dia_emision=fecha,
                     estado=DocumentoTributario.ESTADO_AUTORIZADO
                 ).aggregate(total=Sum('iva'))['total'] or 0
                 
+                archivado_emitido, archivado_recibido = iva_archivado.get(contribuyente.nit, (0, 0))
+                iva_emitido += archivado_emitido
+                iva_recibido += archivado_recibido
+                
                 resultado.append({
                     'contribuyente': contribuyente,
                     'iva_emitido': iva_emitido,
@@ -343,14 +373,14 @@ class ReporteRangoFechasView(AuditorRequiredMixin, FormView):
         
         # Consultar documentos en el rango de fechas
         documentos = DocumentoTributario.objects.filter(
-            fecha_emision__date__gte=fecha_desde,
-            fecha_emision__date__lte=fecha_hasta,
+            dia_emision__gte=fecha_desde,
+            dia_emision__lte=fecha_hasta,
             estado=DocumentoTributario.ESTADO_AUTORIZADO
         )
         
         # Agrupar por día
         documentos_por_dia = documentos.annotate(
-            dia=TruncDay('fecha_emision')
+            dia=F('dia_emision')
         ).values('dia').annotate(
             total=Sum('total'),
             subtotal=Sum('subtotal'),
@@ -358,6 +388,20 @@ class ReporteRangoFechasView(AuditorRequiredMixin, FormView):
             cantidad=Count('id')
         ).order_by('dia')
         
+        # Sumar los días que tienen documentos en el archivo histórico
+        archivados = archivo.totales_por_dia(
+            fecha_desde, fecha_hasta, estado=DocumentoTributario.ESTADO_AUTORIZADO
+        )
+        if archivados:
+            por_dia = {item['dia']: item for item in documentos_por_dia}
+            for dia, totales_dia in archivados.items():
+                item = por_dia.setdefault(dia, {
+                    'dia': dia, 'total': 0, 'subtotal': 0, 'iva': 0, 'cantidad': 0
+                })
+                for campo, valor in totales_dia.items():
+                    item[campo] += valor
+            documentos_por_dia = sorted(por_dia.values(), key=lambda item: item['dia'])
+        
         # Preparar datos para la gráfica
         labels = []
         totales = []
@@ -401,8 +445,8 @@ class ExportarCsvView(AuditorRequiredMixin, FormView):
         
         # Consultar documentos en el rango de fechas
         documentos = DocumentoTributario.objects.filter(
-            fecha_emision__date__gte=fecha_desde,
-            fecha_emision__date__lte=fecha_hasta
+            dia_emision__gte=fecha_desde,
+            dia_emision__lte=fecha_hasta
         ).select_related('emisor', 'receptor', 'tipo_documento')
         
         # Crear respuesta HTTP con el CSV
@@ -442,6 +486,25 @@ class ExportarCsvView(AuditorRequiredMixin, FormView):
                 numero_autorizacion
             ])
         
+        # Documentos del rango que están en el archivo histórico
+        estados = dict(DocumentoTributario.ESTADOS)
+        for doc in archivo.documentos(desde=fecha_desde, hasta=fecha_hasta):
+            writer.writerow([
+                doc['id'],
+                doc['tipo_documento_nombre'],
+                doc['referencia_interna'],
+                doc['fecha_emision'].strftime('%d/%m/%Y %H:%M'),
+                doc['emisor_nit'],
+                doc['emisor_nombre'],
+                doc['receptor_nit'],
+                doc['receptor_nombre'],
+                doc['subtotal'],
+                doc['iva'],
+                doc['total'],
+                estados.get(doc['estado'], doc['estado']),
+                doc['numero_autorizacion'] or '-'
+            ])
+        
         return response
 
 
@@ -464,13 +527,18 @@ class GenerarPdfView(AuditorRequiredMixin, FormView):
         
         # Consultar datos
         documentos = DocumentoTributario.objects.filter(
-            fecha_emision__date__gte=fecha_desde,
-            fecha_emision__date__lte=fecha_hasta
+            dia_emision__gte=fecha_desde,
+            dia_emision__lte=fecha_hasta
         ).select_related('emisor', 'receptor', 'tipo_documento')
         
+        # Documentos del rango que están en el archivo histórico (diccionarios
+        # con las columnas de archivo.COLUMNAS_DOCUMENTO)
+        documentos_archivados = list(archivo.documentos(desde=fecha_desde, hasta=fecha_hasta))
+        
         # Renderizar template a string
         # html_string = render_to_string('consulta/pdf_template.html', {
         #     'documentos': documentos,
+        #     'documentos_archivados': documentos_archivados,
         #     'fecha_desde': fecha_desde,
         #     'fecha_hasta': fecha_hasta,
         #     'fecha_generacion': timezone.now()
@@ -492,6 +560,7 @@ class GenerarPdfView(AuditorRequiredMixin, FormView):
         # Por ahora, solo renderizamos una página informativa
         return render(self.request, 'consulta/pdf_preview.html', {
             'documentos': documentos,
+            'documentos_archivados': documentos_archivados,
             'fecha_desde': fecha_desde,
             'fecha_hasta': fecha_hasta
         })
\ No newline at end of file
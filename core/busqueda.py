@@ -0,0 +1,336 @@
+# core/busqueda.py
+"""
+Búsqueda de texto sobre el índice invertido TerminoBusqueda.
+
+Los modelos buscables declaran CAMPOS_BUSQUEDA, un diccionario
+{ruta del campo: peso} (la ruta puede cruzar relaciones, p. ej.
+'receptor__nombre'). Al guardarlos se reemplazan sus términos en el índice
+solo si cambiaron; las cargas en bloque llaman a indexar_lote.
+
+Cada palabra buscada debe coincidir con algún término del objeto: completa
+o como prefijo y, en PostgreSQL con pg_trgm (ver el comando
+indexar_busqueda --trigramas), también como subcadena. La relevancia suma
+el peso de los campos que coinciden, multiplicado por 4 si la palabra es
+el término completo, por 2 si es un prefijo y por 1 si es una subcadena.
+"""
+import re
+import unicodedata
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import Case, F, IntegerField, Max, OuterRef, Q, Subquery, Sum, Value, When
+
+from .models import TerminoBusqueda
+
+
+LONGITUD_TERMINO = 40
+
+# Largo mínimo de una palabra para buscarla como subcadena con trigramas
+LONGITUD_TRIGRAMA = 3
+
+_PALABRA = re.compile(r'[0-9a-z]+')
+
+# Motores con pg_trgm instalado, por alias de conexión
+_trigramas = {}
+
+
+def normalizar(texto):
+    """
+    Minúsculas y sin tildes
+    """
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+
+
+def terminos(texto):
+    """
+    Términos de un texto a indexar: cada palabra y, en las palabras
+    compuestas como 'FAC-001' o '1234567-8', también la unión de sus partes
+    """
+    resultado = []
+    for trozo in normalizar(texto).split():
+        partes = _PALABRA.findall(trozo)
+        resultado.extend(partes)
+        if len(partes) > 1:
+            resultado.append(''.join(partes))
+    return [termino[:LONGITUD_TERMINO] for termino in resultado]
+
+
+def palabras_consulta(texto):
+    """
+    Palabras de una búsqueda; las compuestas se buscan unidas
+    """
+    palabras = (''.join(_PALABRA.findall(trozo)) for trozo in normalizar(texto).split())
+    return list(dict.fromkeys(palabra[:LONGITUD_TERMINO] for palabra in palabras if palabra))
+
+
+def _valor(instancia, ruta):
+    valor = instancia
+    for parte in ruta.split('__'):
+        valor = getattr(valor, parte, None)
+        if valor is None:
+            return ''
+    return valor
+
+
+def terminos_instancia(instancia):
+    """
+    Retorna:
+    - Diccionario {(campo, termino): peso} de los campos buscables de la instancia
+    """
+    resultado = {}
+    for campo, peso in instancia.CAMPOS_BUSQUEDA.items():
+        for termino in terminos(_valor(instancia, campo)):
+            resultado[(campo, termino)] = peso
+    return resultado
+
+
+def _filas(instancia, terminos_objeto):
+    modelo = instancia._meta.label_lower
+    return [
+        TerminoBusqueda(modelo=modelo, objeto_id=instancia.pk, campo=campo, termino=termino, peso=peso)
+        for (campo, termino), peso in terminos_objeto.items()
+    ]
+
+
+def indexar(instancia, update_fields=None):
+    """
+    Actualiza los términos de una instancia guardada si cambiaron
+
+    Si cambiaron, también se reindexan los objetos que copian sus campos
+    (las relaciones listadas en DEPENDIENTES_BUSQUEDA del modelo).
+
+    Parámetros:
+    - instancia: Instancia de un modelo con CAMPOS_BUSQUEDA
+    - update_fields: Campos guardados; si ninguno es buscable no se hace nada
+
+    Retorna:
+    - True si los términos cambiaron
+    """
+    if update_fields is not None:
+        locales = {campo.split('__')[0] for campo in instancia.CAMPOS_BUSQUEDA}
+        if not locales & set(update_fields):
+            return False
+
+    modelo = instancia._meta.label_lower
+    nuevos = terminos_instancia(instancia)
+    guardados = TerminoBusqueda.objects.filter(modelo=modelo, objeto_id=instancia.pk)
+    actuales = {(campo, termino): peso for campo, termino, peso in guardados.values_list('campo', 'termino', 'peso')}
+    if actuales == nuevos:
+        return False
+
+    guardados.delete()
+    TerminoBusqueda.objects.bulk_create(_filas(instancia, nuevos))
+
+    if actuales:
+        for relacion in getattr(instancia, 'DEPENDIENTES_BUSQUEDA', ()):
+            dependientes = getattr(instancia, relacion).all()
+            relacionados = {
+                campo.rsplit('__', 1)[0]
+                for campo in dependientes.model.CAMPOS_BUSQUEDA if '__' in campo
+            }
+            indexar_lote(dependientes.select_related(*relacionados).iterator(chunk_size=500))
+    return True
+
+
+def indexar_lote(instancias, tamano_lote=500):
+    """
+    Reemplaza los términos de un conjunto de instancias (de un mismo modelo)
+    con un borrado y una inserción por lote
+
+    Retorna:
+    - Cantidad de instancias indexadas
+    """
+    cantidad = 0
+    lote = []
+
+    def guardar():
+        TerminoBusqueda.objects.filter(
+            modelo=lote[0]._meta.label_lower,
+            objeto_id__in=[instancia.pk for instancia in lote]
+        ).delete()
+        TerminoBusqueda.objects.bulk_create([
+            fila for instancia in lote for fila in _filas(instancia, terminos_instancia(instancia))
+        ])
+
+    for instancia in instancias:
+        lote.append(instancia)
+        if len(lote) >= tamano_lote:
+            guardar()
+            cantidad += len(lote)
+            lote = []
+    if lote:
+        guardar()
+        cantidad += len(lote)
+    return cantidad
+
+
+def eliminar(modelo, ids):
+    """
+    Elimina los términos de objetos borrados (p. ej. al archivarlos)
+    """
+    TerminoBusqueda.objects.filter(modelo=modelo._meta.label_lower, objeto_id__in=list(ids)).delete()
+
+
+def modelos_buscables():
+    """
+    Modelos instalados que declaran CAMPOS_BUSQUEDA
+    """
+    return [modelo for modelo in apps.get_models() if hasattr(modelo, 'CAMPOS_BUSQUEDA')]
+
+
+def reconstruir(modelo, tamano_lote=500):
+    """
+    Vuelve a generar todos los términos de un modelo, descartando los de
+    objetos que ya no existen
+
+    Retorna:
+    - Cantidad de objetos indexados
+    """
+    relacionados = {campo.rsplit('__', 1)[0] for campo in modelo.CAMPOS_BUSQUEDA if '__' in campo}
+    with transaction.atomic():
+        TerminoBusqueda.objects.filter(modelo=modelo._meta.label_lower).delete()
+        return indexar_lote(
+            modelo.objects.select_related(*relacionados).order_by('pk').iterator(chunk_size=tamano_lote),
+            tamano_lote
+        )
+
+
+def crear_indice_trigramas(alias='default'):
+    """
+    Instala pg_trgm y crea el índice GIN de trigramas sobre los términos,
+    con el que la búsqueda también encuentra subcadenas (solo PostgreSQL)
+
+    Lanza:
+    - ImproperlyConfigured si la base de datos no es PostgreSQL
+    """
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        raise ImproperlyConfigured('El índice de trigramas requiere PostgreSQL')
+    tabla = connection.ops.quote_name(TerminoBusqueda._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        cursor.execute(
+            f'CREATE INDEX IF NOT EXISTS termino_busqueda_trgm_idx ON {tabla} USING gin (termino gin_trgm_ops)'
+        )
+    _trigramas.pop(alias, None)
+
+
+def usa_trigramas(alias='default'):
+    """
+    Indica si la base de datos puede buscar subcadenas con el índice de
+    trigramas (PostgreSQL con la extensión pg_trgm)
+    """
+    if not getattr(settings, 'BUSQUEDA_TRIGRAMAS', True):
+        return False
+    if alias not in _trigramas:
+        connection = connections[alias]
+        disponible = False
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                disponible = cursor.fetchone() is not None
+        _trigramas[alias] = disponible
+    return _trigramas[alias]
+
+
+def _coincide(palabra, trigramas):
+    condicion = Q(termino__startswith=palabra)
+    if trigramas and len(palabra) >= LONGITUD_TRIGRAMA:
+        condicion |= Q(termino__contains=palabra)
+    return condicion
+
+
+def _coincidencias(modelo, palabras, campos, alias):
+    """
+    Términos del modelo que coinciden con alguna palabra, agrupados por
+    objeto, con una marca por palabra y la relevancia
+    """
+    trigramas = usa_trigramas(alias)
+    terminos_modelo = TerminoBusqueda.objects.using(alias).filter(modelo=modelo._meta.label_lower)
+    if campos:
+        terminos_modelo = terminos_modelo.filter(campo__in=list(campos))
+
+    cualquiera = Q()
+    marcas = {}
+    for posicion, palabra in enumerate(palabras):
+        condicion = _coincide(palabra, trigramas)
+        cualquiera |= condicion
+        marcas[f'palabra_{posicion}'] = Max(Case(When(condicion, then=Value(1)), default=Value(0)))
+
+    puntaje = [When(termino=palabra, then=Value(4)) for palabra in palabras]
+    puntaje += [When(termino__startswith=palabra, then=Value(2)) for palabra in palabras]
+    relevancia = Sum(F('peso') * Case(*puntaje, default=Value(1), output_field=IntegerField()))
+    return terminos_modelo.filter(cualquiera), marcas, relevancia
+
+
+def filtrar(queryset, texto, campos=None):
+    """
+    Filtra un QuerySet por las palabras de una búsqueda, sin cambiar su orden
+
+    Parámetros:
+    - queryset: QuerySet de un modelo con CAMPOS_BUSQUEDA
+    - texto: Texto buscado; si no tiene palabras no se filtra
+    - campos: Rutas de CAMPOS_BUSQUEDA en las que buscar (por defecto todas)
+
+    Retorna:
+    - QuerySet filtrado
+    """
+    palabras = palabras_consulta(texto)
+    if not palabras:
+        return queryset
+
+    coincidencias, marcas, _ = _coincidencias(queryset.model, palabras, campos, queryset.db)
+    objetos = coincidencias.values('objeto_id').annotate(**marcas).filter(
+        **{marca: 1 for marca in marcas}
+    ).values('objeto_id')
+    return queryset.filter(pk__in=Subquery(objetos))
+
+
+def filtrar_subcadena(queryset, texto, campo):
+    """
+    Filtra un QuerySet por un campo buscable de modo que el texto también
+    coincida como subcadena
+
+    Con el índice de trigramas se usa filtrar; sin él (SQLite, o
+    PostgreSQL sin pg_trgm) el índice solo encuentra palabras completas o
+    prefijos, así que se filtra con icontains sobre la columna.
+
+    Parámetros:
+    - queryset: QuerySet de un modelo con CAMPOS_BUSQUEDA
+    - texto: Texto buscado
+    - campo: Ruta de CAMPOS_BUSQUEDA en la que buscar
+
+    Retorna:
+    - QuerySet filtrado
+    """
+    if usa_trigramas(queryset.db):
+        return filtrar(queryset, texto, campos=[campo])
+    return queryset.filter(**{f'{campo}__icontains': texto})
+
+
+def buscar(queryset, texto, campos=None):
+    """
+    Filtra un QuerySet por las palabras de una búsqueda y anota su relevancia
+
+    Parámetros:
+    - queryset: QuerySet de un modelo con CAMPOS_BUSQUEDA
+    - texto: Texto buscado; si no tiene palabras no se filtra
+    - campos: Rutas de CAMPOS_BUSQUEDA en las que buscar (por defecto todas)
+
+    Retorna:
+    - QuerySet filtrado con la anotación relevancia (0 si no se filtró)
+    """
+    palabras = palabras_consulta(texto)
+    if not palabras:
+        return queryset.annotate(relevancia=Value(0, output_field=IntegerField()))
+
+    coincidencias, _, relevancia = _coincidencias(queryset.model, palabras, campos, queryset.db)
+    puntaje = coincidencias.filter(objeto_id=OuterRef('pk')).values('objeto_id').annotate(
+        relevancia=relevancia
+    ).values('relevancia')
+    return filtrar(queryset, texto, campos).annotate(
+        relevancia=Subquery(puntaje, output_field=IntegerField())
+    )
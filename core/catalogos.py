@@ -0,0 +1,189 @@
+# core/catalogos.py
+"""
+Caché de catálogos pequeños (tipos de documento, errores de validación,
+establecimientos) en dos niveles.
+
+1. Un LRU en memoria de cada proceso.
+2. La caché compartida de Django (alias CATALOGOS_CACHE), común a todos
+   los workers.
+
+Las entradas de ambos niveles llevan la versión del catálogo, un contador
+guardado en la base de datos (VersionCatalogo). Al modificar un catálogo
+se incrementa la versión en la misma transacción y, al confirmarse, se
+publica en la caché compartida. Cada lectura compara la versión publicada,
+por lo que todos los procesos ven el cambio en la siguiente solicitud. En
+régimen estable ninguna lectura consulta la base de datos.
+
+Con una caché local al proceso (LocMemCache, la de desarrollo) otro
+proceso no podría publicar la versión: cada proceso la lee de la base de
+datos y la recuerda CATALOGOS_VERSION_TTL segundos, por lo que los cambios
+de otros procesos se ven con ese retraso como máximo. Los del mismo
+proceso se ven de inmediato.
+
+Los objetos devueltos se comparten entre solicitudes y no deben
+modificarse.
+"""
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models import F
+
+from .models import VersionCatalogo
+
+
+_CLAVE_VERSION = 'catalogo:{nombre}:version'
+_CLAVE_VALOR = 'catalogo:{nombre}:{version}:{clave}'
+
+
+def _cache():
+    return caches[getattr(settings, 'CATALOGOS_CACHE', 'default')]
+
+
+# Versiones leídas de la base de datos cuando la caché es local al proceso:
+# {nombre: (version, vencimiento)}
+_versiones = {}
+
+
+def _version_bd(nombre):
+    version = VersionCatalogo.objects.filter(nombre=nombre).values_list('version', flat=True).first()
+    return version or 0
+
+
+def _recordar_version(nombre):
+    version = _version_bd(nombre)
+    _versiones[nombre] = (version, time.monotonic() + getattr(settings, 'CATALOGOS_VERSION_TTL', 5))
+    return version
+
+
+def incrementar_version(nombre):
+    """
+    Incrementa la versión del catálogo en la transacción actual y la publica
+    en la caché compartida al confirmarse
+    """
+    if not VersionCatalogo.objects.filter(nombre=nombre).update(version=F('version') + 1):
+        VersionCatalogo.objects.get_or_create(nombre=nombre)
+        VersionCatalogo.objects.filter(nombre=nombre).update(version=F('version') + 1)
+    # Este proceso lee la versión nueva desde ya, también dentro de la transacción
+    _versiones.pop(nombre, None)
+
+    def publicar():
+        version = _recordar_version(nombre)
+        _cache().set(_CLAVE_VERSION.format(nombre=nombre), version, None)
+
+    transaction.on_commit(publicar)
+
+
+def version_vigente(nombre):
+    """
+    Versión vigente: la publicada en la caché compartida o, si no está, la
+    de la base de datos. Con una caché local al proceso, la de la base de
+    datos leída hace menos de CATALOGOS_VERSION_TTL segundos.
+    """
+    cache = _cache()
+    if isinstance(cache, LocMemCache):
+        version, vencimiento = _versiones.get(nombre, (None, 0))
+        if time.monotonic() < vencimiento:
+            return version
+        return _recordar_version(nombre)
+    clave = _CLAVE_VERSION.format(nombre=nombre)
+    version = cache.get(clave)
+    if version is None:
+        version = _version_bd(nombre)
+        # add no pisa una versión publicada mientras se leía la base de datos
+        cache.add(clave, version, None)
+    return version
+
+
+class _LRU:
+    """
+    Diccionario limitado a las entradas usadas más recientemente
+    """
+
+    def __init__(self, tamano):
+        self.tamano = tamano
+        self.entradas = OrderedDict()
+        self.lock = Lock()
+
+    def obtener(self, clave, defecto=None):
+        with self.lock:
+            if clave not in self.entradas:
+                return defecto
+            self.entradas.move_to_end(clave)
+            return self.entradas[clave]
+
+    def guardar(self, clave, valor):
+        with self.lock:
+            self.entradas[clave] = valor
+            self.entradas.move_to_end(clave)
+            while len(self.entradas) > self.tamano:
+                self.entradas.popitem(last=False)
+
+
+_local = _LRU(getattr(settings, 'CATALOGOS_LRU', 256))
+_SIN_VALOR = object()
+
+# Catálogos declarados, por nombre
+_catalogos = {}
+
+
+def catalogos():
+    """
+    Catálogos declarados por las aplicaciones instaladas, por nombre
+    """
+    return dict(_catalogos)
+
+
+class Catalogo:
+    """
+    Catálogo en caché cargado por una función
+
+    Parámetros:
+    - nombre: Nombre del catálogo, usado en las claves y en VersionCatalogo
+    - cargar: Función que lee el catálogo de la base de datos; recibe la
+      clave de obtener() (p. ej. el id del contribuyente) y debe devolver un
+      valor que se pueda serializar con pickle
+    """
+
+    def __init__(self, nombre, cargar):
+        self.nombre = nombre
+        self.cargar = cargar
+        _catalogos[nombre] = self
+
+    def version(self):
+        return version_vigente(self.nombre)
+
+    def obtener(self, *clave):
+        """
+        Retorna:
+        - El catálogo (para la clave indicada) de la versión vigente
+        """
+        version = self.version()
+        clave_local = (self.nombre, version, clave)
+        valor = _local.obtener(clave_local, _SIN_VALOR)
+        if valor is not _SIN_VALOR:
+            return valor
+
+        cache = _cache()
+        clave_compartida = _CLAVE_VALOR.format(
+            nombre=self.nombre, version=version, clave=':'.join(str(parte) for parte in clave)
+        )
+        valor = cache.get(clave_compartida, _SIN_VALOR)
+        if valor is _SIN_VALOR:
+            valor = self.cargar(*clave)
+            cache.set(clave_compartida, valor, getattr(settings, 'CATALOGOS_TIMEOUT', 24 * 60 * 60))
+        _local.guardar(clave_local, valor)
+        return valor
+
+    def invalidar(self):
+        """
+        Descarta el catálogo en todos los procesos (se llama desde las
+        señales post_save y post_delete de los modelos del catálogo;
+        después de modificarlos con update(), bulk_create o loaddata se usa
+        el comando invalidar_catalogos)
+        """
+        incrementar_version(self.nombre)
@@ -0,0 +1,69 @@
+# core/management/commands/benchmark_nit.py
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.validators import NIT_VALIDO, analizar_nit, validate_nits
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara la validación de NIT uno por uno (sin y con memoria LRU) '
+        'contra la validación vectorizada validate_nits'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cantidad', type=int, default=1000000, help='Cantidad de NIT a validar')
+        parser.add_argument(
+            '--distintos', type=int, default=2000,
+            help='Cantidad de NIT distintos entre los generados (afecta a la memoria LRU)'
+        )
+        parser.add_argument('--semilla', type=int, default=2024, help='Semilla del generador aleatorio')
+
+    def handle(self, *args, **options):
+        cantidad = options['cantidad']
+        distintos = options['distintos']
+        if cantidad < 1 or distintos < 1:
+            raise CommandError('La cantidad de NIT debe ser mayor que cero')
+
+        aleatorio = random.Random(options['semilla'])
+        base = [self._nit_aleatorio(aleatorio) for _ in range(min(distintos, cantidad))]
+        nits = [aleatorio.choice(base) for _ in range(cantidad)]
+        self.stdout.write(f'NIT generados: {cantidad} ({len(set(nits))} distintos)')
+
+        # Función original: cálculo completo en cada llamada
+        sin_memoria = analizar_nit.__wrapped__
+        inicio = time.perf_counter()
+        esperado = [sin_memoria(nit)[0] == NIT_VALIDO for nit in nits]
+        duracion_original = time.perf_counter() - inicio
+        self._reportar('analizar_nit sin memoria (validate_nit original)', cantidad, duracion_original)
+
+        analizar_nit.cache_clear()
+        inicio = time.perf_counter()
+        memoria = [analizar_nit(nit)[0] == NIT_VALIDO for nit in nits]
+        duracion = time.perf_counter() - inicio
+        self._reportar('analizar_nit con memoria LRU', cantidad, duracion, duracion_original)
+        self.stdout.write(f'  {analizar_nit.cache_info()}')
+
+        inicio = time.perf_counter()
+        validos, esperados = validate_nits(nits)
+        duracion = time.perf_counter() - inicio
+        self._reportar('validate_nits vectorizado', cantidad, duracion, duracion_original)
+
+        if memoria != esperado or validos.tolist() != esperado:
+            raise CommandError('Los resultados de las implementaciones no coinciden')
+
+        self.stdout.write(self.style.SUCCESS(f'Resultados idénticos: {sum(esperado)} NIT válidos'))
+
+    def _nit_aleatorio(self, aleatorio):
+        cuerpo = str(aleatorio.randint(100000, 99999999))
+        verificador = aleatorio.choice('0123456789K')
+        separador = aleatorio.choice(['', '-'])
+        return f'{cuerpo}{separador}{verificador}'
+
+    def _reportar(self, nombre, cantidad, duracion, referencia=None):
+        linea = f'{nombre}: {duracion:.3f} s ({cantidad / duracion:,.0f} NIT/s)'
+        if referencia:
+            linea += f', {referencia / duracion:.1f}x'
+        self.stdout.write(linea)
@@ -0,0 +1,47 @@
+# core/management/commands/indexar_busqueda.py
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from core import busqueda
+
+
+class Command(BaseCommand):
+    help = (
+        'Reconstruye el índice de búsqueda de los modelos buscables y, en '
+        'PostgreSQL, crea el índice de trigramas para buscar subcadenas'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modelo', action='append', dest='modelos', default=[],
+            help='Reconstruir solo el modelo indicado (p. ej. emisor.documentotributario)'
+        )
+        parser.add_argument('--lote', type=int, default=500, help='Objetos por lote')
+        parser.add_argument(
+            '--trigramas', action='store_true',
+            help='Instalar pg_trgm y crear el índice GIN de trigramas (PostgreSQL)'
+        )
+
+    def handle(self, *args, **options):
+        if options['lote'] < 1:
+            raise CommandError('El tamaño del lote debe ser mayor que cero')
+
+        modelos = {modelo._meta.label_lower: modelo for modelo in busqueda.modelos_buscables()}
+        desconocidos = {nombre.lower() for nombre in options['modelos']} - set(modelos)
+        if desconocidos:
+            raise CommandError(f'Modelos no buscables: {", ".join(sorted(desconocidos))}')
+        if options['modelos']:
+            modelos = {nombre: modelos[nombre] for nombre in (n.lower() for n in options['modelos'])}
+
+        if options['trigramas']:
+            try:
+                busqueda.crear_indice_trigramas()
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+            self.stdout.write('Índice de trigramas creado')
+
+        for nombre, modelo in modelos.items():
+            cantidad = busqueda.reconstruir(modelo, options['lote'])
+            self.stdout.write(f'{nombre}: {cantidad} objetos indexados')
+
+        self.stdout.write(self.style.SUCCESS('Índice de búsqueda al día'))
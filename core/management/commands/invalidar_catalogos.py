@@ -0,0 +1,29 @@
+# core/management/commands/invalidar_catalogos.py
+from django.core.management.base import BaseCommand, CommandError
+
+from core import catalogos
+
+
+class Command(BaseCommand):
+    help = (
+        'Invalida los catálogos en caché en todos los procesos; necesario '
+        'después de modificarlos sin save() (loaddata, update() o bulk_create)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--catalogo', action='append', dest='nombres', default=[],
+            help='Invalidar solo el catálogo indicado (p. ej. tipos_documento)'
+        )
+
+    def handle(self, *args, **options):
+        declarados = catalogos.catalogos()
+        desconocidos = set(options['nombres']) - set(declarados)
+        if desconocidos:
+            raise CommandError(f'Catálogos desconocidos: {", ".join(sorted(desconocidos))}')
+
+        for nombre in options['nombres'] or sorted(declarados):
+            declarados[nombre].invalidar()
+            self.stdout.write(f'{nombre}: versión {declarados[nombre].version()}')
+
+        self.stdout.write(self.style.SUCCESS('Catálogos invalidados'))
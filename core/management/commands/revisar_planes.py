@@ -0,0 +1,65 @@
+# core/management/commands/revisar_planes.py
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+
+from core.planes import cargar_consultas_frecuentes, recorridos_secuenciales
+
+
+class Command(BaseCommand):
+    help = (
+        'Ejecuta EXPLAIN sobre las consultas frecuentes registradas y falla si '
+        'alguna recorre secuencialmente una tabla con más filas que el umbral'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--umbral', type=int, default=getattr(settings, 'CONSULTAS_UMBRAL_RECORRIDO', 10000),
+            help='Filas a partir de las cuales un recorrido secuencial se considera un error'
+        )
+        parser.add_argument(
+            '--consulta', action='append', dest='consultas', default=[],
+            help='Revisar solo la consulta indicada (se puede repetir)'
+        )
+        parser.add_argument('--plan', action='store_true', help='Mostrar el plan de cada consulta')
+
+    def handle(self, *args, **options):
+        consultas = cargar_consultas_frecuentes()
+
+        desconocidas = set(options['consultas']) - set(consultas)
+        if desconocidas:
+            raise CommandError(f'Consultas no registradas: {", ".join(sorted(desconocidas))}')
+        if options['consultas']:
+            consultas = {nombre: consultas[nombre] for nombre in options['consultas']}
+
+        umbral = options['umbral']
+        filas_por_tabla = {}
+        fallidas = []
+
+        for nombre, consulta in consultas.items():
+            try:
+                plan, recorridos = recorridos_secuenciales(consulta(), filas_por_tabla)
+            except ImproperlyConfigured as e:
+                raise CommandError(str(e))
+
+            excedidos = [(tabla, filas) for tabla, filas in recorridos if filas > umbral]
+            if excedidos:
+                fallidas.append(nombre)
+                detalle = ', '.join(f'{tabla} ({filas} filas)' for tabla, filas in excedidos)
+                self.stdout.write(self.style.ERROR(f'{nombre}: recorrido secuencial de {detalle}'))
+            elif recorridos:
+                detalle = ', '.join(f'{tabla} ({filas} filas)' for tabla, filas in recorridos)
+                self.stdout.write(self.style.WARNING(f'{nombre}: recorrido secuencial bajo el umbral de {detalle}'))
+            else:
+                self.stdout.write(f'{nombre}: OK')
+
+            if options['plan']:
+                for linea in plan.splitlines():
+                    self.stdout.write(f'    {linea}')
+
+        if fallidas:
+            raise CommandError(
+                f'{len(fallidas)} de {len(consultas)} consultas recorren tablas de más de {umbral} filas'
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'{len(consultas)} consultas revisadas sin recorridos secuenciales sobre el umbral'))
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(max_length=100)),
+                ('objeto_id', models.BigIntegerField()),
+                ('campo', models.CharField(max_length=100)),
+                ('termino', models.CharField(max_length=40)),
+                ('peso', models.PositiveSmallIntegerField(default=1)),
+            ],
+            options={
+                'verbose_name': 'Término de búsqueda',
+                'verbose_name_plural': 'Términos de búsqueda',
+                'indexes': [models.Index(fields=['modelo', 'termino'], name='termino_busqueda_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']), models.Index(fields=['modelo', 'objeto_id'], name='termino_objeto_idx')],
+            },
+        ),
+    ]
@@ -1,5 +1,7 @@
 # core/models.py
+from django.apps import apps
 from django.db import models
+from django.utils import timezone
 
 
 class TimeStampedModel(models.Model):
@@ -13,52 +15,167 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
-# core/validators.py
-from django.core.exceptions import ValidationError
-from django.utils.translation import gettext_lazy as _
+class DiaLocalField(models.DateField):
+    """
+    Fecha local (según la zona horaria activa) de otro DateTimeField del modelo
+
+    Se calcula en pre_save, igual que auto_now, por lo que se mantiene al
+    día tanto en save() como en bulk_create. Permite filtrar por día con una
+    comparación directa sobre una columna indexada en lugar de
+    ``campo__date``, que aplica una conversión sobre cada fila.
+
+    Parámetros:
+    - origen: Nombre del DateTimeField del que se deriva la fecha
+    """
+
+    def __init__(self, *args, origen=None, **kwargs):
+        self.origen = origen
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['origen'] = self.origen
+        if kwargs.get('editable') is False:
+            del kwargs['editable']
+        return name, path, args, kwargs
+
+    def calcular(self, model_instance):
+        """
+        Retorna la fecha local del campo de origen de la instancia
+        """
+        valor = getattr(model_instance, self.origen)
+        if valor is None:
+            return None
+        if timezone.is_aware(valor):
+            return timezone.localdate(valor)
+        return valor.date()
+
+    def pre_save(self, model_instance, add):
+        valor = self.calcular(model_instance)
+        setattr(model_instance, self.attname, valor)
+        return valor
+
 
+class DiaRelacionadoField(models.DateField):
+    """
+    Copia del día de emisión del objeto relacionado por una llave foránea
+
+    Las tablas hijas de los documentos (líneas, autorizaciones, tareas,
+    errores) guardan el día de su documento para poder particionarse por
+    mes igual que él y referirlo con una llave foránea compuesta
+    (documento_id, dia_emision). Se copia en pre_save, por lo que también
+    se llena en bulk_create, cuando el objeto relacionado está cargado en
+    la instancia o el valor aún no existe. Si el día del documento cambia,
+    propagar_dia_relacionado actualiza las copias.
 
-def validate_nit(value):
+    Parámetros:
+    - relacion: Nombre de la llave foránea de la que se copia el día
+    - origen: Campo de día del objeto relacionado
     """
-    Valida un NIT según el algoritmo:
-    1. Multiplique cada carácter por su posición respectiva (siendo la posición 1 el carácter más a la derecha), excepto el último
-    2. Sume todos los resultados
-    3. Obtenga el módulo 11 de la sumatoria
-    4. A 11 réstale el resultado obtenido en el punto 3
-    5. Calcule el módulo 11 del resultado obtenido en el punto 4, si este resultado es 10, entonces el dígito verificador del NIT deberá ser K
+
+    def __init__(self, *args, relacion=None, origen='dia_emision', **kwargs):
+        self.relacion = relacion
+        self.origen = origen
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['relacion'] = self.relacion
+        if self.origen != 'dia_emision':
+            kwargs['origen'] = self.origen
+        if kwargs.get('editable') is False:
+            del kwargs['editable']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        campo = model_instance._meta.get_field(self.relacion)
+        if campo.is_cached(model_instance) or getattr(model_instance, self.attname) is None:
+            relacionado = getattr(model_instance, self.relacion)
+            if relacionado is not None:
+                setattr(model_instance, self.attname, getattr(relacionado, self.origen))
+        return getattr(model_instance, self.attname)
+
+
+def propagar_dia_relacionado(modelo, ids, using=None):
     """
-    # Elimina guiones y otros caracteres especiales
-    nit_limpio = ''.join(c for c in value if c.isalnum())
-    
-    # Verificamos que el NIT tenga al menos 2 caracteres
-    if len(nit_limpio) < 2:
-        raise ValidationError(
-            _('El NIT debe tener al menos 2 caracteres'),
-        )
-    
-    # Separamos el dígito verificador
-    digito_verificador = nit_limpio[-1].upper()
-    cuerpo = nit_limpio[:-1]
-    
-    # Verificamos que el cuerpo sea numérico
-    if not cuerpo.isdigit():
-        raise ValidationError(
-            _('El NIT debe contener solo números y el dígito verificador'),
-        )
-    
-    # Calculamos el dígito verificador
-    suma = 0
-    for i, digito in enumerate(reversed(cuerpo)):
-        suma += int(digito) * (i + 2)
-    
-    modulo = suma % 11
-    resultado = 11 - modulo
-    resultado_final = resultado % 11
-    
-    # Convertimos 10 a 'K' para comparar
-    digito_esperado = 'K' if resultado_final == 10 else str(resultado_final)
-    
-    if digito_verificador != digito_esperado:
-        raise ValidationError(
-            _(f'El dígito verificador del NIT es incorrecto. Debería ser {digito_esperado}'),
-        )
\ No newline at end of file
+    Actualiza el día copiado (DiaRelacionadoField) en los objetos que
+    dependen de los objetos indicados, y en los que dependen de estos
+
+    Se usa cuando el día cambia con update o bulk_update, que no pasan por
+    los objetos relacionados. En PostgreSQL con las tablas particionadas la
+    llave foránea compuesta ya propaga el cambio (ON UPDATE CASCADE) y las
+    actualizaciones no encuentran filas distintas.
+
+    Parámetros:
+    - modelo: Modelo cuyo día cambió
+    - ids: Identificadores de los objetos modificados
+    - using: Alias de la base de datos
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    for dependiente in apps.get_models():
+        for campo in dependiente._meta.concrete_fields:
+            if not isinstance(campo, DiaRelacionadoField):
+                continue
+            relacion = dependiente._meta.get_field(campo.relacion)
+            if relacion.related_model is not modelo:
+                continue
+            objetos = dependiente._default_manager.using(using).filter(**{f'{relacion.attname}__in': ids})
+            objetos.update(**{campo.attname: models.Subquery(
+                modelo._default_manager.filter(pk=models.OuterRef(relacion.attname)).values(campo.origen)[:1]
+            )})
+            propagar_dia_relacionado(dependiente, objetos.values_list('pk', flat=True), using)
+
+
+class TerminoBusqueda(models.Model):
+    """
+    Índice invertido de búsqueda: un término normalizado de un campo de un
+    objeto, con el peso del campo
+
+    Lo mantiene core.busqueda al guardar los modelos con CAMPOS_BUSQUEDA; la
+    búsqueda filtra por prefijo del término (y, en PostgreSQL con pg_trgm,
+    por subcadena) usando índices en lugar de recorrer las tablas.
+    """
+    modelo = models.CharField(max_length=100)
+    objeto_id = models.BigIntegerField()
+    campo = models.CharField(max_length=100)
+    termino = models.CharField(max_length=40)
+    peso = models.PositiveSmallIntegerField(default=1)
+
+    class Meta:
+        verbose_name = "Término de búsqueda"
+        verbose_name_plural = "Términos de búsqueda"
+        indexes = [
+            # Búsqueda por término exacto o prefijo (LIKE 'x%' en PostgreSQL)
+            models.Index(
+                fields=['modelo', 'termino'],
+                name='termino_busqueda_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops']
+            ),
+            # Reemplazo de los términos de un objeto al guardarlo
+            models.Index(fields=['modelo', 'objeto_id'], name='termino_objeto_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo}:{self.objeto_id} {self.campo}={self.termino}"
+
+
+class VersionCatalogo(models.Model):
+    """
+    Versión de un catálogo en caché (core.catalogos)
+
+    Se incrementa en la misma transacción que modifica el catálogo; las
+    entradas en caché de una versión anterior dejan de usarse.
+    """
+    nombre = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Versión de catálogo"
+        verbose_name_plural = "Versiones de catálogos"
+
+    def __str__(self):
+        return f"{self.nombre} v{self.version}"
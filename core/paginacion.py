@@ -0,0 +1,213 @@
+# core/paginacion.py
+"""
+Paginación por cursor (keyset) y conteo estimado para listados grandes.
+
+La paginación por cursor ordena por un campo de fecha y por id, ambos
+descendentes, y cada página filtra a partir de la última fila de la
+anterior, por lo que cualquier página cuesta lo mismo que la primera y no
+se necesita COUNT(*). El cursor es opaco para el cliente: codifica el valor
+del campo y el id de la fila límite, y la dirección.
+
+El paginador con conteo estimado mantiene la paginación por número de
+página pero, en tablas grandes de PostgreSQL y sin filtros, toma el total
+de la estimación del planificador en lugar de contar las filas.
+"""
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .planes import filas_estimadas
+
+
+class CursorInvalido(ValueError):
+    """
+    El cursor recibido no se puede decodificar
+    """
+
+
+def codificar_cursor(valor, pk, atras=False):
+    # isoformat conserva los microsegundos, necesarios para comparar fechas iguales
+    valor = valor.isoformat() if valor is not None else None
+    contenido = json.dumps([valor, pk, atras], separators=(',', ':'))
+    return base64.urlsafe_b64encode(contenido.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """
+    Retorna:
+    - Tupla (valor, pk, atras); valor es datetime o None
+
+    Lanza:
+    - CursorInvalido si el cursor está mal formado
+    """
+    try:
+        contenido = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valor, pk, atras = json.loads(contenido)
+        if valor is not None:
+            valor = parse_datetime(valor)
+            if valor is None:
+                raise ValueError(cursor)
+        return valor, int(pk), bool(atras)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise CursorInvalido(f'Cursor inválido: {cursor}')
+
+
+def _ordenar(queryset, campo, atras):
+    """
+    Ordena por (campo, id) descendentes, o ascendentes al retroceder, tal
+    como los recorre un índice sobre (campo, id)
+    """
+    if atras:
+        return queryset.order_by(campo, 'pk')
+    return queryset.order_by(f'-{campo}', '-pk')
+
+
+def _siguientes(queryset, campo, valor, pk, atras):
+    """
+    Condición de las filas que siguen a (valor, pk) en la dirección de recorrido
+
+    Si el campo admite nulos, estos quedan donde los ordena el motor: al
+    inicio del orden descendente en PostgreSQL y al final en SQLite.
+    """
+    comparacion = 'gt' if atras else 'lt'
+    siguiente_id = Q(**{f'pk__{comparacion}': pk})
+
+    if not queryset.model._meta.get_field(campo).null:
+        return Q(**{f'{campo}__{comparacion}': valor}) | Q(Q(**{campo: valor}), siguiente_id)
+
+    nulos_mayores = connections[queryset.db].features.nulls_order_largest
+    # Los nulos quedan al final del recorrido si son mayores y se avanza hacia los menores, o viceversa
+    nulos_al_final = nulos_mayores == atras
+    if valor is None:
+        condicion = Q(Q(**{f'{campo}__isnull': True}), siguiente_id)
+        if not nulos_al_final:
+            condicion |= Q(**{f'{campo}__isnull': False})
+        return condicion
+
+    condicion = Q(**{f'{campo}__{comparacion}': valor}) | Q(Q(**{campo: valor}), siguiente_id)
+    if nulos_al_final:
+        condicion |= Q(**{f'{campo}__isnull': True})
+    return condicion
+
+
+def _clave(fila, campo):
+    # Admite instancias y diccionarios de values()
+    if isinstance(fila, dict):
+        return fila[campo], fila['id']
+    return getattr(fila, campo), fila.pk
+
+
+def paginar_por_cursor(queryset, campo, cursor=None, tamano=20):
+    """
+    Obtiene una página de un QuerySet ordenado por (campo, id) descendentes
+
+    Parámetros:
+    - queryset: QuerySet ya filtrado; su orden se reemplaza
+    - campo: Campo de fecha del orden (p. ej. 'fecha_emision')
+    - cursor: Cursor recibido (None para la primera página)
+    - tamano: Filas por página
+
+    Retorna:
+    - Tupla (filas, cursor_siguiente, cursor_anterior); los cursores son
+      None si no hay página en esa dirección
+
+    Lanza:
+    - CursorInvalido si el cursor está mal formado
+    """
+    atras = False
+    if cursor:
+        valor, pk, atras = decodificar_cursor(cursor)
+        queryset = queryset.filter(_siguientes(queryset, campo, valor, pk, atras))
+
+    filas = list(_ordenar(queryset, campo, atras)[:tamano + 1])
+    hay_mas = len(filas) > tamano
+    filas = filas[:tamano]
+    if atras:
+        filas.reverse()
+
+    siguiente = anterior = None
+    if filas:
+        # Al retroceder siempre queda la página de la que se vino
+        if (hay_mas and not atras) or (atras and cursor):
+            siguiente = codificar_cursor(*_clave(filas[-1], campo))
+        if (hay_mas and atras) or (cursor and not atras):
+            anterior = codificar_cursor(*_clave(filas[0], campo), atras=True)
+    return filas, siguiente, anterior
+
+
+def contar(queryset):
+    """
+    Total de filas de un QuerySet para paginar por número de página
+
+    Solo un QuerySet sin filtros usa la estimación del planificador, y solo
+    a partir de PAGINACION_CONTEO_ESTIMADO_DESDE filas: con filtros la
+    estimación depende de las estadísticas de cada condición y puede
+    alejarse mucho del total real.
+
+    Retorna:
+    - Cantidad de filas, estimada o exacta (COUNT(*))
+    """
+    if not queryset.query.where:
+        estimadas = filas_estimadas(queryset)
+        umbral = getattr(settings, 'PAGINACION_CONTEO_ESTIMADO_DESDE', 100000)
+        if estimadas is not None and estimadas >= umbral:
+            return estimadas
+    return queryset.count()
+
+
+class PaginadorEstimado(Paginator):
+    """
+    Paginador que, en listados sin filtros de más de
+    PAGINACION_CONTEO_ESTIMADO_DESDE filas estimadas, usa la estimación del
+    planificador como total en lugar de COUNT(*) (ver contar)
+    """
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            return contar(self.object_list)
+        return super().count
+
+
+class PaginacionCursorMixin:
+    """
+    Mixin de ListView que pagina por cursor cuando la URL lo pide
+    (?paginacion=cursor o ?cursor=...) y, si no, por número de página con
+    conteo estimado
+
+    El contexto incluye cursor_siguiente y cursor_anterior; page_obj y
+    paginator son None al paginar por cursor.
+    """
+    paginator_class = PaginadorEstimado
+    campo_cursor = 'fecha_emision'
+
+    def usa_cursor(self):
+        return 'cursor' in self.request.GET or self.request.GET.get('paginacion') == 'cursor'
+
+    def paginate_queryset(self, queryset, page_size):
+        if not self.usa_cursor():
+            return super().paginate_queryset(queryset, page_size)
+
+        try:
+            filas, self.cursor_siguiente, self.cursor_anterior = paginar_por_cursor(
+                queryset, self.campo_cursor, self.request.GET.get('cursor'), page_size
+            )
+        except CursorInvalido:
+            # Un cursor alterado vuelve a la primera página
+            filas, self.cursor_siguiente, self.cursor_anterior = paginar_por_cursor(
+                queryset, self.campo_cursor, None, page_size
+            )
+        return None, None, filas, bool(self.cursor_siguiente or self.cursor_anterior)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['cursor_siguiente'] = getattr(self, 'cursor_siguiente', None)
+        context['cursor_anterior'] = getattr(self, 'cursor_anterior', None)
+        return context
@@ -0,0 +1,127 @@
+# core/planes.py
+"""
+Registro de las consultas frecuentes del sistema y revisión de sus planes
+de ejecución.
+
+Cada aplicación declara sus consultas frecuentes en un módulo
+``consultas_frecuentes.py`` con el decorador ``consulta_frecuente``; la
+función registrada retorna el QuerySet tal como lo arman las vistas y los
+servicios. El comando ``revisar_planes`` ejecuta EXPLAIN sobre cada una y
+falla si alguna recorre secuencialmente una tabla grande.
+"""
+import json
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.utils.module_loading import autodiscover_modules
+
+
+CONSULTAS_FRECUENTES = {}
+
+# Recorridos completos de tabla en el plan de cada motor
+_RECORRIDO_POSTGRESQL = re.compile(r'Seq Scan on (\w+)')
+_RECORRIDO_SQLITE = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+# Alias de las subconsultas de Django (FROM "tabla" U0), que SQLite muestra en el plan
+_ALIAS_TABLA = re.compile(r'"(\w+)" (U\d+)\b')
+
+
+def consulta_frecuente(nombre):
+    """
+    Registra una función sin argumentos que retorna un QuerySet frecuente
+    """
+    def registrar(funcion):
+        CONSULTAS_FRECUENTES[nombre] = funcion
+        return funcion
+    return registrar
+
+
+def cargar_consultas_frecuentes():
+    """
+    Importa los módulos consultas_frecuentes de las aplicaciones instaladas
+
+    Retorna:
+    - Diccionario {nombre: función} ordenado por nombre
+    """
+    autodiscover_modules('consultas_frecuentes')
+    return dict(sorted(CONSULTAS_FRECUENTES.items()))
+
+
+def _filas_tabla(connection, tabla, cache):
+    """
+    Cantidad (estimada en PostgreSQL) de filas de una tabla
+    """
+    if tabla not in cache:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [tabla])
+                fila = cursor.fetchone()
+                cache[tabla] = max(fila[0], 0) if fila else 0
+            else:
+                cursor.execute(f'SELECT COUNT(*) FROM {connection.ops.quote_name(tabla)}')
+                cache[tabla] = cursor.fetchone()[0]
+    return cache[tabla]
+
+
+def filas_estimadas(queryset):
+    """
+    Filas que el planificador estima para un QuerySet, sin ejecutarlo
+
+    Retorna:
+    - Cantidad estimada, o None si el motor no da estimaciones (solo
+      PostgreSQL las da)
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    plan = json.loads(queryset.order_by().explain(format='json'))
+    # Según el driver, el plan llega como lista de un elemento o como el elemento
+    if isinstance(plan, list):
+        plan = plan[0]
+    return int(plan['Plan']['Plan Rows'])
+
+
+def recorridos_secuenciales(queryset, cache=None):
+    """
+    Ejecuta EXPLAIN sobre un QuerySet y detecta los recorridos secuenciales
+
+    Parámetros:
+    - queryset: QuerySet a revisar
+    - cache: Diccionario opcional {tabla: filas} compartido entre consultas
+
+    Retorna:
+    - Tupla (plan, recorridos) con el texto del plan y la lista de tuplas
+      (tabla, filas) de las tablas recorridas completas
+
+    Lanza:
+    - ImproperlyConfigured si el motor no es PostgreSQL ni SQLite
+    """
+    connection = connections[queryset.db]
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        raise ImproperlyConfigured(
+            f'La revisión de planes no está disponible para {connection.vendor}'
+        )
+
+    if cache is None:
+        cache = {}
+
+    plan = queryset.explain()
+    tablas = set(connection.introspection.table_names())
+    alias = {alias: tabla for tabla, alias in _ALIAS_TABLA.findall(str(queryset.query))}
+    recorridos = []
+
+    for linea in plan.splitlines():
+        if connection.vendor == 'postgresql':
+            coincidencia = _RECORRIDO_POSTGRESQL.search(linea)
+        else:
+            # Formato de Django para SQLite: "id padre no_usado detalle"
+            partes = linea.split(' ', 3)
+            coincidencia = _RECORRIDO_SQLITE.match(partes[-1]) if len(partes) == 4 else None
+
+        if coincidencia is None:
+            continue
+        tabla = alias.get(coincidencia.group(1), coincidencia.group(1))
+        if tabla in tablas:
+            recorridos.append((tabla, _filas_tabla(connection, tabla, cache)))
+
+    return plan, recorridos
@@ -1,3 +1,201 @@
-from django.test import TestCase
+import os
+import random
+import shutil
+import tempfile
+import time
+from decimal import Decimal
+from unittest import mock, skipIf
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core import busqueda, catalogos
+from core.validators import NIT_VALIDO, analizar_nit, validate_nits
+
+
+def nit_valido(cuerpo):
+    """
+    Retorna:
+    - El NIT con el dígito verificador correcto para el cuerpo indicado
+    """
+    suma = sum(int(digito) * (i + 2) for i, digito in enumerate(reversed(str(cuerpo))))
+    resultado = (11 - suma % 11) % 11
+    return f"{cuerpo}{'K' if resultado == 10 else resultado}"
+
+
+class EscenarioMixin:
+    """
+    Datos mínimos para emitir y autorizar documentos: un usuario, un emisor
+    con su establecimiento, un receptor, un tipo de documento y los errores
+    de validación
+
+    Cada prueba empieza con las cachés de proceso (y las versiones de
+    catálogo recordadas) vacías y su propio archivo de directorio de NIT:
+    las versiones de los catálogos se repiten entre pruebas porque cada una
+    deshace su transacción.
+
+    Incluye todas las conexiones: los correlativos de autorización se
+    reservan en la conexión AUTORIZACION_SECUENCIA_DB si está configurada.
+    """
+    databases = '__all__'
+
+    @classmethod
+    def setUpTestData(cls):
+        from accounts.models import CustomUser
+        from autoriza.models import ErrorValidacion
+        from emisor.models import Contribuyente, Establecimiento, TipoDocumento
+
+        ErrorValidacion.objects.bulk_create([
+            ErrorValidacion(codigo=codigo, descripcion=descripcion)
+            for codigo, descripcion in ErrorValidacion.TIPOS
+        ])
+        cls.usuario = CustomUser.objects.create_user(
+            'emisor@example.com', 'clave', role=CustomUser.ROLE_ADMIN
+        )
+        cls.emisor = Contribuyente.objects.create(
+            nit=nit_valido(1234567), nombre='Emisor', direccion='Zona 1',
+            correo='emisor@example.com', usuario=cls.usuario
+        )
+        cls.receptor = Contribuyente.objects.create(
+            nit=nit_valido(7654321), nombre='Receptor', direccion='Zona 10',
+            correo='receptor@example.com'
+        )
+        cls.establecimiento = Establecimiento.objects.create(
+            contribuyente=cls.emisor, codigo='001', nombre='Central', direccion='Zona 1'
+        )
+        cls.tipo = TipoDocumento.objects.create(codigo='FACT', nombre='Factura')
+
+    def setUp(self):
+        super().setUp()
+        from emisor import directorio
+
+        temporal = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temporal, True)
+        ajustes = override_settings(
+            DIRECTORIO_NIT_ARCHIVO=os.path.join(temporal, 'directorio_nit.bin'),
+            MEDIA_ROOT=temporal
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.temporal = temporal
+
+        for cache in caches.all():
+            cache.clear()
+        catalogos._local.entradas.clear()
+        catalogos._versiones.clear()
+        directorio._vista = None
+
+    def documento(self, referencia, subtotal=Decimal('100.00'), **campos):
+        """
+        Retorna:
+        - Un documento emitido y guardado con los montos calculados
+        """
+        from emisor.models import DocumentoTributario
+
+        campos = {
+            'emisor': self.emisor, 'receptor': self.receptor,
+            'establecimiento': self.establecimiento, **campos
+        }
+        documento = DocumentoTributario(
+            tipo_documento=self.tipo, referencia_interna=referencia, subtotal=subtotal,
+            estado=DocumentoTributario.ESTADO_EMITIDO, es_borrador=False,
+            **campos
+        )
+        documento.iva = documento.calcular_iva()
+        documento.total = documento.calcular_total()
+        documento.save()
+        return documento
+
+
+class ValidacionNitTests(SimpleTestCase):
+
+    def comparar(self, nits):
+        validos, esperados = validate_nits(nits)
+        for nit, valido, esperado in zip(nits, validos.tolist(), esperados.tolist()):
+            resultado, digito = analizar_nit(nit)
+            with self.subTest(nit=nit):
+                self.assertEqual(valido, resultado == NIT_VALIDO)
+                self.assertEqual(esperado, digito)
+
+    def test_coincide_con_analizar_nit_en_casos_limite(self):
+        self.comparar([
+            nit_valido(1234567), nit_valido(7654321), '1234567-1', '12345-k', '12345-K',
+            '', '1', 'K', '-', ' 1234567 ', 'A123456', '12A3456', '1234567X',
+            '0', '00', '000000000000000000001', nit_valido(10), 'ñ1234', '١٢٣٤٥٦٧',
+            '12 34-5', nit_valido(999999999999),
+        ])
+
+    def test_coincide_con_analizar_nit_en_nit_aleatorios(self):
+        azar = random.Random(2024)
+        caracteres = '0123456789-Kk '
+        nits = [
+            ''.join(azar.choice(caracteres) for _ in range(azar.randint(0, 14)))
+            for _ in range(2000)
+        ]
+        nits += [nit_valido(azar.randint(1, 10 ** 9)) for _ in range(500)]
+        self.comparar(nits)
+
+    def test_lote_vacio(self):
+        validos, esperados = validate_nits([])
+        self.assertEqual((len(validos), len(esperados)), (0, 0))
+
+
+@skipIf(connection.vendor == 'postgresql', 'PostgreSQL sí admite el índice de trigramas')
+class TrigramasTests(SimpleTestCase):
+
+    def test_fuera_de_postgresql_es_un_error_de_configuracion(self):
+        with self.assertRaises(ImproperlyConfigured):
+            busqueda.crear_indice_trigramas()
+
+        with self.assertRaisesMessage(CommandError, 'requiere PostgreSQL'):
+            call_command('indexar_busqueda', trigramas=True, modelos=['emisor.contribuyente'])
+
+
+class CatalogoTests(EscenarioMixin, TestCase):
+
+    def test_en_regimen_estable_no_consulta_la_base_de_datos(self):
+        from emisor.models import tipos_documento_activos
+
+        tipos_documento_activos.obtener()
+        with self.assertNumQueries(0):
+            self.assertEqual(tipos_documento_activos.obtener(), [self.tipo])
+
+    def test_guardar_y_eliminar_invalidan_el_catalogo(self):
+        from emisor.models import TipoDocumento, tipos_documento_activos
+
+        tipos_documento_activos.obtener()
+        with self.captureOnCommitCallbacks(execute=True):
+            nota = TipoDocumento.objects.create(codigo='NCRE', nombre='Nota de crédito')
+        self.assertEqual(tipos_documento_activos.obtener(), [self.tipo, nota])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TipoDocumento.objects.get(pk=self.tipo.pk).delete()
+        self.assertEqual(tipos_documento_activos.obtener(), [nota])
+        with self.assertNumQueries(0):
+            tipos_documento_activos.obtener()
+
+    def test_guardar_invalida_en_el_mismo_proceso_antes_de_confirmar(self):
+        from autoriza.models import ErrorValidacion, errores_validacion
+
+        errores_validacion.obtener()
+        error = ErrorValidacion.objects.get(codigo=ErrorValidacion.TIPO_IVA)
+        error.descripcion = 'IVA incorrecto'
+        error.save()
+        self.assertEqual(errores_validacion.obtener()[ErrorValidacion.TIPO_IVA].descripcion, 'IVA incorrecto')
+
+    def test_la_version_de_otro_proceso_se_ve_al_vencer_el_ttl(self):
+        from core.models import VersionCatalogo
+        from emisor.models import tipos_documento_activos
+
+        version = tipos_documento_activos.version()
+        # Otro proceso modifica el catálogo: este no lo ve hasta que vence el TTL
+        VersionCatalogo.objects.update_or_create(nombre='tipos_documento', defaults={'version': version + 1})
+        with self.assertNumQueries(0):
+            self.assertEqual(tipos_documento_activos.version(), version)
+
+        vencido = time.monotonic() + 60
+        with mock.patch('core.catalogos.time.monotonic', return_value=vencido):
+            self.assertEqual(tipos_documento_activos.version(), version + 1)
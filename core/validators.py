@@ -0,0 +1,155 @@
+# core/validators.py
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError
+from django.utils.translation import gettext_lazy as _
+
+
+# Resultados posibles del análisis de un NIT
+NIT_VALIDO = 'VALIDO'
+NIT_MUY_CORTO = 'MUY_CORTO'
+NIT_NO_NUMERICO = 'NO_NUMERICO'
+NIT_DIGITO_INCORRECTO = 'DIGITO_INCORRECTO'
+
+
+@lru_cache(maxsize=4096)
+def analizar_nit(value):
+    """
+    Calcula el dígito verificador de un NIT y lo compara con el recibido.
+
+    Los resultados se memorizan, ya que los mismos NIT se validan una y otra
+    vez (emisores frecuentes, receptores recurrentes).
+
+    Retorna:
+    - Tupla (resultado, digito_esperado); digito_esperado es '' si el NIT no
+      tiene un formato válido
+    """
+    # Elimina guiones y otros caracteres especiales
+    nit_limpio = ''.join(c for c in value if c.isalnum())
+
+    # Verificamos que el NIT tenga al menos 2 caracteres
+    if len(nit_limpio) < 2:
+        return NIT_MUY_CORTO, ''
+
+    # Separamos el dígito verificador
+    digito_verificador = nit_limpio[-1].upper()
+    cuerpo = nit_limpio[:-1]
+
+    # Verificamos que el cuerpo sea numérico
+    if not cuerpo.isdigit():
+        return NIT_NO_NUMERICO, ''
+
+    # Calculamos el dígito verificador
+    suma = 0
+    for i, digito in enumerate(reversed(cuerpo)):
+        suma += int(digito) * (i + 2)
+
+    modulo = suma % 11
+    resultado = 11 - modulo
+    resultado_final = resultado % 11
+
+    # Convertimos 10 a 'K' para comparar
+    digito_esperado = 'K' if resultado_final == 10 else str(resultado_final)
+
+    if digito_verificador != digito_esperado:
+        return NIT_DIGITO_INCORRECTO, digito_esperado
+
+    return NIT_VALIDO, digito_esperado
+
+
+def validate_nit(value):
+    """
+    Valida un NIT según el algoritmo:
+    1. Multiplique cada carácter por su posición respectiva (siendo la posición 1 el carácter más a la derecha), excepto el último
+    2. Sume todos los resultados
+    3. Obtenga el módulo 11 de la sumatoria
+    4. A 11 réstale el resultado obtenido en el punto 3
+    5. Calcule el módulo 11 del resultado obtenido en el punto 4, si este resultado es 10, entonces el dígito verificador del NIT deberá ser K
+    """
+    resultado, digito_esperado = analizar_nit(value)
+
+    if resultado == NIT_MUY_CORTO:
+        raise ValidationError(
+            _('El NIT debe tener al menos 2 caracteres'),
+        )
+
+    if resultado == NIT_NO_NUMERICO:
+        raise ValidationError(
+            _('El NIT debe contener solo números y el dígito verificador'),
+        )
+
+    if resultado == NIT_DIGITO_INCORRECTO:
+        raise ValidationError(
+            _(f'El dígito verificador del NIT es incorrecto. Debería ser {digito_esperado}'),
+        )
+
+
+def validate_nits(nits):
+    """
+    Valida un conjunto de NIT a la vez con aritmética vectorizada (NumPy).
+
+    Los NIT se convierten en una matriz de códigos de carácter rellenada con
+    ceros; la posición de cada carácter se cuenta desde la derecha ignorando
+    guiones y otros separadores, y el dígito verificador de todas las filas
+    se calcula con una sola suma ponderada. Las filas con caracteres no ASCII
+    se resuelven con analizar_nit para conservar exactamente sus reglas.
+
+    Parámetros:
+    - nits: Secuencia (lista, tupla o arreglo) de NIT en texto
+
+    Retorna:
+    - Tupla (validos, esperados): arreglo booleano con True para los NIT
+      válidos y arreglo con el dígito verificador esperado de cada NIT
+      ('' si no tiene un formato válido)
+    """
+    import numpy as np
+
+    nits = np.asarray(nits, dtype=str)
+    if nits.ndim != 1:
+        nits = nits.ravel()
+
+    cantidad = nits.shape[0]
+    ancho = nits.dtype.itemsize // 4
+    if cantidad == 0 or ancho == 0:
+        return np.zeros(cantidad, dtype=bool), np.full(cantidad, '', dtype='<U1')
+
+    # Matriz (cantidad x ancho) con el código de cada carácter; 0 = relleno
+    codigos = nits.view(np.uint32).reshape(cantidad, ancho)
+    no_ascii = np.flatnonzero(codigos.max(axis=1) > 127)
+    codigos = codigos.astype(np.uint8)
+
+    # Comparaciones sin signo: (c - 48) < 10 equivale a 48 <= c <= 57
+    es_digito = (codigos - np.uint8(48)) < 10
+    es_letra = ((codigos & np.uint8(0xDF)) - np.uint8(65)) < 26
+    conservar = es_digito | es_letra
+
+    # Posición desde la derecha entre los caracteres alfanuméricos (1 = verificador)
+    posicion = np.cumsum(conservar[:, ::-1], axis=1, dtype=np.int16)[:, ::-1] * conservar
+
+    longitud = posicion.max(axis=1)
+
+    cuerpo = posicion >= 2
+    cuerpo_numerico = ~np.any(cuerpo & ~es_digito, axis=1)
+
+    digitos = (codigos - np.uint8(48)).astype(np.int32) * (cuerpo & es_digito)
+    suma = np.einsum('ij,ij->i', digitos, posicion.astype(np.int32))
+    resultado = (11 - suma % 11) % 11
+
+    # Carácter verificador recibido, en mayúscula
+    columna = np.argmax(posicion == 1, axis=1)
+    verificador = codigos[np.arange(cantidad), columna]
+    verificador = np.where(es_letra[np.arange(cantidad), columna], verificador & np.uint8(0xDF), verificador)
+    esperado = np.where(resultado == 10, ord('K'), resultado + 48)
+
+    formato_valido = (longitud >= 2) & cuerpo_numerico
+    validos = formato_valido & (verificador == esperado)
+
+    esperados = np.where(formato_valido, np.array(list('0123456789K'))[resultado], '')
+
+    # Caracteres fuera de ASCII (letras acentuadas, dígitos de otros alfabetos)
+    for indice in no_ascii:
+        estado, digito = analizar_nit(str(nits[indice]))
+        validos[indice] = estado == NIT_VALIDO
+        esperados[indice] = digito
+
+    return validos, esperados
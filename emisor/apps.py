@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class EmisorConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'emisor'
+
+    def ready(self):
+        # Invalidación de cachés al guardar o eliminar (post_save, post_delete)
+        from . import signals  # noqa: F401
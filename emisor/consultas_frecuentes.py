@@ -0,0 +1,101 @@
+# emisor/consultas_frecuentes.py
+"""
+Consultas frecuentes sobre documentos tributarios, tal como las arman las
+vistas de emisor y consulta, la API y los servicios. Los valores de los
+filtros son representativos; solo importa la forma de la consulta.
+"""
+import datetime
+
+from django.db.models import Q, Sum
+from django.utils import timezone
+
+from core import busqueda
+from core.planes import consulta_frecuente
+from .models import DocumentoTributario
+
+
+def _rango_dias(dias=30):
+    hasta = timezone.localdate()
+    return hasta - datetime.timedelta(days=dias), hasta
+
+
+@consulta_frecuente('documentos_del_emisor')
+def documentos_del_emisor():
+    """Listado de documentos del emisor (DocumentoListView, API)"""
+    return DocumentoTributario.objects.filter(emisor_id=1).order_by('-fecha_emision', '-id')[:25]
+
+
+@consulta_frecuente('documentos_pagina_cursor')
+def documentos_pagina_cursor():
+    """Página profunda de todos los documentos por cursor (API, auditores)"""
+    fecha = timezone.now() - datetime.timedelta(days=365)
+    return DocumentoTributario.objects.filter(
+        Q(fecha_emision__lt=fecha) | Q(fecha_emision=fecha, id__lt=1000)
+    ).order_by('-fecha_emision', '-id')[:21]
+
+
+@consulta_frecuente('documentos_del_emisor_por_dias')
+def documentos_del_emisor_por_dias():
+    """Listado del emisor filtrado por días de emisión (DocumentoListView)"""
+    desde, hasta = _rango_dias()
+    return DocumentoTributario.objects.filter(
+        emisor_id=1,
+        dia_emision__gte=desde,
+        dia_emision__lte=hasta
+    ).order_by('-fecha_emision')
+
+
+@consulta_frecuente('buscar_documentos')
+def buscar_documentos():
+    """Búsqueda de documentos por texto (?search= de la API, DocumentoListView)"""
+    return busqueda.buscar(DocumentoTributario.objects.filter(emisor_id=1), 'FAC-00 gomez').order_by('-relevancia')
+
+
+@consulta_frecuente('documentos_recibidos_ultimo_mes')
+def documentos_recibidos_ultimo_mes():
+    """Documentos recibidos por un contribuyente (tablero de consulta)"""
+    return DocumentoTributario.objects.filter(
+        receptor_id=1,
+        fecha_emision__gte=timezone.now() - datetime.timedelta(days=30)
+    )
+
+
+@consulta_frecuente('iva_emitido_del_dia')
+def iva_emitido_del_dia():
+    """IVA cobrado por un contribuyente en un día (ReporteIvaView)"""
+    return DocumentoTributario.objects.filter(
+        emisor_id=1,
+        dia_emision=timezone.localdate(),
+        estado=DocumentoTributario.ESTADO_AUTORIZADO
+    ).values('emisor_id').annotate(total=Sum('iva')).order_by()
+
+
+@consulta_frecuente('iva_recibido_del_dia')
+def iva_recibido_del_dia():
+    """IVA pagado por un contribuyente en un día (ReporteIvaView)"""
+    return DocumentoTributario.objects.filter(
+        receptor_id=1,
+        dia_emision=timezone.localdate(),
+        estado=DocumentoTributario.ESTADO_AUTORIZADO
+    ).values('receptor_id').annotate(total=Sum('iva')).order_by()
+
+
+@consulta_frecuente('referencia_duplicada')
+def referencia_duplicada():
+    """Referencia repetida del emisor en el día (formulario, serializer, carga masiva)"""
+    return DocumentoTributario.objects.filter(
+        emisor_id=1,
+        referencia_interna='REF-0001',
+        dia_emision=timezone.localdate()
+    )
+
+
+@consulta_frecuente('documentos_autorizados_por_dias')
+def documentos_autorizados_por_dias():
+    """Documentos autorizados en un rango (ReporteRangoFechasView, exportaciones)"""
+    desde, hasta = _rango_dias()
+    return DocumentoTributario.objects.filter(
+        estado=DocumentoTributario.ESTADO_AUTORIZADO,
+        dia_emision__gte=desde,
+        dia_emision__lte=hasta
+    ).order_by('-fecha_emision')
@@ -0,0 +1,373 @@
+# emisor/directorio.py
+"""
+Directorio NIT → contribuyente compartido entre procesos.
+
+Resuelve el NIT (ya limpio) de un contribuyente a su id, su nombre y su
+nombre comercial sin consultar la base de datos. Los datos están en un
+archivo (DIRECTORIO_NIT_ARCHIVO) con los NIT ordenados en un arreglo de
+ancho fijo, que cada proceso abre con mmap: la búsqueda es binaria
+(numpy.searchsorted) y todos los workers de la máquina comparten las
+mismas páginas en memoria.
+
+El archivo lo genera el comando construir_directorio_nit o, si no existe,
+el primer proceso que lo necesita. Los contribuyentes creados, modificados
+o eliminados después se leen como un delta: al guardarlos o eliminarlos
+(post_save y post_delete en emisor.signals) se incrementa la versión del
+directorio (core.catalogos) y cada proceso, al ver una versión nueva,
+consulta solo las filas posteriores al archivo y los contribuyentes
+eliminados desde entonces (ContribuyenteEliminado). Cuando el delta supera
+DIRECTORIO_NIT_DELTA_MAXIMO filas el archivo se vuelve a generar.
+
+Después de modificar el NIT o el nombre de los contribuyentes con
+update(), bulk_create, loaddata o SQL se ejecuta construir_directorio_nit.
+"""
+import copy
+import datetime
+import os
+import struct
+import tempfile
+from threading import Lock
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from core.catalogos import incrementar_version, version_vigente
+
+
+NOMBRE = 'directorio_nit'
+
+# Cabecera: identificador, cantidad de contribuyentes, id máximo, fecha de
+# generación (microsegundos desde 1970, UTC) y tamaño de los nombres
+_CABECERA = struct.Struct('<8sqqqq')
+_IDENTIFICADOR = b'SIGTENIT'
+_TAMANO_CABECERA = 64
+
+# Ancho de los NIT en el archivo (Contribuyente.nit tiene max_length=20)
+_ANCHO_NIT = 20
+
+# Separador del nombre y el nombre comercial en el archivo
+_SEPARADOR = '\x00'
+
+# Las filas guardadas durante la generación pueden confirmarse después de
+# leídas; el delta relee las modificadas en este margen
+_MARGEN = datetime.timedelta(minutes=5)
+
+_EPOCA = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def ruta_directorio():
+    return getattr(settings, 'DIRECTORIO_NIT_ARCHIVO', 'directorio_nit.bin')
+
+
+def _alinear(posicion):
+    return (posicion + 7) // 8 * 8
+
+
+def _secciones(cantidad):
+    """
+    Posiciones en el archivo de los NIT, los ids, los desplazamientos de
+    los nombres y los nombres
+    """
+    nits = _TAMANO_CABECERA
+    ids = _alinear(nits + cantidad * _ANCHO_NIT)
+    desplazamientos = ids + cantidad * 8
+    nombres = desplazamientos + (cantidad + 1) * 8
+    return nits, ids, desplazamientos, nombres
+
+
+def _codificar(nit):
+    """
+    Retorna:
+    - El NIT como bytes del arreglo o None si no cabe en él
+    """
+    try:
+        codificado = nit.encode('ascii')
+    except (AttributeError, UnicodeEncodeError):
+        return None
+    if not codificado or len(codificado) > _ANCHO_NIT:
+        return None
+    return codificado
+
+
+def construir(ruta=None):
+    """
+    Genera el archivo del directorio con todos los contribuyentes y publica
+    una versión nueva para que los procesos lo vuelvan a abrir
+
+    Parámetros:
+    - ruta: Archivo a generar (por defecto DIRECTORIO_NIT_ARCHIVO)
+
+    Retorna:
+    - Cantidad de contribuyentes en el archivo
+    """
+    import numpy as np
+    from .models import Contribuyente, ContribuyenteEliminado
+
+    ruta = ruta or ruta_directorio()
+    generado = timezone.now()
+
+    ids = []
+    nits = []
+    nombres = []
+    for contribuyente_id, nit, nombre, nombre_comercial in Contribuyente.objects.order_by().values_list(
+        'id', 'nit', 'nombre', 'nombre_comercial'
+    ).iterator(chunk_size=10000):
+        codificado = _codificar(nit)
+        if codificado is None:
+            continue
+        ids.append(contribuyente_id)
+        nits.append(codificado)
+        nombres.append(f"{nombre}{_SEPARADOR}{nombre_comercial}".encode())
+
+    arreglo_nits = np.array(nits, dtype=f'S{_ANCHO_NIT}')
+    orden = np.argsort(arreglo_nits, kind='stable')
+    arreglo_nits = arreglo_nits[orden]
+    arreglo_ids = np.array(ids, dtype='<i8')[orden]
+    nombres = [nombres[posicion] for posicion in orden]
+    desplazamientos = np.zeros(len(nombres) + 1, dtype='<i8')
+    np.cumsum(np.array([len(nombre) for nombre in nombres], dtype='<i8'), out=desplazamientos[1:])
+
+    cantidad = len(arreglo_ids)
+    inicio_nits, inicio_ids, inicio_desplazamientos, _ = _secciones(cantidad)
+    cabecera = _CABECERA.pack(
+        _IDENTIFICADOR,
+        cantidad,
+        max(ids, default=0),
+        (generado - _EPOCA) // datetime.timedelta(microseconds=1),
+        int(desplazamientos[-1])
+    )
+
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    os.makedirs(directorio, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(cabecera.ljust(inicio_nits, b'\0'))
+            archivo.write(arreglo_nits.tobytes())
+            archivo.write(b'\0' * (inicio_ids - inicio_nits - arreglo_nits.nbytes))
+            archivo.write(arreglo_ids.tobytes())
+            archivo.write(desplazamientos.tobytes())
+            archivo.write(b''.join(nombres))
+        # Los procesos que tienen abierto el archivo anterior lo conservan
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+    # El delta del archivo nuevo solo relee las eliminaciones del margen
+    ContribuyenteEliminado.objects.filter(eliminado__lt=generado - _MARGEN).delete()
+    incrementar_version(NOMBRE)
+    return cantidad
+
+
+class _Vista:
+    """
+    Archivo del directorio abierto por el proceso y el delta posterior a él
+    """
+
+    def __init__(self, ruta):
+        import numpy as np
+
+        with open(ruta, 'rb') as archivo:
+            estado = os.fstat(archivo.fileno())
+            identificador, cantidad, self.id_maximo, generado, tamano_nombres = _CABECERA.unpack(
+                archivo.read(_CABECERA.size)
+            )
+        if identificador != _IDENTIFICADOR:
+            raise ValueError(f"{ruta} no es un directorio de NIT")
+
+        self.archivo = (estado.st_ino, estado.st_mtime_ns)
+        self.generado = _EPOCA + datetime.timedelta(microseconds=generado)
+
+        datos = np.memmap(ruta, dtype=np.uint8, mode='r')
+        inicio_nits, inicio_ids, inicio_desplazamientos, inicio_nombres = _secciones(cantidad)
+        self.nits = datos[inicio_nits:inicio_nits + cantidad * _ANCHO_NIT].view(f'S{_ANCHO_NIT}')
+        self.ids = datos[inicio_ids:inicio_desplazamientos].view('<i8')
+        self.desplazamientos = datos[inicio_desplazamientos:inicio_nombres].view('<i8')
+        self.nombres = datos[inicio_nombres:inicio_nombres + tamano_nombres]
+
+        self.version = None
+        self.delta = {}
+        self.modificados = set()
+
+    def cargar_delta(self, version):
+        """
+        Lee los contribuyentes creados, modificados o eliminados después
+        del archivo
+        """
+        from .models import Contribuyente, ContribuyenteEliminado
+
+        desde = self.generado - _MARGEN
+        delta = {}
+        for contribuyente_id, nit, nombre, nombre_comercial in Contribuyente.objects.filter(
+            Q(pk__gt=self.id_maximo) | Q(modified__gte=desde)
+        ).order_by().values_list('id', 'nit', 'nombre', 'nombre_comercial'):
+            delta[nit] = (contribuyente_id, nombre, nombre_comercial)
+        self.delta = delta
+        # Un contribuyente modificado pudo cambiar de NIT y uno eliminado ya
+        # no existe: la entrada del archivo no vale para ninguno
+        self.modificados = {contribuyente_id for contribuyente_id, _, _ in delta.values()}
+        self.modificados.update(ContribuyenteEliminado.objects.filter(
+            eliminado__gte=desde
+        ).values_list('contribuyente_id', flat=True))
+        self.version = version
+
+    def buscar(self, nits):
+        """
+        Retorna:
+        - Diccionario {nit: (id, nombre, nombre_comercial)} de los NIT encontrados
+        """
+        import numpy as np
+
+        encontrados = {}
+        pendientes = []
+        for nit in nits:
+            if nit in self.delta:
+                encontrados[nit] = self.delta[nit]
+            else:
+                codificado = _codificar(nit)
+                if codificado is not None:
+                    pendientes.append((nit, codificado))
+
+        if not pendientes or not len(self.nits):
+            return encontrados
+
+        claves = np.array([codificado for _, codificado in pendientes], dtype=f'S{_ANCHO_NIT}')
+        posiciones = np.minimum(np.searchsorted(self.nits, claves), len(self.nits) - 1)
+        coincidencias = self.nits[posiciones] == claves
+
+        for (nit, _), posicion, coincide in zip(pendientes, posiciones.tolist(), coincidencias.tolist()):
+            if not coincide:
+                continue
+            contribuyente_id = int(self.ids[posicion])
+            if contribuyente_id in self.modificados:
+                continue
+            inicio, fin = self.desplazamientos[posicion:posicion + 2].tolist()
+            nombre, nombre_comercial = self.nombres[inicio:fin].tobytes().decode().split(_SEPARADOR, 1)
+            encontrados[nit] = (contribuyente_id, nombre, nombre_comercial)
+        return encontrados
+
+
+_vista = None
+_lock = Lock()
+
+
+def _identidad(ruta):
+    try:
+        estado = os.stat(ruta)
+    except FileNotFoundError:
+        return None
+    return (estado.st_ino, estado.st_mtime_ns)
+
+
+def _vista_vigente():
+    """
+    Retorna:
+    - La vista del directorio al día con la versión publicada
+    """
+    global _vista
+
+    version = version_vigente(NOMBRE)
+    vista = _vista
+    if vista is not None and vista.version == version:
+        return vista
+
+    with _lock:
+        vista = _vista
+        if vista is not None and vista.version == version:
+            return vista
+
+        ruta = ruta_directorio()
+        identidad = _identidad(ruta)
+        if identidad is None:
+            construir(ruta)
+            version = version_vigente(NOMBRE)
+            identidad = _identidad(ruta)
+        if vista is None or vista.archivo != identidad:
+            vista = _Vista(ruta)
+        else:
+            # Otros hilos pueden estar leyendo la vista actual
+            vista = copy.copy(vista)
+        vista.cargar_delta(version)
+
+        # Un archivo recién generado relee las filas del margen: no se regenera
+        if (
+            len(vista.delta) > getattr(settings, 'DIRECTORIO_NIT_DELTA_MAXIMO', 10000)
+            and timezone.now() - vista.generado > _MARGEN
+        ):
+            construir(ruta)
+            vista = _Vista(ruta)
+            vista.cargar_delta(version_vigente(NOMBRE))
+
+        _vista = vista
+        return vista
+
+
+def resolver(nits):
+    """
+    Resuelve un lote de NIT a ids de contribuyente sin consultar la base
+    de datos (salvo al cambiar la versión del directorio)
+
+    Parámetros:
+    - nits: NIT ya limpios (sin guiones)
+
+    Retorna:
+    - Diccionario {nit: id} de los NIT registrados
+    """
+    return {
+        nit: datos[0]
+        for nit, datos in _vista_vigente().buscar(set(nits)).items()
+    }
+
+
+def contribuyentes(nits):
+    """
+    Resuelve un lote de NIT a contribuyentes
+
+    Las instancias traen cargados solo id, nit, nombre y nombre_comercial
+    (lo necesario para asignarlas como receptor e indexar el documento);
+    los demás campos se leen de la base de datos al usarlos.
+
+    Parámetros:
+    - nits: NIT ya limpios (sin guiones)
+
+    Retorna:
+    - Diccionario {nit: Contribuyente} de los NIT registrados
+    """
+    from .models import Contribuyente
+
+    db = Contribuyente.objects.db
+    return {
+        nit: Contribuyente.from_db(
+            db, ['id', 'nit', 'nombre', 'nombre_comercial'],
+            [contribuyente_id, nit, nombre, nombre_comercial]
+        )
+        for nit, (contribuyente_id, nombre, nombre_comercial) in _vista_vigente().buscar(set(nits)).items()
+    }
+
+
+def contribuyente(nit):
+    """
+    Retorna:
+    - El contribuyente con el NIT (ya limpio) indicado o None
+    """
+    return contribuyentes([nit]).get(nit)
+
+
+def invalidar():
+    """
+    Publica los contribuyentes modificados en la transacción actual
+    """
+    incrementar_version(NOMBRE)
+
+
+def eliminar(contribuyente_id):
+    """
+    Registra un contribuyente eliminado en la transacción actual y lo
+    publica, para que el delta descarte su entrada del archivo
+    """
+    from .models import ContribuyenteEliminado
+
+    ContribuyenteEliminado.objects.create(contribuyente_id=contribuyente_id)
+    incrementar_version(NOMBRE)
@@ -3,9 +3,56 @@ from django import forms
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from django.forms import inlineformset_factory
+from django.forms.models import ModelChoiceIterator
 from decimal import Decimal
 
-from .models import DocumentoTributario, LineaDocumento, Contribuyente, Establecimiento, TipoDocumento
+from . import directorio
+from .models import (
+    DocumentoTributario, LineaDocumento, Contribuyente, Establecimiento,
+    establecimientos_activos, tipos_documento_activos
+)
+
+
+class _IteradorCatalogo(ModelChoiceIterator):
+    """
+    Opciones de CatalogoChoiceField tomadas de su lista de objetos
+    """
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for objeto in self.field.objetos:
+            yield self.choice(objeto)
+    
+    def __len__(self):
+        return len(self.field.objetos) + (self.field.empty_label is not None)
+    
+    def __bool__(self):
+        return self.field.empty_label is not None or bool(self.field.objetos)
+
+
+class CatalogoChoiceField(forms.ModelChoiceField):
+    """
+    ModelChoiceField cuyas opciones son una lista de objetos ya cargada
+    (de un catálogo en caché, core.catalogos), por lo que mostrar el campo y
+    validar la opción elegida no consultan la base de datos
+    """
+    iterator = _IteradorCatalogo
+    objetos = ()
+    
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, self.queryset.model):
+            value = getattr(value, self.to_field_name or 'pk')
+        clave = self.to_field_name or 'pk'
+        for objeto in self.objetos:
+            if str(getattr(objeto, clave)) == str(value):
+                return objeto
+        raise ValidationError(
+            self.error_messages['invalid_choice'],
+            code='invalid_choice',
+            params={'value': value},
+        )
 
 
 class ContribuyenteForm(forms.ModelForm):
@@ -64,23 +111,24 @@ class DocumentoTributarioForm(forms.ModelForm):
             'moneda': forms.TextInput(attrs={'class': 'form-control', 'readonly': 'readonly'}),
             'observaciones': forms.Textarea(attrs={'class': 'form-control', 'rows': 3}),
         }
+        field_classes = {
+            'tipo_documento': CatalogoChoiceField,
+            'establecimiento': CatalogoChoiceField,
+        }
     
     def __init__(self, *args, **kwargs):
         # El emisor debe ser pasado al formulario para filtrar establecimientos
         self.emisor = kwargs.pop('emisor', None)
         super().__init__(*args, **kwargs)
         
-        # Cargar solo tipos de documento activos
-        self.fields['tipo_documento'].queryset = TipoDocumento.objects.filter(activo=True)
+        # Cargar solo tipos de documento activos (del catálogo en caché)
+        self.fields['tipo_documento'].objetos = tipos_documento_activos.obtener()
         
         # Si hay un emisor, filtrar establecimientos
         if self.emisor:
-            self.fields['establecimiento'].queryset = Establecimiento.objects.filter(
-                contribuyente=self.emisor,
-                activo=True
-            )
+            self.fields['establecimiento'].objetos = establecimientos_activos.obtener(self.emisor.pk)
         else:
-            self.fields['establecimiento'].queryset = Establecimiento.objects.none()
+            self.fields['establecimiento'].objetos = []
     
     def clean_nit_receptor(self):
         """
@@ -96,8 +144,8 @@ class DocumentoTributarioForm(forms.ModelForm):
             # Validar formato del NIT
             validate_nit(nit_limpio)
             
-            # Buscar contribuyente por NIT
-            receptor = Contribuyente.objects.filter(nit=nit_limpio).first()
+            # Buscar contribuyente por NIT en el directorio compartido
+            receptor = directorio.contribuyente(nit_limpio)
             if not receptor:
                 raise ValidationError(_("No existe un contribuyente con el NIT proporcionado."))
                 
@@ -105,59 +153,29 @@ class DocumentoTributarioForm(forms.ModelForm):
         except ValidationError as e:
             raise ValidationError(e)
     
-    def clean(self):
+    def save(self, commit=True, lineas=None, eliminadas=()):
         """
-        Validar que no exista un documento con la misma referencia para el emisor en la misma fecha
-        """
-        cleaned_data = super().clean()
-        
-        # Si faltan datos básicos, no seguir validando
-        if not self.emisor or 'referencia_interna' not in cleaned_data:
-            return cleaned_data
-            
-        referencia = cleaned_data.get('referencia_interna')
-        
-        # Buscar documentos existentes con la misma referencia (para el mismo día)
-        from django.utils import timezone
-        import datetime
-        
-        hoy = timezone.now().date()
-        
-        # Filtrar documentos de hoy con la misma referencia y emisor
-        existe = DocumentoTributario.objects.filter(
-            emisor=self.emisor,
-            referencia_interna=referencia,
-            fecha_emision__date=hoy
-        ).exists()
+        Guardar el documento con los datos calculados
         
-        if existe:
-            self.add_error(
-                'referencia_interna', 
-                _("Ya existe un documento con esta referencia para el día de hoy.")
-            )
+        Parámetros:
+        - lineas: Lista final de líneas del documento (opcional, si no se
+          indica se recalculan los totales con las líneas guardadas)
+        - eliminadas: Líneas existentes que se deben eliminar
         
-        return cleaned_data
-    
-    def save(self, commit=True):
-        """
-        Guardar el documento con los datos calculados
+        La referencia repetida en el día la rechaza la restricción única al
+        guardar: lanza ReferenciaDuplicada, que la vista agrega al formulario.
         """
+        from .services import guardar_documento
+        
         documento = super().save(commit=False)
         
         # Asignar emisor y receptor
         documento.emisor = self.emisor
         documento.receptor = self.cleaned_data.get('nit_receptor')
         
-        # Calcular totales basados en las líneas (si ya existen)
-        if documento.pk:
-            lineas = documento.lineas.all()
-            documento.subtotal = sum(linea.subtotal for linea in lineas)
-            documento.descuento = sum(linea.descuento for linea in lineas)
-            documento.iva = documento.calcular_iva()
-            documento.total = documento.calcular_total()
-        
+        # Los totales se calculan al guardar, junto con las líneas
         if commit:
-            documento.save()
+            guardar_documento(documento, lineas, eliminadas)
         
         return documento
 
@@ -0,0 +1,113 @@
+# emisor/management/commands/benchmark_dia_emision.py
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count, Sum
+
+from emisor.models import DocumentoTributario
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara el plan de ejecución y el tiempo de las consultas por día de '
+        'emisión usando fecha_emision__date contra la columna indexada dia_emision'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha', type=datetime.date.fromisoformat,
+            help='Día a consultar (AAAA-MM-DD); por defecto, el día con más documentos'
+        )
+        parser.add_argument('--dias', type=int, default=7, help='Días del rango en las consultas por rango')
+        parser.add_argument('--repeticiones', type=int, default=20, help='Ejecuciones de cada consulta')
+        parser.add_argument(
+            '--sin-plan', action='store_false', dest='plan',
+            help='No mostrar el plan de ejecución de las consultas'
+        )
+
+    def handle(self, *args, **options):
+        if options['repeticiones'] < 1 or options['dias'] < 1:
+            raise CommandError('Las repeticiones y los días deben ser mayores que cero')
+
+        fecha = options['fecha'] or self._dia_con_mas_documentos()
+        if fecha is None:
+            raise CommandError('No hay documentos para medir')
+        hasta = fecha + datetime.timedelta(days=options['dias'] - 1)
+
+        documento = DocumentoTributario.objects.filter(dia_emision=fecha).only(
+            'emisor_id', 'referencia_interna'
+        ).first()
+
+        documentos = DocumentoTributario.objects.order_by()
+        iva = lambda consulta: consulta.aggregate(total=Sum('iva'))
+        por_emisor = lambda consulta: list(consulta.values('emisor_id').annotate(cantidad=Count('id')))
+        existe = lambda consulta: consulta.exists()
+
+        # (título, consulta con fecha_emision__date, consulta con dia_emision, evaluación)
+        consultas = [
+            (
+                'Documentos autorizados del día',
+                documentos.filter(fecha_emision__date=fecha, estado=DocumentoTributario.ESTADO_AUTORIZADO),
+                documentos.filter(dia_emision=fecha, estado=DocumentoTributario.ESTADO_AUTORIZADO),
+                iva,
+            ),
+            (
+                f'Documentos por emisor en {options["dias"]} días',
+                documentos.filter(fecha_emision__date__gte=fecha, fecha_emision__date__lte=hasta),
+                documentos.filter(dia_emision__gte=fecha, dia_emision__lte=hasta),
+                por_emisor,
+            ),
+        ]
+        if documento is not None:
+            consultas.append((
+                'Referencia duplicada del emisor en el día',
+                documentos.filter(
+                    emisor_id=documento.emisor_id,
+                    referencia_interna=documento.referencia_interna,
+                    fecha_emision__date=fecha
+                ),
+                documentos.filter(
+                    emisor_id=documento.emisor_id,
+                    referencia_interna=documento.referencia_interna,
+                    dia_emision=fecha
+                ),
+                existe,
+            ))
+
+        self.stdout.write(f'Motor de base de datos: {connection.vendor}')
+        self.stdout.write(f'Día consultado: {fecha}')
+
+        for titulo, anterior, nueva, evaluar in consultas:
+            self.stdout.write(self.style.MIGRATE_HEADING(titulo))
+            duracion_anterior = self._medir('fecha_emision__date', anterior, evaluar, options)
+            duracion_nueva = self._medir('dia_emision', nueva, evaluar, options)
+            if duracion_nueva > 0:
+                self.stdout.write(f'  Mejora: {duracion_anterior / duracion_nueva:.1f}x')
+
+    def _dia_con_mas_documentos(self):
+        return DocumentoTributario.objects.values('dia_emision').annotate(
+            cantidad=Count('id')
+        ).order_by('-cantidad').values_list('dia_emision', flat=True).first()
+
+    def _medir(self, etiqueta, consulta, evaluar, options):
+        """
+        Ejecuta la consulta las veces indicadas y muestra su plan y su tiempo medio
+
+        Parámetros:
+        - consulta: QuerySet filtrado
+        - evaluar: Función que ejecuta la consulta (agregado, agrupación o exists)
+        """
+        # Una ejecución previa para no medir la carga inicial de páginas
+        evaluar(consulta)
+        inicio = time.perf_counter()
+        for _ in range(options['repeticiones']):
+            evaluar(consulta.all())
+        duracion = (time.perf_counter() - inicio) / options['repeticiones']
+
+        self.stdout.write(f'  {etiqueta}: {duracion * 1000:.2f} ms por consulta')
+        if options['plan']:
+            for linea in consulta.explain().splitlines():
+                self.stdout.write(f'    {linea}')
+        return duracion
@@ -0,0 +1,86 @@
+# emisor/management/commands/calcular_dia_emision.py
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, transaction
+
+from core import busqueda
+from core.models import propagar_dia_relacionado
+from emisor.models import DocumentoTributario
+from emisor.services import renombrar_referencia
+
+
+class Command(BaseCommand):
+    help = (
+        'Vuelve a calcular el día local de emisión de los documentos '
+        '(tras cambiar TIME_ZONE o modificar fecha_emision con update)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Documentos a actualizar por consulta')
+
+    def handle(self, *args, **options):
+        campo = DocumentoTributario._meta.get_field('dia_emision')
+
+        documentos = DocumentoTributario.objects.only(
+            'id', 'emisor_id', 'referencia_interna', 'fecha_emision', 'dia_emision', 'observaciones'
+        )
+
+        pendientes = []
+        actualizados = 0
+        self.renombrados = []
+
+        for documento in documentos.order_by('id').iterator(chunk_size=options['lote']):
+            dia = campo.calcular(documento)
+            if dia == documento.dia_emision:
+                continue
+            documento.dia_emision = dia
+            pendientes.append(documento)
+
+            if len(pendientes) >= options['lote']:
+                actualizados += self._actualizar(pendientes)
+                pendientes = []
+
+        if pendientes:
+            actualizados += self._actualizar(pendientes)
+
+        self.stdout.write(self.style.SUCCESS(f'{actualizados} documentos actualizados'))
+        if self.renombrados:
+            busqueda.indexar_lote(DocumentoTributario.objects.filter(pk__in=self.renombrados))
+            self.stdout.write(self.style.WARNING(
+                f'{len(self.renombrados)} documentos repetían la referencia del emisor en su día y se '
+                f'renombraron (ids: {", ".join(map(str, self.renombrados[:20]))})'
+            ))
+
+    def _actualizar(self, documentos):
+        """
+        Guarda el día de un bloque de documentos y lo copia a sus líneas,
+        autorizaciones y tareas (propagar_dia_relacionado)
+        """
+        actualizados = self._guardar_dias(documentos)
+        propagar_dia_relacionado(DocumentoTributario, [documento.pk for documento in documentos])
+        return actualizados
+
+    def _guardar_dias(self, documentos):
+        """
+        Guarda el día de un bloque de documentos; si alguno repite la
+        referencia del emisor en el día se guardan uno por uno y los
+        repetidos reciben una referencia libre (renombrar_referencia)
+        """
+        try:
+            with transaction.atomic():
+                DocumentoTributario.objects.bulk_update(documentos, ['dia_emision'])
+            return len(documentos)
+        except IntegrityError:
+            pass
+
+        actualizados = 0
+        for documento in documentos:
+            try:
+                with transaction.atomic():
+                    DocumentoTributario.objects.filter(pk=documento.pk).update(dia_emision=documento.dia_emision)
+                actualizados += 1
+            except IntegrityError:
+                with transaction.atomic():
+                    renombrar_referencia(DocumentoTributario, documento)
+                self.renombrados.append(documento.pk)
+                actualizados += 1
+        return actualizados
@@ -0,0 +1,23 @@
+# emisor/management/commands/construir_directorio_nit.py
+from django.core.management.base import BaseCommand
+
+from emisor import directorio
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera el directorio de NIT compartido por los procesos; se ejecuta '
+        'al desplegar y después de modificar contribuyentes sin save() '
+        '(loaddata, update() o bulk_create)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archivo',
+            help='Archivo a generar (por defecto DIRECTORIO_NIT_ARCHIVO)'
+        )
+
+    def handle(self, *args, **options):
+        ruta = options['archivo'] or directorio.ruta_directorio()
+        cantidad = directorio.construir(ruta)
+        self.stdout.write(self.style.SUCCESS(f'Directorio de NIT generado en {ruta}: {cantidad} contribuyentes'))
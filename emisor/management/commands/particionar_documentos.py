@@ -0,0 +1,77 @@
+# emisor/management/commands/particionar_documentos.py
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from emisor import particiones
+
+
+def _mes(valor):
+    """
+    Convierte AAAA-MM en el primer día de ese mes
+    """
+    try:
+        return datetime.datetime.strptime(valor, '%Y-%m').date()
+    except ValueError:
+        raise CommandError(f'Mes inválido: {valor} (formato AAAA-MM)')
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantiene las particiones mensuales de documentos, líneas y errores de '
+        'autorización en PostgreSQL (DOCUMENTOS_PARTICIONADOS): crea las de los '
+        'meses siguientes y separa las de meses antiguos. Sin particiones muestra '
+        'la cantidad de documentos por mes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--meses', type=int, default=getattr(settings, 'DOCUMENTOS_PARTICIONES_FUTURAS', 3),
+            help='Meses futuros para los que se crean particiones'
+        )
+        parser.add_argument(
+            '--desvincular', type=_mes, metavar='AAAA-MM',
+            help='Separar las particiones de los meses anteriores a AAAA-MM'
+        )
+        parser.add_argument(
+            '--eliminar', action='store_true',
+            help='Borrar las particiones separadas en lugar de conservarlas como tablas'
+        )
+
+    def handle(self, *args, **options):
+        if options['meses'] < 0:
+            raise CommandError('La cantidad de meses no puede ser negativa')
+
+        if not particiones.es_particionada():
+            if options['desvincular']:
+                raise CommandError(
+                    'Los documentos no están particionados (requiere PostgreSQL y DOCUMENTOS_PARTICIONADOS)'
+                )
+            self._resumen_sin_particiones()
+            return
+
+        try:
+            for nombre in particiones.crear_particiones(options['meses']):
+                self.stdout.write(f'Partición creada: {nombre}')
+
+            if options['desvincular']:
+                separadas = particiones.desvincular_particiones(options['desvincular'], options['eliminar'])
+                accion = 'eliminada' if options['eliminar'] else 'separada'
+                for nombre in separadas:
+                    self.stdout.write(f'Partición {accion}: {nombre}')
+        except particiones.ParticionError as e:
+            raise CommandError(str(e))
+
+        vigentes = particiones.particiones()
+        if vigentes:
+            self.stdout.write(f'Particiones de documentos: {vigentes[0][1]:%Y-%m} a {vigentes[-1][1]:%Y-%m}')
+        self.stdout.write(self.style.SUCCESS('Particiones al día'))
+
+    def _resumen_sin_particiones(self):
+        self.stdout.write(
+            'Los documentos no están particionados; las consultas por día usan el '
+            'índice de dia_emision. Documentos por mes:'
+        )
+        for mes, cantidad in particiones.resumen_mensual():
+            self.stdout.write(f'  {mes:%Y-%m}: {cantidad}')
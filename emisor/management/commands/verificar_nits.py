@@ -0,0 +1,45 @@
+# emisor/management/commands/verificar_nits.py
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from emisor.models import Contribuyente
+
+
+class Command(BaseCommand):
+    help = (
+        'Calcula y guarda la validez del NIT de los contribuyentes cuyo '
+        'resultado no está actualizado (registros previos o modificados sin save)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lote', type=int, default=1000, help='Contribuyentes a actualizar por consulta')
+        parser.add_argument(
+            '--todos', action='store_true',
+            help='Volver a verificar todos los contribuyentes'
+        )
+
+    def handle(self, *args, **options):
+        contribuyentes = Contribuyente.objects.only('id', 'nit', *Contribuyente.CAMPOS_VERIFICACION_NIT)
+        if not options['todos']:
+            contribuyentes = contribuyentes.exclude(nit_verificado=F('nit'))
+
+        pendientes = []
+        actualizados = invalidos = 0
+
+        for contribuyente in contribuyentes.order_by('id').iterator(chunk_size=options['lote']):
+            contribuyente.verificar_nit()
+            invalidos += not contribuyente.nit_valido
+            pendientes.append(contribuyente)
+
+            if len(pendientes) >= options['lote']:
+                Contribuyente.objects.bulk_update(pendientes, Contribuyente.CAMPOS_VERIFICACION_NIT)
+                actualizados += len(pendientes)
+                pendientes = []
+
+        if pendientes:
+            Contribuyente.objects.bulk_update(pendientes, Contribuyente.CAMPOS_VERIFICACION_NIT)
+            actualizados += len(pendientes)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{actualizados} contribuyentes verificados, {invalidos} con NIT inválido'
+        ))
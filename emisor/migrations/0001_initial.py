@@ -0,0 +1,122 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+import core.validators
+import django.core.validators
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TipoDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=10, unique=True)),
+                ('nombre', models.CharField(max_length=100)),
+                ('descripcion', models.TextField(blank=True)),
+                ('activo', models.BooleanField(default=True)),
+            ],
+            options={
+                'verbose_name': 'Tipo de Documento',
+                'verbose_name_plural': 'Tipos de Documentos',
+            },
+        ),
+        migrations.CreateModel(
+            name='Contribuyente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('nit', models.CharField(max_length=20, unique=True, validators=[core.validators.validate_nit])),
+                ('nombre', models.CharField(max_length=255)),
+                ('nombre_comercial', models.CharField(blank=True, max_length=255)),
+                ('direccion', models.CharField(max_length=255)),
+                ('correo', models.EmailField(max_length=254)),
+                ('telefono', models.CharField(blank=True, max_length=15)),
+                ('usuario', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='contribuyente', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Contribuyente',
+                'verbose_name_plural': 'Contribuyentes',
+                'ordering': ['nombre'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Establecimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('codigo', models.CharField(max_length=3)),
+                ('nombre', models.CharField(max_length=255)),
+                ('direccion', models.CharField(max_length=255)),
+                ('activo', models.BooleanField(default=True)),
+                ('contribuyente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='establecimientos', to='emisor.contribuyente')),
+            ],
+            options={
+                'verbose_name': 'Establecimiento',
+                'verbose_name_plural': 'Establecimientos',
+                'unique_together': {('contribuyente', 'codigo')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DocumentoTributario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('referencia_interna', models.CharField(max_length=40)),
+                ('fecha_emision', models.DateTimeField(default=django.utils.timezone.now)),
+                ('moneda', models.CharField(default='GTQ', max_length=3)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('descuento', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('iva', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('estado', models.CharField(choices=[('BORRADOR', 'Borrador'), ('EMITIDO', 'Emitido'), ('AUTORIZADO', 'Autorizado'), ('RECHAZADO', 'Rechazado'), ('ANULADO', 'Anulado')], default='BORRADOR', max_length=20)),
+                ('observaciones', models.TextField(blank=True)),
+                ('es_borrador', models.BooleanField(default=True)),
+                ('emisor', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='documentos_emitidos', to='emisor.contribuyente')),
+                ('receptor', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='documentos_recibidos', to='emisor.contribuyente')),
+                ('establecimiento', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='documentos', to='emisor.establecimiento')),
+                ('tipo_documento', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='emisor.tipodocumento')),
+            ],
+            options={
+                'verbose_name': 'Documento Tributario',
+                'verbose_name_plural': 'Documentos Tributarios',
+                'ordering': ['-fecha_emision'],
+                'unique_together': {('emisor', 'referencia_interna', 'fecha_emision')},
+            },
+        ),
+        migrations.CreateModel(
+            name='LineaDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('modified', models.DateTimeField(auto_now=True)),
+                ('descripcion', models.CharField(max_length=255)),
+                ('cantidad', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('precio_unitario', models.DecimalField(decimal_places=2, max_digits=12, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('descuento', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('documento', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='emisor.documentotributario')),
+            ],
+            options={
+                'verbose_name': 'Línea de Documento',
+                'verbose_name_plural': 'Líneas de Documentos',
+                'ordering': ['id'],
+            },
+        ),
+    ]
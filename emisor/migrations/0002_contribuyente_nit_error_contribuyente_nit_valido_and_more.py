@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emisor', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contribuyente',
+            name='nit_error',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='contribuyente',
+            name='nit_valido',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='contribuyente',
+            name='nit_verificado',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+    ]
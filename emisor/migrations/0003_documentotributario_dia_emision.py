@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+import core.models
+from django.conf import settings
+from django.db import migrations
+
+
+def calcular_dia_emision(apps, schema_editor):
+    """
+    Llena el día local de emisión de los documentos existentes antes de
+    declarar la columna NOT NULL
+    """
+    DocumentoTributario = apps.get_model('emisor', 'DocumentoTributario')
+    alias = schema_editor.connection.alias
+
+    if schema_editor.connection.vendor == 'postgresql' and settings.USE_TZ:
+        # Una sola sentencia: la conversión la hace PostgreSQL con la misma zona
+        tabla = schema_editor.quote_name(DocumentoTributario._meta.db_table)
+        schema_editor.execute(
+            f"UPDATE {tabla} SET dia_emision = (fecha_emision AT TIME ZONE %s)::date "
+            f"WHERE dia_emision IS NULL",
+            [settings.TIME_ZONE]
+        )
+        return
+
+    campo = DocumentoTributario._meta.get_field('dia_emision')
+    documentos = DocumentoTributario.objects.using(alias).filter(
+        dia_emision__isnull=True
+    ).only('id', 'fecha_emision').order_by('id')
+
+    pendientes = []
+    for documento in documentos.iterator(chunk_size=2000):
+        documento.dia_emision = campo.calcular(documento)
+        pendientes.append(documento)
+        if len(pendientes) >= 2000:
+            DocumentoTributario.objects.using(alias).bulk_update(pendientes, ['dia_emision'])
+            pendientes = []
+    if pendientes:
+        DocumentoTributario.objects.using(alias).bulk_update(pendientes, ['dia_emision'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emisor', '0002_contribuyente_nit_error_contribuyente_nit_valido_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentotributario',
+            name='dia_emision',
+            field=core.models.DiaLocalField(db_index=True, null=True, origen='fecha_emision'),
+        ),
+        migrations.RunPython(calcular_dia_emision, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='documentotributario',
+            name='dia_emision',
+            field=core.models.DiaLocalField(db_index=True, origen='fecha_emision'),
+        ),
+    ]
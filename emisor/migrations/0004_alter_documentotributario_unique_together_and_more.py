@@ -0,0 +1,123 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+import logging
+
+from django.db import migrations, models
+
+
+logger = logging.getLogger(__name__)
+
+
+def separar_referencias_duplicadas(apps, schema_editor):
+    """
+    La restricción anterior permitía repetir la referencia en el mismo día
+    con otra hora; esos documentos se renombran antes de crear la nueva
+
+    Cambio de datos: de cada grupo (emisor, referencia_interna, dia_emision)
+    con más de un documento, el de menor id conserva la referencia; los
+    demás reciben la primera variante libre ("REF-2", "REF-3", ...) y la
+    referencia original queda en las observaciones. Los ids renombrados se
+    registran en el log de la migración.
+
+    Lanza:
+    - RuntimeError si algún documento por renombrar ya tiene una
+      autorización aprobada; esos casos deben resolverse a mano
+    """
+    alias = schema_editor.connection.alias
+    DocumentoTributario = apps.get_model('emisor', 'DocumentoTributario')
+    Autorizacion = apps.get_model('autoriza', 'Autorizacion')
+    documentos = DocumentoTributario.objects.using(alias)
+    longitud = DocumentoTributario._meta.get_field('referencia_interna').max_length
+
+    grupos = documentos.values('emisor_id', 'referencia_interna', 'dia_emision').annotate(
+        cantidad=models.Count('id'), primero=models.Min('id')
+    ).filter(cantidad__gt=1).order_by()
+
+    repetidos = []
+    for grupo in grupos:
+        repetidos.extend(
+            documentos.filter(
+                emisor_id=grupo['emisor_id'],
+                referencia_interna=grupo['referencia_interna'],
+                dia_emision=grupo['dia_emision']
+            ).exclude(pk=grupo['primero']).only(
+                'id', 'emisor_id', 'referencia_interna', 'dia_emision', 'observaciones'
+            ).order_by('id')
+        )
+    if not repetidos:
+        return
+
+    aprobados = list(
+        Autorizacion.objects.using(alias).filter(
+            documento_id__in=[documento.pk for documento in repetidos], estado='APROBADO'
+        ).order_by('documento_id').values_list('documento_id', flat=True)
+    )
+    if aprobados:
+        raise RuntimeError(
+            "Documentos con autorización aprobada repiten la referencia de otro documento "
+            f"del mismo emisor y día; corríjalos antes de migrar: {aprobados}"
+        )
+
+    for documento in repetidos:
+        original = documento.referencia_interna
+        usadas = set(
+            documentos.filter(
+                emisor_id=documento.emisor_id, dia_emision=documento.dia_emision
+            ).values_list('referencia_interna', flat=True)
+        )
+        numero = 2
+        while True:
+            sufijo = f"-{numero}"
+            candidata = f"{original[:longitud - len(sufijo)]}{sufijo}"
+            if candidata not in usadas:
+                break
+            numero += 1
+        nota = f"Referencia original: {original} (repetida el {documento.dia_emision.strftime('%d/%m/%Y')})"
+        documentos.filter(pk=documento.pk).update(
+            referencia_interna=candidata,
+            observaciones=f"{documento.observaciones}\n{nota}" if documento.observaciones else nota
+        )
+        logger.warning(
+            "Documento %s: referencia %r renombrada a %r (repetida el %s)",
+            documento.pk, original, candidata, documento.dia_emision
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emisor', '0003_documentotributario_dia_emision'),
+        ('autoriza', '0007_fragmentoinforme'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='documentotributario',
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name='documentotributario',
+            index=models.Index(fields=['emisor', '-fecha_emision'], name='documento_emisor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentotributario',
+            index=models.Index(fields=['receptor', '-fecha_emision'], name='documento_receptor_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentotributario',
+            index=models.Index(fields=['emisor', 'dia_emision'], name='documento_emisor_dia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentotributario',
+            index=models.Index(fields=['receptor', 'dia_emision'], name='documento_receptor_dia_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentotributario',
+            index=models.Index(fields=['estado', 'dia_emision'], name='documento_estado_dia_idx'),
+        ),
+        migrations.RunPython(separar_referencias_duplicadas, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='documentotributario',
+            constraint=models.UniqueConstraint(fields=('emisor', 'referencia_interna', 'dia_emision'), name='documento_referencia_dia_unica'),
+        ),
+    ]
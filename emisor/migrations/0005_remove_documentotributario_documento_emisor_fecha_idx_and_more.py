@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emisor', '0004_alter_documentotributario_unique_together_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='documentotributario',
+            name='documento_emisor_fecha_idx',
+        ),
+        migrations.AddIndex(
+            model_name='documentotributario',
+            index=models.Index(fields=['-fecha_emision', '-id'], name='documento_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentotributario',
+            index=models.Index(fields=['emisor', '-fecha_emision', '-id'], name='documento_emisor_fecha_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emisor', '0005_remove_documentotributario_documento_emisor_fecha_idx_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContribuyenteEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('contribuyente_id', models.BigIntegerField()),
+                ('eliminado', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Contribuyente eliminado',
+                'verbose_name_plural': 'Contribuyentes eliminados',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='contribuyente',
+            index=models.Index(fields=['modified'], name='contribuyente_modificado_idx'),
+        ),
+    ]
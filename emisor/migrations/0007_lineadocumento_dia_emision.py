@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+import core.models
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def copiar_dia_emision(apps, schema_editor):
+    """
+    Copia a las líneas existentes el día de emisión de su documento antes
+    de declarar la columna NOT NULL
+    """
+    DocumentoTributario = apps.get_model('emisor', 'DocumentoTributario')
+    LineaDocumento = apps.get_model('emisor', 'LineaDocumento')
+    LineaDocumento.objects.using(schema_editor.connection.alias).filter(
+        dia_emision__isnull=True
+    ).update(dia_emision=Subquery(
+        DocumentoTributario.objects.filter(pk=OuterRef('documento_id')).values('dia_emision')[:1]
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emisor', '0006_contribuyenteeliminado_contribuyente_modificado_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lineadocumento',
+            name='dia_emision',
+            field=core.models.DiaRelacionadoField(null=True, relacion='documento'),
+        ),
+        migrations.RunPython(copiar_dia_emision, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='lineadocumento',
+            name='dia_emision',
+            field=core.models.DiaRelacionadoField(relacion='documento'),
+        ),
+    ]
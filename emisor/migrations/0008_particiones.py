@@ -0,0 +1,270 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:45
+
+import datetime
+import re
+
+from django.conf import settings
+from django.db import migrations
+from django.utils import timezone
+
+
+# Prefijo del comentario de las restricciones que el particionamiento
+# modifica; el resto del comentario es la definición original
+MARCA = 'particiones: '
+
+
+def _tablas(apps):
+    """
+    Tablas particionadas y tablas que guardan el día de su documento
+
+    Retorna:
+    - Tupla (particionadas, con_dia) de nombres de tabla
+    """
+    documentos = apps.get_model('emisor', 'DocumentoTributario')._meta.db_table
+    lineas = apps.get_model('emisor', 'LineaDocumento')._meta.db_table
+    autorizaciones = apps.get_model('autoriza', 'Autorizacion')._meta.db_table
+    errores = apps.get_model('autoriza', 'AutorizacionError')._meta.db_table
+    tareas = apps.get_model('autoriza', 'TareaAutorizacion')._meta.db_table
+    return [documentos, lineas, errores], [documentos, lineas, errores, autorizaciones, tareas]
+
+
+def _es_particionada(cursor, tabla):
+    cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [tabla])
+    return cursor.fetchone() is not None
+
+
+def _llaves_entre(cursor, tablas):
+    """
+    Llaves foráneas entre las tablas indicadas
+
+    Retorna:
+    - Lista de tuplas (tabla, nombre, definición, columna, tabla referida, comentario)
+    """
+    cursor.execute("""
+        SELECT c.conrelid::regclass::text, c.conname, pg_get_constraintdef(c.oid),
+               a.attname, c.confrelid::regclass::text, obj_description(c.oid, 'pg_constraint')
+        FROM pg_constraint c
+        JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1]
+        WHERE c.contype = 'f' AND c.conparentid = 0
+          AND c.conrelid = ANY(%s::regclass[]) AND c.confrelid = ANY(%s::regclass[])
+        ORDER BY 1, 2
+    """, [tablas, tablas])
+    return cursor.fetchall()
+
+
+def _estructura(cursor, tabla):
+    """
+    Restricciones (salvo CHECK, que copia LIKE) e índices de una tabla
+
+    Retorna:
+    - Tupla (restricciones, indices): restricciones como tuplas (nombre,
+      tipo, definición, comentario) e índices como sentencias CREATE INDEX
+    """
+    cursor.execute("""
+        SELECT conname, contype, pg_get_constraintdef(oid), obj_description(oid, 'pg_constraint')
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f') AND conparentid = 0
+        ORDER BY contype, conname
+    """, [tabla])
+    restricciones = cursor.fetchall()
+    cursor.execute("""
+        SELECT pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        WHERE i.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid AND c.conrelid = i.indrelid)
+        ORDER BY 1
+    """, [tabla])
+    return restricciones, [fila[0] for fila in cursor.fetchall()]
+
+
+def _reemplazar_tabla(schema_editor, cursor, tabla, crear_nueva):
+    """
+    Copia una tabla en otra nueva con las mismas columnas, reemplaza la
+    original y restablece la secuencia del id
+
+    Parámetros:
+    - crear_nueva: Función que recibe el nombre de la tabla nueva y la crea
+      (con sus particiones, si corresponde)
+
+    Retorna:
+    - Tupla (restricciones, indices) de la tabla original
+    """
+    q = schema_editor.quote_name
+    nueva = f'{tabla}__nueva'
+    restricciones, indices = _estructura(cursor, tabla)
+
+    crear_nueva(nueva)
+    cursor.execute(f'INSERT INTO {q(nueva)} SELECT * FROM {q(tabla)}')
+    cursor.execute(f'DROP TABLE {q(tabla)}')
+    cursor.execute(f'ALTER TABLE {q(nueva)} RENAME TO {q(tabla)}')
+
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [tabla])
+    secuencia = cursor.fetchone()[0]
+    cursor.execute(f'ALTER SEQUENCE {secuencia} RENAME TO {q(tabla + "_id_seq")}')
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence(%s, 'id'), COALESCE(MAX(id), 0) + 1, false) FROM {q(tabla)}",
+        [tabla]
+    )
+    return restricciones, indices
+
+
+def _meses(desde, hasta):
+    mes = desde.replace(day=1)
+    while mes <= hasta:
+        siguiente = (mes + datetime.timedelta(days=32)).replace(day=1)
+        yield mes, siguiente
+        mes = siguiente
+
+
+def particionar(apps, schema_editor):
+    """
+    Convierte en tablas particionadas por mes de dia_emision los
+    documentos, sus líneas y los errores de autorización
+
+    Solo en PostgreSQL 15 o superior y con DOCUMENTOS_PARTICIONADOS. Cada
+    tabla se copia en una tabla particionada (una partición por mes con
+    datos hasta DOCUMENTOS_PARTICIONES_FUTURAS meses después del actual y
+    una partición DEFAULT). PostgreSQL exige que la llave primaria y las
+    restricciones únicas incluyan la columna de partición: la llave pasa a
+    ser (id, dia_emision) y uuid es único por día. Las llaves foráneas
+    entre estas tablas pasan a ser compuestas, (documento_id, dia_emision)
+    hacia (id, dia_emision), con ON UPDATE CASCADE para que cambiar el día
+    de un documento mueva también sus filas dependientes.
+
+    Las restricciones modificadas llevan un comentario con la definición
+    original, que usa desparticionar para revertir la migración.
+    """
+    conexion = schema_editor.connection
+    if conexion.vendor != 'postgresql' or not getattr(settings, 'DOCUMENTOS_PARTICIONADOS', False):
+        return
+    if conexion.pg_version < 150000:
+        raise RuntimeError('DOCUMENTOS_PARTICIONADOS requiere PostgreSQL 15 o superior')
+
+    q = schema_editor.quote_name
+    particionadas, con_dia = _tablas(apps)
+    hoy = timezone.localdate()
+    hasta = hoy
+    for _ in range(getattr(settings, 'DOCUMENTOS_PARTICIONES_FUTURAS', 3)):
+        hasta = (hasta.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+    with conexion.cursor() as cursor:
+        if _es_particionada(cursor, particionadas[0]):
+            return
+
+        # Las llaves foráneas entre las tablas se vuelven a crear compuestas
+        llaves = _llaves_entre(cursor, con_dia)
+        for tabla, nombre, *_ in llaves:
+            cursor.execute(f'ALTER TABLE {q(tabla)} DROP CONSTRAINT {q(nombre)}')
+
+        cursor.execute(f'SELECT MIN(dia_emision) FROM {q(particionadas[0])}')
+        primer_dia = min(cursor.fetchone()[0] or hoy, hoy)
+
+        for tabla in particionadas:
+            def crear_nueva(nueva):
+                cursor.execute(
+                    f'CREATE TABLE {q(nueva)} (LIKE {q(tabla)} INCLUDING DEFAULTS '
+                    f'INCLUDING CONSTRAINTS INCLUDING IDENTITY) PARTITION BY RANGE (dia_emision)'
+                )
+                for mes, siguiente in _meses(primer_dia, hasta):
+                    cursor.execute(
+                        f'CREATE TABLE {q(tabla + mes.strftime("_p%Y_%m"))} PARTITION OF {q(nueva)} '
+                        f'FOR VALUES FROM (%s) TO (%s)',
+                        [mes, siguiente]
+                    )
+                cursor.execute(f'CREATE TABLE {q(tabla + "_default")} PARTITION OF {q(nueva)} DEFAULT')
+
+            restricciones, indices = _reemplazar_tabla(schema_editor, cursor, tabla, crear_nueva)
+
+            for nombre, tipo, definicion, _ in restricciones:
+                original = None
+                if tipo == 'p':
+                    definicion = 'PRIMARY KEY (id, dia_emision)'
+                elif tipo == 'u' and 'dia_emision' not in definicion:
+                    # Solo se puede exigir la unicidad dentro de cada día
+                    original = definicion
+                    definicion = re.sub(r'[)]$', ', dia_emision)', definicion)
+                cursor.execute(f'ALTER TABLE {q(tabla)} ADD CONSTRAINT {q(nombre)} {definicion}')
+                if original:
+                    cursor.execute(f'COMMENT ON CONSTRAINT {q(nombre)} ON {q(tabla)} IS %s', [MARCA + original])
+            for definicion in indices:
+                cursor.execute(definicion)
+
+        # Las tablas referidas sin particionar (autorizaciones) necesitan una
+        # restricción única que incluya el día
+        for referida in sorted({referida for *_, referida, _ in llaves} - set(particionadas)):
+            unica = f'{referida}_id_dia_emision_uniq'
+            cursor.execute(f'ALTER TABLE {q(referida)} ADD CONSTRAINT {q(unica)} UNIQUE (id, dia_emision)')
+            cursor.execute(f'COMMENT ON CONSTRAINT {q(unica)} ON {q(referida)} IS %s', [MARCA])
+        for tabla, nombre, definicion, columna, referida, _ in llaves:
+            cursor.execute(
+                f'ALTER TABLE {q(tabla)} ADD CONSTRAINT {q(nombre)} '
+                f'FOREIGN KEY ({q(columna)}, dia_emision) REFERENCES {q(referida)} (id, dia_emision) '
+                f'ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED'
+            )
+            cursor.execute(f'COMMENT ON CONSTRAINT {q(nombre)} ON {q(tabla)} IS %s', [MARCA + definicion])
+
+
+def desparticionar(apps, schema_editor):
+    """
+    Vuelve a convertir las tablas particionadas en tablas simples con las
+    restricciones originales
+
+    Las particiones separadas con particionar_documentos --desvincular no
+    se incluyen: siguen como tablas independientes.
+    """
+    conexion = schema_editor.connection
+    if conexion.vendor != 'postgresql':
+        return
+
+    q = schema_editor.quote_name
+    particionadas, con_dia = _tablas(apps)
+
+    with conexion.cursor() as cursor:
+        if not _es_particionada(cursor, particionadas[0]):
+            return
+
+        llaves = _llaves_entre(cursor, con_dia)
+        for tabla, nombre, *_ in llaves:
+            cursor.execute(f'ALTER TABLE {q(tabla)} DROP CONSTRAINT {q(nombre)}')
+        cursor.execute("""
+            SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE conrelid = ANY(%s::regclass[]) AND contype = 'u'
+              AND obj_description(oid, 'pg_constraint') = %s
+        """, [con_dia, MARCA])
+        for tabla, nombre in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {q(tabla)} DROP CONSTRAINT {q(nombre)}')
+
+        for tabla in particionadas:
+            def crear_nueva(nueva):
+                cursor.execute(
+                    f'CREATE TABLE {q(nueva)} (LIKE {q(tabla)} INCLUDING DEFAULTS '
+                    f'INCLUDING CONSTRAINTS INCLUDING IDENTITY)'
+                )
+
+            restricciones, indices = _reemplazar_tabla(schema_editor, cursor, tabla, crear_nueva)
+
+            for nombre, tipo, definicion, comentario in restricciones:
+                if tipo == 'p':
+                    definicion = 'PRIMARY KEY (id)'
+                elif comentario and comentario.startswith(MARCA):
+                    definicion = comentario[len(MARCA):]
+                cursor.execute(f'ALTER TABLE {q(tabla)} ADD CONSTRAINT {q(nombre)} {definicion}')
+            for definicion in indices:
+                cursor.execute(definicion)
+
+        for tabla, nombre, definicion, _, _, comentario in llaves:
+            if comentario and comentario.startswith(MARCA):
+                definicion = comentario[len(MARCA):]
+            cursor.execute(f'ALTER TABLE {q(tabla)} ADD CONSTRAINT {q(nombre)} {definicion}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emisor', '0007_lineadocumento_dia_emision'),
+        ('autoriza', '0011_autorizacion_dia_emision_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(particionar, desparticionar),
+    ]
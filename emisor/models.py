@@ -1,12 +1,15 @@
 
 from django.db import models
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from decimal import Decimal
 from django.utils import timezone
 import uuid
 
-from core.models import TimeStampedModel
+from core import busqueda
+from core.catalogos import Catalogo
+from core.models import DiaLocalField, DiaRelacionadoField, TimeStampedModel, propagar_dia_relacionado
 from core.validators import validate_nit
 
 
@@ -28,13 +31,81 @@ class Contribuyente(TimeStampedModel):
         blank=True
     )
     
+    # Resultado de validar el NIT; se recalcula solo cuando el NIT cambia
+    nit_verificado = models.CharField(max_length=20, blank=True, editable=False)
+    nit_valido = models.BooleanField(default=False, editable=False)
+    nit_error = models.CharField(max_length=255, blank=True, editable=False)
+    
+    CAMPOS_VERIFICACION_NIT = ['nit_verificado', 'nit_valido', 'nit_error']
+    
+    # Campos indexados para la búsqueda (core.busqueda) y su peso; los
+    # documentos recibidos copian el NIT y el nombre del receptor
+    CAMPOS_BUSQUEDA = {'nit': 3, 'nombre': 2, 'nombre_comercial': 2}
+    DEPENDIENTES_BUSQUEDA = ['documentos_recibidos']
+    
     class Meta:
         verbose_name = "Contribuyente"
         verbose_name_plural = "Contribuyentes"
         ordering = ['nombre']
+        indexes = [
+            # Delta del directorio de NIT (emisor.directorio)
+            models.Index(fields=['modified'], name='contribuyente_modificado_idx'),
+        ]
         
     def __str__(self):
         return f"{self.nombre} ({self.nit})"
+    
+    def save(self, *args, **kwargs):
+        if self.nit_verificado != self.nit:
+            self.verificar_nit()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.CAMPOS_VERIFICACION_NIT)
+        # El índice de búsqueda, el directorio de NIT y los catálogos se
+        # actualizan en emisor.signals
+        super().save(*args, **kwargs)
+    
+    def verificar_nit(self):
+        """
+        Valida el NIT actual y guarda el resultado en la instancia (sin guardar)
+        """
+        try:
+            validate_nit(self.nit)
+            self.nit_valido = True
+            self.nit_error = ''
+        except ValidationError as e:
+            self.nit_valido = False
+            self.nit_error = '; '.join(e.messages)[:255]
+        self.nit_verificado = self.nit
+    
+    def error_nit(self):
+        """
+        Retorna None si el NIT es válido o el detalle del error de validación
+        
+        Usa el resultado guardado; solo valida de nuevo si el NIT se modificó
+        sin pasar por save() (update, bulk_create).
+        """
+        if self.nit_verificado != self.nit:
+            self.verificar_nit()
+        return None if self.nit_valido else self.nit_error
+
+
+class ContribuyenteEliminado(models.Model):
+    """
+    Registro de un contribuyente eliminado, para que el delta del directorio
+    de NIT (emisor.directorio) descarte su entrada del archivo
+
+    Los registros anteriores al archivo vigente se borran al generarlo.
+    """
+    contribuyente_id = models.BigIntegerField()
+    eliminado = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = "Contribuyente eliminado"
+        verbose_name_plural = "Contribuyentes eliminados"
+
+    def __str__(self):
+        return f"Contribuyente #{self.contribuyente_id}"
 
 
 class Establecimiento(TimeStampedModel):
@@ -95,6 +166,15 @@ class DocumentoTributario(TimeStampedModel):
         (ESTADO_ANULADO, 'Anulado'),
     ]
     
+    # Campos indexados para la búsqueda (core.busqueda) y su peso
+    CAMPOS_BUSQUEDA = {
+        'referencia_interna': 3,
+        'observaciones': 1,
+        'receptor__nit': 2,
+        'receptor__nombre': 2,
+        'receptor__nombre_comercial': 2,
+    }
+    
     # Campos de identificación
     uuid = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     tipo_documento = models.ForeignKey(TipoDocumento, on_delete=models.PROTECT)
@@ -119,6 +199,8 @@ class DocumentoTributario(TimeStampedModel):
     
     # Fechas
     fecha_emision = models.DateTimeField(default=timezone.now)
+    # Día local de emisión; se calcula al guardar para filtrar por día con índice
+    dia_emision = DiaLocalField(origen='fecha_emision', db_index=True)
     
     # Montos
     moneda = models.CharField(max_length=3, default='GTQ')  # Quetzal guatemalteco
@@ -151,9 +233,27 @@ class DocumentoTributario(TimeStampedModel):
     class Meta:
         verbose_name = "Documento Tributario"
         verbose_name_plural = "Documentos Tributarios"
-        # No puede haber duplicados en referencia para el mismo emisor y fecha
-        unique_together = [['emisor', 'referencia_interna', 'fecha_emision']]
         ordering = ['-fecha_emision']
+        constraints = [
+            # No puede haber duplicados en referencia para el mismo emisor y día
+            models.UniqueConstraint(
+                fields=['emisor', 'referencia_interna', 'dia_emision'],
+                name='documento_referencia_dia_unica'
+            ),
+        ]
+        # Índices según las consultas frecuentes (ver emisor/consultas_frecuentes.py)
+        indexes = [
+            # Listados (y páginas por cursor sobre fecha e id) de todos los
+            # documentos, del emisor y del receptor ordenados por fecha
+            models.Index(fields=['-fecha_emision', '-id'], name='documento_fecha_id_idx'),
+            models.Index(fields=['emisor', '-fecha_emision', '-id'], name='documento_emisor_fecha_idx'),
+            models.Index(fields=['receptor', '-fecha_emision'], name='documento_receptor_fecha_idx'),
+            # Reportes de IVA de un contribuyente por día
+            models.Index(fields=['emisor', 'dia_emision'], name='documento_emisor_dia_idx'),
+            models.Index(fields=['receptor', 'dia_emision'], name='documento_receptor_dia_idx'),
+            # Reportes y exportaciones de documentos autorizados por rango de días
+            models.Index(fields=['estado', 'dia_emision'], name='documento_estado_dia_idx'),
+        ]
     
     def __str__(self):
         return f"{self.tipo_documento} - {self.referencia_interna} ({self.estado})"
@@ -182,31 +282,6 @@ class DocumentoTributario(TimeStampedModel):
             
         return True, ""
     
-    def generar_numero_autorizacion(self):
-        """
-        Genera el número de autorización con formato YYYYMMDD########
-        """
-        from autoriza.models import Autorizacion
-        
-        fecha = self.fecha_emision
-        fecha_str = fecha.strftime("%Y%m%d")
-        
-        # Obtiene el último correlativo para la fecha actual
-        ultimo = Autorizacion.objects.filter(
-            fecha_autorizacion__year=fecha.year,
-            fecha_autorizacion__month=fecha.month,
-            fecha_autorizacion__day=fecha.day
-        ).order_by('-correlativo').first()
-        
-        correlativo = 1
-        if ultimo:
-            correlativo = ultimo.correlativo + 1
-            
-        # Formatea el correlativo con ceros a la izquierda (8 dígitos)
-        correlativo_str = f"{correlativo:08d}"
-        
-        return f"{fecha_str}{correlativo_str}"
-    
     def save(self, *args, **kwargs):
         if not self.pk:
             # Si es nuevo registro y no se ha especificado IVA o total
@@ -214,8 +289,18 @@ class DocumentoTributario(TimeStampedModel):
                 self.iva = self.calcular_iva()
             if not self.total:
                 self.total = self.calcular_total()
-                
+        
+        # El día de emisión se deriva de la fecha; se guarda siempre junto con ella
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'fecha_emision' in update_fields and 'dia_emision' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'dia_emision']
+        
+        dia_anterior = None if self._state.adding else self.dia_emision
         super().save(*args, **kwargs)
+        if dia_anterior is not None and dia_anterior != self.dia_emision:
+            # Las líneas, autorizaciones y tareas guardan una copia del día
+            propagar_dia_relacionado(DocumentoTributario, [self.pk], self._state.db)
+        busqueda.indexar(self, kwargs.get('update_fields'))
 
 
 class LineaDocumento(TimeStampedModel):
@@ -227,6 +312,8 @@ class LineaDocumento(TimeStampedModel):
         on_delete=models.CASCADE,
         related_name='lineas'
     )
+    # Día de emisión del documento (columna de partición, ver emisor/particiones.py)
+    dia_emision = DiaRelacionadoField(relacion='documento')
     descripcion = models.CharField(max_length=255)
     cantidad = models.DecimalField(
         max_digits=12, 
@@ -260,4 +347,19 @@ class LineaDocumento(TimeStampedModel):
     def save(self, *args, **kwargs):
         if not self.subtotal:
             self.subtotal = self.calcular_subtotal()
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+# Catálogos en caché (core.catalogos); se invalidan en emisor.signals al guardar o eliminar
+tipos_documento_activos = Catalogo(
+    'tipos_documento',
+    lambda: list(TipoDocumento.objects.filter(activo=True).order_by('id'))
+)
+establecimientos_activos = Catalogo(
+    'establecimientos',
+    lambda contribuyente_id: list(
+        Establecimiento.objects.filter(
+            contribuyente_id=contribuyente_id, activo=True
+        ).select_related('contribuyente').order_by('id')
+    )
+)
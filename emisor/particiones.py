@@ -0,0 +1,282 @@
+# emisor/particiones.py
+"""
+Mantenimiento de las particiones mensuales de los documentos tributarios.
+
+Con DOCUMENTOS_PARTICIONADOS en PostgreSQL, la migración emisor 0008
+convierte los documentos, sus líneas y los errores de autorización en
+tablas particionadas por rango de ``dia_emision``: una partición por mes
+(``<tabla>_pAAAA_MM``) y una partición DEFAULT para las fechas fuera de
+rango. Las consultas que filtran por dia_emision (reportes, exportaciones,
+tablero) solo leen las particiones de esos meses (partition pruning).
+
+Este módulo crea por adelantado las particiones de los meses siguientes y
+separa (DETACH) las de meses antiguos; lo usa el comando
+particionar_documentos. En otros motores, o sin particiones, las mismas
+consultas usan el índice de dia_emision y ``resumen_mensual`` entrega la
+distribución por mes con el ORM.
+"""
+import contextlib
+import datetime
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import DocumentoTributario, LineaDocumento
+
+
+# Límites de una partición: FOR VALUES FROM ('2024-01-01') TO ('2024-02-01')
+_LIMITES = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+class ParticionError(Exception):
+    """
+    Operación de particionamiento no disponible o no aplicable
+    """
+
+
+def tablas():
+    """
+    Tablas particionadas, empezando por la de documentos
+    """
+    from autoriza.models import AutorizacionError
+
+    return [modelo._meta.db_table for modelo in (DocumentoTributario, LineaDocumento, AutorizacionError)]
+
+
+def _q(nombre):
+    return connection.ops.quote_name(nombre)
+
+
+def siguiente_mes(fecha):
+    return (fecha.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def meses(desde, hasta):
+    """
+    Primer día de cada mes entre dos fechas (ambos meses incluidos)
+    """
+    mes = desde.replace(day=1)
+    while mes <= hasta:
+        yield mes
+        mes = siguiente_mes(mes)
+
+
+def nombre_particion(tabla, mes):
+    return f'{tabla}{mes.strftime("_p%Y_%m")}'
+
+
+def es_particionada():
+    """
+    Indica si la tabla de documentos es una tabla particionada
+    """
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)',
+            [DocumentoTributario._meta.db_table]
+        )
+        return cursor.fetchone() is not None
+
+
+def _requiere_particiones():
+    if not es_particionada():
+        raise ParticionError(
+            'Los documentos no están particionados (requiere PostgreSQL y DOCUMENTOS_PARTICIONADOS)'
+        )
+
+
+def particiones(tabla=None):
+    """
+    Particiones mensuales adjuntas a una tabla (por omisión, la de documentos)
+
+    Retorna:
+    - Lista de tuplas (nombre, desde, hasta) ordenada por fecha
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT hija.relname, pg_get_expr(hija.relpartbound, hija.oid)
+            FROM pg_inherits
+            JOIN pg_class hija ON hija.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+        """, [tabla or DocumentoTributario._meta.db_table])
+        filas = cursor.fetchall()
+
+    resultado = []
+    for nombre, limites in filas:
+        coincidencia = _LIMITES.search(limites or '')
+        if coincidencia:
+            resultado.append((
+                nombre,
+                datetime.date.fromisoformat(coincidencia.group(1)),
+                datetime.date.fromisoformat(coincidencia.group(2)),
+            ))
+    return sorted(resultado, key=lambda particion: particion[1])
+
+
+@contextlib.contextmanager
+def _sin_llaves_hacia_documentos(cursor):
+    """
+    Elimina durante el bloque las llaves foráneas que apuntan a los
+    documentos y al terminar las vuelve a crear (validándolas)
+
+    PostgreSQL verifica esas llaves en la partición de la que sale una
+    fila, por lo que no permite mover documentos con filas dependientes
+    entre particiones fuera de un UPDATE.
+    """
+    cursor.execute("""
+        SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid),
+               obj_description(oid, 'pg_constraint')
+        FROM pg_constraint
+        WHERE contype = 'f' AND conparentid = 0 AND confrelid = to_regclass(%s)
+    """, [DocumentoTributario._meta.db_table])
+    llaves = cursor.fetchall()
+    for tabla, nombre, _, _ in llaves:
+        cursor.execute(f'ALTER TABLE {_q(tabla)} DROP CONSTRAINT {_q(nombre)}')
+    yield
+    for tabla, nombre, definicion, comentario in llaves:
+        cursor.execute(f'ALTER TABLE {_q(tabla)} ADD CONSTRAINT {_q(nombre)} {definicion}')
+        if comentario:
+            cursor.execute(f'COMMENT ON CONSTRAINT {_q(nombre)} ON {_q(tabla)} IS %s', [comentario])
+
+
+def _crear_particion(cursor, tabla, mes):
+    """
+    Crea la partición de un mes trasladando las filas de ese mes que
+    hubieran caído en la partición DEFAULT
+    """
+    nombre = nombre_particion(tabla, mes)
+    cursor.execute(f'CREATE TABLE {_q(nombre)} (LIKE {_q(tabla)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(f"""
+        WITH movidas AS (
+            DELETE FROM {_q(tabla + '_default')}
+            WHERE dia_emision >= %s AND dia_emision < %s
+            RETURNING *
+        )
+        INSERT INTO {_q(nombre)} SELECT * FROM movidas
+    """, [mes, siguiente_mes(mes)])
+    cursor.execute(
+        f'ALTER TABLE {_q(tabla)} ATTACH PARTITION {_q(nombre)} FOR VALUES FROM (%s) TO (%s)',
+        [mes, siguiente_mes(mes)]
+    )
+
+
+@transaction.atomic
+def crear_particiones(meses_futuros=None, hoy=None):
+    """
+    Crea en las tres tablas las particiones que faltan desde el mes actual
+    hasta ``meses_futuros`` meses después (DOCUMENTOS_PARTICIONES_FUTURAS)
+
+    Normalmente la partición DEFAULT está vacía y crear la de un mes es
+    inmediato. Si tiene documentos de ese mes, se trasladan a la partición
+    nueva; para eso se eliminan y se vuelven a validar las llaves foráneas
+    hacia los documentos, lo que recorre las tablas dependientes.
+
+    Retorna:
+    - Lista de nombres de las particiones creadas
+    """
+    _requiere_particiones()
+    if meses_futuros is None:
+        meses_futuros = getattr(settings, 'DOCUMENTOS_PARTICIONES_FUTURAS', 3)
+    hoy = hoy or timezone.localdate()
+    hasta = hoy
+    for _ in range(meses_futuros):
+        hasta = siguiente_mes(hasta)
+
+    pendientes = []
+    for tabla in tablas():
+        existentes = {desde for _, desde, _ in particiones(tabla)}
+        pendientes.extend((tabla, mes) for mes in meses(hoy, hasta) if mes not in existentes)
+    if not pendientes:
+        return []
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT 1 FROM {_q(DocumentoTributario._meta.db_table + "_default")} '
+            f'WHERE dia_emision >= %s AND dia_emision < %s LIMIT 1',
+            [hoy.replace(day=1), siguiente_mes(hasta)]
+        )
+        if cursor.fetchone():
+            with _sin_llaves_hacia_documentos(cursor):
+                for tabla, mes in pendientes:
+                    _crear_particion(cursor, tabla, mes)
+        else:
+            for tabla, mes in pendientes:
+                cursor.execute(
+                    f'CREATE TABLE {_q(nombre_particion(tabla, mes))} PARTITION OF {_q(tabla)} '
+                    f'FOR VALUES FROM (%s) TO (%s)',
+                    [mes, siguiente_mes(mes)]
+                )
+    return [nombre_particion(tabla, mes) for tabla, mes in pendientes]
+
+
+@transaction.atomic
+def desvincular_particiones(antes_de, eliminar=False):
+    """
+    Separa (DETACH) las particiones de los meses anteriores a una fecha
+
+    Las particiones separadas quedan como tablas independientes, con el
+    mismo nombre y sin llaves foráneas, fuera de las consultas de la
+    aplicación, para respaldarlas; con ``eliminar`` se borran. Las
+    autorizaciones y tareas no están particionadas: si alguna pertenece a
+    esos meses no se separa nada (primero archivar_documentos).
+
+    Parámetros:
+    - antes_de: Fecha; se separan las particiones que terminan en o antes de su mes
+    - eliminar: Borrar las tablas separadas
+
+    Retorna:
+    - Lista de nombres de las particiones separadas
+    """
+    from autoriza.models import Autorizacion, TareaAutorizacion
+
+    _requiere_particiones()
+    limite = antes_de.replace(day=1)
+    for modelo in (Autorizacion, TareaAutorizacion):
+        if modelo.objects.filter(dia_emision__lt=limite).exists():
+            raise ParticionError(
+                f'Hay {modelo._meta.verbose_name_plural.lower()} de documentos anteriores a '
+                f'{limite:%Y-%m}; ejecute archivar_documentos antes de separar las particiones'
+            )
+
+    separadas = []
+    with connection.cursor() as cursor:
+        # Primero las tablas dependientes: una partición de documentos solo
+        # se puede separar si ninguna fila la referencia
+        for tabla in reversed(tablas()):
+            for nombre, _, hasta in particiones(tabla):
+                if hasta > limite:
+                    continue
+                cursor.execute(f'ALTER TABLE {_q(tabla)} DETACH PARTITION {_q(nombre)}')
+                cursor.execute(
+                    "SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+                    [nombre]
+                )
+                for (llave,) in cursor.fetchall():
+                    cursor.execute(f'ALTER TABLE {_q(nombre)} DROP CONSTRAINT {_q(llave)}')
+                if eliminar:
+                    cursor.execute(f'DROP TABLE {_q(nombre)}')
+                separadas.append(nombre)
+    return separadas
+
+
+def resumen_mensual():
+    """
+    Cantidad de documentos por mes de emisión, calculada con el ORM; es la
+    alternativa a particiones() sin particionamiento
+
+    Retorna:
+    - Lista de tuplas (mes, cantidad) ordenada por mes
+    """
+    return [
+        (fila['mes'], fila['cantidad'])
+        for fila in DocumentoTributario.objects.annotate(
+            mes=TruncMonth('dia_emision')
+        ).values('mes').annotate(
+            cantidad=Count('id')
+        ).order_by('mes')
+    ]
@@ -0,0 +1,400 @@
+# emisor/services.py
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.utils import timezone
+
+from core import busqueda
+
+from . import directorio
+from .models import (
+    DocumentoTributario, LineaDocumento, establecimientos_activos, tipos_documento_activos
+)
+
+
+# Campos de una línea existente que se actualizan al guardar el documento
+CAMPOS_LINEA = ['descripcion', 'cantidad', 'precio_unitario', 'descuento', 'subtotal', 'modified']
+
+# Restricción única de (emisor, referencia_interna, dia_emision)
+RESTRICCION_REFERENCIA = 'documento_referencia_dia_unica'
+
+
+class ReferenciaDuplicada(ValidationError):
+    """
+    El emisor ya tiene un documento con la misma referencia en el día
+    """
+
+    def __init__(self, documento):
+        dia = documento.dia_emision or timezone.localdate(documento.fecha_emision)
+        super().__init__(self.errores(dia))
+
+    @staticmethod
+    def errores(dia):
+        """
+        Retorna:
+        - Los errores por campo ({campo: [mensajes]}) de una referencia
+          repetida en el día indicado
+        """
+        if dia == timezone.localdate():
+            mensaje = "Ya existe un documento con esta referencia para el día de hoy."
+        else:
+            mensaje = f"Ya existe un documento con esta referencia para el {dia.strftime('%d/%m/%Y')}."
+        return {'referencia_interna': [mensaje]}
+
+
+def es_referencia_duplicada(error):
+    """
+    Indica si un IntegrityError proviene de la restricción de referencia única por día
+    """
+    causa = error.__cause__
+    diagnostico = getattr(causa, 'diag', None)
+    nombre = getattr(diagnostico, 'constraint_name', None)
+    if nombre:
+        # Con DOCUMENTOS_PARTICIONADOS PostgreSQL informa el índice de la
+        # partición; el detalle indica las columnas de la llave repetida
+        detalle = diagnostico.message_detail or ''
+        return nombre == RESTRICCION_REFERENCIA or '(emisor_id, referencia_interna, dia_emision)=' in detalle
+
+    # SQLite (y otros motores) solo informan las columnas de la restricción
+    mensaje = str(error)
+    return RESTRICCION_REFERENCIA in mensaje or (
+        'referencia_interna' in mensaje and 'dia_emision' in mensaje
+    )
+
+
+def referencia_disponible(modelo, emisor_id, referencia, dia, using=DEFAULT_DB_ALIAS):
+    """
+    Retorna:
+    - La primera variante de la referencia ("REF-2", "REF-3", ...) que el
+      emisor no usa en el día, recortada a la longitud del campo
+    """
+    longitud = modelo._meta.get_field('referencia_interna').max_length
+    usadas = set(
+        modelo.objects.using(using).filter(
+            emisor_id=emisor_id, dia_emision=dia
+        ).values_list('referencia_interna', flat=True)
+    )
+    numero = 2
+    while True:
+        sufijo = f"-{numero}"
+        candidata = f"{referencia[:longitud - len(sufijo)]}{sufijo}"
+        if candidata not in usadas:
+            return candidata
+        numero += 1
+
+
+def renombrar_referencia(modelo, documento, using=DEFAULT_DB_ALIAS):
+    """
+    Asigna al documento una referencia libre en su día y deja la original
+    en las observaciones, sin pasar por save()
+
+    Parámetros:
+    - modelo: Clase DocumentoTributario (la actual o la de una migración)
+    - documento: Instancia con id, emisor_id, referencia_interna,
+      dia_emision y observaciones cargados
+    """
+    original = documento.referencia_interna
+    documento.referencia_interna = referencia_disponible(
+        modelo, documento.emisor_id, original, documento.dia_emision, using
+    )
+    nota = f"Referencia original: {original} (repetida el {documento.dia_emision.strftime('%d/%m/%Y')})"
+    documento.observaciones = f"{documento.observaciones}\n{nota}" if documento.observaciones else nota
+    modelo.objects.using(using).filter(pk=documento.pk).update(
+        referencia_interna=documento.referencia_interna,
+        dia_emision=documento.dia_emision,
+        observaciones=documento.observaciones
+    )
+
+
+def guardar_encabezado(documento, **kwargs):
+    """
+    Guarda el encabezado de un documento confiando en la restricción única
+    para rechazar referencias repetidas en el día, sin consultarlas antes
+
+    Parámetros:
+    - documento: Instancia de DocumentoTributario
+    - kwargs: Argumentos de save() (p. ej. update_fields)
+
+    Lanza:
+    - ReferenciaDuplicada si el emisor ya usó la referencia ese día
+    """
+    try:
+        with transaction.atomic():
+            documento.save(**kwargs)
+    except IntegrityError as e:
+        if es_referencia_duplicada(e):
+            raise ReferenciaDuplicada(documento) from e
+        raise
+
+
+def calcular_totales(documento, lineas):
+    """
+    Calcula en memoria el subtotal de cada línea y los totales del documento
+
+    Parámetros:
+    - documento: Instancia de DocumentoTributario
+    - lineas: Lista de instancias de LineaDocumento del documento
+    """
+    for linea in lineas:
+        linea.subtotal = linea.calcular_subtotal().quantize(Decimal('0.01'))
+
+    documento.subtotal = sum((linea.subtotal for linea in lineas), Decimal('0.00'))
+    documento.descuento = sum((linea.descuento for linea in lineas), Decimal('0.00'))
+    documento.iva = documento.calcular_iva()
+    documento.total = documento.calcular_total()
+
+
+@transaction.atomic
+def guardar_documento(documento, lineas=None, eliminadas=(), reemplazar=False):
+    """
+    Guarda un documento y sus líneas calculando los totales en una sola pasada
+
+    El encabezado se guarda una sola vez con los totales ya calculados, las
+    líneas nuevas se insertan con un único bulk_create y las existentes se
+    actualizan con un único bulk_update, sin volver a leerlas.
+
+    Parámetros:
+    - documento: Instancia de DocumentoTributario (nueva o existente)
+    - lineas: Lista final de líneas del documento; las que no tienen pk se
+      crean. Si es None se conservan las líneas guardadas y solo se
+      recalculan los totales.
+    - eliminadas: Líneas existentes que se deben eliminar
+    - reemplazar: Eliminar todas las líneas guardadas antes de crear las recibidas
+
+    Retorna:
+    - Instancia de DocumentoTributario guardada
+
+    Lanza:
+    - ReferenciaDuplicada si el emisor ya usó la referencia ese día
+    """
+    if lineas is None:
+        calcular_totales(documento, list(documento.lineas.all()) if documento.pk else [])
+        guardar_encabezado(documento)
+        return documento
+
+    lineas = list(lineas)
+    calcular_totales(documento, lineas)
+    guardar_encabezado(documento)
+
+    if reemplazar:
+        documento.lineas.all().delete()
+    elif eliminadas:
+        LineaDocumento.objects.filter(
+            documento=documento,
+            pk__in=[linea.pk for linea in eliminadas if linea.pk]
+        ).delete()
+
+    nuevas = []
+    existentes = []
+    now = timezone.now()
+    for linea in lineas:
+        linea.documento = documento
+        if linea.pk is None or reemplazar:
+            linea.pk = None
+            nuevas.append(linea)
+        else:
+            linea.modified = now
+            existentes.append(linea)
+
+    LineaDocumento.objects.bulk_create(nuevas)
+    if existentes:
+        LineaDocumento.objects.bulk_update(existentes, CAMPOS_LINEA)
+
+    return documento
+
+
+def lineas_desde_formset(formset):
+    """
+    Obtiene las líneas de un LineaDocumentoFormSet ya validado sin guardarlas
+
+    Retorna:
+    - Tupla (lineas, eliminadas)
+    """
+    lineas = []
+    eliminadas = []
+    formularios_eliminados = formset.deleted_forms if formset.can_delete else []
+
+    for form in formset.forms:
+        linea = form.instance
+        if form in formularios_eliminados:
+            if linea.pk:
+                eliminadas.append(linea)
+            continue
+        # Formularios extra que se dejaron vacíos
+        if linea.pk is None and not form.has_changed():
+            continue
+        lineas.append(linea)
+
+    return lineas, eliminadas
+
+
+def limpiar_nit(nit):
+    """
+    Elimina guiones y otros caracteres especiales de un NIT
+    """
+    return ''.join(c for c in nit if c.isalnum())
+
+
+def _insertar_documentos(documentos):
+    """
+    Inserta los documentos con bulk_create; si alguno viola una restricción
+    única se reintenta uno por uno para aislar el error
+
+    Los reintentos también usan bulk_create (no save()): los documentos
+    guardados se indexan después en un solo lote.
+
+    Retorna:
+    - Diccionario {posición: {campo: [mensajes]}} de los que no se guardaron
+    """
+    try:
+        with transaction.atomic():
+            DocumentoTributario.objects.bulk_create(documentos)
+        return {}
+    except IntegrityError:
+        pass
+
+    errores = {}
+    for posicion, documento in enumerate(documentos):
+        documento.pk = None
+        try:
+            with transaction.atomic():
+                DocumentoTributario.objects.bulk_create([documento])
+        except IntegrityError as e:
+            if es_referencia_duplicada(e):
+                errores[posicion] = ReferenciaDuplicada(documento).message_dict
+            else:
+                errores[posicion] = {'non_field_errors': [f"No se pudo guardar el documento: {e}"]}
+    return errores
+
+
+@transaction.atomic
+def crear_documentos_lote(emisor, registros, emitir=False, referencias_vistas=None):
+    """
+    Crea en bloque un conjunto de documentos de un emisor con sus líneas
+
+    Los receptores se resuelven con el directorio de NIT y los tipos de
+    documento y establecimientos con los catálogos en caché, las
+    referencias duplicadas se detectan con una sola consulta por día de
+    emisión y los documentos y sus líneas se insertan con bulk_create.
+
+    Parámetros:
+    - emisor: Contribuyente que emite los documentos
+    - registros: Lista de tuplas (indice, datos) con los datos ya validados
+      de cada documento (tipo_documento y establecimiento como id,
+      receptor_nit, referencia_interna, fecha_emision opcional, moneda,
+      observaciones y lineas)
+    - emitir: Crear los documentos emitidos y enviarlos a autorización
+    - referencias_vistas: Conjunto de (referencia, fecha) ya creadas en
+      lotes anteriores de la misma carga (se actualiza)
+
+    Retorna:
+    - Lista de tuplas (indice, documento, errores); documento es None si
+      no se creó y errores tiene la forma de DRF ({campo: [mensajes]})
+    """
+    if referencias_vistas is None:
+        referencias_vistas = set()
+
+    if not registros:
+        return []
+
+    now = timezone.now()
+
+    receptores = directorio.contribuyentes({limpiar_nit(datos['receptor_nit']) for _, datos in registros})
+    tipos = {tipo.pk: tipo for tipo in tipos_documento_activos.obtener()}
+    establecimientos = {
+        establecimiento.pk: establecimiento
+        for establecimiento in establecimientos_activos.obtener(emisor.pk)
+    }
+
+    # Referencias ya registradas por el emisor en los días del lote
+    fechas = [timezone.localdate(datos.get('fecha_emision') or now) for _, datos in registros]
+    existentes = set(
+        DocumentoTributario.objects.filter(
+            emisor=emisor,
+            referencia_interna__in={datos['referencia_interna'] for _, datos in registros},
+            dia_emision__in=set(fechas)
+        ).values_list('referencia_interna', 'dia_emision')
+    )
+
+    resultados = []
+    pendientes = []
+    # Solicitudes de autorización rechazadas por repetir la referencia
+    rechazadas = []
+
+    for (indice, datos), fecha in zip(registros, fechas):
+        errores = {}
+
+        receptor = receptores.get(limpiar_nit(datos['receptor_nit']))
+        if receptor is None:
+            errores['receptor_nit'] = ["No existe un contribuyente con el NIT proporcionado"]
+
+        tipo_documento = tipos.get(datos['tipo_documento'])
+        if tipo_documento is None:
+            errores['tipo_documento'] = ["Tipo de documento inexistente o inactivo"]
+
+        establecimiento = establecimientos.get(datos['establecimiento'])
+        if establecimiento is None:
+            errores['establecimiento'] = ["El establecimiento no pertenece al emisor o está inactivo"]
+
+        clave = (datos['referencia_interna'], fecha)
+        duplicada = clave in existentes or clave in referencias_vistas
+        if duplicada:
+            errores.update(ReferenciaDuplicada.errores(fecha))
+
+        if errores:
+            if emitir and duplicada and len(errores) == 1:
+                rechazadas.append(DocumentoTributario(
+                    emisor=emisor, receptor=receptor, fecha_emision=datos.get('fecha_emision') or now
+                ))
+            resultados.append((indice, None, errores))
+            continue
+
+        referencias_vistas.add(clave)
+
+        documento = DocumentoTributario(
+            tipo_documento=tipo_documento,
+            referencia_interna=datos['referencia_interna'],
+            emisor=emisor,
+            establecimiento=establecimiento,
+            receptor=receptor,
+            fecha_emision=datos.get('fecha_emision') or now,
+            moneda=datos.get('moneda') or 'GTQ',
+            observaciones=datos.get('observaciones', ''),
+            estado=DocumentoTributario.ESTADO_EMITIDO if emitir else DocumentoTributario.ESTADO_BORRADOR,
+            es_borrador=not emitir
+        )
+        lineas = [LineaDocumento(**linea) for linea in datos['lineas']]
+        calcular_totales(documento, lineas)
+        pendientes.append((indice, documento, lineas))
+
+    errores_insercion = _insertar_documentos([documento for _, documento, _ in pendientes])
+
+    guardados = []
+    lineas_lote = []
+    for posicion, (indice, documento, lineas) in enumerate(pendientes):
+        if posicion in errores_insercion:
+            referencias_vistas.discard((documento.referencia_interna, timezone.localdate(documento.fecha_emision)))
+            if emitir and 'referencia_interna' in errores_insercion[posicion]:
+                rechazadas.append(documento)
+            resultados.append((indice, None, errores_insercion[posicion]))
+            continue
+        for linea in lineas:
+            linea.documento = documento
+        lineas_lote.extend(lineas)
+        guardados.append(documento)
+        resultados.append((indice, documento, None))
+
+    LineaDocumento.objects.bulk_create(lineas_lote)
+    busqueda.indexar_lote(guardados)
+
+    if emitir and guardados:
+        from autoriza.tasks import solicitar_autorizaciones
+        solicitar_autorizaciones(guardados)
+
+    if rechazadas:
+        from autoriza.services import registrar_referencias_duplicadas
+        registrar_referencias_duplicadas(rechazadas)
+
+    resultados.sort(key=lambda resultado: resultado[0])
+    return resultados
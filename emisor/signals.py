@@ -0,0 +1,50 @@
+# emisor/signals.py
+"""
+Receptores que mantienen al día el índice de búsqueda, el directorio de
+NIT y los catálogos en caché al guardar o eliminar los modelos de emisor.
+Se conectan en EmisorConfig.ready().
+
+Las cargas con loaddata (raw) no se procesan: después se ejecutan
+invalidar_catalogos y construir_directorio_nit.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core import busqueda
+
+from . import directorio
+from .models import (
+    Contribuyente, Establecimiento, TipoDocumento,
+    establecimientos_activos, tipos_documento_activos
+)
+
+
+@receiver(post_save, sender=Contribuyente, dispatch_uid='emisor.contribuyente_guardado')
+def contribuyente_guardado(sender, instance, created, raw, update_fields, **kwargs):
+    if raw:
+        return
+    # El directorio de NIT y los establecimientos en caché guardan el
+    # NIT y el nombre del contribuyente, los mismos campos de la búsqueda
+    if busqueda.indexar(instance, update_fields):
+        directorio.invalidar()
+        if not created:
+            establecimientos_activos.invalidar()
+
+
+@receiver(post_delete, sender=Contribuyente, dispatch_uid='emisor.contribuyente_eliminado')
+def contribuyente_eliminado(sender, instance, **kwargs):
+    directorio.eliminar(instance.pk)
+
+
+@receiver(post_save, sender=Establecimiento, dispatch_uid='emisor.establecimiento_guardado')
+@receiver(post_delete, sender=Establecimiento, dispatch_uid='emisor.establecimiento_eliminado')
+def establecimiento_modificado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        establecimientos_activos.invalidar()
+
+
+@receiver(post_save, sender=TipoDocumento, dispatch_uid='emisor.tipo_documento_guardado')
+@receiver(post_delete, sender=TipoDocumento, dispatch_uid='emisor.tipo_documento_eliminado')
+def tipo_documento_modificado(sender, instance, raw=False, **kwargs):
+    if not raw:
+        tipos_documento_activos.invalidar()
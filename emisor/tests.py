@@ -1,3 +1,574 @@
-from django.test import TestCase
+import datetime
+import os
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import busqueda
+from core.tests import EscenarioMixin, nit_valido
+
+from . import directorio, particiones
+from .forms import DocumentoTributarioForm, LineaDocumentoFormSet
+from .models import Contribuyente, ContribuyenteEliminado, DocumentoTributario, LineaDocumento
+from .services import ReferenciaDuplicada, guardar_documento, lineas_desde_formset
+
+
+class GuardarDocumentoTests(EscenarioMixin, TestCase):
+
+    def nuevo(self, referencia, **campos):
+        return DocumentoTributario(
+            tipo_documento=self.tipo, referencia_interna=referencia, emisor=self.emisor,
+            receptor=self.receptor, establecimiento=self.establecimiento, **campos
+        )
+
+    def linea(self):
+        return LineaDocumento(descripcion='Servicio', cantidad=Decimal('1'), precio_unitario=Decimal('50.00'))
+
+    def test_referencia_repetida_en_el_dia_lanza_referencia_duplicada(self):
+        guardar_documento(self.nuevo('REF-1'), [self.linea()])
+
+        with self.assertRaises(ReferenciaDuplicada) as contexto:
+            guardar_documento(self.nuevo('REF-1'), [self.linea()])
+
+        self.assertEqual(
+            contexto.exception.message_dict,
+            {'referencia_interna': ['Ya existe un documento con esta referencia para el día de hoy.']}
+        )
+        self.assertEqual(DocumentoTributario.objects.filter(referencia_interna='REF-1').count(), 1)
+        self.assertEqual(LineaDocumento.objects.count(), 1)
+
+    def test_la_misma_referencia_se_acepta_en_otro_dia(self):
+        guardar_documento(self.nuevo('REF-1'), [self.linea()])
+
+        documento = guardar_documento(
+            self.nuevo('REF-1', fecha_emision=timezone.now() - datetime.timedelta(days=1)),
+            [self.linea()]
+        )
+
+        self.assertEqual(documento.subtotal, Decimal('50.00'))
+        self.assertEqual(DocumentoTributario.objects.filter(referencia_interna='REF-1').count(), 2)
+
+
+class DocumentoFormTests(EscenarioMixin, TestCase):
+
+    def test_editar_eliminar_y_agregar_lineas_recalcula_los_totales(self):
+        borrador = DocumentoTributario(
+            tipo_documento=self.tipo, referencia_interna='FORM-1', emisor=self.emisor,
+            receptor=self.receptor, establecimiento=self.establecimiento
+        )
+        guardar_documento(borrador, [
+            LineaDocumento(descripcion='Uno', cantidad=Decimal('1'), precio_unitario=Decimal('10.00')),
+            LineaDocumento(descripcion='Dos', cantidad=Decimal('2'), precio_unitario=Decimal('20.00')),
+            LineaDocumento(descripcion='Tres', cantidad=Decimal('3'), precio_unitario=Decimal('30.00')),
+        ])
+        uno, dos, tres = borrador.lineas.order_by('id')
+
+        datos = {
+            'tipo_documento': self.tipo.pk, 'referencia_interna': 'FORM-1',
+            'establecimiento': self.establecimiento.pk, 'moneda': 'GTQ', 'observaciones': '',
+            'nit_receptor': self.receptor.nit,
+            'lineas-TOTAL_FORMS': '4', 'lineas-INITIAL_FORMS': '3',
+            'lineas-MIN_NUM_FORMS': '1', 'lineas-MAX_NUM_FORMS': '1000',
+        }
+        filas = [
+            (uno, 'Uno editada', '4', '10.00', '5.00', False),
+            (dos, 'Dos', '2', '20.00', '0.00', True),
+            (tres, 'Tres', '3', '30.00', '0.00', False),
+            (None, 'Cuatro', '1', '7.50', '0.00', False),
+        ]
+        for i, (linea, descripcion, cantidad, precio, descuento, eliminar) in enumerate(filas):
+            datos.update({
+                f'lineas-{i}-id': linea.pk if linea else '',
+                f'lineas-{i}-documento': borrador.pk,
+                f'lineas-{i}-descripcion': descripcion,
+                f'lineas-{i}-cantidad': cantidad,
+                f'lineas-{i}-precio_unitario': precio,
+                f'lineas-{i}-descuento': descuento,
+            })
+            if eliminar:
+                datos[f'lineas-{i}-DELETE'] = 'on'
+
+        borrador = DocumentoTributario.objects.get(pk=borrador.pk)
+        form = DocumentoTributarioForm(datos, instance=borrador, emisor=self.emisor)
+        formset = LineaDocumentoFormSet(datos, instance=borrador)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertTrue(formset.is_valid(), formset.errors)
+        lineas, eliminadas = lineas_desde_formset(formset)
+        form.save(lineas=lineas, eliminadas=eliminadas)
+
+        self.assertEqual(
+            list(LineaDocumento.objects.filter(documento=borrador).order_by('id').values_list(
+                'id', 'descripcion', 'cantidad', 'descuento', 'subtotal'
+            )),
+            [
+                (uno.pk, 'Uno editada', Decimal('4.00'), Decimal('5.00'), Decimal('35.00')),
+                (tres.pk, 'Tres', Decimal('3.00'), Decimal('0.00'), Decimal('90.00')),
+                (lineas[-1].pk, 'Cuatro', Decimal('1.00'), Decimal('0.00'), Decimal('7.50')),
+            ]
+        )
+        self.assertFalse(LineaDocumento.objects.filter(pk=dos.pk).exists())
+
+        borrador.refresh_from_db()
+        # Subtotal: 35.00 + 90.00 + 7.50; IVA del 12 % sobre subtotal - descuento
+        self.assertEqual(borrador.subtotal, Decimal('132.50'))
+        self.assertEqual(borrador.descuento, Decimal('5.00'))
+        self.assertEqual(borrador.iva, Decimal('15.30'))
+        self.assertEqual(borrador.total, Decimal('142.80'))
+
+
+@override_settings(TIME_ZONE='America/Guatemala')
+class BusquedaDocumentosTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        for referencia in ['FAC-00123', 'FAC-00456', 'NC-777']:
+            self.documento(referencia)
+
+    def listado(self, **parametros):
+        from .views import DocumentoListView
+
+        solicitud = RequestFactory().get('/', parametros)
+        solicitud.user = self.usuario
+        vista = DocumentoListView()
+        vista.setup(solicitud)
+        return sorted(vista.get_queryset().values_list('referencia_interna', flat=True))
+
+    def test_encuentra_subcadenas_con_y_sin_trigramas(self):
+        # '123' y '5432' no son palabras completas ni prefijos de los términos indexados
+        for trigramas in (True, False):
+            with self.subTest(trigramas=trigramas), \
+                    mock.patch.object(busqueda, 'usa_trigramas', return_value=trigramas):
+                self.assertEqual(self.listado(referencia='123'), ['FAC-00123'])
+                self.assertEqual(self.listado(referencia='fac-00'), ['FAC-00123', 'FAC-00456'])
+                self.assertEqual(self.listado(nit_receptor='5432'), ['FAC-00123', 'FAC-00456', 'NC-777'])
+                self.assertEqual(self.listado(referencia='999'), [])
+
+
+class DiaEmisionTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 23:30 en Guatemala (UTC-6) es 05:30 UTC del día siguiente
+        self.ayer = timezone.localdate() - datetime.timedelta(days=1)
+        self.fecha_emision = datetime.datetime.combine(
+            self.ayer + datetime.timedelta(days=1), datetime.time(5, 30), tzinfo=datetime.timezone.utc
+        )
+
+    def test_cerca_de_la_medianoche_utc_se_guarda_el_dia_local(self):
+        documento = self.documento('MEDIANOCHE', fecha_emision=self.fecha_emision)
+
+        documento.refresh_from_db()
+        self.assertEqual(documento.dia_emision, self.ayer)
+        self.assertEqual(
+            list(DocumentoTributario.objects.filter(dia_emision=self.ayer).values_list('pk', flat=True)),
+            [documento.pk]
+        )
+
+    def test_aparece_en_el_dia_local_de_los_dashboards(self):
+        # Misma agrupación que las gráficas por día del tablero de consulta
+        documento = self.documento('MEDIANOCHE', fecha_emision=self.fecha_emision)
+        desde = timezone.localdate() - datetime.timedelta(days=30)
+
+        def por_dia(consulta):
+            return list(
+                consulta.filter(dia_emision__gte=desde).annotate(dia=F('dia_emision'))
+                .values('dia').annotate(count=Count('id')).order_by('dia').values_list('dia', 'count')
+            )
+
+        self.assertEqual(por_dia(DocumentoTributario.objects.filter(emisor=self.emisor)), [(self.ayer, 1)])
+        self.assertEqual(por_dia(DocumentoTributario.objects.all()), [(self.ayer, 1)])
+        self.assertEqual(
+            list(DocumentoTributario.objects.filter(
+                emisor=self.emisor, dia_emision__gte=self.ayer, dia_emision__lte=self.ayer
+            ).values_list('pk', flat=True)),
+            [documento.pk]
+        )
+        self.assertFalse(DocumentoTributario.objects.filter(dia_emision=self.ayer + datetime.timedelta(days=1)).exists())
+
+
+class MigracionTestCase(TransactionTestCase):
+    """
+    Migra la base de pruebas hacia atrás hasta `antes`, para crear datos
+    con los modelos históricos, y la deja en las últimas migraciones al final
+    """
+    antes = None
+    despues = None
+
+    def migrar(self, destino):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(destino)
+        return executor.loader.project_state(destino).apps
+
+    def tearDown(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        super().tearDown()
+
+    def escenario(self, apps):
+        Contribuyente = apps.get_model('emisor', 'Contribuyente')
+        emisor = Contribuyente.objects.create(nit=nit_valido(1234567), nombre='Emisor', direccion='-', correo='e@example.com')
+        establecimiento = apps.get_model('emisor', 'Establecimiento').objects.create(
+            contribuyente=emisor, codigo='001', nombre='-', direccion='-'
+        )
+        tipo = apps.get_model('emisor', 'TipoDocumento').objects.create(codigo='FACT', nombre='Factura')
+        return {'tipo_documento': tipo, 'emisor': emisor, 'receptor': emisor, 'establecimiento': establecimiento}
+
+
+class MigracionDiaEmisionTests(MigracionTestCase):
+    """
+    La migración 0003 llena dia_emision de los documentos existentes con
+    el día local antes de declarar la columna NOT NULL
+    """
+    antes = [('emisor', '0002_contribuyente_nit_error_contribuyente_nit_valido_and_more')]
+    despues = [('emisor', '0003_documentotributario_dia_emision')]
+
+    @override_settings(TIME_ZONE='America/Guatemala')
+    def test_llena_el_dia_local_de_los_documentos_existentes(self):
+        apps = self.migrar(self.antes)
+        campos = self.escenario(apps)
+        Documento = apps.get_model('emisor', 'DocumentoTributario')
+        fechas = {
+            'NOCHE': datetime.datetime(2024, 3, 16, 5, 30, tzinfo=datetime.timezone.utc),
+            'MANANA': datetime.datetime(2024, 3, 16, 6, 30, tzinfo=datetime.timezone.utc),
+        }
+        for referencia, fecha in fechas.items():
+            Documento.objects.create(
+                referencia_interna=referencia, fecha_emision=fecha, subtotal=Decimal('1.00'),
+                iva=Decimal('0.12'), total=Decimal('1.12'), **campos
+            )
+
+        apps = self.migrar(self.despues)
+
+        self.assertEqual(
+            dict(apps.get_model('emisor', 'DocumentoTributario').objects.values_list('referencia_interna', 'dia_emision')),
+            {'NOCHE': datetime.date(2024, 3, 15), 'MANANA': datetime.date(2024, 3, 16)}
+        )
+
+
+class MigracionReferenciasDuplicadasTests(MigracionTestCase):
+    """
+    La migración 0004 renombra las referencias repetidas por un emisor en el
+    mismo día antes de crear documento_referencia_dia_unica
+    """
+    antes = [('emisor', '0003_documentotributario_dia_emision'), ('autoriza', '0007_fragmentoinforme')]
+    despues = [('emisor', '0004_alter_documentotributario_unique_together_and_more')]
+    registro = 'emisor.migrations.0004_alter_documentotributario_unique_together_and_more'
+
+    def crear_repetidos(self, apps):
+        campos = self.escenario(apps)
+        Documento = apps.get_model('emisor', 'DocumentoTributario')
+        dia = datetime.date(2024, 3, 15)
+        documentos = []
+        # Misma referencia y día, distinta hora: la restricción anterior lo permitía
+        for hora, referencia in [(9, 'REF-1'), (10, 'REF-1'), (11, 'REF-1'), (12, 'REF-1-2')]:
+            documentos.append(Documento.objects.create(
+                referencia_interna=referencia, dia_emision=dia,
+                fecha_emision=datetime.datetime(2024, 3, 15, hora, tzinfo=datetime.timezone.utc),
+                subtotal=Decimal('1.00'), iva=Decimal('0.12'), total=Decimal('1.12'), **campos
+            ))
+        return documentos
+
+    def test_renombra_los_repetidos_y_registra_los_ids(self):
+        primero, segundo, tercero, ocupado = self.crear_repetidos(self.migrar(self.antes))
+
+        with self.assertLogs(self.registro, 'WARNING') as registro:
+            apps = self.migrar(self.despues)
+
+        Documento = apps.get_model('emisor', 'DocumentoTributario')
+        self.assertEqual(
+            dict(Documento.objects.values_list('pk', 'referencia_interna')),
+            {primero.pk: 'REF-1', segundo.pk: 'REF-1-3', tercero.pk: 'REF-1-4', ocupado.pk: 'REF-1-2'}
+        )
+        self.assertEqual(
+            Documento.objects.get(pk=segundo.pk).observaciones,
+            'Referencia original: REF-1 (repetida el 15/03/2024)'
+        )
+        self.assertEqual(len(registro.records), 2)
+        self.assertIn(f"Documento {segundo.pk}:", registro.output[0])
+        self.assertIn(f"Documento {tercero.pk}:", registro.output[1])
+
+    def test_se_detiene_si_un_repetido_esta_aprobado(self):
+        apps = self.migrar(self.antes)
+        primero, segundo, tercero, ocupado = self.crear_repetidos(apps)
+        Autorizacion = apps.get_model('autoriza', 'Autorizacion')
+        Autorizacion.objects.create(documento_id=segundo.pk, estado='APROBADO', numero_autorizacion='A-1')
+
+        with self.assertRaisesMessage(RuntimeError, str([segundo.pk])):
+            self.migrar(self.despues)
+
+        self.assertEqual(
+            sorted(DocumentoTributario.objects.values_list('referencia_interna', flat=True)),
+            ['REF-1', 'REF-1', 'REF-1', 'REF-1-2']
+        )
+        # Resuelto el caso, tearDown completa las migraciones
+        Autorizacion.objects.all().delete()
+
+
+class CalcularDiaEmisionTests(EscenarioMixin, TestCase):
+
+    def test_renombra_el_documento_que_choca_al_cambiar_de_dia(self):
+        primero = self.documento('REF-1')
+        movido = self.documento('REF-1', fecha_emision=primero.fecha_emision - datetime.timedelta(days=1))
+        # update() no pasa por save(): el día queda desactualizado
+        DocumentoTributario.objects.filter(pk=movido.pk).update(fecha_emision=primero.fecha_emision)
+
+        call_command('calcular_dia_emision', stdout=open(os.devnull, 'w'))
+
+        movido.refresh_from_db()
+        self.assertEqual(movido.dia_emision, primero.dia_emision)
+        self.assertEqual(movido.referencia_interna, 'REF-1-2')
+        self.assertIn('Referencia original: REF-1', movido.observaciones)
+        primero.refresh_from_db()
+        self.assertEqual(primero.referencia_interna, 'REF-1')
+
+
+class DiaRelacionadoTests(EscenarioMixin, TestCase):
+    """
+    Las líneas, autorizaciones, tareas y errores guardan el día de su
+    documento (columna de partición) y lo siguen cuando cambia
+    """
+
+    def setUp(self):
+        super().setUp()
+        from autoriza.models import AutorizacionError, ErrorValidacion
+        from autoriza.services import crear_solicitudes_autorizacion
+        from autoriza.tasks import encolar_autorizaciones
+
+        self.emitido = guardar_documento(
+            DocumentoTributario(
+                tipo_documento=self.tipo, referencia_interna='REF-1', emisor=self.emisor,
+                receptor=self.receptor, establecimiento=self.establecimiento,
+                fecha_emision=timezone.now() - datetime.timedelta(days=40),
+                estado=DocumentoTributario.ESTADO_EMITIDO, es_borrador=False
+            ),
+            [LineaDocumento(descripcion='Servicio', cantidad=Decimal('1'), precio_unitario=Decimal('50.00'))]
+        )
+        encolar_autorizaciones([self.emitido])
+        autorizacion, = crear_solicitudes_autorizacion([self.emitido])
+        AutorizacionError.objects.create(
+            autorizacion=autorizacion, error=ErrorValidacion.objects.get(codigo=ErrorValidacion.TIPO_IVA)
+        )
+
+    def dias(self):
+        from autoriza.models import Autorizacion, AutorizacionError, TareaAutorizacion
+
+        return {
+            modelo.__name__: set(modelo.objects.values_list('dia_emision', flat=True))
+            for modelo in (LineaDocumento, Autorizacion, AutorizacionError, TareaAutorizacion)
+        }
+
+    def esperado(self, dia):
+        return {nombre: {dia} for nombre in ('LineaDocumento', 'Autorizacion', 'AutorizacionError', 'TareaAutorizacion')}
+
+    def test_se_copia_al_crear_y_sigue_al_documento_al_guardarlo(self):
+        self.assertEqual(self.dias(), self.esperado(self.emitido.dia_emision))
+
+        documento = DocumentoTributario.objects.get(pk=self.emitido.pk)
+        documento.fecha_emision = timezone.now()
+        guardar_documento(documento)
+
+        self.assertEqual(self.dias(), self.esperado(timezone.localdate()))
+
+    def test_calcular_dia_emision_lo_propaga(self):
+        fecha = timezone.now()
+        # update() no pasa por save(): ni el documento ni sus filas dependientes cambian de día
+        DocumentoTributario.objects.filter(pk=self.emitido.pk).update(fecha_emision=fecha)
+        self.assertEqual(self.dias(), self.esperado(self.emitido.dia_emision))
+
+        call_command('calcular_dia_emision', stdout=open(os.devnull, 'w'))
+
+        self.assertEqual(self.dias(), self.esperado(timezone.localdate(fecha)))
+
+
+class ParticionarDocumentosSinParticionesTests(EscenarioMixin, TestCase):
+    """
+    Sin particiones (SQLite, o PostgreSQL sin DOCUMENTOS_PARTICIONADOS) el
+    comando solo informa los documentos por mes
+    """
+
+    def setUp(self):
+        super().setUp()
+        if particiones.es_particionada():
+            self.skipTest('Los documentos están particionados')
+
+    def test_muestra_los_documentos_por_mes(self):
+        self.documento('REF-1', fecha_emision=datetime.datetime(2024, 3, 15, 12, tzinfo=timezone.get_current_timezone()))
+        self.documento('REF-2', fecha_emision=datetime.datetime(2024, 3, 20, 12, tzinfo=timezone.get_current_timezone()))
+        self.documento('REF-3', fecha_emision=datetime.datetime(2024, 5, 1, 12, tzinfo=timezone.get_current_timezone()))
+        salida = StringIO()
+
+        call_command('particionar_documentos', stdout=salida)
+
+        self.assertIn('  2024-03: 2\n  2024-05: 1\n', salida.getvalue())
+
+    def test_desvincular_requiere_particiones(self):
+        with self.assertRaisesMessage(CommandError, 'no están particionados'):
+            call_command('particionar_documentos', '--desvincular', '2024-01', stdout=StringIO())
+
+
+class ParticionesTests(EscenarioMixin, TransactionTestCase):
+    """
+    Particiones mensuales en PostgreSQL; solo corre si la base de pruebas
+    se migró con DOCUMENTOS_PARTICIONADOS
+    """
+
+    def setUp(self):
+        if not particiones.es_particionada():
+            self.skipTest('Requiere PostgreSQL con DOCUMENTOS_PARTICIONADOS')
+        super().setUp()
+        self.setUpTestData()
+
+    def documento_completo(self, referencia, dia):
+        """
+        Documento del día indicado con una línea, su autorización y un error
+        """
+        from autoriza.models import Autorizacion, AutorizacionError, ErrorValidacion
+
+        documento = self.documento(referencia, fecha_emision=datetime.datetime.combine(
+            dia, datetime.time(12), tzinfo=timezone.get_current_timezone()
+        ))
+        LineaDocumento.objects.create(
+            documento=documento, descripcion='Servicio', cantidad=Decimal('1'), precio_unitario=Decimal('100.00')
+        )
+        autorizacion = Autorizacion.objects.create(documento=documento)
+        AutorizacionError.objects.create(
+            autorizacion=autorizacion, error=ErrorValidacion.objects.get(codigo=ErrorValidacion.TIPO_IVA)
+        )
+        return documento
+
+    def ubicacion(self, dia):
+        """
+        Partición en la que está cada fila del día, por tabla
+        """
+        resultado = {}
+        with connection.cursor() as cursor:
+            for tabla in particiones.tablas():
+                cursor.execute(f'SELECT DISTINCT tableoid::regclass::text FROM {tabla} WHERE dia_emision = %s', [dia])
+                resultado[tabla] = [fila[0] for fila in cursor.fetchall()]
+        return resultado
+
+    def eliminar_tablas(self, nombres):
+        with connection.cursor() as cursor:
+            for nombre in nombres:
+                cursor.execute(f'DROP TABLE IF EXISTS {connection.ops.quote_name(nombre)}')
+
+    def test_crear_particiones_traslada_las_filas_de_default(self):
+        # Más allá de las particiones futuras que crea la migración
+        dia = (timezone.localdate().replace(day=1) + datetime.timedelta(days=400)).replace(day=10)
+        documento = self.documento_completo('FUTURO', dia)
+        self.assertEqual(self.ubicacion(dia), {tabla: [f'{tabla}_default'] for tabla in particiones.tablas()})
+
+        creadas = particiones.crear_particiones(0, hoy=dia)
+
+        self.assertEqual(creadas, [particiones.nombre_particion(tabla, dia) for tabla in particiones.tablas()])
+        self.assertEqual(self.ubicacion(dia), {tabla: [particiones.nombre_particion(tabla, dia)] for tabla in particiones.tablas()})
+        self.assertEqual(particiones.crear_particiones(0, hoy=dia), [])
+        # Las llaves foráneas hacia los documentos se volvieron a crear
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LineaDocumento.objects.create(
+                documento_id=documento.pk, dia_emision=dia + datetime.timedelta(days=1),
+                descripcion='Otra', cantidad=Decimal('1'), precio_unitario=Decimal('1.00'), subtotal=Decimal('1.00')
+            )
+
+    def test_cambiar_el_dia_mueve_las_filas_dependientes(self):
+        hoy = timezone.localdate()
+        anterior = hoy.replace(day=1) - datetime.timedelta(days=400)
+        documento = self.documento_completo('REF-1', anterior)
+
+        documento.fecha_emision = timezone.now()
+        documento.save()
+
+        self.assertEqual(self.ubicacion(anterior), {tabla: [] for tabla in particiones.tablas()})
+        self.assertEqual(self.ubicacion(hoy), {tabla: [particiones.nombre_particion(tabla, hoy)] for tabla in particiones.tablas()})
+
+    def test_las_consultas_por_dia_solo_leen_la_particion_del_mes(self):
+        hoy = timezone.localdate()
+        plan = DocumentoTributario.objects.filter(dia_emision=hoy).explain()
+        self.assertIn(particiones.nombre_particion(DocumentoTributario._meta.db_table, hoy), plan)
+        self.assertNotIn('_default', plan)
+
+        plan = LineaDocumento.objects.filter(dia_emision__gte=hoy.replace(day=1), dia_emision__lte=hoy).explain()
+        self.assertIn(particiones.nombre_particion(LineaDocumento._meta.db_table, hoy), plan)
+        self.assertNotIn('_default', plan)
+
+    def test_desvincular_exige_archivar_las_autorizaciones(self):
+        from autoriza.models import Autorizacion
+
+        dia = datetime.date(2020, 1, 15)
+        self.documento_completo('ANTIGUO', dia)
+        self.addCleanup(self.eliminar_tablas, particiones.crear_particiones(0, hoy=dia))
+
+        with self.assertRaisesMessage(CommandError, 'archivar_documentos'):
+            call_command('particionar_documentos', '--desvincular', '2020-02', stdout=StringIO())
+
+        Autorizacion.objects.all().delete()
+        salida = StringIO()
+        call_command('particionar_documentos', '--desvincular', '2020-02', stdout=salida)
+
+        self.assertIn('Partición separada: emisor_documentotributario_p2020_01', salida.getvalue())
+        self.assertFalse(DocumentoTributario.objects.filter(dia_emision=dia).exists())
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT referencia_interna FROM emisor_documentotributario_p2020_01')
+            self.assertEqual(cursor.fetchall(), [('ANTIGUO',)])
+
+
+class DirectorioTests(EscenarioMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        directorio.construir()
+        self.archivo = directorio._identidad(directorio.ruta_directorio())
+
+    def test_en_regimen_estable_no_consulta_la_base_de_datos(self):
+        directorio.resolver([self.receptor.nit])
+        with self.assertNumQueries(0):
+            self.assertEqual(directorio.resolver([self.receptor.nit]), {self.receptor.nit: self.receptor.pk})
+
+    def test_resuelve_los_contribuyentes_guardados_despues_del_archivo(self):
+        nuevo_nit = nit_valido(2468135)
+        with self.captureOnCommitCallbacks(execute=True):
+            nuevo = Contribuyente.objects.create(
+                nit=nuevo_nit, nombre='Nuevo', direccion='Zona 4', correo='nuevo@example.com'
+            )
+            self.receptor.nombre = 'Receptor Renombrado'
+            self.receptor.save()
+
+        self.assertEqual(directorio.resolver([nuevo_nit]), {nuevo_nit: nuevo.pk})
+        self.assertEqual(directorio.contribuyente(self.receptor.nit).nombre, 'Receptor Renombrado')
+
+        nit_anterior = self.receptor.nit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.receptor.nit = nit_valido(1357924)
+            self.receptor.save()
+        self.assertEqual(
+            directorio.resolver([nit_anterior, self.receptor.nit]), {self.receptor.nit: self.receptor.pk}
+        )
+        self.assertEqual(directorio._identidad(directorio.ruta_directorio()), self.archivo)
+
+    def test_los_eliminados_se_descartan_sin_regenerar_el_archivo(self):
+        directorio.resolver([self.receptor.nit])
+        nit = self.receptor.nit
+        with self.captureOnCommitCallbacks(execute=True):
+            Contribuyente.objects.filter(pk=self.receptor.pk).delete()
+
+        self.assertEqual(directorio.resolver([nit, self.emisor.nit]), {self.emisor.nit: self.emisor.pk})
+        self.assertEqual(directorio._identidad(directorio.ruta_directorio()), self.archivo)
+        self.assertTrue(ContribuyenteEliminado.objects.filter(contribuyente_id=self.receptor.pk).exists())
+
+    def test_generar_el_archivo_borra_las_eliminaciones_anteriores(self):
+        antigua = ContribuyenteEliminado.objects.create(contribuyente_id=-1)
+        ContribuyenteEliminado.objects.filter(pk=antigua.pk).update(
+            eliminado=timezone.now() - datetime.timedelta(hours=1)
+        )
+        reciente = ContribuyenteEliminado.objects.create(contribuyente_id=-2)
+
+        directorio.construir()
+        self.assertEqual(list(ContribuyenteEliminado.objects.values_list('pk', flat=True)), [reciente.pk])
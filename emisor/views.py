@@ -9,12 +9,15 @@ from django.http import HttpResponseRedirect, JsonResponse
 from django.db import transaction
 from django.utils import timezone
 
+from core import busqueda
+from core.paginacion import PaginacionCursorMixin
 from .models import DocumentoTributario, LineaDocumento, Contribuyente, Establecimiento
 from .forms import (
     DocumentoTributarioForm, LineaDocumentoFormSet, 
     BusquedaDocumentoForm, ContribuyenteForm,
     EstablecimientoForm
 )
+from .services import ReferenciaDuplicada, guardar_encabezado, lineas_desde_formset
 
 
 class ContribuyenteRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -32,9 +35,12 @@ class ContribuyenteRequiredMixin(LoginRequiredMixin, UserPassesTestMixin):
         return super().handle_no_permission()
 
 
-class DocumentoListView(ContribuyenteRequiredMixin, ListView):
+class DocumentoListView(ContribuyenteRequiredMixin, PaginacionCursorMixin, ListView):
     """
     Vista para listar los documentos del contribuyente
+
+    Con ?paginacion=cursor las páginas se recorren por cursor (fecha de
+    emisión e id) en lugar de por número.
     """
     model = DocumentoTributario
     template_name = 'emisor/documento_list.html'
@@ -54,16 +60,16 @@ class DocumentoListView(ContribuyenteRequiredMixin, ListView):
             data = form.cleaned_data
             
             if data.get('referencia'):
-                queryset = queryset.filter(referencia_interna__icontains=data['referencia'])
+                queryset = busqueda.filtrar_subcadena(queryset, data['referencia'], 'referencia_interna')
             
             if data.get('fecha_desde'):
-                queryset = queryset.filter(fecha_emision__date__gte=data['fecha_desde'])
+                queryset = queryset.filter(dia_emision__gte=data['fecha_desde'])
                 
             if data.get('fecha_hasta'):
-                queryset = queryset.filter(fecha_emision__date__lte=data['fecha_hasta'])
+                queryset = queryset.filter(dia_emision__lte=data['fecha_hasta'])
                 
             if data.get('nit_receptor'):
-                queryset = queryset.filter(receptor__nit__icontains=data['nit_receptor'])
+                queryset = busqueda.filtrar_subcadena(queryset, data['nit_receptor'], 'receptor__nit')
                 
             if data.get('estado'):
                 queryset = queryset.filter(estado=data['estado'])
@@ -74,7 +80,7 @@ class DocumentoListView(ContribuyenteRequiredMixin, ListView):
             if data.get('monto_maximo'):
                 queryset = queryset.filter(total__lte=data['monto_maximo'])
         
-        return queryset.order_by('-fecha_emision')
+        return queryset.order_by('-fecha_emision', '-id')
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -147,28 +153,21 @@ class DocumentoCreateView(ContribuyenteRequiredMixin, CreateView):
         lineas_formset = context['lineas_formset']
         
         if lineas_formset.is_valid():
-            # Guardar el documento
-            self.object = form.save()
-            
-            # Guardar las líneas
-            lineas_formset.instance = self.object
-            lineas_formset.save()
-            
-            # Calcular totales
-            self.object.subtotal = sum(linea.subtotal for linea in self.object.lineas.all())
-            self.object.descuento = sum(linea.descuento for linea in self.object.lineas.all())
-            self.object.iva = self.object.calcular_iva()
-            self.object.total = self.object.calcular_total()
-            self.object.save()
+            # Se emite directamente: el documento se guarda una vez con
+            # sus totales y sus líneas
+            form.instance.estado = DocumentoTributario.ESTADO_EMITIDO
+            form.instance.es_borrador = False
             
-            # Cambiar estado a emitido
-            self.object.estado = DocumentoTributario.ESTADO_EMITIDO
-            self.object.es_borrador = False
-            self.object.save()
+            lineas, eliminadas = lineas_desde_formset(lineas_formset)
+            try:
+                self.object = form.save(lineas=lineas, eliminadas=eliminadas)
+            except ReferenciaDuplicada as e:
+                form.add_error(None, e)
+                return self.render_to_response(self.get_context_data(form=form))
             
-            # Crear solicitud de autorización
-            from autoriza.services import crear_solicitud_autorizacion
-            autorizacion = crear_solicitud_autorizacion(self.object)
+            # Crear solicitud de autorización (o encolarla si es asíncrona)
+            from autoriza.tasks import solicitar_autorizacion
+            solicitar_autorizacion(self.object)
             
             messages.success(self.request, 'Documento creado correctamente y enviado para autorización')
             return HttpResponseRedirect(self.get_success_url())
@@ -212,17 +211,13 @@ class DocumentoBorradorCreateView(ContribuyenteRequiredMixin, CreateView):
         lineas_formset = context['lineas_formset']
         
         if lineas_formset.is_valid():
-            self.object = form.save()
-            
-            lineas_formset.instance = self.object
-            lineas_formset.save()
-            
-            # Calcular totales
-            self.object.subtotal = sum(linea.subtotal for linea in self.object.lineas.all())
-            self.object.descuento = sum(linea.descuento for linea in self.object.lineas.all())
-            self.object.iva = self.object.calcular_iva()
-            self.object.total = self.object.calcular_total()
-            self.object.save()
+            # Guardar el documento con sus totales y sus líneas
+            lineas, eliminadas = lineas_desde_formset(lineas_formset)
+            try:
+                self.object = form.save(lineas=lineas, eliminadas=eliminadas)
+            except ReferenciaDuplicada as e:
+                form.add_error(None, e)
+                return self.render_to_response(self.get_context_data(form=form))
             
             messages.success(self.request, 'Borrador guardado correctamente')
             return HttpResponseRedirect(self.get_success_url())
@@ -275,17 +270,13 @@ class DocumentoBorradorUpdateView(ContribuyenteRequiredMixin, UpdateView):
         lineas_formset = context['lineas_formset']
         
         if lineas_formset.is_valid():
-            self.object = form.save()
-            
-            lineas_formset.instance = self.object
-            lineas_formset.save()
-            
-            # Recalcular totales
-            self.object.subtotal = sum(linea.subtotal for linea in self.object.lineas.all())
-            self.object.descuento = sum(linea.descuento for linea in self.object.lineas.all())
-            self.object.iva = self.object.calcular_iva()
-            self.object.total = self.object.calcular_total()
-            self.object.save()
+            # Guardar el documento y aplicar los cambios de las líneas
+            lineas, eliminadas = lineas_desde_formset(lineas_formset)
+            try:
+                self.object = form.save(lineas=lineas, eliminadas=eliminadas)
+            except ReferenciaDuplicada as e:
+                form.add_error(None, e)
+                return self.render_to_response(self.get_context_data(form=form))
             
             messages.success(self.request, 'Borrador actualizado correctamente')
             return HttpResponseRedirect(self.get_success_url())
@@ -330,11 +321,15 @@ class DocumentoBorradorEmitirView(ContribuyenteRequiredMixin, UpdateView):
         self.object.estado = DocumentoTributario.ESTADO_EMITIDO
         self.object.es_borrador = False
         self.object.fecha_emision = timezone.now()
-        self.object.save()
+        try:
+            guardar_encabezado(self.object)
+        except ReferenciaDuplicada as e:
+            messages.error(self.request, e.messages[0])
+            return HttpResponseRedirect(reverse('emisor:documento_borrador_update', kwargs={'pk': self.object.pk}))
         
-        # Crear solicitud de autorización
-        from autoriza.services import crear_solicitud_autorizacion
-        autorizacion = crear_solicitud_autorizacion(self.object)
+        # Crear solicitud de autorización (o encolarla si es asíncrona)
+        from autoriza.tasks import solicitar_autorizacion
+        solicitar_autorizacion(self.object)
         
         messages.success(self.request, 'Documento emitido correctamente y enviado para autorización')
         return HttpResponseRedirect(self.get_success_url())
@@ -169,6 +169,51 @@ SYSTEM_NAME = 'SIGTE'
 SYSTEM_DESCRIPTION = 'Sistema de Gestión Tributaria Electrónica'
 SYSTEM_VERSION = '1.0.0'
 
+# Autorización asíncrona: la emisión solo encola la solicitud y el comando
+# procesar_cola_autorizacion la valida en segundo plano
+AUTORIZACION_ASINCRONA = False
+AUTORIZACION_MAX_INTENTOS = 5
+
+# Alias de DATABASES (una segunda conexión a la misma base de datos) en el
+# que se reservan los correlativos de autorización; sin él, la fila de la
+# secuencia del día queda bloqueada hasta confirmar el lote
+AUTORIZACION_SECUENCIA_DB = 'secuencias'
+
+# Filas a partir de las cuales revisar_planes rechaza un recorrido secuencial
+# en el plan de una consulta frecuente
+CONSULTAS_UMBRAL_RECORRIDO = 10000
+
+# Directorio del archivo histórico de documentos (archivar_documentos)
+ARCHIVO_DOCUMENTOS_DIR = os.path.join(BASE_DIR, 'archivo')
+
+# Particionar por mes de emisión los documentos, sus líneas y los errores de
+# autorización (PostgreSQL 15 o superior; lo aplica la migración emisor 0008)
+# y meses futuros con partición creada (particionar_documentos)
+DOCUMENTOS_PARTICIONADOS = False
+DOCUMENTOS_PARTICIONES_FUTURAS = 3
+
+# Filas estimadas a partir de las cuales los listados web paginados por número
+# informan el total estimado por PostgreSQL en lugar de ejecutar COUNT(*)
+PAGINACION_CONTEO_ESTIMADO_DESDE = 100000
+
+# Buscar también subcadenas con el índice de trigramas cuando PostgreSQL
+# tiene pg_trgm (indexar_busqueda --trigramas)
+BUSQUEDA_TRIGRAMAS = True
+
+# Caché de catálogos (core.catalogos): alias de la caché compartida entre
+# procesos (en producción debe ser Redis o Memcached), entradas del LRU de
+# cada proceso, vigencia en segundos de cada versión en la caché compartida
+# y segundos que cada proceso recuerda la versión si la caché es local
+CATALOGOS_CACHE = 'default'
+CATALOGOS_LRU = 256
+CATALOGOS_TIMEOUT = 24 * 60 * 60
+CATALOGOS_VERSION_TTL = 5
+
+# Directorio de NIT (emisor.directorio): archivo compartido por los procesos
+# y contribuyentes modificados a partir de los cuales se vuelve a generar
+DIRECTORIO_NIT_ARCHIVO = os.path.join(BASE_DIR, 'directorio_nit.bin')
+DIRECTORIO_NIT_DELTA_MAXIMO = 10000
+
 
 # sigte/settings/development.py
 from .base import *
@@ -229,6 +274,16 @@ DATABASES = {
         'PORT': os.environ.get('DB_PORT', '5432'),
     }
 }
+DATABASES['secuencias'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+
+# Caché compartida por todos los procesos (catálogos y versión del
+# directorio de NIT); requiere el paquete redis
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/1'),
+    }
+}
 
 # Email
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'